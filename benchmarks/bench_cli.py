@@ -0,0 +1,101 @@
+# benchmarks/bench_cli.py
+
+"""
+Замер холодного старта командной строки (src.cli).
+
+Каждая команда запускается в новом процессе интерпретатора, как из терминала:
+--help, --help каждой подкоманды и eval/load синтетической модели из файла .model.
+Печатается лучшее время из --repeat запусков, а для --help дополнительно проверяется,
+что при запуске не импортируются тяжёлые модули (xlwings, pandas, Lark, NumPy).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_cli
+    python -m benchmarks.bench_cli --cells 10000 --repeat 5 --output benchmarks/results/cli.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('xlwings', 'pandas', 'lark', 'numpy')
+COMMANDS = ('load', 'compile', 'eval', 'check', 'export', 'goalseek', 'serve')
+
+
+def _run(args: list) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def heavy_imports(argv: list) -> list:
+    """Тяжёлые модули, импортированные при запуске src.cli с аргументами argv (например, ['--help'])."""
+    # Список модулей печатается в stderr при выходе: --help завершает процесс через SystemExit
+    code = ("import atexit, sys; atexit.register(lambda: print(','.join(m for m in "
+            f"{HEAVY_MODULES!r} if m in sys.modules), file=sys.stderr)); "
+            "from src.cli import main; sys.exit(main(sys.argv[1:]))")
+    result = subprocess.run([sys.executable, '-c', code, *argv], cwd=ROOT,
+                            capture_output=True, text=True)
+    last = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ''
+    return [name for name in last.split(',') if name]
+
+
+def bench(cells: int, repeat: int) -> dict:
+    """Лучшее время каждой команды из repeat запусков, с."""
+    from src.ast_builder import compile_formulas
+    from src.cache import save_model
+    from src.synthetic import generate_workbook
+
+    with tempfile.TemporaryDirectory() as directory:
+        all_sheets = generate_workbook(cells)
+        model = save_model(os.path.join(directory, 'bench.model'), all_sheets, compile_formulas(all_sheets))
+        runs = {
+            'python': ['-c', 'pass'],  # Запуск самого интерпретатора — нижняя граница
+            '--help': ['-m', 'src.cli', '--help'],
+            **{f"{command} --help": ['-m', 'src.cli', command, '--help'] for command in COMMANDS},
+            'load .model': ['-m', 'src.cli', 'load', model],
+            'eval .model': ['-m', 'src.cli', 'eval', model],
+        }
+        return {name: min(_run(args) for _ in range(repeat)) for name, args in runs.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cells', type=int, default=10_000, help="размер синтетической модели")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="сохранить результаты в JSON")
+    args = parser.parse_args(argv)
+
+    times = bench(args.cells, args.repeat)
+    for name, seconds in times.items():
+        print(f"{name:<20} {seconds * 1000:>9.1f} мс")
+    heavy = {name: heavy_imports(argv) for name, argv in
+             [('--help', ['--help']), *((f"{c} --help", [c, '--help']) for c in COMMANDS)]}
+    failed = {name: modules for name, modules in heavy.items() if modules}
+    for name, modules in failed.items():
+        print(f"{name}: при запуске импортированы {', '.join(modules)}")
+
+    if args.output:
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cells': args.cells,
+            'times': times,
+            'heavy_imports': heavy,
+        }
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+# benchmarks/bench_pipeline.py
+
+"""
+Замер масштабирования всех этапов конвейера на синтетических книгах (src.synthetic).
+
+Этапы: split_into_constants_and_formulas, extract_cell_references (по всем формулам),
+build_dependency_graph, topological_sort_kahn, parse_formula (compile_formulas)
+и вычисление (evaluate_components по уже разобранным формулам).
+Для каждого размера печатается время каждого этапа и время на ячейку,
+а с --memory — и объём памяти модели (src.memory.model_footprint).
+
+Результаты можно сохранить в JSON (--output) и сравнить с сохранённым ранее прогоном
+(--baseline): этапы, ставшие медленнее больше чем на --tolerance (и модель, ставшая
+больше на ту же долю), считаются регрессией, и программа завершается с кодом 1.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --sizes 1000 10000 --output benchmarks/results/base.json
+    python -m benchmarks.bench_pipeline --baseline benchmarks/results/base.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+
+from src.ast_builder import compile_formulas
+from src.graph import build_dependency_graph, build_reverse_graph, topological_sort_kahn
+from src.loader import split_into_constants_and_formulas
+from src.memory import model_footprint
+from src.model import workbook_values, evaluate_components
+from src.parser import extract_cell_references
+from src.ranges import CalcContext
+from src.synthetic import generate_raw_sheets
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+STAGES = ('split', 'references', 'graph', 'sort', 'parse', 'evaluate')
+DEFAULT_TOLERANCE = 0.25
+MIN_SECONDS = 0.01  # Более короткие этапы не сравниваются: слишком велик шум
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def _extract_all(all_sheets: dict) -> int:
+    count = 0
+    for content in all_sheets.values():
+        for formula in content['formulas'].values():
+            count += len(extract_cell_references(formula, all_sheets))
+    return count
+
+
+def bench(cells: int, params: dict, repeat: int = 1, memory: bool = False) -> dict:
+    """Лучшее из repeat измерений каждого этапа для книги из cells ячеек."""
+    raw = generate_raw_sheets(cells, **params)
+    best = {stage: float('inf') for stage in STAGES}
+    for _ in range(repeat):
+        times = {}
+        all_sheets, times['split'] = _timed(split_into_constants_and_formulas, raw)
+        references, times['references'] = _timed(_extract_all, all_sheets)
+        (graph, in_degree), times['graph'] = _timed(build_dependency_graph, all_sheets)
+        if params.get('cycles'):
+            times['sort'] = None  # Граф с циклами не сортируется
+        else:
+            _, times['sort'] = _timed(lambda: topological_sort_kahn(graph, in_degree, build_reverse_graph(graph)))
+        formulas, times['parse'] = _timed(compile_formulas, all_sheets)
+        context = CalcContext(workbook_values(all_sheets))
+        _, times['evaluate'] = _timed(evaluate_components, all_sheets, formulas, context, bool(params.get('cycles')))
+        for stage, value in times.items():
+            best[stage] = None if value is None else min(best[stage], value)
+    row = {
+        'cells': cells,
+        'formulas': sum(len(content['formulas']) for content in all_sheets.values()),
+        'references': references,
+        'stages': best,
+    }
+    if memory:
+        footprint = model_footprint(all_sheets, formulas, (graph, in_degree), context)
+        row['footprint'] = {'total': footprint.total, 'structures': footprint.structures}
+    return row
+
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """Регрессии относительно baseline: (ячеек, этап, было, стало); для памяти этап — 'footprint'."""
+    before = {row['cells']: row for row in baseline['results']}
+    regressions = []
+    for row in results:
+        old_row = before.get(row['cells'])
+        if old_row is None:
+            continue
+        old, new = old_row.get('footprint'), row.get('footprint')
+        if old and new and new['total'] > old['total'] * (1 + tolerance):
+            regressions.append((row['cells'], 'footprint', old['total'], new['total']))
+        old = old_row['stages']
+        for stage, new_time in row['stages'].items():
+            old_time = old.get(stage)
+            if old_time and new_time and max(old_time, new_time) >= MIN_SECONDS \
+                    and new_time > old_time * (1 + tolerance):
+                regressions.append((row['cells'], stage, old_time, new_time))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--sheets', type=int, default=3)
+    parser.add_argument('--chain-depth', type=int, default=1000)
+    parser.add_argument('--fan-in', type=int, default=3)
+    parser.add_argument('--range-density', type=float, default=0.1)
+    parser.add_argument('--cross-sheet-ratio', type=float, default=0.1)
+    parser.add_argument('--cycles', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--memory', action='store_true', help="замерить и память модели")
+    parser.add_argument('--output', help="сохранить результаты в JSON")
+    parser.add_argument('--baseline', help="сравнить с результатами из JSON")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="допустимое замедление этапа (доля), по умолчанию 0.25")
+    args = parser.parse_args(argv)
+    params = {
+        'sheets': args.sheets, 'chain_depth': args.chain_depth, 'fan_in': args.fan_in,
+        'range_density': args.range_density, 'cross_sheet_ratio': args.cross_sheet_ratio,
+        'cycles': args.cycles, 'seed': args.seed,
+    }
+
+    print(f"{'ячеек':>10} {'формул':>10} " + ' '.join(f"{stage + ', с':>13}" for stage in STAGES) + f" {'мкс/ячейку':>11}")
+    results = []
+    for cells in args.sizes:
+        row = bench(cells, params, args.repeat, args.memory)
+        results.append(row)
+        stages = row['stages']
+        total = sum(value for value in stages.values() if value is not None)
+        cols = ' '.join(f"{'—' if stages[s] is None else format(stages[s], '.3f'):>13}" for s in STAGES)
+        print(f"{row['cells']:>10} {row['formulas']:>10} {cols} {total / cells * 1e6:>11.2f}")
+        if args.memory:
+            print(f"{'':>10} память модели: {row['footprint']['total'] / 2 ** 20:.1f} МБ")
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'params': params,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        if baseline.get('params') != params:
+            print("Внимание: параметры генератора отличаются от сохранённого прогона")
+        regressions = compare(results, baseline, args.tolerance)
+        for cells, stage, old, new in regressions:
+            if stage == 'footprint':
+                print(f"Регрессия: {cells} ячеек, память: {old / 2 ** 20:.1f} МБ -> {new / 2 ** 20:.1f} МБ "
+                      f"({new / old - 1:+.0%})")
+            else:
+                print(f"Регрессия: {cells} ячеек, {stage}: {old:.3f} с -> {new:.3f} с ({new / old - 1:+.0%})")
+        if regressions:
+            return 1
+        print("Регрессий нет")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# benchmarks/bench_server.py
+
+"""
+Замер задержки сервера «что если» (src.server) на синтетической книге.
+
+Сервер запускается в этом же процессе на Unix-сокете (или по HTTP с --http),
+--clients клиентов одновременно шлют по --requests запросов: случайные значения
+--inputs ячеек листа «Вход» и первые --outputs формул первого листа как выходы.
+Время запроса пропорционально числу формул, зависящих от входов («пересчитывается на запрос»).
+Печатаются задержка p50/p99 со стороны клиента, пропускная способность
+и средний размер пакета, в который сервер объединил запросы.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_server
+    python -m benchmarks.bench_server --cells 100000 --clients 32 --requests 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from src.ast_builder import compile_formulas
+from src.server import ModelServer
+from src.synthetic import generate_workbook, INPUT_SHEET
+
+
+async def _client(connect, request_bodies: list, latencies: list, http: bool):
+    reader, writer = await connect()
+    for body in request_bodies:
+        started = time.perf_counter()
+        if http:
+            payload = body.encode('utf-8')
+            writer.write(b"POST /eval HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(payload) + payload)
+            length = 0
+            while (line := await reader.readline()) != b'\r\n':
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            answer = json.loads(await reader.readexactly(length))
+        else:
+            writer.write(body.encode('utf-8') + b'\n')
+            answer = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - started)
+        if 'error' in answer:
+            raise RuntimeError(answer['error'])
+    writer.close()
+
+
+async def bench(cells: int, clients: int, requests: int, http: bool, batch_window: float, seed: int,
+                input_count: int = 2, output_count: int = 5) -> dict:
+    all_sheets = generate_workbook(cells, seed=seed)
+    formulas = compile_formulas(all_sheets)
+    inputs = [f"{INPUT_SHEET}!{addr}" for addr in all_sheets[INPUT_SHEET]['constants']][:input_count]
+    sheet = next(name for name, content in all_sheets.items() if content['formulas'])
+    outputs = [f"{sheet}!{addr}" for addr in all_sheets[sheet]['formulas']][:output_count]
+    rng = random.Random(seed)
+    server = ModelServer({'bench': (all_sheets, formulas)}, batch_window=batch_window)
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            if http:
+                sockets = (await server.start_http('127.0.0.1', 0)).sockets
+                port = sockets[0].getsockname()[1]
+                connect = lambda: asyncio.open_connection('127.0.0.1', port)
+            else:
+                path = os.path.join(directory, 'bench.sock')
+                await server.start_unix(path)
+                connect = lambda: asyncio.open_unix_connection(path)
+
+            def body():
+                values = {cell: rng.uniform(0, 100) for cell in inputs}
+                return json.dumps({'model': 'bench', 'inputs': values, 'outputs': outputs})
+
+            # Первый запрос строит ScenarioModel — он в замер не входит
+            warmup = []
+            await _client(connect, [body()], warmup, http)
+            latencies = []
+            started = time.perf_counter()
+            await asyncio.gather(*(_client(connect, [body() for _ in range(requests)], latencies, http)
+                                   for _ in range(clients)))
+            elapsed = time.perf_counter() - started
+            stats = server.stats()
+            recalculated = next(iter(server._batchers.values())).model.recalculated
+        finally:
+            await server.close()
+    latencies.sort()
+    return {
+        'cells': cells,
+        'formulas': len(formulas),
+        'recalculated': recalculated,
+        'warmup_ms': warmup[0] * 1000,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        'requests_per_second': len(latencies) / elapsed,
+        'mean_batch': stats['mean_batch'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cells', type=int, default=10_000)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=100, help="запросов на клиента")
+    parser.add_argument('--inputs', type=int, default=2, help="сколько входных ячеек меняет запрос")
+    parser.add_argument('--outputs', type=int, default=5, help="сколько формул возвращает запрос")
+    parser.add_argument('--http', action='store_true', help="HTTP вместо Unix-сокета")
+    parser.add_argument('--batch-window', type=float, default=0.0, metavar='МС')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    result = asyncio.run(bench(args.cells, args.clients, args.requests, args.http,
+                               args.batch_window / 1000, args.seed, args.inputs, args.outputs))
+    print(f"ячеек: {result['cells']}, формул: {result['formulas']}, пересчитывается на запрос: "
+          f"{result['recalculated']}, первый запрос: {result['warmup_ms']:.1f} мс")
+    print(f"p50: {result['p50_ms']:.2f} мс, p99: {result['p99_ms']:.2f} мс, "
+          f"{result['requests_per_second']:.0f} запросов/с, средний пакет: {result['mean_batch']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# benchmarks/bench_topological_sort.py
+
+"""
+Замер масштабирования топологической сортировки: src.graph.topological_sort_kahn
+на словарях и CSRGraph.topological_order на целочисленных массивах.
+
+Строится синтетический граф, похожий на финансовую модель: столбцы-цепочки
+(нарастающий итог) плюс ссылки на ячейки предыдущего столбца.
+Для каждого размера печатается время построения обратного индекса, время сортировки
+и время в пересчёте на одну вершину — при линейной сложности оно почти не растёт,
+а также время сортировки того же графа в CSR-представлении.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_topological_sort
+    python -m benchmarks.bench_topological_sort --sizes 1000 10000 --repeat 3
+"""
+
+import argparse
+import random
+import time
+
+from src.csr_graph import CSRGraph
+from src.graph import build_reverse_graph, topological_sort_kahn
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+ROWS_PER_COLUMN = 1_000
+
+
+def make_graph(n: int, seed: int = 0):
+    """
+    Граф из n вершин: ячейка зависит от ячейки выше (цепочка по столбцу)
+    и от одной-двух случайных ячеек предыдущего столбца. Возвращает graph и in_degree.
+    """
+    rnd = random.Random(seed)
+    graph = {}
+    for i in range(n):
+        col, row = divmod(i, ROWS_PER_COLUMN)
+        deps = []
+        if row > 0:
+            deps.append(f"S!{col}:{row - 1}")
+        if col > 0:
+            for _ in range(rnd.randint(1, 2)):
+                deps.append(f"S!{col - 1}:{rnd.randrange(ROWS_PER_COLUMN)}")
+        graph[f"S!{col}:{row}"] = deps
+    in_degree = {node: len(deps) for node, deps in graph.items()}
+    return graph, in_degree
+
+
+def bench(n: int, repeat: int) -> dict:
+    """Лучшее из repeat измерений для графа из n вершин."""
+    graph, in_degree = make_graph(n)
+    edges = sum(len(deps) for deps in graph.values())
+    csr = CSRGraph.from_dict(graph)
+    reverse_time = sort_time = csr_time = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        dependents = build_reverse_graph(graph)
+        reverse_time = min(reverse_time, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        order = topological_sort_kahn(graph, in_degree, dependents)
+        sort_time = min(sort_time, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        csr.topological_order()
+        csr_time = min(csr_time, time.perf_counter() - start)
+    assert len(order) == n
+    return {'nodes': n, 'edges': edges, 'reverse_s': reverse_time, 'sort_s': sort_time, 'csr_s': csr_time}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    print(f"{'вершин':>10} {'рёбер':>10} {'индекс, с':>10} {'сортировка, с':>14} {'мкс/вершину':>12} {'CSR, с':>8}")
+    for n in args.sizes:
+        r = bench(n, args.repeat)
+        per_node = (r['reverse_s'] + r['sort_s']) / n * 1e6
+        print(f"{r['nodes']:>10} {r['edges']:>10} {r['reverse_s']:>10.3f} {r['sort_s']:>14.3f} {per_node:>12.2f} {r['csr_s']:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
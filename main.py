@@ -1,13 +1,12 @@
 # main.py
 
-from src.loader import read_excel_file, split_into_constants_and_formulas
+"""
+Точка входа: python main.py <команда> ... — то же, что python -m src.cli (см. src/cli.py).
+"""
 
-def main():
-    # Убедитесь, что test.xlsx лежит в корне проекта или укажите полный путь
-    raw = read_excel_file('C:/Users/pc/practicum/marketplace_analytics/Экономика поставок.xlsx')
-    sheets = split_into_constants_and_formulas(raw)
-    print("Листы:", sheets.keys())
-    print("Константы Вход:", sheets['Вход']['constants'])
+import sys
+
+from src.cli import main
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
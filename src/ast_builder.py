@@ -1,6 +1,9 @@
 from lark import Lark, Transformer, v_args
-from src.evaluator import ConstantNode, CellNode, FunctionNode, BinaryOpNode, FormulaNode
+from src.evaluator import ConstantNode, CellNode, RangeNode, FunctionNode, BinaryOpNode, FormulaNode
 from lark.exceptions import UnexpectedInput
+from src.errors import error_from_code, NAME
+from src.metrics import instrumented, add as add_metric
+from src.ranges import parse_cell, column_to_letter, split_ref
 
 # Определение грамматики для Excel-подобных формул
 # Грамматика будет поддерживать операторы, ссылки на ячейки, функции и арифметику
@@ -11,52 +14,79 @@ EXCEL_GRAMMAR = r"""
     %ignore COMMENT
 
     // --- Терминалы ---
-    // Для чисел, строк и переменных
-    CELL:       /[A-Za-z]+\d+(:[A-Za-z]+\d+)?/   // Ячейки, например A1 или B2:C3
-    SHEET_NAME: /[A-Za-z_]\w+/                    // Названия листов, например Sheet1 или My_Sheet
+    // Префикс листа вместе с '!': Sheet1!, Вход!, 'My Sheet'!
+    SHEET_PREFIX.3: /('([^']|'')+'|[^\W\d][\w.]*)!/
+    // Имя функции — только если сразу за ним идёт открывающая скобка
+    FUNC_NAME.3:    /[A-Za-z_][A-Za-z0-9_.]*(?=\s*\()/
+    // Логические константы TRUE / FALSE
+    BOOL.2:         /(TRUE|FALSE)(?![\w(])/i
+    // Ячейки и диапазоны, например A1, $B$2 или B2:C3, а также столбцы A:C и строки 1:3
+    CELL.1:         /\$?[A-Za-z]{1,3}\$?\d+(:\$?[A-Za-z]{1,3}\$?\d+)?|\$?[A-Za-z]{1,3}:\$?[A-Za-z]{1,3}(?![\w(])|\$?\d+:\$?\d+/
+    // Строковые литералы в двойных кавычках ("" внутри строки — экранированная кавычка)
+    STRING:         /"([^"]|"")*"/
+    // Литералы ошибок Excel: #DIV/0!, #N/A, #REF! и т.д.
+    ERROR.3:        /#(NULL!|DIV\/0!|VALUE!|REF!|NAME\?|NUM!|N\/A)/i
 
     // Импортируем стандартные токены
-    %import common.CNAME      -> NAME
     %import common.NUMBER     -> NUMBER
-    %import common.WS_INLINE
-    %ignore WS_INLINE          // Игнорируем пробелы и табуляцию
+    %import common.WS
+    %ignore WS                 // Игнорируем пробелы, табуляцию и переносы строк
 
     // Основное правило для формул
-    ?start: expr
-
-    // Операции с термами, включая арифметику и сложение
+    ?start: comparison
+
+    // Сравнения имеют самый низкий приоритет
+    ?comparison: concat
+               | comparison ">" concat   -> gt
+               | comparison "<" concat   -> lt
+               | comparison ">=" concat  -> ge
+               | comparison "<=" concat  -> le
+               | comparison "=" concat   -> eq
+               | comparison "<>" concat  -> ne
+
+    // Склейка строк
+    ?concat: expr
+           | concat "&" expr -> concat
+
+    // Сложение и вычитание
     ?expr: expr "+" term    -> add
          | expr "-" term    -> sub
          | term
 
-    // Операции с термами умножения и деления
-    ?term: factor "*" factor -> mul
-         | factor "/" factor -> div
-         | factor
-
-    // Факторы: это могут быть ячейки, числа или выражения в скобках
-    ?factor: NUMBER          -> number
-           | NAME            -> cell
-           | "(" expr ")"
-
-    // Правила для операций
-    add: expr "+" term  -> add_op
-    sub: expr "-" term  -> sub_op
-    mul: term "*" factor -> mul_op
-    div: term "/" factor -> div_op
-
-    // Разбор функций с несколькими аргументами
-    function_call: NAME "(" [ expr ("," expr)* ] ")" -> function_call
-
-    // Разбор ячеек и ссылок
-    cell_ref: SHEET_NAME "!" CELL   -> sheet_cell
-            | CELL                  -> cell
+    // Умножение и деление
+    ?term: term "*" power   -> mul
+         | term "/" power   -> div
+         | power
+
+    // Возведение в степень (в Excel унарный минус связывает сильнее: -2^2 = 4)
+    ?power: unary
+          | power "^" unary -> pow
+
+    ?unary: "-" unary       -> neg
+          | "+" unary       -> pos
+          | percent
+
+    ?percent: atom
+            | percent "%"   -> percent
+
+    // Атомы: числа, строки, логические значения, функции, ссылки и выражения в скобках
+    ?atom: NUMBER           -> number
+         | STRING           -> string
+         | BOOL             -> boolean
+         | ERROR            -> error
+         | SHEET_PREFIX ERROR -> sheet_error
+         | function_call
+         | reference
+         | "(" comparison ")"
+
+    // Вызов функции; аргументы можно пропускать: IF(A1,,1)
+    function_call: FUNC_NAME "(" [comparison] ("," [comparison])* ")"
+
+    // Ссылка на ячейку или диапазон, возможно с префиксом листа
+    reference: [SHEET_PREFIX] CELL
 """
 
 
-
-
-
 # Инициализация парсера Lark с заданной грамматикой и алгоритмом обработки ошибок
 # Мы будем использовать 'lalr' для парсинга и 'contextual' лексер для лучшей работы с контекстом
 parser = Lark(EXCEL_GRAMMAR, parser='lalr', lexer='contextual')
@@ -66,12 +96,19 @@ parser = Lark(EXCEL_GRAMMAR, parser='lalr', lexer='contextual')
 class ToAST(Transformer):
     """
     Класс ToAST преобразует дерево разбора (Parse Tree) в наше собственное AST (объектное представление),
-    которое состоит из различных узлов: ConstantNode, CellNode, FunctionNode, BinaryOpNode.
+    которое состоит из различных узлов: ConstantNode, CellNode, RangeNode, FunctionNode, BinaryOpNode.
     """
 
     # Для операторов используем стандартные операторы Python
     from operator import add, sub, mul, truediv as div
 
+    def __init__(self, sheet: str = None, extents=None):
+        super().__init__()
+        # Лист, на котором находится формула: ссылки без листа дополняются его именем
+        self.sheet = sheet
+        # Заполненная часть листов {лист: (строк, столбцов)}: ей ограничиваются ссылки A:A и 1:1
+        self.extents = extents
+
     def number(self, token):
         """
         Преобразует лексему NUMBER (число) в объект ConstantNode.
@@ -79,25 +116,65 @@ class ToAST(Transformer):
         # Конвертируем строковое значение в число (например, "3" в 3.0)
         return ConstantNode(float(token))
 
-    def cell(self, token):
+    def string(self, token):
+        """
+        Преобразует строковый литерал ("текст") в ConstantNode без кавычек.
+        """
+        return ConstantNode(token.value[1:-1].replace('""', '"'))
+
+    def boolean(self, token):
+        """
+        Преобразует TRUE/FALSE в логическую константу.
+        """
+        return ConstantNode(token.value.upper() == 'TRUE')
+
+    def error(self, token):
         """
-        Преобразует ссылку на ячейку (например, "A1") в объект CellNode.
+        Преобразует литерал ошибки (#N/A, #REF!, ...) в константу-ошибку.
         """
-        return CellNode(token.value)  # Используем значение токена (адрес ячейки) для создания узла
+        return ConstantNode(error_from_code(token.value))
 
-    def sheet_cell(self, sheet, cell):
+    def sheet_error(self, sheet, token):
         """
-        Преобразует межлистовую ссылку (например, "Sheet1!A1") в объект CellNode с полным адресом.
+        Ссылка на удалённый диапазон ('Лист'!#REF!) — это просто ошибка #REF!.
         """
-        full_ref = f"{sheet.value}!{cell.value}"  # Формируем полный адрес: "Sheet1!A1"
-        return CellNode(full_ref)
+        return ConstantNode(error_from_code(token.value))
+
+    def reference(self, sheet, cell):
+        """
+        Преобразует ссылку на ячейку или диапазон ("A1", "Sheet1!B2:C3")
+        в CellNode или RangeNode с полным адресом без '$' и кавычек.
+        """
+        addr = cell.value.replace('$', '').upper()
+        if sheet is not None:
+            name = sheet.value[:-1]  # Отрезаем завершающий '!'
+            if name.startswith("'"):
+                name = name[1:-1].replace("''", "'")  # Снимаем кавычки: 'My Sheet' -> My Sheet
+            addr = f"{name}!{addr}"  # Формируем полный адрес: "Sheet1!A1"
+        elif self.sheet is not None:
+            addr = f"{self.sheet}!{addr}"  # Локальная ссылка на листе формулы
+        if ':' in addr:
+            if self.extents is not None:
+                addr = _clip_to_extent(addr, self.extents)
+            return RangeNode(addr)
+        return CellNode(addr)
 
     def function_call(self, name, *args):
         """
         Преобразует вызов функции (например, SUM(A1, B1)) в объект FunctionNode.
+        Пропущенные аргументы (IF(A1,,1)) становятся пустыми константами.
         """
+        # Вызов без аргументов: FOO() даёт единственный пустой плейсхолдер
+        if len(args) == 1 and args[0] is None:
+            args = ()
+        args = [ConstantNode(None) if arg is None else arg for arg in args]
+        # Префиксы новых функций Excel (_xlfn.XLOOKUP) отбрасываем
+        func = name.value.upper()
+        for prefix in ('_XLFN.', '_XLWS.'):
+            if func.startswith(prefix):
+                func = func[len(prefix):]
         # Преобразуем имя функции в верхний регистр и создаем объект FunctionNode с аргументами
-        return FunctionNode(name.value.upper(), list(args))
+        return FunctionNode(func, args)
 
     # Операторы: создание бинарных узлов для операций
     def add(self, a, b):
@@ -124,6 +201,36 @@ class ToAST(Transformer):
         """
         return BinaryOpNode('/', a, b)
 
+    def pow(self, a, b):
+        """
+        Создает узел для возведения в степень "^"
+        """
+        return BinaryOpNode('^', a, b)
+
+    def concat(self, a, b):
+        """
+        Создает узел для склейки строк "&"
+        """
+        return BinaryOpNode('&', a, b)
+
+    def neg(self, a):
+        """
+        Унарный минус: -x представляется как (-1) * x
+        """
+        return BinaryOpNode('*', ConstantNode(-1.0), a)
+
+    def pos(self, a):
+        """
+        Унарный плюс: +x в Excel ничего не меняет
+        """
+        return a
+
+    def percent(self, a):
+        """
+        Процент: x% представляется как x / 100
+        """
+        return BinaryOpNode('/', a, ConstantNode(100.0))
+
     # Методы для операций сравнения (например, A1 > 0)
     def gt(self, a, b):
         return BinaryOpNode('>', a, b)
@@ -150,7 +257,46 @@ class ToAST(Transformer):
         return children[0]
 
 
-def parse_formula(formula: str) -> FormulaNode:
+class _SheetExtents:
+    """Заполненная часть каждого листа {лист: (строк, столбцов)}; считается при первом обращении."""
+
+    def __init__(self, all_sheets: dict, known: dict = None):
+        self.all_sheets = all_sheets
+        self._extents = dict(known or {})
+
+    def get(self, sheet: str):
+        extent = self._extents.get(sheet)
+        if extent is None and sheet in self.all_sheets:
+            rows = cols = 1
+            for addr in self.all_sheets[sheet]['data']:
+                row, col = parse_cell(addr)
+                rows, cols = max(rows, row), max(cols, col)
+            extent = self._extents[sheet] = (rows, cols)
+        return extent
+
+
+def _clip_to_extent(ref: str, extents) -> str:
+    """
+    Ссылку на целые столбцы ('Лист!A:C') или строки ('Лист!1:3') ограничивает
+    заполненной частью листа: 'Лист!A1:C<последняя строка>'. Прочие ссылки не меняются.
+    """
+    sheet, addr = split_ref(ref)
+    extent = extents.get(sheet)
+    if extent is None:
+        return ref
+    first, last = addr.split(':', 1)
+    rows, cols = extent
+    if first.isalpha() and last.isalpha():
+        addr = f"{first}1:{last}{rows}"
+    elif first.isdigit() and last.isdigit():
+        addr = f"A{first}:{column_to_letter(cols)}{last}"
+    else:
+        return ref
+    return f"{sheet}!{addr}" if sheet is not None else addr
+
+
+@instrumented('parse')
+def parse_formula(formula: str, sheet: str = None, extents=None) -> FormulaNode:
     """
     Главная функция для парсинга формулы:
       1. Убирает ведущий символ '=' (как в Excel).
@@ -159,6 +305,11 @@ def parse_formula(formula: str) -> FormulaNode:
 
     Параметры:
     - formula: строка формулы (например "=SUM(A1,B2)+IF(C3>0,D4,E5)").
+    - sheet: имя листа формулы; если задано, ссылки без листа ("A1")
+      превращаются в полные адреса ("Лист!A1"), как ключи графа зависимостей.
+    - extents: заполненная часть листов {лист: (строк, столбцов)}; если задана,
+      ссылки на целые столбцы и строки (A:A, 1:1) ограничиваются ею,
+      иначе они занимают весь лист Excel.
     
     Возвращает:
     - Экземпляр FormulaNode (корневой узел AST).
@@ -173,7 +324,38 @@ def parse_formula(formula: str) -> FormulaNode:
         raise SyntaxError(f"Invalid formula syntax: {e}") from e
 
     # 3) Преобразуем Parse Tree в объектное представление (AST) с помощью ToAST
-    ast = ToAST().transform(tree)
+    ast = ToAST(sheet, extents).transform(tree)
 
     # Возвращаем корень AST для последующего вычисления
     return ast
+
+
+def compile_formulas(all_sheets: dict, errors: list = None, cells=None, extents: dict = None) -> dict:
+    """
+    Разбирает все формулы книги.
+    Возвращает словарь {'Лист!A1': FormulaNode}, где ссылки внутри AST
+    уже дополнены именем листа, а ссылки A:A и 1:1 ограничены заполненной частью листа.
+    Формула, которую не удалось разобрать, не прерывает разбор книги: ячейка получает
+    значение #NAME?, а пара ('Лист!A1', сообщение) добавляется в errors (если передан).
+    cells — разобрать только эти формулы (ссылки A:A всё равно ограничиваются по всей книге).
+    extents — заполненная часть листов {лист: (строк, столбцов)}, которых нет в all_sheets:
+    когда разбирается часть книги, ссылки A:A на другие листы ограничиваются по ним.
+    """
+    compiled = {}
+    extents = _SheetExtents(all_sheets, extents)
+    failed = 0
+    for sheet, content in all_sheets.items():
+        for addr, formula in content['formulas'].items():
+            cell = f"{sheet}!{addr}"
+            if cells is not None and cell not in cells:
+                continue
+            try:
+                compiled[cell] = parse_formula(formula, sheet, extents)
+            except SyntaxError as error:
+                compiled[cell] = ConstantNode(NAME)
+                failed += 1
+                if errors is not None:
+                    errors.append((cell, str(error)))
+    if failed:
+        add_metric('parse_errors', failed)
+    return compiled
@@ -0,0 +1,252 @@
+# src/autodiff.py
+
+"""
+Модуль autodiff: чувствительность выходов книги к входным ячейкам
+прямым автоматическим дифференцированием.
+- Dual(value, tangent): число (наследник float) с вектором производных по всем входам
+- SensitivityModel(all_sheets, inputs, outputs, ...): ScenarioModel, умеющая считать производные
+    * jacobian(values=None) -> (values, matrix): значения выходов и матрица
+      d выход / d вход (строки — outputs, столбцы — inputs) за одно вычисление
+- sensitivities(all_sheets, inputs, outputs, values=None, ...) -> SensitivityReport
+    * matrix, values, elasticity(), as_dict(), format()
+
+Во входные ячейки записываются дуальные числа с единичными векторами производных,
+и книга вычисляется один раз — как обычный сценарий ScenarioModel, то есть только
+формулы, зависящие от входов. BinaryOpNode (+ - * / ^) и SUM/AVERAGE/MIN/MAX
+работают с Dual как с обычными числами, а производные переносятся перегруженными
+операторами. Всё, что сравнивает или ищет (IF, MATCH, VLOOKUP, условия SUMIF),
+видит обычное значение float, поэтому ветвления и поиск кусочно-постоянны:
+производная берётся той ветви или того значения, которые выбраны в этой точке.
+
+Ограничения: суммы SUMIF/SUMIFS/AVERAGEIF(S) считаются по массивам NumPy
+(src/criteria.py), и производные через них теряются (считаются нулевыми);
+текст-число, приведённый к числу, тоже не несёт производной.
+В циклических компонентах производные итерируются вместе со значениями,
+а сходимость проверяется только по значениям.
+"""
+
+import math
+
+import numpy as np
+
+from src.errors import ExcelError
+from src.evaluator import register_number_type, to_number
+from src.model import DEFAULT_MAX_ITERATIONS, DEFAULT_MAX_CHANGE
+from src.ranges import RangeRef
+from src.scenarios import ScenarioModel
+
+
+def _power_slope(base: float, exponent: float) -> float:
+    """Производная base^exponent по основанию."""
+    if exponent == 0:
+        return 0.0
+    if base == 0:
+        # В нуле: 1 для первой степени, 0 для больших; дробные степени меньше 1 вертикальны
+        return 1.0 if exponent == 1 else (0.0 if exponent > 1 else math.inf)
+    return exponent * base ** (exponent - 1)
+
+
+class Dual(float):
+    """
+    Дуальное число: значение float и вектор производных tangent (np.ndarray)
+    по всем входам сразу. С обычными числами ведёт себя как float.
+    """
+    __slots__ = ('tangent',)
+
+    def __new__(cls, value: float, tangent: np.ndarray):
+        self = float.__new__(cls, value)
+        self.tangent = tangent
+        return self
+
+    def __repr__(self):
+        return f"Dual({float(self)!r}, {self.tangent!r})"
+
+    # Результат арифметики: Dual, если есть от чего зависеть
+    def __add__(self, other):
+        if isinstance(other, Dual):
+            return Dual(float(self) + float(other), self.tangent + other.tangent)
+        if isinstance(other, (int, float)):
+            return Dual(float(self) + other, self.tangent)
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, Dual):
+            return Dual(float(self) - float(other), self.tangent - other.tangent)
+        if isinstance(other, (int, float)):
+            return Dual(float(self) - other, self.tangent)
+        return NotImplemented
+
+    def __rsub__(self, other):
+        if isinstance(other, (int, float)):
+            return Dual(other - float(self), -self.tangent)
+        return NotImplemented
+
+    def __mul__(self, other):
+        if isinstance(other, Dual):
+            a, b = float(self), float(other)
+            return Dual(a * b, b * self.tangent + a * other.tangent)
+        if isinstance(other, (int, float)):
+            return Dual(float(self) * other, other * self.tangent)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, Dual):
+            a, b = float(self), float(other)
+            return Dual(a / b, (self.tangent - (a / b) * other.tangent) / b)
+        if isinstance(other, (int, float)):
+            return Dual(float(self) / other, self.tangent / other)
+        return NotImplemented
+
+    def __rtruediv__(self, other):
+        if isinstance(other, (int, float)):
+            b = float(self)
+            return Dual(other / b, (-other / (b * b)) * self.tangent)
+        return NotImplemented
+
+    def __pow__(self, other):
+        a = float(self)
+        if isinstance(other, Dual):
+            b = float(other)
+            value = a ** b
+            if isinstance(value, complex):
+                return value  # _power превратит это в #NUM!
+            # d(a^b) = b·a^(b-1)·da + a^b·ln(a)·db; ln(a) определён только при a > 0
+            tangent = _power_slope(a, b) * self.tangent
+            if a > 0:
+                tangent = tangent + value * math.log(a) * other.tangent
+            return Dual(value, tangent)
+        if isinstance(other, (int, float)):
+            value = a ** other
+            if isinstance(value, complex):
+                return value
+            return Dual(value, _power_slope(a, other) * self.tangent)
+        return NotImplemented
+
+    def __rpow__(self, other):
+        if isinstance(other, (int, float)):
+            value = other ** float(self)
+            if isinstance(value, complex):
+                return value
+            return Dual(value, (value * math.log(other) if other > 0 else 0.0) * self.tangent)
+        return NotImplemented
+
+    def __neg__(self):
+        return Dual(-float(self), -self.tangent)
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        return -self if self < 0 else self
+
+    def __reduce__(self):
+        return (Dual, (float(self), self.tangent))
+
+
+register_number_type(Dual)
+
+
+def _tangent(value, size: int):
+    """Вектор производных значения ячейки (None — если это не число)."""
+    if isinstance(value, RangeRef) and len(value) == 1:
+        value = value.value(0, 0)
+    if isinstance(value, Dual):
+        return value.tangent
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return np.zeros(size)  # Не зависит от входов
+    return None
+
+
+def _plain(value):
+    """Значение без производных."""
+    if isinstance(value, RangeRef) and len(value) == 1:
+        value = value.value(0, 0)
+    return float(value) if isinstance(value, Dual) else value
+
+
+class SensitivityModel(ScenarioModel):
+    """
+    ScenarioModel, считающая вместе со значениями выходов их производные по входам.
+    Параметры — как у ScenarioModel; входные ячейки должны содержать числа.
+    """
+
+    def __init__(self, all_sheets: dict, inputs, outputs, iterative: bool = False,
+                 max_iterations: int = DEFAULT_MAX_ITERATIONS, max_change: float = DEFAULT_MAX_CHANGE,
+                 formulas: dict = None):
+        super().__init__(all_sheets, inputs, outputs, iterative, max_iterations, max_change, formulas)
+        self.base = {}  # Значения входов в книге: точка, в которой считаются производные по умолчанию
+        for cell in self.inputs:
+            sheet, addr = cell.split('!', 1)
+            value = to_number(all_sheets.get(sheet, {}).get('constants', {}).get(addr))
+            if type(value) is ExcelError:
+                raise ValueError(f"Входная ячейка {cell} не содержит числа")
+            self.base[cell] = float(value)
+
+    def jacobian(self, values: dict = None) -> tuple:
+        """
+        Значения выходов и производные в точке values ({вход: число}; недостающие
+        входы берутся из книги). Возвращает ({выход: значение}, matrix), где
+        matrix[i, j] = d outputs[i] / d inputs[j]; для выходов-ошибок и нечисел строка — NaN.
+        """
+        size = len(self.inputs)
+        point = {**self.base, **(values or {})}
+        seeded = {cell: Dual(point[cell], np.eye(1, size, j)[0]) for j, cell in enumerate(self.inputs)}
+        results = self.evaluate(seeded)
+        matrix = np.full((len(self.outputs), size), np.nan)
+        for i, cell in enumerate(self.outputs):
+            tangent = _tangent(results[cell], size)
+            if tangent is not None:
+                matrix[i] = tangent
+        return {cell: _plain(value) for cell, value in results.items()}, matrix
+
+
+class SensitivityReport:
+    """Матрица чувствительности: matrix[i, j] = d outputs[i] / d inputs[j] в точке point."""
+
+    def __init__(self, inputs: list, outputs: list, point: dict, values: dict, matrix: np.ndarray):
+        self.inputs = inputs
+        self.outputs = outputs
+        self.point = point
+        self.values = values
+        self.matrix = matrix
+
+    def elasticity(self) -> np.ndarray:
+        """Эластичности: (d y / y) / (d x / x) — относительное изменение выхода на 1% входа."""
+        x = np.array([self.point[cell] for cell in self.inputs], dtype=float)
+        y = np.array([v if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+                      for v in (self.values[cell] for cell in self.outputs)], dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.matrix * x[None, :] / y[:, None]
+
+    def as_dict(self) -> dict:
+        """{выход: {вход: производная}}."""
+        return {output: {cell: float(self.matrix[i, j]) for j, cell in enumerate(self.inputs)}
+                for i, output in enumerate(self.outputs)}
+
+    def format(self) -> str:
+        width = max(12, *(len(cell) for cell in self.inputs))
+        lines = [f"{'выход':<20} {'значение':>14} " + ' '.join(f"{cell:>{width}}" for cell in self.inputs)]
+        for i, output in enumerate(self.outputs):
+            value = self.values[output]
+            value = f"{value:.6g}" if isinstance(value, (int, float)) else str(value)
+            lines.append(f"{output:<20} {value:>14} " + ' '.join(f"{d:>{width}.6g}" for d in self.matrix[i]))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f"SensitivityReport(outputs={len(self.outputs)}, inputs={len(self.inputs)})"
+
+
+def sensitivities(all_sheets: dict, inputs, outputs, values: dict = None, iterative: bool = False,
+                  formulas: dict = None) -> SensitivityReport:
+    """
+    Чувствительность outputs к inputs в точке values (по умолчанию — значения книги)
+    за одно вычисление затронутой части книги.
+    """
+    model = SensitivityModel(all_sheets, inputs, outputs, iterative, formulas=formulas)
+    point = {**model.base, **(values or {})}
+    results, matrix = model.jacobian(point)
+    return SensitivityReport(model.inputs, model.outputs, point, results, matrix)
@@ -0,0 +1,114 @@
+# src/cache.py
+
+"""
+Модуль cache:
+- load_model(path, use_cache=True) -> (all_sheets, formulas)
+    Загружает книгу и разобранные формулы. Книга Excel читается через xlwings только
+    при первом обращении, дальше — из кэша, пока файл не изменится.
+    path может быть и файлом модели, сохранённым save_model (.model).
+- save_model(path, all_sheets, formulas) -> str / read_model(path) -> (all_sheets, formulas)
+- cache_path(source) -> str: где лежит кэш для файла книги
+- clear_cache() -> int: удаляет все файлы кэша, возвращает их число
+
+Кэш — это pickle пары (all_sheets, formulas) в каталоге из переменной окружения
+EXCEL_TO_PYTHON_CACHE (по умолчанию ~/.cache/excel_to_python). Ключ — абсолютный путь,
+размер и время изменения файла книги, а также CACHE_VERSION: при изменении классов AST
+версию нужно увеличить, и старые записи перестанут подходить.
+Загрузка из кэша не импортирует xlwings, pandas и Lark.
+"""
+
+import hashlib
+import os
+import pickle
+import sys
+
+CACHE_VERSION = 1
+MODEL_SUFFIX = '.model'
+_ENV_VAR = 'EXCEL_TO_PYTHON_CACHE'
+
+
+def cache_dir() -> str:
+    return os.environ.get(_ENV_VAR) or os.path.join(os.path.expanduser('~'), '.cache', 'excel_to_python')
+
+
+def cache_path(source: str) -> str:
+    """Путь к файлу кэша для книги source (зависит от её размера и времени изменения)."""
+    source = os.path.abspath(source)
+    stat = os.stat(source)
+    key = f"{CACHE_VERSION}|{source}|{stat.st_size}|{stat.st_mtime_ns}"
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(cache_dir(), f"{name}-{digest}{MODEL_SUFFIX}")
+
+
+def save_model(path: str, all_sheets: dict, formulas: dict) -> str:
+    """Сохраняет книгу и разобранные формулы; запись атомарна (через временный файл)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp = f"{path}.{os.getpid()}.tmp"
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 20000))  # pickle рекурсивен, а AST длинных выражений глубокие
+    try:
+        with open(temp, 'wb') as handle:
+            pickle.dump((CACHE_VERSION, all_sheets, formulas), handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+    finally:
+        sys.setrecursionlimit(limit)
+        if os.path.exists(temp):
+            os.remove(temp)
+    return path
+
+
+def read_model(path: str) -> tuple:
+    """Читает файл модели; ValueError, если он записан другой версией."""
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 20000))
+    try:
+        with open(path, 'rb') as handle:
+            version, all_sheets, formulas = pickle.load(handle)
+    finally:
+        sys.setrecursionlimit(limit)
+    if version != CACHE_VERSION:
+        raise ValueError(f"Файл модели {path} записан версией {version}, ожидается {CACHE_VERSION}")
+    return all_sheets, formulas
+
+
+def compile_workbook(path: str) -> tuple:
+    """Читает книгу Excel (нужен Excel и xlwings) и разбирает формулы."""
+    from src.ast_builder import compile_formulas
+    from src.loader import read_excel_file, split_into_constants_and_formulas
+    all_sheets = split_into_constants_and_formulas(read_excel_file(path))
+    return all_sheets, compile_formulas(all_sheets)
+
+
+def load_model(path: str, use_cache: bool = True) -> tuple:
+    """
+    Книга и разобранные формулы для path (.xlsx/.xlsm или .model).
+    use_cache=False — всегда читать книгу заново (кэш при этом обновляется).
+    """
+    if path.endswith(MODEL_SUFFIX):
+        return read_model(path)
+    cached = cache_path(path)
+    if use_cache and os.path.exists(cached):
+        try:
+            return read_model(cached)
+        except (ValueError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            pass  # Повреждённый или устаревший кэш просто перестраивается
+    all_sheets, formulas = compile_workbook(path)
+    try:
+        save_model(cached, all_sheets, formulas)
+    except OSError:
+        pass  # Без кэша всё работает, только медленнее
+    return all_sheets, formulas
+
+
+def clear_cache() -> int:
+    directory = cache_dir()
+    if not os.path.isdir(directory):
+        return 0
+    removed = 0
+    for name in os.listdir(directory):
+        if name.endswith(MODEL_SUFFIX):
+            os.remove(os.path.join(directory, name))
+            removed += 1
+    return removed
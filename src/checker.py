@@ -0,0 +1,162 @@
+# src/checker.py
+
+"""
+Модуль checker:
+- compare_values(expected, actual, rtol, atol) -> np.ndarray[bool]
+    Векторное сравнение списков значений с относительным и абсолютным допуском.
+- check_workbook(all_sheets, rtol=1e-9, atol=1e-9, processes=None, ...) -> CheckReport
+    Вычисляет все формулы книги (по листам, параллельно) и сверяет результаты
+    с сохранёнными Excel значениями all_sheets[...]['calculated'].
+- CheckReport: итог проверки
+    * checked, matched — сколько формул проверено и совпало
+    * mismatches — расхождения, отсортированные по влиянию (сколько ячеек от них зависит)
+    * by_sheet — число расхождений по листам
+    * format(limit) — текстовый отчёт
+
+Расхождение-«первопричина» (root) — то, у которого ни одна прямая зависимость сама не расходится:
+исправлять модель нужно начиная с них, остальные часто уходят сами.
+"""
+
+import numpy as np
+
+from src.errors import ExcelError
+from src.model import evaluate_workbook
+from src.partition import evaluate_partitioned
+from src.query import DependencyQuery
+from src.ranges import RangeRef
+from src.writer import excel_serial
+
+DEFAULT_RTOL = 1e-9
+DEFAULT_ATOL = 1e-9
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+
+
+def _same_other(expected, actual) -> bool:
+    """Сравнение нечисловых значений (текст, логические, ошибки, пустые)."""
+    if isinstance(actual, RangeRef):
+        actual = actual.value(0, 0) if actual.shape == (1, 1) else actual
+    if expected is None:
+        # xlwings возвращает ошибки Excel и пустую строку как None
+        return actual is None or actual == '' or isinstance(actual, ExcelError)
+    if isinstance(actual, ExcelError):
+        return isinstance(expected, str) and expected.upper() == actual.code
+    if isinstance(expected, str) and isinstance(actual, str):
+        return expected == actual
+    return expected == actual and type(expected) is type(actual)
+
+
+def compare_values(expected: list, actual: list, rtol: float = DEFAULT_RTOL,
+                   atol: float = DEFAULT_ATOL) -> np.ndarray:
+    """
+    Сравнивает пары значений. Числа — одним вызовом np.isclose
+    (|actual - expected| <= atol + rtol * |expected|), остальное — поштучно.
+    Даты в expected сравниваются как последовательные числа Excel.
+    Возвращает массив признаков совпадения.
+    """
+    n = len(expected)
+    expected = [excel_serial(value) for value in expected]
+    ok = np.zeros(n, dtype=bool)
+    numeric = np.fromiter((_is_number(e) and _is_number(a) for e, a in zip(expected, actual)),
+                          dtype=bool, count=n)
+    if numeric.any():
+        idx = np.flatnonzero(numeric)
+        exp = np.array([expected[i] for i in idx], dtype=float)
+        act = np.array([actual[i] for i in idx], dtype=float)
+        ok[idx] = np.isclose(act, exp, rtol=rtol, atol=atol, equal_nan=True)
+    for i in np.flatnonzero(~numeric).tolist():
+        ok[i] = _same_other(expected[i], actual[i])
+    return ok
+
+
+class CheckReport:
+    """Результат сверки вычисленных значений с Excel."""
+
+    def __init__(self, checked: int, mismatches: list):
+        self.checked = checked
+        self.mismatches = mismatches
+        self.matched = checked - len(mismatches)
+        self.by_sheet = {}
+        for row in mismatches:
+            sheet = row['cell'].split('!', 1)[0]
+            self.by_sheet[sheet] = self.by_sheet.get(sheet, 0) + 1
+
+    @property
+    def ok(self) -> bool:
+        return not self.mismatches
+
+    @property
+    def roots(self) -> list:
+        """Расхождения-первопричины."""
+        return [row for row in self.mismatches if row['root']]
+
+    def format(self, limit: int = 20) -> str:
+        """Текстовый отчёт: сводка и самые влиятельные расхождения."""
+        lines = [f"Проверено формул: {self.checked}, совпало: {self.matched}, расхождений: {len(self.mismatches)}"]
+        for sheet, count in sorted(self.by_sheet.items(), key=lambda item: -item[1]):
+            lines.append(f"  {sheet}: {count}")
+        for row in self.mismatches[:limit]:
+            mark = '*' if row['root'] else ' '
+            lines.append(f"{mark} {row['cell']}: Excel={row['expected']!r} Python={row['actual']!r} "
+                         f"(зависимых ячеек: {row['dependents']})")
+        if len(self.mismatches) > limit:
+            lines.append(f"... и ещё {len(self.mismatches) - limit}")
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f"CheckReport(checked={self.checked}, mismatches={len(self.mismatches)})"
+
+
+def _difference(expected, actual) -> float:
+    """Абсолютная разница для чисел; для прочих расхождений — бесконечность."""
+    if _is_number(expected) and _is_number(actual):
+        return abs(float(actual) - float(expected))
+    return float('inf')
+
+
+def check_workbook(all_sheets: dict, rtol: float = DEFAULT_RTOL, atol: float = DEFAULT_ATOL,
+                   processes: int = None, iterative: bool = False, formulas: dict = None) -> CheckReport:
+    """
+    Вычисляет все формулы и сверяет их с сохранёнными значениями Excel.
+    - rtol, atol: относительный и абсолютный допуск для чисел
+    - processes: число процессов для вычисления листов (0 — в текущем процессе,
+      None — по числу ядер); при iterative=True книга считается целиком в одном процессе,
+      так как циклы могут проходить через несколько листов
+    - formulas: уже разобранные формулы (compile_formulas, src.cache); без них книга разбирается заново
+    Расхождения упорядочены по числу зависящих от них ячеек, затем по величине разницы.
+    """
+    if iterative:
+        values = evaluate_workbook(all_sheets, iterative=True, formulas=formulas)
+    else:
+        values = evaluate_partitioned(all_sheets, processes=processes, formulas=formulas)
+
+    cells, expected, actual = [], [], []
+    for sheet, content in all_sheets.items():
+        calculated = content.get('calculated', {})
+        for addr in content['formulas']:
+            key = f"{sheet}!{addr}"
+            cells.append(key)
+            expected.append(calculated.get(addr))
+            actual.append(values.get(key))
+    ok = compare_values(expected, actual, rtol, atol)
+    bad = np.flatnonzero(~ok).tolist()
+    if not bad:
+        return CheckReport(len(cells), [])
+
+    # Влияние расхождения — сколько ячеек от него транзитивно зависит
+    query = DependencyQuery.from_workbook(all_sheets)
+    bad_cells = {cells[i] for i in bad}
+    mismatches = []
+    for i in bad:
+        mismatches.append({
+            'cell': cells[i],
+            'expected': expected[i],
+            'actual': actual[i],
+            'difference': _difference(expected[i], actual[i]),
+            'dependents': query.count_dependents(cells[i]),
+            'root': not any(dep in bad_cells for dep in query.precedents(cells[i], depth=1)),
+        })
+    mismatches.sort(key=lambda row: (-row['dependents'], -row['difference'], row['cell']))
+    return CheckReport(len(cells), mismatches)
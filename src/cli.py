@@ -0,0 +1,243 @@
+# src/cli.py
+
+"""
+Модуль cli: командная строка.
+    python -m src.cli load КНИГА            — листы и число констант/формул
+    python -m src.cli compile КНИГА [-o F]   — разобрать формулы и сохранить модель (кэш или файл .model)
+    python -m src.cli eval КНИГА [--cells ...] — вычислить книгу или отдельные ячейки
+    python -m src.cli check КНИГА            — сверить результаты с сохранёнными значениями Excel
+    python -m src.cli export КНИГА -o F      — записать вычисленные значения (.xlsx, .csv, .parquet, .arrow)
+    python -m src.cli goalseek КНИГА --set Ц --to V --by Х — подбор параметра (src.solver)
+    python -m src.cli serve КНИГА... --port P  — сервер запросов «что если» (src.server)
+    python -m src.cli bench [...]            — benchmarks.bench_pipeline с теми же аргументами
+- main(argv=None) -> int: точка входа (её же вызывает main.py)
+
+КНИГА — файл Excel (читается через xlwings один раз, дальше берётся из кэша src.cache)
+или файл модели .model. Тяжёлые модули (xlwings, pandas, Lark, NumPy) импортируются
+только той командой, которой они нужны, поэтому --help и команды, работающие из кэша,
+запускаются быстро. --metrics печатает время этапов (src.metrics) в stderr.
+"""
+
+import argparse
+import sys
+import time
+
+
+def _load(args) -> tuple:
+    from src.cache import load_model
+    return load_model(args.workbook, use_cache=not args.no_cache)
+
+
+def _print_table(rows: list, header: tuple):
+    widths = [max(len(str(row[i])) for row in [header, *rows]) for i in range(len(header))]
+    for row in [header, *rows]:
+        print('  '.join(str(value).ljust(width) if i == 0 else str(value).rjust(width)
+                        for i, (value, width) in enumerate(zip(row, widths))))
+
+
+def _evaluate(args, all_sheets: dict, formulas: dict, targets=None):
+    """Вычисляет книгу по уже разобранным формулам (полностью или только targets)."""
+    from src.model import workbook_values, evaluate_components
+    if targets:
+        from src.evaluator import PullContext
+        context = PullContext(workbook_values(all_sheets), formulas)
+        for key in targets:
+            context.get(key)
+        return context
+    from src.ranges import CalcContext
+    context = CalcContext(workbook_values(all_sheets))
+    return evaluate_components(all_sheets, formulas, context, args.iterative)
+
+
+def cmd_load(args) -> int:
+    all_sheets, formulas = _load(args)
+    rows = [(sheet, len(content['data']), len(content['constants']), len(content['formulas']))
+            for sheet, content in all_sheets.items()]
+    _print_table(rows, ('лист', 'ячеек', 'констант', 'формул'))
+    return 0
+
+
+def cmd_compile(args) -> int:
+    from src.cache import save_model, cache_path, MODEL_SUFFIX
+    started = time.perf_counter()
+    args.no_cache = True  # compile всегда читает книгу заново
+    if args.workbook.endswith(MODEL_SUFFIX):
+        print("Файл уже является моделью", file=sys.stderr)
+        return 2
+    all_sheets, formulas = _load(args)
+    path = save_model(args.output, all_sheets, formulas) if args.output else cache_path(args.workbook)
+    print(f"Формул: {len(formulas)}, листов: {len(all_sheets)}, {time.perf_counter() - started:.2f} с -> {path}")
+    return 0
+
+
+def cmd_eval(args) -> int:
+    all_sheets, formulas = _load(args)
+    started = time.perf_counter()
+    if args.profile:
+        from src.profiler import Profiler
+        profiler = Profiler()
+        texts = {f"{sheet}!{addr}": text for sheet, content in all_sheets.items()
+                 for addr, text in content['formulas'].items()}
+        context = _evaluate(args, all_sheets, profiler.instrument(formulas, texts), args.cells)
+    else:
+        context = _evaluate(args, all_sheets, formulas, args.cells)
+    elapsed = time.perf_counter() - started
+    if args.cells:
+        for cell in args.cells:
+            print(f"{cell}\t{context.get(cell)!r}")
+    else:
+        from src.errors import ExcelError
+        errors = sum(1 for cell in formulas if isinstance(context.get(cell), ExcelError))
+        print(f"Вычислено формул: {len(formulas)}, ошибок Excel: {errors}, {elapsed:.2f} с")
+    if args.profile:
+        print(profiler.format(args.profile))
+        if args.folded:
+            profiler.write_folded(args.folded)
+    return 0
+
+
+def cmd_check(args) -> int:
+    from src.checker import check_workbook
+    all_sheets, formulas = _load(args)
+    report = check_workbook(all_sheets, rtol=args.rtol, atol=args.atol,
+                            processes=args.processes, iterative=args.iterative, formulas=formulas)
+    print(report.format(args.limit))
+    return 0 if report.ok else 1
+
+
+def cmd_export(args) -> int:
+    all_sheets, formulas = _load(args)
+    context = _evaluate(args, all_sheets, formulas)
+    output = args.output
+    extension = output.rsplit('.', 1)[-1].lower()
+    if extension in ('xlsx', 'xlsm'):
+        from src.writer import write_results
+        write_results(output, all_sheets, context, formulas=args.formulas)
+    elif extension == 'csv':
+        import csv
+        from src.scenarios import csv_text
+        with open(output, 'w', newline='', encoding='utf-8') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['cell', 'value'])
+            for cell in formulas:
+                writer.writerow([cell, csv_text(context.get(cell))])
+    else:
+        from src.columnar import export_sheets
+        export_sheets(output, all_sheets, context)
+    print(f"Записано: {output}")
+    return 0
+
+
+def cmd_goalseek(args) -> int:
+    from src.solver import goal_seek
+    all_sheets, formulas = _load(args)
+    bracket = tuple(args.bracket) if args.bracket else None
+    result = goal_seek(all_sheets, args.set, args.to, args.by, bracket=bracket, method=args.method,
+                       iterative=args.iterative, formulas=formulas)
+    print(result.format())
+    return 0 if result.converged else 1
+
+
+def cmd_serve(args) -> int:
+    import os
+    from src.server import serve
+    models = {}
+    for item in args.workbooks:
+        name, _, path = item.rpartition('=')  # ИМЯ=ПУТЬ или просто ПУТЬ (имя — по файлу)
+        models[name or os.path.splitext(os.path.basename(path))[0]] = path
+    if args.port is None and args.socket is None:
+        args.port = 8050
+    serve(models, host=args.host, port=args.port, socket_path=args.socket, iterative=args.iterative,
+          batch_window=args.batch_window / 1000, max_batch=args.max_batch, max_models=args.max_models)
+    return 0
+
+
+def cmd_bench(args) -> int:
+    from benchmarks.bench_pipeline import main as bench_main
+    return bench_main(args.bench_args)
+
+
+def _workbook_parser() -> argparse.ArgumentParser:
+    parent = argparse.ArgumentParser(add_help=False)
+    parent.add_argument('workbook', help="файл Excel или модели (.model)")
+    parent.add_argument('--no-cache', action='store_true', help="прочитать книгу заново, не из кэша")
+    parent.add_argument('--iterative', action='store_true', help="разрешить циклические ссылки")
+    return parent
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='excel_to_python', description="Вычисление книг Excel на Python")
+    parser.add_argument('--metrics', action='store_true', help="напечатать время этапов в stderr")
+    commands = parser.add_subparsers(dest='command', required=True)
+    workbook = _workbook_parser()
+
+    command = commands.add_parser('load', parents=[workbook], help="сводка по листам книги")
+    command.set_defaults(func=cmd_load)
+
+    command = commands.add_parser('compile', parents=[workbook], help="разобрать формулы и сохранить модель")
+    command.add_argument('-o', '--output', help="файл модели (.model); по умолчанию — кэш")
+    command.set_defaults(func=cmd_compile)
+
+    command = commands.add_parser('eval', parents=[workbook], help="вычислить книгу или ячейки")
+    command.add_argument('--cells', nargs='+', help="адреса 'Лист!A1'; вычисляются только они")
+    command.add_argument('--profile', type=int, nargs='?', const=20, default=0, metavar='N',
+                         help="профилировать и показать N самых затратных ячеек")
+    command.add_argument('--folded', help="записать стеки профиля для flame graph")
+    command.set_defaults(func=cmd_eval)
+
+    command = commands.add_parser('check', parents=[workbook], help="сверить с сохранёнными значениями Excel")
+    command.add_argument('--rtol', type=float, default=1e-9)
+    command.add_argument('--atol', type=float, default=1e-9)
+    command.add_argument('--processes', type=int, default=None, help="0 — в текущем процессе")
+    command.add_argument('--limit', type=int, default=20, help="сколько расхождений показать")
+    command.set_defaults(func=cmd_check)
+
+    command = commands.add_parser('export', parents=[workbook], help="записать вычисленные значения")
+    command.add_argument('-o', '--output', required=True, help=".xlsx, .csv, .parquet или .arrow")
+    command.add_argument('--formulas', action='store_true', help="в .xlsx записать и формулы")
+    command.set_defaults(func=cmd_export)
+
+    command = commands.add_parser('goalseek', parents=[workbook], help="подобрать вход под целевое значение")
+    command.add_argument('--set', required=True, metavar='ЯЧЕЙКА', help="целевая ячейка 'Лист!A1'")
+    command.add_argument('--to', required=True, type=float, metavar='ЗНАЧЕНИЕ')
+    command.add_argument('--by', required=True, metavar='ЯЧЕЙКА', help="изменяемая ячейка-константа")
+    command.add_argument('--method', choices=('newton', 'secant', 'brent'), default='newton')
+    command.add_argument('--bracket', type=float, nargs=2, metavar=('A', 'B'), help="интервал поиска")
+    command.set_defaults(func=cmd_goalseek)
+
+    command = commands.add_parser('serve', help="держать книги в памяти и отвечать на запросы JSON")
+    command.add_argument('workbooks', nargs='+', metavar='[ИМЯ=]КНИГА', help="книги Excel или файлы .model")
+    command.add_argument('--host', default='127.0.0.1')
+    command.add_argument('--port', type=int, help="порт HTTP (по умолчанию 8050, если не задан --socket)")
+    command.add_argument('--socket', help="путь к Unix-сокету")
+    command.add_argument('--iterative', action='store_true', help="разрешить циклические ссылки")
+    command.add_argument('--batch-window', type=float, default=0.0, metavar='МС',
+                         help="сколько ждать попутных запросов перед пакетом")
+    command.add_argument('--max-batch', type=int, default=256)
+    command.add_argument('--max-models', type=int, default=32, help="сколько наборов входов/выходов держать")
+    command.set_defaults(func=cmd_serve)
+
+    # Аргументы bench не разбираются здесь, а целиком передаются в bench_pipeline (см. main)
+    command = commands.add_parser('bench', help="замер этапов на синтетических книгах", add_help=False)
+    command.set_defaults(func=cmd_bench)
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+    if args.command == 'bench':
+        args.bench_args = rest
+    elif rest:
+        parser.error(f"неизвестные аргументы: {' '.join(rest)}")
+    if not args.metrics:
+        return args.func(args)
+    from src.metrics import collect
+    with collect() as metrics:
+        code = args.func(args)
+    print(metrics.format(), file=sys.stderr)
+    return code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
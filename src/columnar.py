@@ -0,0 +1,321 @@
+# src/columnar.py
+
+"""
+Модуль columnar:
+- sheet_columns(sheet, content, values, cells=None) -> dict
+    Значения листа в виде типизированных столбцов (массивы NumPy и списки), без pyarrow.
+- sheets_table(all_sheets, values) -> pyarrow.Table
+- export_sheets(path, all_sheets, values, chunk_size=65536) -> str
+    Все ячейки книги в один файл Parquet (.parquet) или Arrow IPC (.arrow, .feather),
+    по частям не больше chunk_size строк.
+- scenario_schema(names, text_columns=()) -> pyarrow.Schema
+- scenario_batch(columns, text_columns=()) -> pyarrow.RecordBatch
+    Пакет сценариев {'Лист!A1': значения по сценариям} -> широкая таблица, столбцы на ячейку.
+- ScenarioSink(path, text_columns=()): потоковая запись пакетов сценариев в Parquet/Arrow
+    * write(columns), close(); работает как контекстный менеджер
+- export_scenarios(path, batches, text_columns=()) -> str
+
+Таблица ячеек «длинная»: строка на ячейку, столбцы sheet, cell, row, col, formula
+и по столбцу на каждый тип значения (number, text, boolean, error) — заполнен ровно один
+из них (или ни одного, если ячейка пуста). Так у каждого столбца свой тип Arrow.
+
+Пакеты сценариев раскладываются так же, но «вширь»: у каждой ячейки столбцы
+'<ячейка>' (float64), '<ячейка>.text', '<ячейка>.boolean' и '<ячейка>.error'.
+Схема не зависит от значений, поэтому пакет с ошибками или текстом после пакета
+чисел записывается в тот же файл. Массивы float64 передаются в Arrow без копирования.
+pyarrow нужен только для записи и импортируется при первом обращении.
+"""
+
+import os
+from numbers import Real
+
+import numpy as np
+
+from src.errors import ExcelError
+from src.ranges import parse_cell, RangeRef
+from src.writer import excel_serial
+
+DEFAULT_CHUNK_SIZE = 65536
+# Столбцы ячейки в пакетах сценариев: '<ячейка>' — число, остальные — по суффиксу
+TEXT_SUFFIX = '.text'
+BOOLEAN_SUFFIX = '.boolean'
+ERROR_SUFFIX = '.error'
+_FORMATS = {'.parquet': 'parquet', '.pq': 'parquet', '.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow'}
+
+
+def _pyarrow():
+    """Ленивый импорт pyarrow: остальной проект без него работает."""
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401  (подмодуль нужен для записи Parquet)
+    except ImportError:
+        raise ImportError("Для выгрузки в Arrow/Parquet установите пакет pyarrow") from None
+    return pyarrow
+
+
+def _file_format(path: str, file_format: str = None) -> str:
+    if file_format is None:
+        file_format = _FORMATS.get(os.path.splitext(path)[1].lower())
+        if file_format is None:
+            raise ValueError(f"Не удалось определить формат по расширению файла: {path}")
+    if file_format not in ('parquet', 'arrow'):
+        raise ValueError(f"Неизвестный формат: {file_format} (ожидается 'parquet' или 'arrow')")
+    return file_format
+
+
+def _plain(value):
+    """Значение ячейки в виде, пригодном для столбца: диапазон -> левая верхняя ячейка, дата -> число."""
+    if isinstance(value, RangeRef):
+        value = value.value(0, 0)
+    return excel_serial(value)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, Real) and not isinstance(value, bool)
+
+
+# --- Таблица ячеек ---
+
+def sheet_columns(sheet: str, content: dict, values, cells=None) -> dict:
+    """
+    Столбцы для ячеек листа (по умолчанию — всех, по строкам и столбцам).
+    Возвращает {'sheet', 'cell', 'formula', 'text', 'boolean', 'error': списки,
+    'row', 'col': int32, 'number': float64, 'number_valid': bool} — массивы NumPy
+    одинаковой длины; number_valid отмечает строки, где значение числовое.
+    """
+    if cells is None:
+        cells = sorted(content['data'], key=lambda addr: parse_cell(addr))
+    n = len(cells)
+    rows = np.empty(n, dtype=np.int32)
+    cols = np.empty(n, dtype=np.int32)
+    number = np.zeros(n, dtype=np.float64)
+    number_valid = np.zeros(n, dtype=bool)
+    formula, text, boolean, error = [None] * n, [None] * n, [None] * n, [None] * n
+    formulas, constants = content['formulas'], content['constants']
+    for i, addr in enumerate(cells):
+        rows[i], cols[i] = parse_cell(addr)
+        if addr in formulas:
+            formula[i] = formulas[addr]
+            value = values.get(f"{sheet}!{addr}")
+        else:
+            value = constants.get(addr, content['data'][addr])
+        value = _plain(value)
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            boolean[i] = value
+        elif _is_number(value):
+            number[i] = value
+            number_valid[i] = True
+        elif isinstance(value, ExcelError):
+            error[i] = value.code
+        else:
+            text[i] = str(value)
+    return {'sheet': [sheet] * n, 'cell': list(cells), 'row': rows, 'col': cols, 'formula': formula,
+            'number': number, 'number_valid': number_valid, 'text': text, 'boolean': boolean, 'error': error}
+
+
+def _sheet_schema(pa):
+    return pa.schema([
+        ('sheet', pa.dictionary(pa.int32(), pa.string())),
+        ('cell', pa.string()),
+        ('row', pa.int32()),
+        ('col', pa.int32()),
+        ('formula', pa.string()),
+        ('number', pa.float64()),
+        ('text', pa.string()),
+        ('boolean', pa.bool_()),
+        ('error', pa.string()),
+    ])
+
+
+def _sheet_batches(pa, all_sheets: dict, values, chunk_size: int):
+    """Пакеты таблицы ячеек: лист за листом, не больше chunk_size строк в пакете."""
+    schema = _sheet_schema(pa)
+    # Один словарь имён листов на весь файл (формат Arrow IPC не допускает замены словаря)
+    names = pa.array(list(all_sheets), pa.string())
+    for index, (sheet, content) in enumerate(all_sheets.items()):
+        cells = sorted(content['data'], key=lambda addr: parse_cell(addr))
+        for start in range(0, len(cells), chunk_size):
+            columns = sheet_columns(sheet, content, values, cells[start:start + chunk_size])
+            arrays = [
+                pa.DictionaryArray.from_arrays(pa.array(np.full(len(columns['cell']), index, np.int32)), names),
+                pa.array(columns['cell'], pa.string()),
+                pa.array(columns['row']),
+                pa.array(columns['col']),
+                pa.array(columns['formula'], pa.string()),
+                pa.array(columns['number'], mask=~columns['number_valid']),
+                pa.array(columns['text'], pa.string()),
+                pa.array(columns['boolean'], pa.bool_()),
+                pa.array(columns['error'], pa.string()),
+            ]
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def sheets_table(all_sheets: dict, values) -> "pyarrow.Table":
+    """Все ячейки книги одной таблицей Arrow (значения формул берутся из values)."""
+    pa = _pyarrow()
+    return pa.Table.from_batches(list(_sheet_batches(pa, all_sheets, values, DEFAULT_CHUNK_SIZE)),
+                                 schema=_sheet_schema(pa))
+
+
+class _TableWriter:
+    """Потоковая запись пакетов одной схемы в Parquet или Arrow IPC."""
+
+    def __init__(self, pa, path: str, schema, file_format: str):
+        if file_format == 'parquet':
+            self._writer = pa.parquet.ParquetWriter(path, schema)
+        else:
+            self._writer = pa.ipc.new_file(path, schema)
+
+    def write(self, batch):
+        if batch.num_rows:
+            self._writer.write_batch(batch)
+
+    def close(self):
+        self._writer.close()
+
+
+def export_sheets(path: str, all_sheets: dict, values, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  file_format: str = None) -> str:
+    """
+    Выгружает все ячейки книги в path (формат — по расширению или file_format).
+    Файл пишется по частям, поэтому в памяти не больше chunk_size строк сразу.
+    Возвращает путь к файлу.
+    """
+    file_format = _file_format(path, file_format)
+    pa = _pyarrow()
+    writer = _TableWriter(pa, path, _sheet_schema(pa), file_format)
+    try:
+        for batch in _sheet_batches(pa, all_sheets, values, chunk_size):
+            writer.write(batch)
+    finally:
+        writer.close()
+    return path
+
+
+# --- Пакеты сценариев ---
+
+def scenario_schema(names, text_columns=()) -> "pyarrow.Schema":
+    """
+    Схема пакетов сценариев для столбцов names: у каждой ячейки четыре столбца —
+    '<ячейка>' (float64), '<ячейка>.text', '<ячейка>.boolean' и '<ячейка>.error';
+    столбцы text_columns (например, ключи сценариев из CSV) — одна строка.
+    Схема зависит только от имён, поэтому одинакова во всех пакетах файла.
+    """
+    pa = _pyarrow()
+    fields = []
+    for name in names:
+        if name in text_columns:
+            fields.append((name, pa.string()))
+        else:
+            fields.extend([(name, pa.float64()), (name + TEXT_SUFFIX, pa.string()),
+                           (name + BOOLEAN_SUFFIX, pa.bool_()), (name + ERROR_SUFFIX, pa.string())])
+    return pa.schema(fields)
+
+
+def _arrays(pa, values) -> list:
+    """Массивы Arrow (число, текст, логическое, ошибка) для одной ячейки пакета сценариев."""
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'biuf':
+        n = len(values)
+        if values.dtype.kind == 'b':
+            return [pa.nulls(n, pa.float64()), pa.nulls(n, pa.string()), pa.array(values), pa.nulls(n, pa.string())]
+        # float64 без пропусков передаётся без копирования
+        number = pa.array(values.astype(np.float64, copy=False))
+        return [number, pa.nulls(n, pa.string()), pa.nulls(n, pa.bool_()), pa.nulls(n, pa.string())]
+    n = len(values)
+    numbers = np.zeros(n, dtype=np.float64)
+    valid = np.zeros(n, dtype=bool)
+    texts, booleans, errors = [None] * n, [None] * n, [None] * n
+    for i, value in enumerate(values):
+        value = _plain(value)
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            booleans[i] = value
+        elif _is_number(value):
+            numbers[i] = value
+            valid[i] = True
+        elif isinstance(value, ExcelError):
+            errors[i] = value.code
+        else:
+            texts[i] = str(value)
+    return [pa.array(numbers, mask=~valid), pa.array(texts, pa.string()),
+            pa.array(booleans, pa.bool_()), pa.array(errors, pa.string())]
+
+
+def scenario_batch(columns: dict, text_columns=(), schema=None) -> "pyarrow.RecordBatch":
+    """
+    Пакет сценариев {'Лист!A1': значения} -> RecordBatch (строка на сценарий) со схемой
+    scenario_schema(columns, text_columns). Если передана schema (схема уже записанных
+    пакетов), набор столбцов должен с ней совпадать.
+    """
+    pa = _pyarrow()
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"Столбцы пакета разной длины: {sorted(lengths)}")
+    expected = scenario_schema(columns, text_columns)
+    if schema is None:
+        schema = expected
+    elif expected.names != schema.names:
+        raise ValueError("Набор столбцов пакета отличается от первого пакета")
+    arrays = []
+    for name, values in columns.items():
+        if name in text_columns:
+            arrays.append(pa.array([None if v is None else str(v) for v in values], pa.string()))
+        else:
+            arrays.extend(_arrays(pa, values))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class ScenarioSink:
+    """
+    Потоковая запись результатов сценариев. Схема задаётся именами столбцов первого
+    пакета (см. scenario_schema) и не зависит от значений, поэтому ошибки и значения
+    другого типа в следующих пакетах записываются без перестройки файла. Пример:
+        with ScenarioSink('out.parquet') as sink:
+            for columns in batches:
+                sink.write(columns)
+    """
+
+    def __init__(self, path: str, file_format: str = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 text_columns=()):
+        self.path = path
+        self.file_format = _file_format(path, file_format)
+        self.chunk_size = chunk_size
+        self.text_columns = frozenset(text_columns)
+        self.rows = 0
+        self._schema = None
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, columns: dict):
+        """Записывает пакет {'Лист!A1': значения по сценариям}; большие пакеты — частями."""
+        n = len(next(iter(columns.values()), ()))
+        if self._schema is None:
+            self._schema = scenario_schema(columns, self.text_columns)
+            self._writer = _TableWriter(_pyarrow(), self.path, self._schema, self.file_format)
+        for start in range(0, max(n, 1), self.chunk_size):
+            part = {name: values[start:start + self.chunk_size] for name, values in columns.items()}
+            batch = scenario_batch(part, self.text_columns, self._schema)
+            self._writer.write(batch)
+            self.rows += batch.num_rows
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def export_scenarios(path: str, batches, file_format: str = None,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE, text_columns=()) -> str:
+    """Записывает последовательность пакетов сценариев в один файл. Возвращает путь к файлу."""
+    with ScenarioSink(path, file_format, chunk_size, text_columns) as sink:
+        for columns in batches:
+            sink.write(columns)
+    return path
@@ -0,0 +1,448 @@
+# src/criteria.py
+
+"""
+Модуль criteria:
+- compile_criterion(criterion) -> Criterion: разбор условия Excel (">=10", "<>abc", "яб*", 5)
+  один раз; скомпилированные условия кэшируются
+- sumif / sumifs / countif / countifs / averageif / averageifs — функции для excel_funcs
+
+Маска строк вычисляется векторно (NumPy) по столбцовым массивам диапазона.
+Если все условия — простые равенства и те же диапазоны условий встречаются
+повторно (SUMIFS по одной таблице с разными ключами), строится групповой индекс:
+один проход группировки по столбцам условий, после чего каждый следующий вызов —
+это поиск в словаре. Первый вызов с новыми диапазонами идёт по маскам, поэтому
+формулы вида COUNTIF($A$1:A2,A2), протянутые вниз, индексов не строят.
+SUMIF и AVERAGEIF, как Excel, приводят диапазон суммирования к размеру
+диапазона условия от его левой верхней ячейки; *IFS требуют одинаковой формы.
+Массивы и индексы кэшируются в context.range_cache (см. src.ranges.CalcContext).
+"""
+
+import operator
+from functools import lru_cache
+import numpy as np
+from src.ranges import RangeRef
+from src.lookup import wildcard_regex, has_wildcards
+from src.errors import ExcelError, DIV0, VALUE
+
+
+# Операторы сравнения, которые могут стоять в начале текстового условия
+_OPERATORS = {
+    '=': operator.eq,
+    '<>': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+def _to_number(value):
+    """Пытается интерпретировать значение как число, иначе возвращает None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            return None
+    return None
+
+
+def group_key(value):
+    """
+    Ключ равенства для группового индекса:
+    числа и текст-число сравниваются как числа, текст — без учёта регистра.
+    Пустые ячейки и ошибки ключа не имеют (None).
+    """
+    if value is None or type(value) is ExcelError:
+        return None
+    if isinstance(value, bool):
+        return ('b', value)
+    number = _to_number(value)
+    if number is not None:
+        return ('n', number)
+    return ('t', str(value).lower())
+
+
+# ----------------------------------------------------------------------------
+# Столбцовое представление диапазона
+# ----------------------------------------------------------------------------
+
+# Вид значения ячейки для ColumnArrays
+_BLANK, _NUMBER, _BOOL, _TEXT, _ERROR, _OTHER = range(6)
+_KINDS = {type(None): _BLANK, bool: _BOOL, str: _TEXT, ExcelError: _ERROR, int: _NUMBER, float: _NUMBER}
+
+
+def _kind(cls) -> int:
+    """Вид значений типа cls (подклассы int/float — например, Dual — считаются числами)."""
+    kind = _KINDS.get(cls)
+    if kind is None:
+        kind = _KINDS[cls] = _NUMBER if issubclass(cls, (int, float)) and not issubclass(cls, bool) else _OTHER
+    return kind
+
+
+class ColumnArrays:
+    """
+    Значения диапазона (в порядке строк) в виде NumPy-массивов:
+    - num: числа (NaN для нечисловых ячеек), is_num — маска числовых ячеек
+    - text_num: текст, похожий на число, в виде числа (иначе NaN)
+    - text: текст в нижнем регистре (None для нетекстовых ячеек)
+    - is_blank, is_bool, bools — пустые и логические ячейки
+    - is_err — ячейки с ошибками Excel
+    Вид ячеек определяется за один проход по типам; text и text_num, нужные только
+    текстовым условиям и равенству с числом, строятся при первом обращении.
+    """
+    __slots__ = ('size', 'num', 'is_num', 'is_blank', 'is_bool', 'bools', 'is_err', 'raw',
+                 '_texts', '_text', '_text_num')
+
+    def __init__(self, values: list):
+        self.raw = values
+        self.size = n = len(values)
+        kinds = np.array([_kind(cls) for cls in map(type, values)], dtype=np.int8).reshape(n)
+        self.is_num = kinds == _NUMBER
+        self.is_bool = kinds == _BOOL
+        self.is_err = kinds == _ERROR
+        self.num = np.full(n, np.nan)
+        where = np.flatnonzero(self.is_num)
+        if where.size:
+            self.num[where] = [values[i] for i in where.tolist()]
+        self.bools = np.zeros(n, dtype=bool)
+        where = np.flatnonzero(self.is_bool)
+        if where.size:
+            self.bools[where] = [values[i] for i in where.tolist()]
+        where = np.flatnonzero(kinds == _TEXT)
+        self._texts = (where, [values[i] for i in where.tolist()])  # Позиции и значения текстовых ячеек
+        self.is_blank = kinds == _BLANK
+        if where.size:
+            self.is_blank[where] = [v == '' for v in self._texts[1]]
+        self._text = None
+        self._text_num = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            where, texts = self._texts
+            self._text = np.full(self.size, None, dtype=object)
+            if where.size:
+                self._text[where] = [v.lower() for v in texts]
+        return self._text
+
+    @property
+    def text_num(self):
+        if self._text_num is None:
+            where, texts = self._texts
+            self._text_num = np.full(self.size, np.nan)
+            if where.size:
+                numbers = [_to_number(v) for v in texts]
+                self._text_num[where] = [np.nan if v is None else v for v in numbers]
+        return self._text_num
+
+    def sum_values(self, mask):
+        """
+        Сумма и количество числовых ячеек под маской.
+        Если под маску попала ячейка-ошибка, вместо суммы возвращается эта ошибка.
+        """
+        errors = mask & self.is_err
+        selected = mask & self.is_num
+        if errors.any():
+            return self.raw[int(np.argmax(errors))], int(selected.sum())
+        return float(self.num[selected].sum()), int(selected.sum())
+
+
+def _range_values(rng) -> list:
+    if isinstance(rng, RangeRef):
+        return rng.values()
+    if isinstance(rng, (list, tuple)):
+        if rng and isinstance(rng[0], (list, tuple)):
+            return [v for row in rng for v in row]
+        return list(rng)
+    return [rng] # Одиночное значение — диапазон из одной ячейки
+
+
+def _cache_of(rng):
+    """range_cache контекста диапазона или None, если кэширование недоступно."""
+    if isinstance(rng, RangeRef):
+        return getattr(rng.context, 'range_cache', None)
+    return None
+
+
+def column_arrays(rng) -> ColumnArrays:
+    """Столбцовые массивы диапазона, по возможности из кэша."""
+    cache = _cache_of(rng)
+    if cache is None:
+        return ColumnArrays(_range_values(rng))
+    key = ('columns', rng.key)
+    arrays = cache.get(key)
+    if arrays is None:
+        arrays = cache.put(key, [rng], ColumnArrays(rng.values()))
+    return arrays
+
+
+# ----------------------------------------------------------------------------
+# Компиляция условий
+# ----------------------------------------------------------------------------
+
+class Criterion:
+    """
+    Скомпилированное условие Excel.
+    - op: оператор сравнения ('=', '<>', '<', ...)
+    - number / text / boolean: операнд в подходящем представлении
+    - regex: шаблон для подстановочных знаков (только для '=' и '<>')
+    - key: ключ равенства для группового индекса (None, если условие не «равенство»)
+    """
+    __slots__ = ('op', 'number', 'text', 'boolean', 'regex', 'key')
+
+    def __init__(self, op, number=None, text=None, boolean=None, regex=None):
+        self.op = op
+        self.number = number
+        self.text = text
+        self.boolean = boolean
+        self.regex = regex
+        self.key = None
+        if op == '=' and regex is None:
+            if boolean is not None:
+                self.key = ('b', boolean)
+            elif number is not None:
+                self.key = ('n', number)
+            elif text:
+                self.key = ('t', text)
+
+    def mask(self, arrays: ColumnArrays):
+        """Векторно вычисляет булеву маску строк, удовлетворяющих условию."""
+        op = self.op
+        if self.boolean is not None:
+            eq = arrays.is_bool & (arrays.bools == self.boolean)
+            return eq if op == '=' else ~eq
+        if self.number is not None:
+            compare = _OPERATORS[op]
+            if op in ('=', '<>'):
+                # Равенство с числом учитывает и текст, похожий на число
+                eq = (arrays.is_num & (arrays.num == self.number)) | (arrays.text_num == self.number)
+                return eq if op == '=' else ~eq
+            with np.errstate(invalid='ignore'):
+                return arrays.is_num & compare(arrays.num, self.number)
+        if self.text == '' and self.regex is None:
+            # "" или "=" — пустые ячейки, "<>" — непустые
+            return arrays.is_blank if op == '=' else ~arrays.is_blank
+        if self.regex is not None:
+            match = self.regex.match
+            eq = np.fromiter((t is not None and match(t) is not None for t in arrays.text),
+                             bool, arrays.size)
+            return eq if op == '=' else ~eq
+        if op in ('=', '<>'):
+            eq = arrays.text == self.text
+            return eq if op == '=' else ~eq
+        compare = _OPERATORS[op]
+        return np.fromiter((t is not None and compare(t, self.text) for t in arrays.text),
+                           bool, arrays.size)
+
+
+@lru_cache(maxsize=4096)
+def _compile(kind: str, value) -> Criterion:
+    if kind == 'bool':
+        return Criterion('=', boolean=value)
+    if kind == 'number':
+        return Criterion('=', number=float(value))
+    text = value
+    op = '='
+    for candidate in ('>=', '<=', '<>', '>', '<', '='):
+        if text.startswith(candidate):
+            op = candidate
+            text = text[len(candidate):]
+            break
+    number = _to_number(text) if text.strip() else None
+    if number is not None:
+        return Criterion(op, number=number)
+    upper = text.strip().upper()
+    if upper in ('TRUE', 'FALSE') and op in ('=', '<>'):
+        return Criterion(op, boolean=(upper == 'TRUE'))
+    regex = wildcard_regex(text) if op in ('=', '<>') and has_wildcards(text) else None
+    return Criterion(op, text=text.lower(), regex=regex)
+
+
+def compile_criterion(criterion) -> Criterion:
+    """
+    Компилирует условие Excel в Criterion.
+    Результат кэшируется, так что одно и то же условие разбирается один раз.
+    """
+    if isinstance(criterion, bool):
+        return _compile('bool', criterion)
+    if isinstance(criterion, (int, float)):
+        return _compile('number', float(criterion))
+    if criterion is None:
+        return _compile('text', '')
+    return _compile('text', str(criterion))
+
+
+# ----------------------------------------------------------------------------
+# Групповой индекс
+# ----------------------------------------------------------------------------
+
+_FIRST_USE = object()  # Отметка в range_cache: диапазоны уже встречались, индекса ещё нет
+
+
+def _group_sums(ranges: list, sum_range):
+    """
+    Групповой индекс: {кортеж ключей условий: [сумма, количество числовых, количество строк]}.
+    Строится за один проход по столбцам условий и кэшируется в range_cache, но только
+    при повторном обращении к тем же диапазонам: при первом возвращается None
+    (и запоминается отметка), и вызов считается по маскам.
+    sum_range может быть None (только подсчёт строк для COUNTIFS).
+    Если в группу попала ячейка-ошибка диапазона суммирования, вместо суммы хранится ошибка.
+    """
+    cache = _cache_of(ranges[0])
+    key = ('groups', tuple(r.key for r in ranges), sum_range.key if sum_range is not None else None)
+    watched = list(ranges) + ([sum_range] if sum_range is not None else [])
+    groups = cache.get(key)
+    if groups is None:
+        cache.put(key, watched, _FIRST_USE)  # Сбрасывается вместе с индексом при изменении ячеек
+        return None
+    if groups is not _FIRST_USE:
+        return groups
+
+    columns = [r.values() for r in ranges]
+    sums = column_arrays(sum_range) if sum_range is not None else None
+    groups = {}
+    for pos, row in enumerate(zip(*columns)):
+        gkey = tuple(group_key(v) for v in row)
+        acc = groups.get(gkey)
+        if acc is None:
+            acc = groups[gkey] = [0.0, 0, 0]
+        acc[2] += 1
+        if sums is None:
+            continue
+        if sums.is_num[pos] and type(acc[0]) is not ExcelError:
+            acc[0] += float(sums.num[pos])  # Из criteria выходят только float Python, не np.float64
+            acc[1] += 1
+        elif sums.is_err[pos] and type(acc[0]) is not ExcelError:
+            acc[0] = sums.raw[pos]
+    return cache.put(key, watched, groups)
+
+
+def _can_group(ranges, criteria) -> bool:
+    """Групповой индекс возможен, если все условия — равенства и есть кэш."""
+    return (all(isinstance(r, RangeRef) for r in ranges)
+            and _cache_of(ranges[0]) is not None
+            and all(c.key is not None for c in criteria))
+
+
+def _shape(rng) -> tuple:
+    """(строк, столбцов) диапазона, списка строк, плоского списка (столбец) или одного значения."""
+    if isinstance(rng, RangeRef):
+        return rng.shape
+    if isinstance(rng, (list, tuple)):
+        if rng and isinstance(rng[0], (list, tuple)):
+            return len(rng), len(rng[0])
+        return len(rng), 1
+    return 1, 1
+
+
+def _same_shape(*ranges) -> bool:
+    """Диапазоны одинаковой формы: 2×3 и 3×2 (или 6×1) Excel не сопоставляет."""
+    return len({_shape(r) for r in ranges}) <= 1
+
+
+def _resize(rng, like):
+    """
+    Диапазон суммирования SUMIF/AVERAGEIF размера like от левой верхней ячейки rng:
+    SUMIF(A1:A3,"x",B1) суммирует B1:B3. Списки обрезаются или дополняются пустыми.
+    """
+    rows, cols = _shape(like)
+    if _shape(rng) == (rows, cols):
+        return rng
+    if isinstance(rng, RangeRef):
+        return RangeRef(rng.sheet, rng.top, rng.left, rng.top + rows - 1, rng.left + cols - 1, rng.context)
+    values = _range_values(rng)
+    width = _shape(rng)[1]
+    return [[values[i * width + j] if j < width and i * width + j < len(values) else None
+             for j in range(cols)] for i in range(rows)]
+
+
+def _aggregate(sum_range, pairs):
+    """
+    Общая часть *IFS-функций.
+    pairs — список (диапазон условия, условие).
+    Возвращает (сумма, количество числовых значений, количество подходящих строк);
+    сумма может оказаться ошибкой из диапазона суммирования.
+    При несогласованных аргументах возвращает VALUE.
+    """
+    if pairs is None:
+        return VALUE # Условия должны идти парами (диапазон, условие)
+    ranges = [r for r, _ in pairs]
+    criteria = [compile_criterion(c) for _, c in pairs]
+    if not _same_shape(*(ranges + ([sum_range] if sum_range is not None else []))):
+        return VALUE # Диапазоны условий и суммирования разного размера
+
+    if _can_group(ranges, criteria) and (sum_range is None or isinstance(sum_range, RangeRef)):
+        groups = _group_sums(ranges, sum_range)
+        if groups is not None:
+            acc = groups.get(tuple(c.key for c in criteria))
+            return tuple(acc) if acc is not None else (0.0, 0, 0)
+
+    mask = None
+    for rng, criterion in zip(ranges, criteria):
+        part = criterion.mask(column_arrays(rng))
+        mask = part if mask is None else (mask & part)
+    if sum_range is None:
+        return 0.0, 0, int(mask.sum())
+    total, count = column_arrays(sum_range).sum_values(mask)
+    return total, count, int(mask.sum())
+
+
+def _pairs(args):
+    """Разбивает аргументы *IFS на пары (диапазон, условие); None при нечётном числе."""
+    if len(args) % 2:
+        return None
+    return [(args[i], args[i + 1]) for i in range(0, len(args), 2)]
+
+
+# ----------------------------------------------------------------------------
+# Excel-функции
+# ----------------------------------------------------------------------------
+
+def _total(result):
+    return result if type(result) is ExcelError else result[0]
+
+
+def _average(result):
+    if type(result) is ExcelError:
+        return result
+    total, count, _ = result
+    if type(total) is ExcelError:
+        return total
+    return total / count if count else DIV0 # Нет подходящих значений
+
+
+def sumif(rng, criterion, sum_range=None):
+    """SUMIF: сумма значений sum_range (или самого rng) в строках, где rng удовлетворяет условию."""
+    return _total(_aggregate(rng if sum_range is None else _resize(sum_range, rng), [(rng, criterion)]))
+
+
+def sumifs(sum_range, *args):
+    """SUMIFS: сумма sum_range по строкам, удовлетворяющим всем условиям."""
+    return _total(_aggregate(sum_range, _pairs(args)))
+
+
+def countif(rng, criterion):
+    """COUNTIF: количество ячеек rng, удовлетворяющих условию."""
+    result = _aggregate(None, [(rng, criterion)])
+    return result if type(result) is ExcelError else result[2]
+
+
+def countifs(*args):
+    """COUNTIFS: количество строк, удовлетворяющих всем условиям."""
+    result = _aggregate(None, _pairs(args))
+    return result if type(result) is ExcelError else result[2]
+
+
+def averageif(rng, criterion, average_range=None):
+    """AVERAGEIF: среднее значений average_range (или rng) по подходящим строкам."""
+    return _average(_aggregate(rng if average_range is None else _resize(average_range, rng),
+                               [(rng, criterion)]))
+
+
+def averageifs(average_range, *args):
+    """AVERAGEIFS: среднее average_range по строкам, удовлетворяющим всем условиям."""
+    return _average(_aggregate(average_range, _pairs(args)))
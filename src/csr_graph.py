@@ -0,0 +1,261 @@
+# src/csr_graph.py
+
+"""
+Модуль csr_graph:
+- CSRGraph: компактный граф зависимостей на целочисленных идентификаторах вершин
+    * nodes / ids — таблица 'Sheet!A1' <-> номер вершины
+    * prec_ptr, prec_idx — предшественники (от чего зависит ячейка) в формате CSR
+    * dep_ptr, dep_idx — последователи (что зависит от ячейки) в формате CSR
+    * in_degree — входные степени (numpy-массив)
+  CSRGraph.from_workbook(all_sheets), CSRGraph.from_dict(graph)
+  topological_order() / topological_sort(), find_cycles(), has_cycle(), reachable(...)
+  as_dict() -> (graph, in_degree): представление в виде словарей, как у build_dependency_graph
+
+Формат CSR (compressed sparse row): соседи вершины i лежат в idx[ptr[i]:ptr[i + 1]].
+Одно ребро занимает 2 × 4 байта (по разу в каждом направлении) вместо ссылок на строки
+в списках словаря, а обходы работают с целыми числами вместо хэширования адресов.
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+
+from src.graph import iter_formula_dependencies, strongly_connected_components, \
+    is_cyclic_component, CyclicDependencyError
+
+INDEX_DTYPE = np.int32  # Номера вершин; 2^31 ячеек с запасом хватает для любой книги
+
+
+def _to_csr(rows: np.ndarray, cols: np.ndarray, n: int):
+    """
+    Упаковывает рёбра (rows[k] -> cols[k]) в массивы ptr/idx.
+    Порядок соседей каждой вершины сохраняется (устойчивая сортировка).
+    """
+    order = np.argsort(rows, kind='stable')
+    ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=ptr[1:])
+    return ptr, cols[order].astype(INDEX_DTYPE, copy=False)
+
+
+class CSRGraph:
+    """
+    Граф зависимостей в виде CSR-массивов.
+    Ребро (node, dep) означает, что ячейка node зависит от ячейки dep.
+    """
+
+    def __init__(self, nodes: list, sources, targets):
+        self.nodes = list(nodes)  # Номер вершины -> 'Sheet!A1'
+        self.ids = {node: i for i, node in enumerate(self.nodes)}  # 'Sheet!A1' -> номер
+        n = len(self.nodes)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        self.prec_ptr, self.prec_idx = _to_csr(sources, targets, n)
+        self.dep_ptr, self.dep_idx = _to_csr(targets, sources, n)
+        self.in_degree = np.diff(self.prec_ptr).astype(INDEX_DTYPE)
+
+    @classmethod
+    def from_edges(cls, nodes: list, edges):
+        """
+        Строит граф по списку вершин и парам (ячейка, список зависимостей).
+        Зависимости, которых нет среди nodes, добавляются как новые вершины.
+        """
+        nodes = list(nodes)
+        ids = {node: i for i, node in enumerate(nodes)}
+        sources, targets = [], []
+        for node, deps in edges:
+            if node not in ids:
+                ids[node] = len(nodes)
+                nodes.append(node)
+            source = ids[node]
+            for dep in deps:
+                target = ids.get(dep)
+                if target is None:
+                    target = ids[dep] = len(nodes)
+                    nodes.append(dep)
+                sources.append(source)
+                targets.append(target)
+        return cls(nodes, sources, targets)
+
+    @classmethod
+    def from_workbook(cls, all_sheets: dict):
+        """
+        Строит граф книги без промежуточного словаря строк.
+        Порядок вершин тот же, что у build_dependency_graph: сначала ячейки с данными,
+        затем пустые ячейки, на которые ссылаются формулы.
+        """
+        nodes = [f"{sheet}!{addr}" for sheet, content in all_sheets.items() for addr in content['data']]
+        return cls.from_edges(nodes, iter_formula_dependencies(all_sheets))
+
+    @classmethod
+    def from_dict(cls, graph: dict):
+        """Строит граф по словарю {ячейка: список зависимостей}."""
+        return cls.from_edges(graph.keys(), graph.items())
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node):
+        return node in self.ids
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.prec_idx)
+
+    @property
+    def nbytes(self) -> int:
+        """Объём памяти под массивы графа (без таблицы имён)."""
+        return sum(a.nbytes for a in (self.prec_ptr, self.prec_idx, self.dep_ptr, self.dep_idx, self.in_degree))
+
+    # --- Соседи одной вершины ---
+
+    def precedent_ids(self, i: int) -> np.ndarray:
+        """Номера ячеек, от которых зависит вершина i."""
+        return self.prec_idx[self.prec_ptr[i]:self.prec_ptr[i + 1]]
+
+    def dependent_ids(self, i: int) -> np.ndarray:
+        """Номера ячеек, которые зависят от вершины i."""
+        return self.dep_idx[self.dep_ptr[i]:self.dep_ptr[i + 1]]
+
+    def precedents(self, node: str) -> list:
+        return [self.nodes[j] for j in self.precedent_ids(self.ids[node]).tolist()]
+
+    def dependents(self, node: str) -> list:
+        return [self.nodes[j] for j in self.dependent_ids(self.ids[node]).tolist()]
+
+    # --- Сортировка и циклы ---
+
+    def _kahn(self):
+        """
+        Алгоритм Кана на целых числах. Массивы CSR один раз превращаются в списки
+        Python: доступ к элементу списка заметно быстрее, чем к элементу numpy-массива,
+        а «волновой» векторный вариант вырождается на цепочках (нарастающий итог),
+        где в каждой волне одна вершина.
+        Возвращает (порядок вершин, оставшиеся степени).
+        """
+        ptr, idx = self.dep_ptr.tolist(), self.dep_idx.tolist()
+        remaining = self.in_degree.tolist()
+        order = [i for i, deg in enumerate(remaining) if deg == 0]
+        append = order.append
+        for u in order:  # Список растёт по ходу обхода и служит очередью
+            for v in idx[ptr[u]:ptr[u + 1]]:
+                remaining[v] -= 1
+                if not remaining[v]:
+                    append(v)
+        return np.array(order, dtype=INDEX_DTYPE), np.array(remaining)
+
+    def topological_order(self) -> np.ndarray:
+        """
+        Номера вершин в порядке вычисления (зависимости раньше зависящих).
+        При циклических ссылках выбрасывает CyclicDependencyError.
+        """
+        order, remaining = self._kahn()
+        if len(order) < len(self.nodes):
+            raise CyclicDependencyError(self._cycles_among(np.flatnonzero(remaining > 0)))
+        return order
+
+    def topological_sort(self) -> list:
+        """То же, что topological_order, но с адресами ячеек."""
+        nodes = self.nodes
+        return [nodes[i] for i in self.topological_order().tolist()]
+
+    def _cycles_among(self, candidates: np.ndarray) -> list:
+        """
+        Циклы среди заданных вершин. Кандидатов — только вершины, которые Кан
+        не смог упорядочить, поэтому Тарьян работает на маленьком подграфе.
+        """
+        inside = np.zeros(len(self.nodes), dtype=bool)
+        inside[candidates] = True
+        nodes = self.nodes
+        sub = {
+            nodes[i]: [nodes[j] for j in self.precedent_ids(i).tolist() if inside[j]]
+            for i in candidates.tolist()
+        }
+        return [sorted(c) for c in strongly_connected_components(sub) if is_cyclic_component(c, sub)]
+
+    def find_cycles(self) -> list:
+        """Список циклов, каждый — отсортированный список ячеек."""
+        order, remaining = self._kahn()
+        if len(order) == len(self.nodes):
+            return []
+        return self._cycles_among(np.flatnonzero(remaining > 0))
+
+    def has_cycle(self) -> bool:
+        return len(self._kahn()[0]) < len(self.nodes)
+
+    # --- Достижимость ---
+
+    def reachable_ids(self, sources, direction: str = 'dependents') -> np.ndarray:
+        """
+        Номера всех вершин, достижимых из sources (сами sources не включаются,
+        если не лежат на цикле). direction: 'dependents' — что зависит от sources,
+        'precedents' — от чего зависят sources.
+        """
+        if direction == 'dependents':
+            ptr, idx = self.dep_ptr, self.dep_idx
+        elif direction == 'precedents':
+            ptr, idx = self.prec_ptr, self.prec_idx
+        else:
+            raise ValueError(f"Неизвестное направление обхода: {direction}")
+        ptr, idx = ptr.tolist(), idx.tolist()
+        visited = bytearray(len(self.nodes))
+        queue = [int(i) for i in sources]
+        found = []
+        for u in queue:  # Обход в ширину: список служит очередью
+            for v in idx[ptr[u]:ptr[u + 1]]:
+                if not visited[v]:
+                    visited[v] = 1
+                    found.append(v)
+                    queue.append(v)
+        return np.sort(np.array(found, dtype=INDEX_DTYPE))
+
+    def reachable(self, cells, direction: str = 'dependents') -> list:
+        """То же, что reachable_ids, но принимает и возвращает адреса ячеек."""
+        found = self.reachable_ids([self.ids[c] for c in cells], direction)
+        return [self.nodes[i] for i in found.tolist()]
+
+    # --- Представление в виде словарей ---
+
+    def as_dict(self):
+        """
+        Представления (graph, in_degree) с тем же интерфейсом, что у build_dependency_graph:
+        их можно передавать в topological_sort_kahn, has_cycle и т. д. Данные не копируются.
+        """
+        return _PrecedentsView(self), _InDegreeView(self)
+
+
+class _PrecedentsView(Mapping):
+    """Словарь {ячейка: список зависимостей} поверх CSR-массивов."""
+
+    def __init__(self, csr: CSRGraph):
+        self._csr = csr
+
+    def __getitem__(self, node):
+        return self._csr.precedents(node)
+
+    def __iter__(self):
+        return iter(self._csr.nodes)
+
+    def __len__(self):
+        return len(self._csr)
+
+    def __contains__(self, node):
+        return node in self._csr.ids
+
+
+class _InDegreeView(Mapping):
+    """Словарь {ячейка: входная степень} поверх массива in_degree."""
+
+    def __init__(self, csr: CSRGraph):
+        self._csr = csr
+
+    def __getitem__(self, node):
+        return int(self._csr.in_degree[self._csr.ids[node]])
+
+    def __iter__(self):
+        return iter(self._csr.nodes)
+
+    def __len__(self):
+        return len(self._csr)
+
+    def __contains__(self, node):
+        return node in self._csr.ids
@@ -0,0 +1,242 @@
+# src/diff.py
+
+"""
+Модуль diff:
+- ast_hash(node) -> str: структурный хэш AST формулы (не зависит от пробелов, регистра, '$')
+- diff_workbooks(old_sheets, new_sheets, outputs=None, ...) -> WorkbookDiff
+    Сравнивает две версии книги: содержимое ячеек, структуру графа и вычисленные значения.
+- diff_files(old_path, new_path, **kwargs) -> WorkbookDiff: то же для файлов Excel
+- WorkbookDiff: отчёт
+    * cells — изменённые ячейки по видам: added, removed, formula, constant, kind
+    * reformatted — формулы, у которых изменился только текст, но не структура
+    * structure — {ячейка: (добавленные зависимости, удалённые зависимости)}
+    * outputs — изменившиеся значения с причинами: изменёнными ячейками-предшественниками
+    * recalculated — сколько формул новой версии пришлось вычислить
+    * format(limit) — текстовый отчёт
+
+Формулы с одинаковым текстом не разбираются вовсе; формулы с разным текстом разбираются
+и сравниваются по хэшу AST, поэтому '=SUM( $A$1:A3 )' и '=sum(A1:A3)' считаются одинаковыми.
+Целиком вычисляется только старая версия. В новой пересчитываются лишь изменённые
+формулы и формулы, зависящие от изменённых ячеек (по графам обеих версий);
+остальные значения берутся из старой версии — их формулы и входы не изменились.
+"""
+
+import hashlib
+
+from src.ast_builder import parse_formula, compile_formulas
+from src.checker import compare_values, DEFAULT_RTOL, DEFAULT_ATOL
+from src.evaluator import ConstantNode, CellNode, RangeNode, FunctionNode, BinaryOpNode
+from src.graph import iter_formula_dependencies
+from src.model import workbook_values, evaluate_components
+from src.partition import evaluate_partitioned
+from src.query import DependencyQuery
+from src.ranges import CalcContext
+
+CHANGE_KINDS = ('added', 'removed', 'formula', 'constant', 'kind')
+
+
+def _node_label(node) -> str:
+    """Собственная часть узла (без детей) для хэша."""
+    if isinstance(node, ConstantNode):
+        return f"C:{type(node.value).__name__}:{node.value!r}"
+    if isinstance(node, CellNode):
+        return f"R:{node.ref}"
+    if isinstance(node, RangeNode):
+        return f"G:{node.ref}"
+    if isinstance(node, FunctionNode):
+        return f"F:{node.name}:{len(node.args)}"
+    if isinstance(node, BinaryOpNode):
+        return f"B:{node.op}"
+    return f"?:{type(node).__name__}"
+
+
+def ast_hash(node) -> str:
+    """
+    Хэш дерева формулы: одинаков для структурно одинаковых формул.
+    Вычисляется без рекурсии (обход в обратном порядке), поэтому длинные выражения не страшны.
+    """
+    hashes = {}
+    stack = [(node, False)]
+    while stack:
+        current, expanded = stack.pop()
+        children = current.children()
+        if not expanded and children:
+            stack.append((current, True))
+            stack.extend((child, False) for child in children)
+            continue
+        digest = hashlib.sha1(_node_label(current).encode())
+        for child in children:
+            digest.update(hashes[id(child)].encode())
+        hashes[id(current)] = digest.hexdigest()
+    return hashes[id(node)]
+
+
+class WorkbookDiff:
+    """Результат сравнения двух версий книги."""
+
+    def __init__(self, cells: dict, reformatted: list, structure: dict, outputs: list, recalculated: int = 0):
+        self.cells = cells
+        self.reformatted = reformatted
+        self.structure = structure
+        self.outputs = outputs
+        self.recalculated = recalculated
+
+    @property
+    def changed_cells(self) -> list:
+        """Все изменённые ячейки (без учёта переформатированных формул)."""
+        return sorted(cell for kind in CHANGE_KINDS for cell in self.cells[kind])
+
+    def format(self, limit: int = 20) -> str:
+        counts = ', '.join(f"{kind}: {len(self.cells[kind])}" for kind in CHANGE_KINDS)
+        lines = [
+            f"Изменено ячеек — {counts}; переформатировано формул: {len(self.reformatted)}",
+            f"Изменена структура зависимостей: {len(self.structure)} ячеек",
+            f"Пересчитано формул новой версии: {self.recalculated}",
+            f"Изменилось значений: {len(self.outputs)}",
+        ]
+        for row in self.outputs[:limit]:
+            causes = ', '.join(row['causes'][:5]) + (' ...' if len(row['causes']) > 5 else '')
+            lines.append(f"  {row['cell']}: {row['old']!r} -> {row['new']!r} (причины: {causes})")
+        if len(self.outputs) > limit:
+            lines.append(f"  ... и ещё {len(self.outputs) - limit}")
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f"WorkbookDiff(changed={len(self.changed_cells)}, outputs={len(self.outputs)})"
+
+
+def _cells(all_sheets: dict) -> dict:
+    """{'Лист!A1': (это_формула, содержимое)} для всех ячеек книги."""
+    cells = {}
+    for sheet, content in all_sheets.items():
+        formulas = content['formulas']
+        for addr, value in content['data'].items():
+            is_formula = addr in formulas
+            cells[f"{sheet}!{addr}"] = (is_formula, formulas[addr] if is_formula else value)
+    return cells
+
+
+def _compare_cells(old_cells: dict, new_cells: dict) -> tuple:
+    """Сопоставляет ячейки двух версий и раскладывает изменения по видам."""
+    changes = {kind: [] for kind in CHANGE_KINDS}
+    reformatted = []
+    for cell in sorted(old_cells.keys() | new_cells.keys()):
+        old, new = old_cells.get(cell), new_cells.get(cell)
+        if old is None:
+            changes['added'].append(cell)
+        elif new is None:
+            changes['removed'].append(cell)
+        elif old[0] != new[0]:
+            changes['kind'].append(cell)  # Константа стала формулой или наоборот
+        elif old[1] == new[1]:
+            continue  # Текст не изменился — разбирать не нужно
+        elif not new[0]:
+            changes['constant'].append(cell)
+        else:
+            sheet = cell.split('!', 1)[0]
+            if ast_hash(parse_formula(old[1], sheet=sheet)) == ast_hash(parse_formula(new[1], sheet=sheet)):
+                reformatted.append(cell)
+            else:
+                changes['formula'].append(cell)
+    return changes, reformatted
+
+
+def _compare_structure(old_sheets: dict, new_sheets: dict) -> dict:
+    """Ячейки, у которых изменился набор зависимостей: (добавленные, удалённые)."""
+    old_deps = {node: set(deps) for node, deps in iter_formula_dependencies(old_sheets)}
+    new_deps = {node: set(deps) for node, deps in iter_formula_dependencies(new_sheets)}
+    structure = {}
+    for node in sorted(old_deps.keys() | new_deps.keys()):
+        before, after = old_deps.get(node, set()), new_deps.get(node, set())
+        if before != after:
+            structure[node] = (sorted(after - before), sorted(before - after))
+    return structure
+
+
+def _recalculate(new_sheets: dict, old_values: dict, changed: set, graphs: list) -> tuple:
+    """
+    Значения новой версии книги: старые значения, в которых пересчитаны только формулы,
+    достижимые из изменённых ячеек changed по графам graphs (CSRGraph обеих версий).
+    Возвращает (значения, число пересчитанных формул).
+    """
+    affected = set(changed)
+    for csr in graphs:
+        sources = [cell for cell in changed if cell in csr]
+        if sources:
+            affected.update(csr.reachable(sources, direction='dependents'))
+
+    context = CalcContext(old_values)
+    constants = workbook_values(new_sheets)
+    for cell in changed:
+        if cell in constants:
+            context[cell] = constants[cell]
+        else:
+            context.pop(cell, None)  # Удалённая ячейка или новая формула (её вычислим ниже)
+
+    # Часть книги из затронутых формул: остальные ячейки уже лежат в context
+    part = {}
+    for sheet, content in new_sheets.items():
+        formulas = {addr: formula for addr, formula in content['formulas'].items()
+                    if f"{sheet}!{addr}" in affected}
+        if formulas:
+            part[sheet] = {'data': dict(formulas), 'constants': {}, 'formulas': formulas, 'calculated': {}}
+    compiled = compile_formulas(new_sheets, cells=affected)
+    for cell in compiled:
+        context.pop(cell, None)  # Старое значение не должно просочиться, если формула не вычислится
+    evaluate_components(part, compiled, context)
+    return context, len(compiled)
+
+
+def diff_workbooks(old_sheets: dict, new_sheets: dict, outputs=None, rtol: float = DEFAULT_RTOL,
+                   atol: float = DEFAULT_ATOL, processes: int = 0) -> WorkbookDiff:
+    """
+    Сравнивает две версии книги (структуры all_sheets из loader).
+    - outputs: ячейки, значения которых сравниваются; None — все формулы новой версии
+    - rtol, atol: допуски для чисел (как в checker)
+    - processes: число процессов для вычисления старой версии (0 — в текущем процессе);
+      новая версия пересчитывается только там, где есть изменения
+    Для каждого изменившегося значения перечисляются изменённые ячейки среди его
+    предшественников (и сама ячейка, если изменилась она) — это и есть причины.
+    """
+    old_cells, new_cells = _cells(old_sheets), _cells(new_sheets)
+    changes, reformatted = _compare_cells(old_cells, new_cells)
+    structure = _compare_structure(old_sheets, new_sheets)
+
+    if outputs is None:
+        outputs = [cell for cell, (is_formula, _) in new_cells.items() if is_formula]
+    changed = set(changes['added']) | set(changes['removed']) | set(changes['formula']) \
+        | set(changes['constant']) | set(changes['kind'])
+    query_new = DependencyQuery.from_workbook(new_sheets)
+    query_old = None
+    # Удалённые ячейки и их зависимые видны только в графе старой версии
+    if changes['removed'] or changes['kind']:
+        query_old = DependencyQuery.from_workbook(old_sheets)
+
+    old_values = evaluate_partitioned(old_sheets, processes=processes)
+    graphs = [query.csr for query in (query_new, query_old) if query is not None]
+    new_values, recalculated = _recalculate(new_sheets, old_values, changed, graphs)
+    before = [old_values.get(cell) for cell in outputs]
+    after = [new_values.get(cell) for cell in outputs]
+    same = compare_values(before, after, rtol, atol)
+
+    rows = []
+    for cell, old, new, ok in zip(outputs, before, after, same.tolist()):
+        if ok:
+            continue
+        causes = set()
+        if cell in changed:
+            causes.add(cell)
+        if cell in query_new.csr:
+            causes.update(c for c in query_new.precedents(cell) if c in changed)
+        if query_old is not None and cell in query_old.csr:
+            causes.update(c for c in query_old.precedents(cell) if c in changed)
+        rows.append({'cell': cell, 'old': old, 'new': new, 'causes': sorted(causes)})
+    return WorkbookDiff(changes, reformatted, structure, rows, recalculated)
+
+
+def diff_files(old_path: str, new_path: str, **kwargs) -> WorkbookDiff:
+    """Загружает две версии книги из файлов Excel и сравнивает их (см. diff_workbooks)."""
+    from src.loader import read_excel_file, split_into_constants_and_formulas  # Нужен Excel (xlwings)
+    old_sheets = split_into_constants_and_formulas(read_excel_file(old_path))
+    new_sheets = split_into_constants_and_formulas(read_excel_file(new_path))
+    return diff_workbooks(old_sheets, new_sheets, **kwargs)
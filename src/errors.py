@@ -0,0 +1,69 @@
+# src/errors.py
+
+"""
+Модуль errors:
+- ExcelError: значение-ошибка Excel (#DIV/0!, #N/A, #VALUE!, #REF!, ...)
+- DIV0, NA, VALUE, REF, NAME, NUM, NULL: единственные экземпляры ошибок
+- ERRORS: словарь {код: ошибка} для разбора литералов вида #N/A в формулах
+- is_error(value) -> bool
+- CyclicDependencyError(cycles): исключение — циклические ссылки там, где они не разрешены
+
+Ошибки — обычные значения, а не исключения: они возвращаются из узлов AST
+и функций и распространяются дальше, не раскручивая стек Python.
+Сравнение типа (type(v) is ExcelError) — самая дешёвая проверка на горячем пути.
+"""
+
+
+class ExcelError:
+    """
+    Значение-ошибка Excel. Экземпляры создаются один раз (см. ниже),
+    поэтому их можно сравнивать через `is`.
+    """
+    __slots__ = ('code',)
+
+    def __init__(self, code: str):
+        self.code = code # Текст ошибки так, как его показывает Excel
+
+    def __repr__(self):
+        return self.code
+
+    __str__ = __repr__
+
+    def __reduce__(self):
+        # При передаче между процессами восстанавливаем тот же самый экземпляр
+        return (error_from_code, (self.code,))
+
+
+DIV0 = ExcelError('#DIV/0!')   # Деление на ноль
+NA = ExcelError('#N/A')        # Значение не найдено
+VALUE = ExcelError('#VALUE!')  # Аргумент неподходящего типа
+REF = ExcelError('#REF!')      # Недопустимая ссылка
+NAME = ExcelError('#NAME?')    # Неизвестная функция или имя
+NUM = ExcelError('#NUM!')      # Недопустимое числовое значение
+NULL = ExcelError('#NULL!')    # Пустое пересечение диапазонов
+
+# Все ошибки по их текстовому коду
+ERRORS = {err.code: err for err in (DIV0, NA, VALUE, REF, NAME, NUM, NULL)}
+
+
+def error_from_code(code: str) -> ExcelError:
+    """Возвращает экземпляр ошибки по коду ('#N/A' -> NA)."""
+    return ERRORS[code.upper()]
+
+
+def is_error(value) -> bool:
+    """Проверяет, является ли значение ошибкой Excel."""
+    return type(value) is ExcelError
+
+
+class CyclicDependencyError(ValueError):
+    """
+    Граф содержит циклические ссылки. Атрибут cycles — список циклов,
+    каждый цикл — список ячеек (см. src.graph.find_cycles).
+    """
+
+    def __init__(self, cycles: list):
+        self.cycles = cycles
+        shown = '; '.join(', '.join(cycle) for cycle in cycles[:5])
+        more = f" (и ещё {len(cycles) - 5})" if len(cycles) > 5 else ""
+        super().__init__(f"Граф содержит цикл — топологическая сортировка невозможна: {shown}{more}")
@@ -1,6 +1,13 @@
 #evaluator.py
 
+import numbers
+import threading
+from contextlib import contextmanager
 from typing import Any, Dict, Tuple, List
+from src.ranges import RangeRef, CalcContext, split_ref, parse_range
+from src.errors import ExcelError, DIV0, NA, VALUE, NAME, NUM, CyclicDependencyError
+from src.lookup import vlookup, hlookup, xlookup, index, match
+from src.criteria import sumif, sumifs, countif, countifs, averageif, averageifs
 
 # ----------------------------------------------------------------------------
 # Базовые классы узлов AST (Abstract Syntax Tree)
@@ -16,6 +23,10 @@ class FormulaNode:
         # При отсутствии переопределения вызываем ошибку.
         raise NotImplementedError("FormulaNode.eval must be implemented in subclasses")
 
+    def children(self) -> tuple:
+        # Дочерние узлы; у листьев (констант и ссылок) их нет
+        return ()
+
 
 class ConstantNode(FormulaNode):
     """
@@ -46,6 +57,23 @@ class CellNode(FormulaNode):
         return context.get(self.ref)
 
 
+class RangeNode(FormulaNode):
+    """
+    Узел для ссылки на диапазон ячеек ("B2:D10" или "Sheet1!B2:D10").
+    Адрес разбирается один раз при построении узла,
+    а eval() возвращает ленивый RangeRef поверх context.
+    """
+    def __init__(self, ref: str):
+        # Сохраняем исходную ссылку и заранее разобранные границы диапазона
+        self.ref = ref
+        self.sheet, addr = split_ref(ref)
+        self.bounds = parse_range(addr)
+
+    def eval(self, context: Dict[str, Any]) -> RangeRef:
+        # Значения не копируются: функции сами читают нужные ячейки
+        return RangeRef(self.sheet, *self.bounds, context)
+
+
 class FunctionNode(FormulaNode):
     """
     Узел для вызова Excel-функций.
@@ -56,18 +84,49 @@ class FunctionNode(FormulaNode):
         self.name = name
         # Список аргументов — других узлов AST
         self.args = args
+        # Специальная форма (IF, IFERROR, CHOOSE, AND, OR) получает узлы, а не значения,
+        # и сама решает, какие аргументы вычислять
+        self.lazy = lazy_forms.get(name)
+        if self.lazy is not None:
+            # Число аргументов проверяется один раз: неверный вызов всегда даёт #VALUE!
+            low, high = lazy_arity[name]
+            if not low <= len(args) <= high:
+                self.lazy = _wrong_arity
+
+    def children(self) -> tuple:
+        return tuple(self.args)
 
     def eval(self, context: Dict[str, Any]) -> Any:
-        # Сначала рекурсивно вычисляем все аргументы
-        values = [arg.eval(context) for arg in self.args]
-        # Затем вызываем соответствующую функцию из excel_funcs,
-        # передавая распакованный список значений
-        return excel_funcs[self.name](*values)
+        if self.lazy is not None:
+            # Ленивые формы вычисляют только нужные ветви и сами получают узлы
+            func, values = self.lazy, (self.args, context)
+        else:
+            # Сначала рекурсивно вычисляем все аргументы
+            values = [arg.eval(context) for arg in self.args]
+            # Ошибка в любом аргументе становится результатом функции
+            for value in values:
+                if type(value) is ExcelError:
+                    return value
+            func = excel_funcs.get(self.name)
+            if func is None:
+                return NAME # Неизвестная функция
+        # Затем вызываем соответствующую функцию из excel_funcs (или ленивую форму),
+        # передавая распакованный список значений.
+        # Исключения Python внутри функций превращаются в ошибки Excel,
+        # чтобы одна неудачная ячейка не прерывала вычисление всей книги
+        try:
+            return func(*values)
+        except ZeroDivisionError:
+            return DIV0
+        except CyclicDependencyError:
+            raise  # Цикл в режиме pull — ошибка книги, а не значения
+        except (ValueError, TypeError, ArithmeticError, IndexError):
+            return VALUE
 
 
 class BinaryOpNode(FormulaNode):
     """
-    Узел для бинарных операций: +, -, *, /.
+    Узел для бинарных операций: +, -, *, /, ^, & и сравнений.
     Хранит оператор и два дочерних узла (левый и правый операнды).
     """
     def __init__(self, op: str, left: FormulaNode, right: FormulaNode):
@@ -77,26 +136,149 @@ class BinaryOpNode(FormulaNode):
         self.left = left
         self.right = right
 
+    def children(self) -> tuple:
+        return (self.left, self.right)
+
     def eval(self, context):
         l = self.left.eval(context)
+        if type(l) is ExcelError:
+            return l  # Ошибка распространяется без вычисления правой части
         r = self.right.eval(context)
-
-        if self.op == '+':   return l + r
-        if self.op == '-':   return l - r
-        if self.op == '*':   return l * r
-        if self.op == '/':   return l / r
+        if type(r) is ExcelError:
+            return r
+        op = self.op
+
+        if op in _ARITHMETIC:
+            # Быстрый путь: оба операнда уже числа; иначе приводим по правилам Excel
+            if type(l) not in _NUMBER_TYPES:
+                l = to_number(l)
+                if type(l) is ExcelError:
+                    return l
+            if type(r) not in _NUMBER_TYPES:
+                r = to_number(r)
+                if type(r) is ExcelError:
+                    return r
+            if op == '+':   return l + r
+            if op == '-':   return l - r
+            if op == '*':   return l * r
+            if op == '/':   return l / r if r else DIV0
+            return _power(l, r)
+
+        # Диапазон из нескольких ячеек не сцепляется и не сравнивается (формулы массива не поддерживаются)
+        if isinstance(l, RangeRef) and len(l) != 1 or isinstance(r, RangeRef) and len(r) != 1:
+            return VALUE
+
+        if op == '&':   return to_text(l) + to_text(r)
 
         # сравнения:
-        if self.op == '>':   return l > r
-        if self.op == '<':   return l < r
-        if self.op == '>=':  return l >= r
-        if self.op == '<=':  return l <= r
-        if self.op == '=':   return l == r
-        if self.op == '<>':  return l != r
+        l, r = _compare_key(l, r), _compare_key(r, l)
+        if op == '>':   return l > r
+        if op == '<':   return l < r
+        if op == '>=':  return l >= r
+        if op == '<=':  return l <= r
+        if op == '=':   return l == r
+        if op == '<>':  return l != r
 
         raise ValueError(f"Unsupported operator {self.op}")
 
 
+# ----------------------------------------------------------------------------
+# Приведение типов по правилам Excel
+# ----------------------------------------------------------------------------
+
+_ARITHMETIC = frozenset('+-*/^')
+_NUMBER_TYPES = (int, float)  # bool сюда не входит: type(True) is bool
+
+
+def register_number_type(cls: type) -> None:
+    """
+    Разрешает арифметике и агрегатам считать числом ещё один тип — наследник float
+    (например, дуальные числа src/autodiff.py). Быстрые проверки идут через type(),
+    поэтому без регистрации такие значения приводились бы к float и теряли свои данные.
+    """
+    global _NUMBER_TYPES
+    if not issubclass(cls, float):
+        raise TypeError(f"{cls.__name__} должен наследовать float")
+    if cls not in _NUMBER_TYPES:
+        _NUMBER_TYPES = _NUMBER_TYPES + (cls,)
+
+
+def _single_value(value):
+    """Диапазон из одной ячейки ведёт себя как значение этой ячейки."""
+    if isinstance(value, RangeRef) and len(value) == 1:
+        return value.value(0, 0)
+    return value
+
+
+def to_number(value):
+    """
+    Приводит значение к числу для арифметики:
+    пустая ячейка -> 0, TRUE/FALSE -> 1/0, текст-число -> число,
+    остальное -> #VALUE!.
+    """
+    value = _single_value(value)
+    if value is None:
+        return 0
+    if type(value) is ExcelError or type(value) in _NUMBER_TYPES:
+        return value
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, numbers.Real):
+        return float(value)  # Прочие числа (np.float64, np.int64) — к float Python
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return VALUE
+    return VALUE
+
+
+def to_text(value) -> str:
+    """Текстовое представление значения для операции '&'."""
+    value = _single_value(value)
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))  # Excel показывает 2.0 как "2"
+    return str(value)
+
+
+def _compare_key(value, other):
+    """
+    Ключ сравнения Excel: числа < текст < логические значения,
+    текст без учёта регистра; пустая ячейка равна 0, "" или FALSE
+    в зависимости от типа второго операнда.
+    """
+    value = _single_value(value)
+    if value is None:
+        other = _single_value(other)
+        if isinstance(other, str):
+            return (1, '')
+        if isinstance(other, bool):
+            return (2, False)
+        return (0, 0)
+    if isinstance(value, bool):
+        return (2, value)
+    if isinstance(value, str):
+        return (1, value.lower())
+    return (0, value)
+
+
+def _power(base, exponent):
+    """Возведение в степень с ошибками Excel вместо исключений."""
+    if base == 0 and exponent < 0:
+        return DIV0
+    try:
+        result = base ** exponent
+    except (OverflowError, ZeroDivisionError):
+        return NUM
+    if isinstance(result, complex):
+        return NUM  # Дробная степень отрицательного числа
+    return result
+
+
 # ----------------------------------------------------------------------------
 # Словарь с базовыми функциями, имитирующими Excel-функции
 # ----------------------------------------------------------------------------
@@ -106,30 +288,474 @@ def _ensure_sequence(values: Tuple[Any, ...]) -> Tuple[Any, ...]:
     Если передали один аргумент-итерируемый (список/кортеж), возвращаем его,
     иначе возвращаем все аргументы как кортеж.
     Это позволяет поддерживать как вызов SUM(1,2,3), так и SUM([1,2,3]).
+    Диапазоны (RangeRef) разворачиваются в плоский список значений,
+    пустые ячейки диапазона пропускаются, как в Excel.
     """
+    # Если среди аргументов есть диапазоны — разворачиваем их
+    if any(isinstance(v, RangeRef) for v in values):
+        flat = []
+        for v in values:
+            if isinstance(v, RangeRef):
+                flat.extend(x for x in v.values() if x is not None)
+            else:
+                flat.append(v)
+        return tuple(flat)
     # Если ровно один аргумент и он список или кортеж — возвращаем его
     if len(values) == 1 and isinstance(values[0], (list, tuple)):
         return values[0]
     # Иначе возвращаем сам полученный кортеж
     return values
 
+def _numbers(values: Tuple[Any, ...]):
+    """
+    Числовые значения аргументов (текст и пустые ячейки пропускаются).
+    Если среди значений есть ошибка, возвращается она вместо списка.
+    """
+    result = []
+    for v in _ensure_sequence(values):
+        if type(v) in _NUMBER_TYPES or isinstance(v, bool):
+            result.append(v)
+        elif type(v) is ExcelError:
+            return v
+        elif isinstance(v, numbers.Real):
+            result.append(float(v))  # np.float64 и т. п. из массивов NumPy
+    return result
+
+
+def _sum(*values):
+    numbers = _numbers(values)
+    return numbers if type(numbers) is ExcelError else sum(numbers)
+
+
+def _average(*values):
+    numbers = _numbers(values)
+    if type(numbers) is ExcelError:
+        return numbers
+    # Среднее: сумма / количество; для пустого набора Excel возвращает #DIV/0!
+    return sum(numbers) / len(numbers) if numbers else DIV0
+
+
+def _min(*values):
+    numbers = _numbers(values)
+    if type(numbers) is ExcelError:
+        return numbers
+    return min(numbers) if numbers else 0
+
+
+def _max(*values):
+    numbers = _numbers(values)
+    if type(numbers) is ExcelError:
+        return numbers
+    return max(numbers) if numbers else 0
+
+
 # Определяем функции, которые будут использоваться для вычисления
 excel_funcs = {
-    'SUM': lambda *values: sum(_ensure_sequence(values)),
-    'AVERAGE': lambda *values: (
-        # Среднее: сумма / количество, если не пусто, иначе 0
-        (sum(_ensure_sequence(values)) / len(_ensure_sequence(values)))
-        if _ensure_sequence(values) else 0
-    ),
-    'MIN': lambda *values: min(_ensure_sequence(values)),
-    'MAX': lambda *values: max(_ensure_sequence(values)),
+    'SUM': _sum,
+    'AVERAGE': _average,
+    'MIN': _min,
+    'MAX': _max,
     'IF': lambda condition, true_value, false_value:
         # Условная функция: возвращаем true_value, если condition истинно, иначе false_value
+        # (FunctionNode использует ленивую форму из lazy_forms, см. ниже)
         true_value if condition else false_value,
+    'AND': lambda *values: all(all(_truth_values(value)) for value in values),
+    'OR': lambda *values: any(any(_truth_values(value)) for value in values),
+    'CHOOSE': lambda number, *options: options[int(number) - 1],
+    # Функции поиска работают через кэшируемые индексы диапазонов (src/lookup.py)
+    'VLOOKUP': vlookup,
+    'HLOOKUP': hlookup,
+    'XLOOKUP': xlookup,
+    'INDEX': index,
+    'MATCH': match,
+    # Условные агрегаты: скомпилированные условия, векторные маски и групповые индексы (src/criteria.py)
+    'SUMIF': sumif,
+    'SUMIFS': sumifs,
+    'COUNTIF': countif,
+    'COUNTIFS': countifs,
+    'AVERAGEIF': averageif,
+    'AVERAGEIFS': averageifs,
     # Можно добавить другие Excel-функции аналогичным образом
 }
 
 
+# ----------------------------------------------------------------------------
+# Ленивые специальные формы: IF, IFERROR, IFNA, CHOOSE, AND, OR, ISERROR, ISNA
+# ----------------------------------------------------------------------------
+
+class EvalStats:
+    """
+    Счётчики ленивого вычисления:
+    - skipped_branches: сколько аргументов-ветвей не пришлось вычислять
+    - skipped_nodes: сколько узлов AST было в этих ветвях
+    - pulled_cells: сколько формул вычислено по запросу в режиме pull (PullContext)
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.skipped_branches = 0
+        self.skipped_nodes = 0
+        self.pulled_cells = 0
+
+    def restore(self, counters: Dict[str, int]):
+        """Возвращает счётчики к значениям as_dict(), снятым раньше."""
+        for name, value in counters.items():
+            setattr(self, name, value)
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            'skipped_branches': self.skipped_branches,
+            'skipped_nodes': self.skipped_nodes,
+            'pulled_cells': self.pulled_cells,
+        }
+
+
+_local = threading.local()  # _local.stats — EvalStats текущего потока, пока включён сбор
+
+
+@contextmanager
+def collect_stats():
+    """
+    Включает счётчики ленивого вычисления в текущем потоке:
+        with collect_stats() as stats:
+            evaluate_workbook(all_sheets)
+        print(stats.as_dict())
+    Без него счётчики не ведутся и ничего не стоят.
+    """
+    previous = getattr(_local, 'stats', None)
+    stats = _local.stats = EvalStats()
+    try:
+        yield stats
+    finally:
+        _local.stats = previous
+
+
+def count_nodes(node: FormulaNode) -> int:
+    """
+    Количество узлов в поддереве AST.
+    Результат запоминается в самом узле, поэтому повторный подсчёт бесплатен.
+    """
+    size = getattr(node, '_size', None)
+    if size is None:
+        size = 1 + sum(count_nodes(child) for child in node.children())
+        node._size = size
+    return size
+
+
+def _skip(*nodes: FormulaNode) -> None:
+    """Учитывает в счётчиках невычисленные ветви (если сбор включён, см. collect_stats)."""
+    stats = getattr(_local, 'stats', None)
+    if stats is None:
+        return
+    for node in nodes:
+        stats.skipped_branches += 1
+        stats.skipped_nodes += count_nodes(node)
+
+
+def _condition(value):
+    """
+    Условие IF как логическое значение: числа — по нулю, текст 'TRUE'/'FALSE' — по смыслу,
+    прочий текст и диапазон из нескольких ячеек — #VALUE!, как в Excel.
+    """
+    value = _single_value(value)
+    if isinstance(value, str):
+        upper = value.upper()
+        return upper == 'TRUE' if upper in ('TRUE', 'FALSE') else VALUE
+    if isinstance(value, RangeRef):
+        return VALUE
+    return value
+
+
+def _lazy_if(args: List[FormulaNode], context: Dict[str, Any]) -> Any:
+    """IF(условие, если_истина, [если_ложь]): вычисляется только выбранная ветвь."""
+    condition = _condition(args[0].eval(context))
+    if type(condition) is ExcelError:
+        _skip(*args[1:])
+        return condition
+    true_node = args[1] if len(args) > 1 else None
+    false_node = args[2] if len(args) > 2 else None
+    taken, skipped = (true_node, false_node) if condition else (false_node, true_node)
+    if skipped is not None:
+        _skip(skipped)
+    if taken is None:
+        # Отсутствующая ветвь «ложь» в Excel возвращает FALSE
+        return bool(condition)
+    return taken.eval(context)
+
+
+def _lazy_iferror(args: List[FormulaNode], context: Dict[str, Any]) -> Any:
+    """IFERROR(значение, значение_при_ошибке): запасная ветвь вычисляется только при ошибке."""
+    try:
+        value = args[0].eval(context)
+    except CyclicDependencyError:
+        raise
+    except (ValueError, TypeError, ArithmeticError):
+        value = VALUE  # Непредвиденное исключение считаем ошибкой #VALUE!
+    if type(value) is ExcelError:
+        return args[1].eval(context)
+    _skip(args[1])
+    return value
+
+
+def _lazy_ifna(args: List[FormulaNode], context: Dict[str, Any]) -> Any:
+    """IFNA(значение, значение_при_NA): как IFERROR, но перехватывает только #N/A."""
+    value = args[0].eval(context)
+    if value is NA:
+        return args[1].eval(context)
+    _skip(args[1])
+    return value
+
+
+def _lazy_iserror(args: List[FormulaNode], context: Dict[str, Any]) -> bool:
+    """ISERROR(значение): TRUE, если значение — любая ошибка Excel."""
+    return type(_single_value(args[0].eval(context))) is ExcelError
+
+
+def _lazy_isna(args: List[FormulaNode], context: Dict[str, Any]) -> bool:
+    """ISNA(значение): TRUE, если значение — #N/A."""
+    return _single_value(args[0].eval(context)) is NA
+
+
+def _lazy_choose(args: List[FormulaNode], context: Dict[str, Any]) -> Any:
+    """CHOOSE(номер, вариант1, вариант2, ...): вычисляется только выбранный вариант."""
+    number = to_number(args[0].eval(context))
+    options = args[1:]
+    if type(number) is ExcelError:
+        _skip(*options)
+        return number
+    if not 1 <= number < len(options) + 1:  # Заодно отсекает NaN и бесконечность до int()
+        _skip(*options)
+        return VALUE
+    number = int(number)
+    _skip(*(node for i, node in enumerate(options, start=1) if i != number))
+    return options[number - 1].eval(context)
+
+
+def _truth_values(value) -> list:
+    """
+    Логические значения аргумента AND/OR; пустые ячейки диапазона пропускаются.
+    Ошибка внутри аргумента возвращается вместо списка.
+    """
+    if isinstance(value, RangeRef):
+        value = value.values()
+    elif not isinstance(value, (list, tuple)):
+        return value if type(value) is ExcelError else [bool(value)]
+    result = []
+    for v in value:
+        if type(v) is ExcelError:
+            return v
+        if v is not None:
+            result.append(bool(v))
+    return result
+
+
+def _lazy_and(args: List[FormulaNode], context: Dict[str, Any]) -> Any:
+    """AND: вычисление прекращается на первом ложном аргументе."""
+    for i, node in enumerate(args):
+        values = _truth_values(node.eval(context))
+        if type(values) is ExcelError:
+            _skip(*args[i + 1:])
+            return values
+        if not all(values):
+            _skip(*args[i + 1:])
+            return False
+    return True
+
+
+def _lazy_or(args: List[FormulaNode], context: Dict[str, Any]) -> Any:
+    """OR: вычисление прекращается на первом истинном аргументе."""
+    for i, node in enumerate(args):
+        values = _truth_values(node.eval(context))
+        if type(values) is ExcelError:
+            _skip(*args[i + 1:])
+            return values
+        if any(values):
+            _skip(*args[i + 1:])
+            return True
+    return False
+
+
+def _wrong_arity(args: List[FormulaNode], context: Dict[str, Any]) -> Any:
+    """Специальная форма с неверным числом аргументов (IF(), CHOOSE(1), ...)."""
+    return VALUE
+
+
+# Специальные формы получают список узлов-аргументов и context
+lazy_forms = {
+    'IF': _lazy_if,
+    'IFERROR': _lazy_iferror,
+    'CHOOSE': _lazy_choose,
+    'AND': _lazy_and,
+    'OR': _lazy_or,
+    # Функции, которые должны видеть ошибку в аргументе, а не распространять её
+    'IFNA': _lazy_ifna,
+    'ISERROR': _lazy_iserror,
+    'ISNA': _lazy_isna,
+}
+
+# Допустимое число аргументов специальных форм: (наименьшее, наибольшее)
+lazy_arity = {
+    'IF': (2, 3),
+    'IFERROR': (2, 2),
+    'CHOOSE': (2, 255),
+    'AND': (1, 255),
+    'OR': (1, 255),
+    'IFNA': (2, 2),
+    'ISERROR': (1, 1),
+    'ISNA': (1, 1),
+}
+
+
+# ----------------------------------------------------------------------------
+# Режим pull: формулы вычисляются только по запросу
+# ----------------------------------------------------------------------------
+
+def _add_counters(total: Dict[str, int], counters: Dict[str, int]):
+    for name, count in counters.items():
+        total[name] += count
+
+
+# Глубина, до которой PullContext вычисляет зависимости рекурсивно (см. PullContext)
+PULL_RECURSION_DEPTH = 50
+
+
+class _Pending(Exception):
+    """
+    Формуле понадобилась ещё не вычисленная ячейка key; path — прерванные ячейки между
+    вершиной стека и key. Не наследует ValueError, поэтому обработчики ошибок функций
+    и IFERROR его не перехватывают.
+    """
+    def __init__(self, key: str, path: list):
+        self.key = key
+        self.path = path
+
+
+class PullContext(CalcContext):
+    """
+    Контекст, в котором значение формульной ячейки вычисляется при первом обращении.
+    - values: начальные значения (константы) по адресам 'Лист!A1'
+    - formulas: {адрес: FormulaNode} для формульных ячеек
+    Ячейки, на которые ссылаются только невыбранные ветви IF/CHOOSE/...,
+    так и не вычисляются; их количество возвращает pending_count().
+
+    Зависимости вычисляются рекурсивно до глубины PULL_RECURSION_DEPTH, глубже —
+    через явный стек: вычисление формулы прерывается, недостающая ячейка кладётся
+    на стек и считается первой, а формула затем вычисляется заново. Поэтому длина
+    цепочки не ограничена стеком Python. Цикл приводит к CyclicDependencyError.
+    """
+    def __init__(self, values: Dict[str, Any], formulas: Dict[str, FormulaNode]):
+        super().__init__(values)
+        self.formulas = formulas
+        self._stack = []          # Явный стек _pull: ячейки, ждущие своих зависимостей
+        self._paths = []          # _paths[i] — ячейки цепочки между _stack[i] и _stack[i + 1]
+        self._chain = []          # Ячейки, которые сейчас вычисляются, от внешней к внутренней
+        self._in_progress = set() # Ячейки стека и цепочки (для обнаружения циклов)
+        self._depth = 0           # Глубина рекурсии внутри текущей ячейки стека
+        self._kept = []           # Для каждой ячейки _chain: вклад в счётчики её вычисленных зависимостей
+
+    def get(self, key, default=None):
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        if key not in self.formulas:
+            return default
+        if key in self._in_progress:
+            raise CyclicDependencyError([self._cycle(key)])
+        if not self._chain:
+            return self._pull(key)
+        if self._depth >= PULL_RECURSION_DEPTH:
+            raise _Pending(key, self._chain[1:])  # _pull() вычислит key первым
+        self._depth += 1
+        try:
+            self._evaluate(key)
+        finally:
+            self._depth -= 1
+        return dict.__getitem__(self, key)
+
+    def _pull(self, key: str) -> Any:
+        """Вычисляет key и его зависимости, не углубляясь рекурсией дальше PULL_RECURSION_DEPTH."""
+        stack = self._stack
+        stack.append(key)
+        self._in_progress.add(key)
+        try:
+            while stack:
+                cell = stack[-1]
+                if dict.__contains__(self, cell):
+                    stack.pop()
+                    if self._paths:
+                        self._paths.pop()
+                    self._in_progress.discard(cell)
+                    continue
+                try:
+                    self._evaluate(cell)
+                except _Pending as pending:
+                    stack.append(pending.key)
+                    self._paths.append(pending.path)
+                    self._in_progress.add(pending.key)
+        finally:
+            stack.clear()
+            self._paths.clear()
+            self._chain.clear()
+            self._in_progress.clear()
+            self._kept.clear()
+        return dict.__getitem__(self, key)
+
+    def _cycle(self, key: str) -> list:
+        """Ячейки цикла, замыкающегося на key: ждущие на стеке и вычисляемые сейчас."""
+        chain = self._chain
+        if key in chain:
+            return chain[chain.index(key):]
+        stack = self._stack
+        cycle = []
+        for i in range(stack.index(key), len(stack) - 1):  # Вершина стека — первая ячейка цепочки
+            cycle.append(stack[i])
+            cycle.extend(self._paths[i])
+        return cycle + chain
+
+    def _evaluate(self, cell: str):
+        """
+        Вычисляет формулу cell и запоминает значение. Если попытку прервал _Pending,
+        счётчики collect_stats откатываются, кроме вклада уже вычисленных в ней ячеек.
+        """
+        stats = getattr(_local, 'stats', None)
+        if stats is not None:
+            before = stats.as_dict()
+            self._kept.append(dict.fromkeys(before, 0))
+        nested = bool(self._chain)  # Ячейки стека _pull уже в _in_progress и остаются там
+        self._chain.append(cell)
+        if nested:
+            self._in_progress.add(cell)
+        try:
+            value = self.formulas[cell].eval(self)
+        except _Pending:
+            if stats is not None:
+                kept = self._kept.pop()
+                stats.restore({name: before[name] + kept[name] for name in before})
+                if self._kept:
+                    _add_counters(self._kept[-1], kept)
+            raise
+        finally:
+            self._chain.pop()
+            if nested:
+                self._in_progress.discard(cell)
+        self[cell] = value
+        if stats is not None:
+            stats.pulled_cells += 1
+            self._kept.pop()
+            if self._kept:
+                after = stats.as_dict()
+                _add_counters(self._kept[-1], {name: after[name] - before[name] for name in before})
+
+    def __getitem__(self, key):
+        if not dict.__contains__(self, key) and key in self.formulas:
+            return self.get(key)
+        return dict.__getitem__(self, key)
+
+    def pending_count(self) -> int:
+        """Сколько формульных ячеек так и не понадобилось вычислять."""
+        return sum(1 for key in self.formulas if not dict.__contains__(self, key))
+
+
 # ----------------------------------------------------------------------------
 # Функции-утилиты для работы с AST
 # ----------------------------------------------------------------------------
@@ -1,14 +1,102 @@
 #src/graph.py
 
+from bisect import bisect_left, bisect_right
 from collections import defaultdict, deque
+from src.metrics import instrumented
 from src.parser import extract_cell_references
-from collections import deque
+from src.errors import CyclicDependencyError  # Определено в errors, чтобы его видел и evaluator
+from src.ranges import split_ref, parse_cell, parse_range, letter_to_column, column_to_letter
 
+
+def _sheet_cell_index(all_sheets: dict) -> dict:
+    """
+    Индекс ячеек с данными по листам: {лист: {номер столбца: отсортированные номера строк}}.
+    Нужен, чтобы разворачивать диапазоны только в реально существующие ячейки.
+    """
+    index = {}
+    for sheet, content in all_sheets.items():
+        columns = defaultdict(list)
+        for addr in content['data'].keys():
+            try:
+                row, col = parse_cell(addr)
+            except ValueError:
+                continue
+            columns[col].append(row)
+        for rows in columns.values():
+            rows.sort()
+        index[sheet] = columns
+    return index
+
+
+def _reference_bounds(addr: str) -> tuple:
+    """
+    Границы диапазона 'A1:B3' (а также 'A:A' и '1:3') в виде (top, left, bottom, right).
+    Для столбцов и строк недостающая граница — бесконечность.
+    """
+    first, last = addr.upper().replace('$', '').split(':', 1)
+    if first.isalpha() and last.isalpha():       # Диапазон столбцов A:C
+        left, right = sorted((letter_to_column(first), letter_to_column(last)))
+        return 1, left, float('inf'), right
+    if first.isdigit() and last.isdigit():       # Диапазон строк 1:3
+        top, bottom = sorted((int(first), int(last)))
+        return top, 1, bottom, float('inf')
+    return parse_range(f"{first}:{last}")
+
+
+def _cells_in_bounds(sheet: str, bounds: tuple, cell_index: dict) -> list:
+    """Ячейки с данными листа sheet, попадающие в границы bounds."""
+    top, left, bottom, right = bounds
+    cells = []
+    for col, rows in cell_index.get(sheet, {}).items():
+        if left <= col <= right:
+            letter = column_to_letter(col)
+            lo, hi = bisect_left(rows, top), bisect_right(rows, bottom)
+            cells.extend(f"{sheet}!{letter}{row}" for row in rows[lo:hi])
+    return cells
+
+
+def _expand_reference(dep_node: str, cell_index: dict) -> list:
+    """
+    Разворачивает ссылку 'Лист!A1:B3' (а также 'Лист!A:A' и 'Лист!1:3')
+    в список ячеек с данными внутри диапазона. Одиночная ячейка возвращается как есть.
+    """
+    sheet, addr = split_ref(dep_node)
+    addr = addr.upper()
+    if ':' not in addr:
+        return [f"{sheet}!{addr}"]
+    return _cells_in_bounds(sheet, _reference_bounds(addr), cell_index)
+
+
+def iter_formula_dependencies(all_sheets: dict):
+    """
+    Для каждой формулы книги выдаёт пару (ячейка 'Sheet!A1', список её зависимостей).
+    Диапазоны развёрнуты в ячейки с данными, повторы убраны.
+    Общий источник рёбер для build_dependency_graph и CSRGraph.
+    """
+    cell_index = _sheet_cell_index(all_sheets)
+    for sheet, content in all_sheets.items():
+        for addr, formula in content['formulas'].items():
+            node = f"{sheet}!{addr}"
+            deps = extract_cell_references(formula, all_sheets)  # Извлекаем зависимости для данной формулы
+            expanded = {}  # Упорядоченное множество: одна ячейка — одно ребро
+            for dep in deps:
+                if '!' in dep:
+                    dep_node = dep  # Межлистовая зависимость
+                else:
+                    dep_node = f"{sheet}!{dep}"  # Локальная зависимость в текущем листе
+                for cell in _expand_reference(dep_node, cell_index):
+                    expanded[cell] = None
+            yield node, list(expanded)
+
+
+@instrumented('graph', items=lambda result, *args: len(result[0]))
 def build_dependency_graph(all_sheets: dict):
     """
     Строит граф зависимостей между ячейками:
     - вершины: 'Sheet!A1'
     - ребро из X в Y, если Y зависит от X.
+    Диапазоны в формулах разворачиваются в ячейки с данными внутри них,
+    а ссылки на пустые ячейки добавляются как вершины без зависимостей.
     Возвращает graph и словарь in_degree (входные степени).
     """
     graph = defaultdict(list)  # Словарь, где для каждой ячейки мы храним список её зависимостей
@@ -24,20 +112,19 @@ def build_dependency_graph(all_sheets: dict):
 
     # Шаг 2: Обработка формул и добавление зависимостей
     # Для каждой формулы находим ячейки, от которых она зависит
-    for sheet, content in all_sheets.items():
-        for addr, formula in content['formulas'].items():
-            node = f"{sheet}!{addr}"
-            deps = extract_cell_references(formula, all_sheets)  # Извлекаем зависимости для данной формулы
-            for dep in deps:
-                if '!' in dep:
-                    dep_node = dep  # Межлистовая зависимость
-                else:
-                    dep_node = f"{sheet}!{dep}"  # Локальная зависимость в текущем листе
-                graph[node].append(dep_node)  # Добавляем зависимость dep_node -> node
-                in_degree[node] += 1  # Увеличиваем входную степень для node
+    for node, deps in iter_formula_dependencies(all_sheets):
+        for dep_node in deps:
+            graph[node].append(dep_node)  # Добавляем зависимость dep_node -> node
+            in_degree[node] += 1  # Увеличиваем входную степень для node
 
     # Шаг 3: Обработка ячеек, которые не имеют зависимостей
-    # Если ячейка не имеет зависимостей, то её входная степень остаётся равной 0
+    # Если ячейка не имеет зависимостей, то её входная степень остаётся равной 0.
+    # Сюда же попадают пустые ячейки, на которые ссылаются формулы.
+    for node in list(graph.keys()):
+        for dep_node in graph[node]:
+            if dep_node not in in_degree:
+                graph[dep_node]
+                in_degree[dep_node] = 0
     for sheet, content in all_sheets.items():
         for addr in content['data'].keys():
             node = f"{sheet}!{addr}"
@@ -47,60 +134,400 @@ def build_dependency_graph(all_sheets: dict):
     return graph, in_degree
 
 
+def strongly_connected_components(graph: dict) -> list:
+    """
+    Разбивает граф на компоненты сильной связности (итеративный алгоритм Тарьяна,
+    без рекурсии, поэтому длинные цепочки не упираются в лимит рекурсии).
+    Компоненты возвращаются в порядке вычисления: каждая компонента идёт
+    после всех компонент, от которых она зависит.
+    Компонента из нескольких вершин (или вершина с петлёй) — это циклическая ссылка.
+    """
+    index = {}        # Порядковый номер посещения вершины
+    low = {}          # Минимальный номер, достижимый из поддерева вершины
+    on_stack = set()  # Вершины, находящиеся в стеке Тарьяна
+    stack = []        # Стек Тарьяна
+    components = []   # Результат
+    counter = 0
+
+    for root in list(graph):
+        if root in index:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph.get(root, ())))]  # Явный стек обхода вместо рекурсии
+
+        while work:
+            node, deps = work[-1]
+            descended = False
+            for dep in deps:
+                if dep not in index:
+                    # Спускаемся в ещё не посещённую вершину
+                    index[dep] = low[dep] = counter
+                    counter += 1
+                    stack.append(dep)
+                    on_stack.add(dep)
+                    work.append((dep, iter(graph.get(dep, ()))))
+                    descended = True
+                    break
+                if dep in on_stack:
+                    low[node] = min(low[node], index[dep])
+            if descended:
+                continue
+
+            # Все зависимости вершины обработаны — возвращаемся к родителю
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                # node — корень компоненты: снимаем её со стека
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+
+    return components
+
+
+def is_cyclic_component(component: list, graph: dict) -> bool:
+    """Компонента циклическая, если в ней больше одной вершины или вершина ссылается сама на себя."""
+    return len(component) > 1 or component[0] in graph.get(component[0], ())
+
+
+def find_cycles(graph: dict) -> list:
+    """
+    Находит все циклические ссылки в графе за один линейный проход (через
+    strongly_connected_components). Возвращает список циклов, каждый цикл —
+    отсортированный список ячеек, входящих в него.
+    """
+    return [sorted(component) for component in strongly_connected_components(graph)
+            if is_cyclic_component(component, graph)]
 
 
 def has_cycle(graph: dict) -> bool:
     """
-    Проверяет граф на наличие цикла (DFS).
+    Проверяет граф на наличие цикла.
     Возвращает True, если цикл найден.
     """
-    visited = {node: 0 for node in graph}  # 0=не посещено, 1=в процессе, 2=завершено
-
-    def dfs(u):
-        if visited[u] == 1:
-            return True  # Цикл найден, так как мы встретили вершину, которую уже обрабатываем
-        if visited[u] == 2:
-            return False  # Вершина уже обработана, цикла нет
-        visited[u] = 1  # Отметим вершину как "в процессе обработки"
-        for v in graph[u]:
-            if dfs(v):
-                return True  # Если цикл найден, возвращаем True
-        visited[u] = 2  # Завершаем обработку вершины
-        return False
+    return bool(find_cycles(graph))
 
-    # Применяем DFS ко всем вершинам, чтобы проверить наличие цикла
-    return any(dfs(node) for node in graph if visited[node] == 0)
 
+def build_reverse_graph(graph: dict) -> dict:
+    """
+    Строит обратный индекс смежности: {ячейка: список ячеек, которые от неё зависят}.
+    graph хранит для каждой ячейки её зависимости (предшественников),
+    а обратный индекс позволяет за O(1) найти последователей — это нужно
+    сортировке Кана и пересчёту зависимых ячеек.
+    Повторяющееся ребро попадает в индекс столько же раз, сколько учтено в in_degree.
+    """
+    dependents = {node: [] for node in graph}
+    for node, dependencies in graph.items():
+        for dep in dependencies:
+            if dep in dependents:
+                dependents[dep].append(node)
+            else:
+                dependents[dep] = [node]  # Зависимость, которой нет среди ключей graph
+    return dependents
 
 
-def topological_sort_kahn(graph: dict, in_degree: dict) -> list:
+@instrumented('sort', items=lambda order, *args, **kwargs: len(order))
+def topological_sort_kahn(graph: dict, in_degree: dict, dependents: dict = None) -> list:
     """
-    Топологическая сортировка по алгоритму Кана.
+    Топологическая сортировка по алгоритму Кана за O(V+E).
     Возвращает упорядоченный список вершин.
-    В начале проверяется, есть ли цикл в графе.
-    Если цикл найден, выбрасывается исключение.
+    dependents — обратный индекс (см. build_reverse_graph); если не передан, строится здесь.
+    Входной словарь in_degree не изменяется.
+    Если в графе есть цикл, часть вершин так и не получит нулевую степень —
+    в этом случае выбрасывается CyclicDependencyError со списком циклов.
     """
-    # Проверяем наличие цикла перед началом сортировки
-    if has_cycle(graph):
-        raise ValueError("Граф содержит цикл — топологическая сортировка невозможна")
+    if dependents is None:
+        dependents = build_reverse_graph(graph)
+    remaining = dict(in_degree) # Рабочая копия входных степеней
 
     # Основной алгоритм Кана для топологической сортировки
-    queue = deque([n for n, deg in in_degree.items() if deg == 0]) # Инициализируем очередь с вершинами с нулевой степенью
+    queue = deque([n for n, deg in remaining.items() if deg == 0]) # Инициализируем очередь с вершинами с нулевой степенью
     topo = [] # Список для хранения топологически отсортированных вершин
 
     while queue:
         u = queue.popleft() # Извлекаем вершину из очереди
         topo.append(u) # Добавляем вершину в результат
-        
-        result = []  # Список для хранения ячеек, которые зависят от u
-        for key, dependencies in graph.items():
-            if u in dependencies:  # Если u есть в списке зависимостей для этой ячейки
-                result.append(key)  # Добавляем текущий ключ (ячейку) в результат
-
-        for v in result:
-            in_degree[v] -= 1 # Уменьшаем входную степень для вершины v
-            if in_degree[v] == 0: # Если входная степень стала 0, добавляем её в очередь
+        for v in dependents.get(u, ()): # Только ячейки, которые действительно зависят от u
+            remaining[v] -= 1 # Уменьшаем входную степень для вершины v
+            if remaining[v] == 0: # Если входная степень стала 0, добавляем её в очередь
                 queue.append(v)
 
+    if len(topo) < len(remaining):
+        # Ищем циклы только среди неотсортированных вершин: всё остальное заведомо ациклично
+        left = {node: graph.get(node, ()) for node, deg in remaining.items() if deg > 0}
+        raise CyclicDependencyError(find_cycles(left))
     return topo
 
+
+class DependencyGraph:
+    """
+    Изменяемый граф зависимостей книги: формулы можно добавлять, заменять и удалять
+    по одной, не перестраивая граф целиком.
+    - graph: {ячейка: {зависимость: None}} — предшественники (упорядоченное множество)
+    - dependents: {ячейка: {зависящая ячейка: None}} — обратный индекс
+    - in_degree: {ячейка: число зависимостей}
+    Порядок вычисления поддерживается динамическим алгоритмом Пирса-Келли:
+    при добавлении ребра переставляются только вершины между концами ребра,
+    нарушившими порядок, поэтому правка одной формулы стоит микросекунды.
+    Правка, создающая цикл, отменяется целиком и выбрасывает CyclicDependencyError.
+    """
+
+    def __init__(self):
+        self.graph = {}
+        self.dependents = {}
+        self.in_degree = {}
+        self.formulas = {}      # Ячейка -> текст формулы
+        self._direct = {}       # Ячейка с формулой -> одиночные ячейки, на которые она ссылается
+        self._ranges = defaultdict(dict)  # Лист -> {ячейка с формулой: [границы диапазонов]}
+        self._cells = set()     # Ячейки с данными (константы и формулы)
+        self._cell_index = {}   # Лист -> {столбец: отсортированные номера строк}, как в _sheet_cell_index
+        self._ord = {}          # Ячейка -> позиция в порядке вычисления
+        self._order = []        # Позиция -> ячейка (None — «дырка» после удаления)
+
+    @classmethod
+    def from_workbook(cls, all_sheets: dict):
+        """
+        Строит граф книги (те же вершины и рёбра, что у build_dependency_graph)
+        и начальный порядок вычисления.
+        """
+        self = cls()
+        for sheet, content in all_sheets.items():
+            for addr in content['data']:
+                self._add_cell(f"{sheet}!{addr}")
+        for sheet, content in all_sheets.items():
+            for addr, formula in content['formulas'].items():
+                cell = f"{sheet}!{addr}"
+                direct, ranges = self._parse(cell, formula)
+                self._remember(cell, formula, direct, ranges)
+                for dep in self._expand(direct, ranges):
+                    self._link(dep, cell)
+        order = topological_sort_kahn(self.graph, self.in_degree, self.dependents)
+        self._order = order
+        self._ord = {node: i for i, node in enumerate(order)}
+        return self
+
+    # --- Публичный интерфейс ---
+
+    def add_formula(self, cell: str, formula: str):
+        """Добавляет формулу в ячейку 'Лист!A1', где формулы ещё нет."""
+        if cell in self.formulas:
+            raise ValueError(f"В ячейке {cell} уже есть формула")
+        self._set_formula(cell, formula)
+
+    def replace_formula(self, cell: str, formula: str):
+        """Заменяет существующую формулу ячейки."""
+        if cell not in self.formulas:
+            raise KeyError(f"В ячейке {cell} нет формулы")
+        self._set_formula(cell, formula)
+
+    def remove_formula(self, cell: str):
+        """Удаляет формулу: ячейка становится пустой."""
+        if cell not in self.formulas:
+            raise KeyError(f"В ячейке {cell} нет формулы")
+        for dep in list(self.graph[cell]):
+            self._unlink(dep, cell)
+            self._drop_if_orphan(dep)
+        self._forget(cell)
+        self._remove_cell(cell)
+
+    def topological_order(self) -> list:
+        """Текущий порядок вычисления: каждая ячейка после своих зависимостей."""
+        if len(self._order) > 2 * len(self._ord):
+            self._compact()
+        return [node for node in self._order if node is not None]
+
+    # --- Разбор ссылок ---
+
+    def _parse(self, cell: str, formula: str):
+        """Одиночные ссылки и границы диапазонов формулы (с полными адресами)."""
+        sheet = cell.split('!', 1)[0]
+        direct, ranges = [], []
+        for dep in extract_cell_references(formula, self._cell_index):
+            ref_sheet, addr = split_ref(dep if '!' in dep else f"{sheet}!{dep}")
+            addr = addr.upper()
+            if ':' in addr:
+                ranges.append((ref_sheet, _reference_bounds(addr)))
+            else:
+                direct.append(f"{ref_sheet}!{addr}")
+        return direct, ranges
+
+    def _expand(self, direct: list, ranges: list) -> dict:
+        """Упорядоченное множество зависимостей: одиночные ячейки и ячейки с данными из диапазонов."""
+        deps = dict.fromkeys(direct)
+        for sheet, bounds in ranges:
+            deps.update(dict.fromkeys(_cells_in_bounds(sheet, bounds, self._cell_index)))
+        return deps
+
+    def _remember(self, cell: str, formula: str, direct: list, ranges: list):
+        self.formulas[cell] = formula
+        self._direct[cell] = set(direct)
+        for sheet in {s for s, _ in ranges}:
+            self._ranges[sheet][cell] = [b for s, b in ranges if s == sheet]
+
+    def _forget(self, cell: str):
+        del self.formulas[cell]
+        del self._direct[cell]
+        for sheet_ranges in self._ranges.values():
+            sheet_ranges.pop(cell, None)
+
+    def _ranges_containing(self, cell: str) -> list:
+        """Формулы, в диапазоны которых попадает ячейка."""
+        sheet, addr = cell.split('!', 1)
+        row, col = parse_cell(addr)
+        return [
+            formula_cell
+            for formula_cell, bounds in self._ranges.get(sheet, {}).items()
+            if any(top <= row <= bottom and left <= col <= right for top, left, bottom, right in bounds)
+        ]
+
+    # --- Вершины и рёбра ---
+
+    def _ensure_node(self, node: str):
+        if node not in self.graph:
+            self.graph[node] = {}
+            self.dependents[node] = {}
+            self.in_degree[node] = 0
+            self._ord[node] = len(self._order) # Новая вершина без рёбер — в конец порядка
+            self._order.append(node)
+
+    def _drop_node(self, node: str):
+        del self.graph[node]
+        del self.dependents[node]
+        del self.in_degree[node]
+        self._order[self._ord.pop(node)] = None
+
+    def _drop_if_orphan(self, node: str):
+        """Удаляет пустую ячейку, на которую больше никто не ссылается."""
+        if node in self.graph and node not in self._cells and not self.graph[node] and not self.dependents[node]:
+            self._drop_node(node)
+
+    def _add_cell(self, cell: str):
+        """Регистрирует ячейку с данными (для разворачивания диапазонов)."""
+        self._ensure_node(cell)
+        self._cells.add(cell)
+        sheet, addr = cell.split('!', 1)
+        try:
+            row, col = parse_cell(addr)
+        except ValueError:
+            return
+        columns = self._cell_index.setdefault(sheet, defaultdict(list))
+        rows = columns[col]
+        rows.insert(bisect_left(rows, row), row)
+
+    def _remove_cell(self, cell: str):
+        """Ячейка больше не содержит данных: она выпадает из диапазонов, но остаётся для прямых ссылок."""
+        self._cells.discard(cell)
+        sheet, addr = cell.split('!', 1)
+        row, col = parse_cell(addr)
+        rows = self._cell_index[sheet][col]
+        del rows[bisect_left(rows, row)]
+        for node in list(self.dependents[cell]):
+            if cell not in self._direct[node]:
+                self._unlink(cell, node)
+        self._drop_if_orphan(cell)
+
+    def _link(self, dep: str, node: str):
+        """Ребро dep -> node: node зависит от dep."""
+        self._ensure_node(dep)
+        self._ensure_node(node)
+        self.graph[node][dep] = None
+        self.dependents[dep][node] = None
+        self.in_degree[node] += 1
+
+    def _unlink(self, dep: str, node: str):
+        del self.graph[node][dep]
+        del self.dependents[dep][node]
+        self.in_degree[node] -= 1
+
+    # --- Правка формулы ---
+
+    def _set_formula(self, cell: str, formula: str):
+        direct, ranges = self._parse(cell, formula)
+        is_new_cell = cell not in self._cells
+        if is_new_cell:
+            self._add_cell(cell)
+        new_deps = self._expand(direct, ranges)
+        removed = [dep for dep in self.graph[cell] if dep not in new_deps]
+        added = [(dep, cell) for dep in new_deps if dep not in self.graph[cell]]
+        if is_new_cell:
+            # Новая ячейка попадает в уже существующие диапазоны других формул
+            added += [(cell, node) for node in self._ranges_containing(cell)]
+
+        for dep in removed:
+            self._unlink(dep, cell) # Удаление рёбер порядок не нарушает
+        linked = []
+        try:
+            for dep, node in added:
+                self._link(dep, node)
+                linked.append((dep, node))
+                self._restore_order(dep, node)
+        except CyclicDependencyError:
+            # Откат: без новых рёбер и со старыми граф снова такой же, как до правки
+            for dep, node in linked:
+                self._unlink(dep, node)
+                self._drop_if_orphan(dep)
+            for dep in removed:
+                self._link(dep, cell)
+                self._restore_order(dep, cell)
+            if is_new_cell:
+                self._remove_cell(cell)
+            raise
+
+        if cell in self.formulas:
+            self._forget(cell)
+        self._remember(cell, formula, direct, ranges)
+        for dep in removed:
+            self._drop_if_orphan(dep)
+
+    def _restore_order(self, x: str, y: str):
+        """
+        Восстанавливает порядок после добавления ребра x -> y (алгоритм Пирса-Келли).
+        Если y уже после x, ничего делать не нужно. Иначе ищутся вершины между ними:
+        зависящие от y (вперёд) и те, от которых зависит x (назад); первые сдвигаются
+        после вторых на тех же позициях. Если из y достижима x — это цикл.
+        """
+        lower, upper = self._ord[y], self._ord[x]
+        if lower > upper:
+            return
+        ord_ = self._ord
+
+        forward, stack = {y: None}, [y]
+        while stack:
+            u = stack.pop()
+            for v in self.dependents[u]:
+                if v == x:
+                    region = set(forward) | {x}
+                    sub = {n: [d for d in self.graph[n] if d in region] for n in region}
+                    raise CyclicDependencyError(find_cycles(sub))
+                if v not in forward and ord_[v] <= upper:
+                    forward[v] = None
+                    stack.append(v)
+
+        backward, stack = {x: None}, [x]
+        while stack:
+            u = stack.pop()
+            for v in self.graph[u]:
+                if v not in backward and ord_[v] >= lower:
+                    backward[v] = None
+                    stack.append(v)
+
+        moved = sorted(backward, key=ord_.get) + sorted(forward, key=ord_.get)
+        positions = sorted(ord_[node] for node in moved)
+        for node, position in zip(moved, positions):
+            ord_[node] = position
+            self._order[position] = node
+
+    def _compact(self):
+        """Убирает «дырки» от удалённых вершин из массива порядка."""
+        self._order = [node for node in self._order if node is not None]
+        self._ord = {node: i for i, node in enumerate(self._order)}
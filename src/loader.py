@@ -5,9 +5,10 @@
 - read_excel_file(file_path) -> dict: сырые данные по листам (значения и формулы)
 - split_into_constants_and_formulas(raw_sheets) -> all_sheets: структура с data/constants/formulas/calculated
 """
-import pandas as pd # Импортируем библиотеку pandas для работы с таблицами
 import xlwings as xw # Импортируем xlwings для работы с Excel
 from collections import defaultdict # Импортируем defaultdict для удобной работы с недостающими ключами в словарях
+from src.ranges import column_to_letter # Перевод номера столбца в букву (общий для всех модулей)
+from src.metrics import instrumented # Замер этапов (см. src/metrics.py)
 
 
 def handle_series(value):
@@ -18,16 +19,7 @@ def handle_series(value):
     return value # Если не Series, возвращаем сам объект
 
 
-def column_to_letter(col_idx):
-    """Преобразует числовой индекс (1-based) в букву столбца Excel"""
-    letter = "" # Инициализация пустой строки для хранения буквы
-    while col_idx > 0:
-        col_idx -= 1 # Уменьшаем индекс на 1, чтобы привести к 0-based
-        letter = chr(col_idx % 26 + 65) + letter # Получаем букву столбца
-        col_idx //= 26 # Уменьшаем индекс на количество букв в алфавите
-    return letter # Возвращаем букву столбца
-
-
+@instrumented('read', items=lambda raw, *args: len(raw))  # Элементы — листы
 def read_excel_file(file_path: str) -> dict:
     """
     Читает Excel-файл:
@@ -50,6 +42,7 @@ def read_excel_file(file_path: str) -> dict:
     return raw_sheets # Возвращаем все данные о листах
 
 
+@instrumented('split', items=lambda sheets, *args: sum(len(c['data']) for c in sheets.values()))  # Элементы — ячейки
 def split_into_constants_and_formulas(raw_sheets: dict) -> dict:
     """
     Преобразует сырые данные из read_excel_file в структуру all_sheets:
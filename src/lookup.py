@@ -0,0 +1,334 @@
+# src/lookup.py
+
+"""
+Модуль lookup:
+- vlookup / hlookup / xlookup / index / match — Excel-функции поиска для excel_funcs
+- VectorIndex: индекс по строке или столбцу диапазона
+    * точное совпадение — хэш-таблица {ключ: позиция}
+    * приближённое совпадение — бинарный поиск по отсортированному массиву ключей
+Если значение не найдено, функции возвращают ошибку NA (#N/A), а не бросают исключение.
+Индексы кэшируются в context.range_cache (см. src.ranges.CalcContext) по ключу
+диапазона и сбрасываются только при изменении ячейки внутри этого диапазона.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from src.ranges import RangeRef
+from src.errors import NA, REF
+
+
+# ----------------------------------------------------------------------------
+# Нормализация значений для сравнения
+# ----------------------------------------------------------------------------
+
+def lookup_key(value):
+    """
+    Приводит значение ячейки к ключу сравнения по правилам Excel:
+    числа < текст < логические значения, текст сравнивается без учёта регистра.
+    Пустые ячейки (None) не индексируются — возвращается None.
+    """
+    if isinstance(value, bool):
+        return (2, value)
+    if isinstance(value, (int, float)):
+        return (0, float(value))
+    if isinstance(value, str):
+        return (1, value.lower())
+    return None
+
+
+def has_wildcards(value) -> bool:
+    """Проверяет, содержит ли строка подстановочные знаки Excel (* или ?)."""
+    return isinstance(value, str) and ('*' in value or '?' in value)
+
+
+def wildcard_regex(pattern: str):
+    """
+    Компилирует шаблон Excel с подстановочными знаками в регулярное выражение:
+    '*' — любая последовательность, '?' — один символ, '~' экранирует следующий символ.
+    """
+    parts = []
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == '~' and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1])) # Экранированный символ берём буквально
+            i += 2
+            continue
+        if ch == '*':
+            parts.append('.*')
+        elif ch == '?':
+            parts.append('.')
+        else:
+            parts.append(re.escape(ch))
+        i += 1
+    return re.compile(''.join(parts) + r'\Z', re.IGNORECASE | re.DOTALL)
+
+
+# ----------------------------------------------------------------------------
+# Индекс по вектору (одна строка или один столбец)
+# ----------------------------------------------------------------------------
+
+class VectorIndex:
+    """
+    Индекс по вектору значений:
+    - first/last: хэш-таблицы ключ -> первая/последняя позиция (0-based)
+    - sorted_keys: отсортированные уникальные ключи, строятся лениво
+      при первом приближённом поиске
+    """
+    __slots__ = ('first', 'last', 'size', '_sorted')
+
+    def __init__(self, values: list):
+        first = {}
+        last = {}
+        for pos, value in enumerate(values):
+            key = lookup_key(value)
+            if key is None:
+                continue # Пустые ячейки не участвуют в поиске
+            if key not in first:
+                first[key] = pos
+            last[key] = pos
+        self.first = first
+        self.last = last
+        self.size = len(values)
+        self._sorted = None
+
+    @property
+    def sorted_keys(self) -> list:
+        if self._sorted is None:
+            self._sorted = sorted(self.first)
+        return self._sorted
+
+    def exact(self, value, from_end: bool = False):
+        """Позиция точного совпадения или None."""
+        key = lookup_key(value)
+        if key is None:
+            return None
+        return (self.last if from_end else self.first).get(key)
+
+    def floor(self, value):
+        """
+        Ключ наибольшего значения <= value (того же типа) или None.
+        Аналог приближённого поиска VLOOKUP/MATCH(…, 1) по отсортированным данным.
+        """
+        key = lookup_key(value)
+        if key is None:
+            return None
+        keys = self.sorted_keys
+        i = bisect_right(keys, key) - 1
+        if i < 0 or keys[i][0] != key[0]:
+            return None # Нет значения того же типа, не превышающего искомое
+        return keys[i]
+
+    def ceil(self, value):
+        """Ключ наименьшего значения >= value (того же типа) или None."""
+        key = lookup_key(value)
+        if key is None:
+            return None
+        keys = self.sorted_keys
+        i = bisect_left(keys, key)
+        if i >= len(keys) or keys[i][0] != key[0]:
+            return None
+        return keys[i]
+
+
+def _vector_values(vector) -> list:
+    """Значения вектора: RangeRef (строка/столбец) или обычный список."""
+    if isinstance(vector, RangeRef):
+        return vector.values()
+    if vector and isinstance(vector[0], (list, tuple)):
+        return [v for row in vector for v in row] # Список строк превращаем в плоский
+    return list(vector)
+
+
+def get_index(vector) -> VectorIndex:
+    """
+    Возвращает VectorIndex для вектора.
+    Для RangeRef в CalcContext индекс берётся из context.range_cache
+    (или строится и сохраняется туда), для остальных — строится заново.
+    """
+    if isinstance(vector, RangeRef):
+        cache = getattr(vector.context, 'range_cache', None)
+        if cache is not None:
+            key = ('index', vector.key)
+            index = cache.get(key)
+            if index is None:
+                index = cache.put(key, [vector], VectorIndex(vector.values()))
+            return index
+    return VectorIndex(_vector_values(vector))
+
+
+def _wildcard_position(vector, pattern: str, from_end: bool = False):
+    """Линейный поиск по шаблону с подстановочными знаками."""
+    regex = wildcard_regex(pattern)
+    values = _vector_values(vector)
+    positions = range(len(values) - 1, -1, -1) if from_end else range(len(values))
+    for pos in positions:
+        value = values[pos]
+        if isinstance(value, str) and regex.match(value):
+            return pos
+    return None
+
+
+# ----------------------------------------------------------------------------
+# Вспомогательные функции доступа к таблице
+# ----------------------------------------------------------------------------
+
+def _shape(table):
+    """Размер таблицы (строки, столбцы) для RangeRef или списка списков."""
+    if isinstance(table, RangeRef):
+        return table.shape
+    if table and isinstance(table[0], (list, tuple)):
+        return len(table), len(table[0])
+    return len(table), 1 # Плоский список считаем столбцом
+
+
+def _cell(table, i: int, j: int):
+    """Значение ячейки (i, j) таблицы, индексы 0-based."""
+    if isinstance(table, RangeRef):
+        return table.value(i, j)
+    if table and isinstance(table[0], (list, tuple)):
+        return table[i][j]
+    return table[i]
+
+
+def _column(table, j: int):
+    if isinstance(table, RangeRef):
+        return table.column_ref(j)
+    if table and isinstance(table[0], (list, tuple)):
+        return [row[j] for row in table]
+    return table
+
+
+def _row(table, i: int):
+    if isinstance(table, RangeRef):
+        return table.row_ref(i)
+    if table and isinstance(table[0], (list, tuple)):
+        return list(table[i])
+    return [table[i]]
+
+
+def _result(value):
+    """Пустая ячейка в результате поиска отображается в Excel как 0."""
+    return 0 if value is None else value
+
+
+def _approximate(value) -> bool:
+    """Аргумент range_lookup: по умолчанию TRUE, пустой или 0 — FALSE."""
+    return bool(value)
+
+
+# ----------------------------------------------------------------------------
+# Excel-функции
+# ----------------------------------------------------------------------------
+
+def _find(vector, value, approximate: bool):
+    """Общий поиск позиции для VLOOKUP/HLOOKUP; None, если значение не найдено."""
+    if approximate:
+        idx = get_index(vector)
+        key = idx.floor(value)
+        if key is None:
+            return None
+        return idx.last[key] # В отсортированных данных бинарный поиск попадает на последний дубль
+    if has_wildcards(value):
+        return _wildcard_position(vector, value)
+    return get_index(vector).exact(value)
+
+
+def vlookup(lookup_value, table, col_index, range_lookup=True):
+    """VLOOKUP: ищет значение в первом столбце таблицы и возвращает значение из столбца col_index."""
+    col = int(col_index) - 1
+    rows, cols = _shape(table)
+    if col < 0 or col >= cols:
+        return REF # Номер столбца вне таблицы
+    pos = _find(_column(table, 0), lookup_value, _approximate(range_lookup))
+    if pos is None:
+        return NA
+    return _result(_cell(table, pos, col))
+
+
+def hlookup(lookup_value, table, row_index, range_lookup=True):
+    """HLOOKUP: ищет значение в первой строке таблицы и возвращает значение из строки row_index."""
+    row = int(row_index) - 1
+    rows, cols = _shape(table)
+    if row < 0 or row >= rows:
+        return REF # Номер строки вне таблицы
+    pos = _find(_row(table, 0), lookup_value, _approximate(range_lookup))
+    if pos is None:
+        return NA
+    return _result(_cell(table, row, pos))
+
+
+def match(lookup_value, lookup_array, match_type=1):
+    """
+    MATCH: позиция (1-based) значения в векторе.
+    match_type: 1 — наибольшее <= значения, 0 — точное, -1 — наименьшее >= значения.
+    """
+    match_type = 1 if match_type is None else int(match_type)
+    if match_type == 0:
+        if has_wildcards(lookup_value):
+            pos = _wildcard_position(lookup_array, lookup_value)
+        else:
+            pos = get_index(lookup_array).exact(lookup_value)
+    else:
+        idx = get_index(lookup_array)
+        key = idx.floor(lookup_value) if match_type > 0 else idx.ceil(lookup_value)
+        pos = None if key is None else idx.last[key]
+    if pos is None:
+        return NA
+    return pos + 1
+
+
+def xlookup(lookup_value, lookup_array, return_array, if_not_found=None,
+            match_mode=0, search_mode=1):
+    """
+    XLOOKUP: ищет значение в lookup_array и возвращает соответствующий элемент return_array.
+    match_mode: 0 — точное, -1 — точное или следующее меньшее,
+                1 — точное или следующее большее, 2 — подстановочные знаки.
+    search_mode: 1 — с начала, -1 — с конца; 2/-2 (бинарный поиск) сводятся к 1/-1,
+                 так как индекс и так отсортирован.
+    """
+    match_mode = 0 if match_mode is None else int(match_mode)
+    from_end = search_mode is not None and int(search_mode) < 0
+    if match_mode == 2:
+        pos = _wildcard_position(lookup_array, str(lookup_value), from_end)
+    else:
+        idx = get_index(lookup_array)
+        pos = idx.exact(lookup_value, from_end)
+        if pos is None and match_mode in (-1, 1):
+            key = idx.floor(lookup_value) if match_mode == -1 else idx.ceil(lookup_value)
+            if key is not None:
+                pos = (idx.last if from_end else idx.first)[key]
+    if pos is None:
+        if if_not_found is not None:
+            return if_not_found
+        return NA
+
+    rows, cols = _shape(return_array)
+    lookup_rows, _ = _shape(lookup_array)
+    if rows == 1 and cols > 1 and lookup_rows == 1:
+        return _result(_cell(return_array, 0, pos))   # Горизонтальный поиск
+    if cols == 1:
+        return _result(_cell(return_array, pos, 0))   # Вертикальный поиск
+    return _row(return_array, pos)                    # Возвращаем целую строку таблицы
+
+
+def index(array, row_num, col_num=None):
+    """
+    INDEX: значение на пересечении строки row_num и столбца col_num (1-based).
+    Для вектора достаточно одного номера. Номер 0 возвращает весь столбец/строку.
+    """
+    rows, cols = _shape(array)
+    row = 0 if row_num is None else int(row_num)
+    col = None if col_num is None else int(col_num)
+    if col is None:
+        if rows == 1:
+            row, col = 1, row   # Горизонтальный вектор: номер относится к столбцу
+        else:
+            col = 1
+    if row < 0 or row > rows or col < 0 or col > cols:
+        return REF # Номер строки или столбца вне диапазона
+    if row == 0:
+        return _column(array, col - 1)
+    if col == 0:
+        return _row(array, row - 1)
+    return _result(_cell(array, row - 1, col - 1))
@@ -0,0 +1,203 @@
+# src/memory.py
+
+"""
+Модуль memory:
+- deep_size(obj, seen=None) -> int: размер объекта со всем, на что он ссылается (байты)
+- model_footprint(all_sheets, formulas=None, graph=None, context=None, extra=None) -> FootprintReport
+    Сколько памяти занимает загруженная модель: по структурам, по листам и по типам узлов AST.
+- FootprintReport
+    * total — всего байт; structures — {структура: байты}
+    * sheets — {лист: {'data', 'constants', 'formulas', 'calculated': байты}}
+    * node_types — {'FunctionNode': {'count', 'bytes'}, ...}
+    * shared — сколько раз встретился уже учтённый объект
+    * as_dict(), format()
+
+Общие объекты учитываются один раз — в той структуре, где встретились первыми
+(структуры обходятся в порядке: листы книги, формулы, граф, контекст, extra).
+Например, строка формулы лежит и в 'data', и в 'formulas' листа, но посчитана будет
+только в 'data'; значения констант, скопированные в контекст, — только в листах.
+Функции, классы и модули не считаются: это код, а не данные модели.
+"""
+
+import sys
+import types
+
+import numpy as np
+
+from src.evaluator import FormulaNode
+
+_SKIP_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+               types.MethodType, types.CodeType)
+_SKIP = set(_SKIP_TYPES)
+_ATOMIC = {str, bytes, int, float, bool, complex, type(None)}  # Не ссылаются на другие объекты
+SHEET_PARTS = ('data', 'constants', 'formulas', 'calculated')
+
+
+_slots = {}  # Класс -> имена всех его __slots__ (с учётом предков)
+
+
+def _slot_names(cls) -> tuple:
+    names = _slots.get(cls)
+    if names is None:
+        names = []
+        for base in cls.__mro__:
+            slots = getattr(base, '__slots__', ())
+            names.extend([slots] if isinstance(slots, str) else slots)
+        names = _slots[cls] = tuple(name for name in names if name not in ('__dict__', '__weakref__'))
+    return names
+
+
+def _references(obj):
+    """Объекты, на которые ссылается obj (без учёта кода)."""
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            yield key
+            yield value
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        yield from obj
+    elif isinstance(obj, np.ndarray):
+        if obj.base is not None:
+            yield obj.base  # Представление: данные принадлежат базовому массиву
+        if obj.dtype == object:
+            yield from obj.ravel().tolist()
+    # Атрибуты экземпляра, в том числе у наследников dict (например, CalcContext.range_cache)
+    if type(obj) not in (dict, list, tuple, set, frozenset):
+        attrs = getattr(obj, '__dict__', None)
+        if attrs is not None:
+            yield attrs
+        for slot in _slot_names(type(obj)):
+            value = getattr(obj, slot, None)
+            if value is not None:
+                yield value
+
+
+class _Walker:
+    """Обход графа объектов с общим множеством уже учтённых объектов."""
+
+    def __init__(self):
+        self.seen = set()
+        self.shared = 0
+        self.node_types = {}
+
+    def size(self, root) -> int:
+        """Размер ещё не учтённых объектов, достижимых из root; узлы AST учитываются по типам."""
+        total = 0
+        seen = self.seen
+        node_types = self.node_types
+        getsizeof = sys.getsizeof
+        stack = [(root, None)]
+        pop, push = stack.pop, stack.append
+        while stack:
+            obj, node_type = pop()
+            key = id(obj)
+            if key in seen:
+                self.shared += 1
+                continue
+            cls = type(obj)
+            if cls in _SKIP or isinstance(obj, _SKIP_TYPES):
+                continue
+            seen.add(key)
+            size = getsizeof(obj)
+            total += size
+            if cls in _ATOMIC:
+                if node_type is not None:
+                    node_types[node_type]['bytes'] += size
+                continue
+            if isinstance(obj, FormulaNode):
+                node_type = cls.__name__
+                stats = node_types.get(node_type)
+                if stats is None:
+                    stats = node_types[node_type] = {'count': 0, 'bytes': 0}
+                stats['count'] += 1
+            if node_type is not None:
+                node_types[node_type]['bytes'] += size
+            if cls is dict:
+                for item in obj.items():
+                    push((item[0], node_type))
+                    push((item[1], node_type))
+            elif cls is list or cls is tuple:
+                for child in obj:
+                    push((child, node_type))
+            else:
+                for child in _references(obj):
+                    push((child, node_type))
+        return total
+
+
+def deep_size(obj, seen: set = None) -> int:
+    """Размер obj со всеми достижимыми объектами; seen — id уже учтённых объектов (дополняется)."""
+    walker = _Walker()
+    if seen is not None:
+        walker.seen = seen
+    return walker.size(obj)
+
+
+class FootprintReport:
+    """Отчёт о памяти модели."""
+
+    def __init__(self, structures: dict, sheets: dict, node_types: dict, shared: int):
+        self.structures = structures
+        self.sheets = sheets
+        self.node_types = node_types
+        self.shared = shared
+
+    @property
+    def total(self) -> int:
+        return sum(self.structures.values())
+
+    def as_dict(self) -> dict:
+        return {'total': self.total, 'structures': dict(self.structures), 'sheets': self.sheets,
+                'node_types': self.node_types, 'shared': self.shared}
+
+    def format(self) -> str:
+        def mb(size):
+            return f"{size / 2 ** 20:10.2f}"
+
+        total = self.total or 1
+        lines = [f"Всего: {self.total / 2 ** 20:.2f} МБ (общих ссылок: {self.shared})", f"{'структура':<24} {'МБ':>10} {'доля':>7}"]
+        for name, size in sorted(self.structures.items(), key=lambda item: -item[1]):
+            lines.append(f"{name:<24} {mb(size)} {size / total:>7.1%}")
+        if self.sheets:
+            lines.append(f"{'лист':<24} " + ' '.join(f"{part:>10}" for part in SHEET_PARTS))
+            for sheet, parts in self.sheets.items():
+                lines.append(f"{sheet:<24} " + ' '.join(mb(parts.get(part, 0)) for part in SHEET_PARTS))
+        if self.node_types:
+            lines.append(f"{'тип узла':<24} {'узлов':>10} {'МБ':>10} {'байт/узел':>10}")
+            for name, stats in sorted(self.node_types.items(), key=lambda item: -item[1]['bytes']):
+                per_node = stats['bytes'] / stats['count'] if stats['count'] else 0
+                lines.append(f"{name:<24} {stats['count']:>10} {mb(stats['bytes'])} {per_node:>10.0f}")
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f"FootprintReport(total={self.total}, structures={list(self.structures)})"
+
+
+def model_footprint(all_sheets: dict, formulas: dict = None, graph=None, context=None,
+                    extra: dict = None) -> FootprintReport:
+    """
+    Считает память модели.
+    - all_sheets: книга (loader); formulas: результат compile_formulas
+    - graph: граф зависимостей в любом виде (пара graph, in_degree, CSRGraph, DependencyGraph)
+    - context: контекст вычисления; extra: прочие структуры {название: объект}
+    """
+    walker = _Walker()
+    structures = {}
+    sheets = {}
+    for sheet, content in all_sheets.items():
+        parts = sheets[sheet] = {}
+        # Сам словарь листа и его служебные ключи
+        overhead = sys.getsizeof(content)
+        walker.seen.add(id(content))
+        for part, value in content.items():
+            size = walker.size(value)
+            parts[part] = size
+            name = f"sheets.{part}" if part in SHEET_PARTS else 'sheets.other'
+            structures[name] = structures.get(name, 0) + size
+        structures['sheets.other'] = structures.get('sheets.other', 0) + overhead
+    structures['sheets.other'] = structures.get('sheets.other', 0) + walker.size(all_sheets)
+    for name, value in (('formulas', formulas), ('graph', graph), ('context', context)):
+        if value is not None:
+            structures[name] = walker.size(value)
+    for name, value in (extra or {}).items():
+        structures[name] = walker.size(value)
+    return FootprintReport(structures, sheets, walker.node_types, walker.shared)
@@ -0,0 +1,215 @@
+# src/metrics.py
+
+"""
+Модуль metrics:
+- collect(memory=False, hooks=()) -> Metrics: контекстный менеджер, включающий сбор метрик
+    with collect() as metrics:
+        all_sheets = split_into_constants_and_formulas(read_excel_file(path))
+        evaluate_workbook(all_sheets)
+    print(metrics.format())
+- instrumented(stage, items=None): декоратор этапа конвейера
+- stage(name): контекстный менеджер для произвольного участка кода
+- add(name, value): добавляет счётчик к текущему этапу (например, попадания в кэш)
+- Metrics: собранные данные
+    * report() -> dict: {этап: {'calls', 'wall', 'self', 'cpu', 'items', 'peak_bytes', 'counters'}}
+    * format() -> str: текстовая таблица (с долей попаданий для пар счётчиков *_hits / *_misses)
+
+Для каждого этапа считаются: число вызовов, время по часам (wall — вместе с вложенными
+этапами, self — без них), процессорное время, число обработанных элементов,
+пиковый прирост памяти (только при memory=True, через tracemalloc) и счётчики.
+hooks — функции hook(stage, data), которые вызываются для каждого этапа при выходе
+из collect: через них метрики можно передать в свою систему мониторинга.
+
+Пока сбор не включён, обёртка этапа — это одна проверка глобальной переменной,
+поэтому инструментирование почти ничего не стоит. Метрики собираются только в текущем
+процессе (работа процессов-исполнителей partition и scenarios не учитывается).
+"""
+
+import functools
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+_active = None  # Текущий Metrics или None, если сбор выключен
+
+
+class _Frame:
+    """Открытый этап: время начала и накопленное время вложенных этапов."""
+    __slots__ = ('name', 'wall', 'cpu', 'children', 'memory', 'peak')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.children = 0.0
+        self.memory = 0
+        self.peak = 0
+
+
+class Metrics:
+    """Собранные метрики этапов (заполняется, пока активен collect)."""
+
+    def __init__(self, memory: bool = False, hooks=()):
+        self.memory = memory
+        self.hooks = list(hooks)
+        self.stages = {}  # этап -> {'calls', 'wall', 'self', 'cpu', 'items', 'peak_bytes', 'counters'}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, name: str) -> dict:
+        record = self.stages.get(name)
+        if record is None:
+            record = self.stages[name] = {'calls': 0, 'wall': 0.0, 'self': 0.0, 'cpu': 0.0,
+                                          'items': 0, 'peak_bytes': 0, 'counters': {}}
+        return record
+
+    def enter(self, name: str) -> _Frame:
+        frame = _Frame(name)
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            stack = self._stack()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            frame.memory = current
+        self._stack().append(frame)
+        frame.cpu = time.process_time()
+        frame.wall = time.perf_counter()
+        return frame
+
+    def exit(self, frame: _Frame, items: int = 0):
+        wall = time.perf_counter() - frame.wall
+        cpu = time.process_time() - frame.cpu
+        stack = self._stack()
+        stack.pop()
+        peak = 0
+        if self.memory:
+            peak = max(frame.peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            peak -= frame.memory
+        if stack:
+            stack[-1].children += wall
+        with self._lock:
+            record = self._record(frame.name)
+            record['calls'] += 1
+            record['wall'] += wall
+            record['self'] += wall - frame.children
+            record['cpu'] += cpu
+            record['items'] += items
+            record['peak_bytes'] = max(record['peak_bytes'], peak)
+
+    def add(self, name: str, value):
+        """Прибавляет value к счётчику name текущего этапа (или этапа «-», если этапа нет)."""
+        stack = self._stack()
+        with self._lock:
+            counters = self._record(stack[-1].name if stack else '-')['counters']
+            counters[name] = counters.get(name, 0) + value
+
+    def report(self) -> dict:
+        with self._lock:
+            return {name: {**record, 'counters': dict(record['counters'])} for name, record in self.stages.items()}
+
+    def emit(self):
+        """Передаёт метрики каждого этапа во все hooks."""
+        for name, data in self.report().items():
+            for hook in self.hooks:
+                hook(name, data)
+
+    def format(self) -> str:
+        lines = [f"{'этап':<12} {'вызовов':>9} {'время, с':>9} {'без влож., с':>12} {'ЦП, с':>8} "
+                 f"{'элементов':>10} {'память, МБ':>10}"]
+        for name, r in self.report().items():
+            memory = f"{r['peak_bytes'] / 2 ** 20:.1f}" if self.memory else '—'
+            lines.append(f"{name:<12} {r['calls']:>9} {r['wall']:>9.3f} {r['self']:>12.3f} {r['cpu']:>8.3f} "
+                         f"{r['items']:>10} {memory:>10}")
+            counters = r['counters']
+            for key in sorted(counters):
+                lines.append(f"{'':<12}   {key} = {counters[key]}")
+                if key.endswith('_misses'):
+                    prefix = key[:-len('_misses')]
+                    hits = counters.get(prefix + '_hits', 0)
+                    total = hits + counters[key]
+                    if total:
+                        lines.append(f"{'':<12}   {prefix}: попаданий {hits / total:.1%}")
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f"Metrics(stages={list(self.stages)})"
+
+
+@contextmanager
+def collect(memory: bool = False, hooks=()):
+    """
+    Включает сбор метрик на время блока with. memory=True включает tracemalloc
+    (замедляет выполнение в несколько раз — только для разовых замеров).
+    При выходе вызываются hooks.
+    """
+    global _active
+    if _active is not None:
+        raise RuntimeError("Сбор метрик уже включён")
+    metrics = Metrics(memory, hooks)
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _active = metrics
+    try:
+        yield metrics
+    finally:
+        _active = None
+        if started_tracing:
+            tracemalloc.stop()
+        metrics.emit()
+
+
+def active():
+    """Текущий Metrics или None."""
+    return _active
+
+
+def add(name: str, value):
+    """Прибавляет значение к счётчику текущего этапа; без включённого сбора ничего не делает."""
+    if _active is not None:
+        _active.add(name, value)
+
+
+@contextmanager
+def stage(name: str):
+    """Участок кода как этап (счётчики — через add)."""
+    metrics = _active
+    if metrics is None:
+        yield
+        return
+    frame = metrics.enter(name)
+    try:
+        yield
+    finally:
+        metrics.exit(frame)
+
+
+def instrumented(name: str, items=None):
+    """
+    Декоратор этапа. items(result, *args, **kwargs) -> int — число обработанных элементов
+    (вызывается только при включённом сборе); без items считается 1 на вызов.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            metrics = _active
+            if metrics is None:
+                return func(*args, **kwargs)
+            frame = metrics.enter(name)
+            count = 0
+            try:
+                result = func(*args, **kwargs)
+                count = items(result, *args, **kwargs) if items is not None else 1
+                return result
+            finally:
+                metrics.exit(frame, count)
+        return wrapper
+    return decorator
@@ -0,0 +1,190 @@
+# src/model.py
+
+"""
+Модуль model:
+- workbook_values(all_sheets) -> dict: значения констант всех листов по адресам 'Лист!A1'
+- prune_workbook(all_sheets, outputs) -> (reduced_sheets, report)
+    Оставляет в книге только выходные ячейки и всё, от чего они зависят.
+- evaluate_components(all_sheets, formulas, context, ...) -> CalcContext
+    Вычисление формул по компонентам сильной связности в готовый контекст.
+- evaluate_workbook(all_sheets, targets=None, iterative=False, ...) -> CalcContext
+    Вычисляет формулы книги.
+    * targets заданы — режим pull: вычисляются только нужные ячейки;
+    * иначе — все формулы по компонентам сильной связности графа зависимостей:
+      ациклические части по порядку, циклические — итерациями до сходимости
+      (аналог «Итеративных вычислений» Excel).
+"""
+
+from src import metrics
+from src.ast_builder import compile_formulas
+from src.csr_graph import CSRGraph
+from src.evaluator import PullContext
+from src.graph import (
+    build_dependency_graph,
+    strongly_connected_components,
+    is_cyclic_component,
+    CyclicDependencyError,
+)
+from src.ranges import CalcContext
+
+# Значения по умолчанию, как в настройках Excel (Файл -> Параметры -> Формулы)
+DEFAULT_MAX_ITERATIONS = 100
+DEFAULT_MAX_CHANGE = 0.001
+
+
+def workbook_values(all_sheets: dict) -> dict:
+    """
+    Собирает константы всех листов в один словарь с полными адресами 'Лист!A1'.
+    """
+    values = {}
+    for sheet, content in all_sheets.items():
+        for addr, value in content['constants'].items():
+            values[f"{sheet}!{addr}"] = value
+    return values
+
+
+def prune_workbook(all_sheets: dict, outputs) -> tuple:
+    """
+    Отсекает «мёртвые» формулы: оставляет только выходные ячейки outputs ('Лист!A1')
+    и их транзитивных предшественников. Возвращает уменьшенную книгу той же структуры
+    (её можно передавать в compile_formulas / evaluate_workbook) и отчёт:
+    сколько формул, констант, рёбер и каких листов было отброшено.
+    """
+    csr = CSRGraph.from_workbook(all_sheets)
+    missing = [cell for cell in outputs if cell not in csr]
+    if missing:
+        raise KeyError(f"Выходные ячейки отсутствуют в книге: {', '.join(missing)}")
+    keep = set(outputs)
+    keep.update(csr.reachable(outputs, direction='precedents'))
+
+    reduced = {}
+    formulas_total = formulas_kept = constants_total = constants_kept = 0
+    for sheet, content in all_sheets.items():
+        formulas_total += len(content['formulas'])
+        constants_total += len(content.get('constants', {}))
+        part = {
+            key: {addr: value for addr, value in cells.items() if f"{sheet}!{addr}" in keep}
+            for key, cells in content.items()
+        }
+        if part['data']:
+            reduced[sheet] = part
+            formulas_kept += len(part['formulas'])
+            constants_kept += len(part.get('constants', {}))
+
+    edges_kept = sum(int(csr.in_degree[csr.ids[cell]]) for cell in keep)
+    report = {
+        'outputs': len(set(outputs)),
+        'formulas_total': formulas_total,
+        'formulas_dropped': formulas_total - formulas_kept,
+        'constants_dropped': constants_total - constants_kept,
+        'edges_total': csr.num_edges,
+        'edges_dropped': csr.num_edges - edges_kept,
+        'sheets_dropped': [sheet for sheet in all_sheets if sheet not in reduced],
+    }
+    return reduced, report
+
+
+def _change(old, new) -> float:
+    """Величина изменения значения между итерациями (для нечисел — 0 или бесконечность)."""
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)) \
+            and not isinstance(old, bool) and not isinstance(new, bool):
+        return abs(new - old)
+    return 0.0 if old == new else float('inf')
+
+
+def _initial_value(node: str, all_sheets: dict):
+    """
+    Начальное значение ячейки цикла: сохранённый Excel результат, если он есть, иначе 0
+    (Excel тоже начинает итерации с последних вычисленных значений).
+    """
+    sheet, addr = node.split('!', 1)
+    calculated = all_sheets.get(sheet, {}).get('calculated', {}).get(addr)
+    return 0 if calculated is None else calculated
+
+
+def _iterate_component(component: list, formulas: dict, context: CalcContext,
+                       all_sheets: dict, max_iterations: int, max_change: float) -> dict:
+    """
+    Итеративно вычисляет циклическую компоненту до тех пор, пока наибольшее
+    изменение значения не станет меньше max_change, но не более max_iterations раз.
+    Возвращает сведения о сходимости.
+    """
+    cells = [node for node in component if node in formulas]
+    for node in cells:
+        context[node] = _initial_value(node, all_sheets)
+
+    iterations = 0
+    delta = float('inf')
+    while iterations < max_iterations:
+        iterations += 1
+        delta = 0.0
+        for node in cells:
+            new = formulas[node].eval(context)
+            delta = max(delta, _change(context.get(node), new))
+            context[node] = new  # Новое значение сразу используется в этой же итерации
+        if delta < max_change:
+            break
+    return {
+        'cells': cells,
+        'iterations': iterations,
+        'max_change': delta,
+        'converged': delta < max_change,
+    }
+
+
+def evaluate_workbook(all_sheets: dict, targets=None, iterative: bool = False,
+                      max_iterations: int = DEFAULT_MAX_ITERATIONS,
+                      max_change: float = DEFAULT_MAX_CHANGE, formulas: dict = None) -> CalcContext:
+    """
+    Вычисляет книгу и возвращает контекст со значениями ячеек.
+    - targets: список адресов 'Лист!A1'; если задан, вычисляются только они
+      и те ячейки, которые действительно понадобились (невыбранные ветви
+      IF/CHOOSE/IFERROR и их предшественники не вычисляются).
+    - iterative: разрешить циклические ссылки и вычислять их итерациями;
+      без этого флага цикл приводит к CyclicDependencyError, как предупреждение Excel.
+    - max_iterations, max_change: предельное число итераций и точность сходимости.
+    - formulas: уже разобранные формулы (compile_formulas, src.cache); без них книга разбирается заново.
+    После полного вычисления в context.iteration_report лежат сведения
+    о каждой циклической компоненте.
+    """
+    if formulas is None:
+        formulas = compile_formulas(all_sheets)
+    if targets is not None:
+        context = PullContext(workbook_values(all_sheets), formulas)
+        with metrics.stage('evaluate'):
+            for key in targets:
+                context.get(key) # Значение вычисляется и запоминается при первом обращении
+            metrics.add('pulled_targets', len(targets))
+        return context
+
+    context = CalcContext(workbook_values(all_sheets))
+    evaluate_components(all_sheets, formulas, context, iterative, max_iterations, max_change)
+    return context
+
+
+@metrics.instrumented('evaluate', items=lambda context, all_sheets, formulas, *args, **kwargs: len(formulas))
+def evaluate_components(all_sheets: dict, formulas: dict, context: CalcContext, iterative: bool = False,
+                        max_iterations: int = DEFAULT_MAX_ITERATIONS,
+                        max_change: float = DEFAULT_MAX_CHANGE) -> CalcContext:
+    """
+    Вычисляет формулы formulas в context по компонентам сильной связности графа книги.
+    Значения ячеек вне all_sheets (например, пришедшие из других частей книги)
+    должны уже лежать в context. Сведения об итерациях — в context.iteration_report.
+    """
+    graph, _ = build_dependency_graph(all_sheets)
+    cache = context.range_cache
+    hits, misses = cache.hits, cache.misses
+    context.iteration_report = []
+    for component in strongly_connected_components(graph):
+        if not is_cyclic_component(component, graph):
+            node = component[0]
+            if node in formulas:
+                context[node] = formulas[node].eval(context)
+            continue
+        if not iterative:
+            raise CyclicDependencyError([sorted(component)])
+        context.iteration_report.append(
+            _iterate_component(component, formulas, context, all_sheets, max_iterations, max_change))
+    metrics.add('range_cache_hits', cache.hits - hits)
+    metrics.add('range_cache_misses', cache.misses - misses)
+    return context
@@ -10,6 +10,8 @@
 
 import re
 
+from src.metrics import instrumented
+
 def process_sheet_names(all_sheets: dict) -> list:
     """
     Экранирует имена листов для регулярного выражения.
@@ -26,6 +28,7 @@ def process_sheet_names(all_sheets: dict) -> list:
             processed.append(sheet) # Иначе, оставляем как есть
     return processed # Возвращаем список обработанных имен листов
 
+@instrumented('references')
 def extract_cell_references(formula: str, all_sheets: dict) -> list:
     """
     Извлекает ссылки на ячейки/диапазоны из формулы:
@@ -48,7 +51,8 @@ def extract_cell_references(formula: str, all_sheets: dict) -> list:
 
     # 2) Префикс листа: либо 'Имя Листа'!, либо bare ИмяЛиста!
     #    Здесь мы не смотрим на all_sheets — это просто синтаксис
-    sheet_prefix = r"(?:'[^']+'|[^!'\s\(\),]+)!" # Соответствует имени листа (с учётом кавычек и специальных символов)
+    #    Имя без кавычек не может содержать операторы, поэтому они не входят в имя листа
+    sheet_prefix = r"(?:'[^']+'|[^!'\s\(\),+\-*/^&=<>;]+)!" # Соответствует имени листа (с учётом кавычек и специальных символов)
 
     # 3) Собираем финальный шаблон, который будет искать все нужные ссылки в формуле
     full_pattern = rf"""
@@ -0,0 +1,185 @@
+# src/partition.py
+
+"""
+Модуль partition:
+- Partition: часть книги (один или несколько листов) с граничными ячейками
+- partition_by_sheet(all_sheets) -> list[Partition]
+    Делит книгу на части по листам. Листы, ссылающиеся друг на друга по кругу,
+    объединяются в одну часть, поэтому части образуют DAG и возвращаются
+    в порядке вычисления.
+- evaluate_partitioned(all_sheets, processes=None, outputs=None, ...) -> dict
+    Вычисляет каждую часть в отдельном процессе. Между процессами передаются
+    только граничные значения: то, что одна часть читает у другой.
+
+Каждому процессу отправляются только листы его части и значения импортируемых ячеек,
+а обратно приходят только экспортируемые ячейки (и запрошенные outputs), а не весь контекст.
+Независимые части (например, листы, зависящие только от «Входа») считаются параллельно.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from src.ast_builder import compile_formulas, _SheetExtents
+from src.graph import iter_formula_dependencies, strongly_connected_components
+from src.model import workbook_values, evaluate_components, DEFAULT_MAX_ITERATIONS, DEFAULT_MAX_CHANGE
+from src.ranges import CalcContext, RangeRef
+
+
+class Partition:
+    """
+    Часть книги:
+    - sheets: листы части
+    - imports: ячейки других частей, которые читают формулы этой части
+    - exports: ячейки этой части, которые читают другие части
+    - depends_on: номера частей, от которых зависит эта часть
+    """
+
+    def __init__(self, index: int, sheets: list):
+        self.index = index
+        self.sheets = sheets
+        self.imports = set()
+        self.exports = set()
+        self.depends_on = set()
+
+    def __repr__(self):
+        return (f"Partition({self.index}, sheets={self.sheets}, "
+                f"imports={len(self.imports)}, exports={len(self.exports)})")
+
+
+def partition_by_sheet(all_sheets: dict) -> list:
+    """
+    Делит книгу на части по листам и находит граничные ячейки.
+    Возвращает части в порядке вычисления (зависимости раньше зависящих).
+    """
+    # Рёбра между ячейками разных листов — это и есть граница
+    cross = []
+    sheet_graph = {sheet: set() for sheet in all_sheets}
+    for node, deps in iter_formula_dependencies(all_sheets):
+        sheet = node.split('!', 1)[0]
+        for dep in deps:
+            dep_sheet = dep.split('!', 1)[0]
+            if dep_sheet != sheet and dep_sheet in all_sheets:
+                cross.append((dep, node))
+                sheet_graph[sheet].add(dep_sheet)
+
+    # Листы с круговыми ссылками друг на друга вычисляются вместе
+    partitions = []
+    part_of = {}
+    for component in strongly_connected_components(sheet_graph):
+        partition = Partition(len(partitions), sorted(component, key=list(all_sheets).index))
+        for sheet in component:
+            part_of[sheet] = partition.index
+        partitions.append(partition)
+
+    for dep, node in cross:
+        source = partitions[part_of[dep.split('!', 1)[0]]]
+        target = partitions[part_of[node.split('!', 1)[0]]]
+        if source is not target:
+            source.exports.add(dep)
+            target.imports.add(dep)
+            target.depends_on.add(source.index)
+    return partitions
+
+
+def _portable(value):
+    """Значение, которое можно дёшево передать в другой процесс (диапазон — как таблица значений)."""
+    if isinstance(value, RangeRef):
+        return value.values()
+    return value
+
+
+def _evaluate_partition(sheets: dict, imports: dict, wanted, iterative: bool,
+                        max_iterations: int, max_change: float, formulas: dict = None,
+                        extents: dict = None) -> dict:
+    """
+    Вычисляет одну часть книги (выполняется в процессе-исполнителе).
+    wanted — ячейки, значения которых нужно вернуть; None — все ячейки части.
+    formulas — разобранные формулы части; None — разобрать в процессе-исполнителе,
+    ограничивая ссылки A:A на другие листы их заполненной частью из extents.
+    Возвращает словарь {адрес: значение}.
+    """
+    context = CalcContext(workbook_values(sheets))
+    context.update(imports)
+    if formulas is None:
+        formulas = compile_formulas(sheets, extents=extents)
+    evaluate_components(sheets, formulas, context, iterative, max_iterations, max_change)
+    if wanted is None:
+        own = tuple(f"{sheet}!" for sheet in sheets)
+        wanted = [key for key in context if key.startswith(own)]
+    return {key: _portable(context.get(key)) for key in wanted}
+
+
+def evaluate_partitioned(all_sheets: dict, processes: int = None, outputs=None, iterative: bool = False,
+                         max_iterations: int = DEFAULT_MAX_ITERATIONS,
+                         max_change: float = DEFAULT_MAX_CHANGE, formulas: dict = None) -> dict:
+    """
+    Вычисляет книгу по частям (см. partition_by_sheet), каждую часть — в своём процессе.
+    - processes: число процессов (по умолчанию — число ядер); 0 — всё в текущем процессе
+    - outputs: адреса 'Лист!A1', значения которых нужно вернуть; None — все ячейки книги
+    - iterative, max_iterations, max_change: как у evaluate_workbook (циклы внутри части)
+    - formulas: уже разобранные формулы всей книги (compile_formulas, src.cache); каждой части
+      передаются её формулы, иначе части разбирают свои листы сами
+    Возвращает словарь {адрес: значение}.
+    """
+    partitions = partition_by_sheet(all_sheets)
+    wanted_by_part = {}
+    if outputs is not None:
+        for partition in partitions:
+            own = tuple(f"{sheet}!" for sheet in partition.sheets)
+            wanted_by_part[partition.index] = {cell for cell in outputs if cell.startswith(own)}
+
+    def task(partition):
+        sheets = {sheet: all_sheets[sheet] for sheet in partition.sheets}
+        imports = {cell: boundary[cell] for cell in partition.imports if cell in boundary}
+        wanted = None
+        if outputs is not None:
+            wanted = partition.exports | wanted_by_part[partition.index]
+        own = other = None
+        if formulas is not None:
+            own = {f"{sheet}!{addr}": formulas[f"{sheet}!{addr}"]
+                   for sheet in partition.sheets for addr in all_sheets[sheet]['formulas']}
+        else:
+            # Размеры остальных листов: без них A:A в процессе-исполнителе занимал бы весь столбец
+            other = {sheet: extents.get(sheet) for sheet in all_sheets if sheet not in sheets}
+        return sheets, imports, wanted, iterative, max_iterations, max_change, own, other
+
+    extents = _SheetExtents(all_sheets)
+    boundary = {}  # Значения граничных ячеек, полученные от уже вычисленных частей
+    results = {}
+
+    def collect(partition, values):
+        for cell in partition.exports:
+            boundary[cell] = values.get(cell)
+        if outputs is None:
+            results.update(values)
+        else:
+            results.update({cell: values.get(cell) for cell in wanted_by_part[partition.index]})
+
+    if processes == 0:
+        for partition in partitions:  # Части уже упорядочены
+            values = _evaluate_partition(*task(partition))
+            collect(partition, values)
+        return results
+
+    processes = processes or os.cpu_count() or 1
+    waiting = {p.index: set(p.depends_on) for p in partitions}
+    with ProcessPoolExecutor(max_workers=min(processes, max(len(partitions), 1))) as pool:
+        running = {}
+
+        def submit_ready():
+            for index in [i for i, deps in waiting.items() if not deps]:
+                del waiting[index]
+                partition = partitions[index]
+                running[pool.submit(_evaluate_partition, *task(partition))] = partition
+
+        submit_ready()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                partition = running.pop(future)
+                values = future.result()
+                collect(partition, values)
+                for deps in waiting.values():
+                    deps.discard(partition.index)
+            submit_ready()
+    return results
@@ -0,0 +1,209 @@
+# src/profiler.py
+
+"""
+Модуль profiler:
+- Profiler: профилировщик вычисления формул
+    * instrument(formulas) -> dict: копии AST с замерами времени (исходные формулы не меняются)
+    * cells / functions: {ключ: {'calls', 'inclusive', 'exclusive'}} — по ячейкам 'Лист!A1'
+      и по функциям Excel ('SUM', 'VLOOKUP', ...)
+    * top(n, kind='cells', by='exclusive') -> list: самые «дорогие» ячейки или функции
+    * format(n) -> str: таблица top-N
+    * write_folded(path) -> str: стеки в формате flame graph («Лист!A1;SUM;IF 1234», время в мкс)
+- profile_workbook(all_sheets, targets=None, iterative=False, ...) -> (context, Profiler)
+    Вычисляет книгу как evaluate_workbook, но с профилированием.
+
+Время inclusive — полное время узла, exclusive — без вложенных замеряемых узлов
+(для ячейки — без функций внутри неё и, в режиме pull, без других ячеек,
+вычисленных по запросу). Если функция вложена сама в себя (SUM(SUM(...))),
+inclusive считается только для внешнего вызова. Вычисления, прерванные в режиме pull
+из-за глубины рекурсии (см. PullContext), не учитываются: ячейка потом вычисляется
+заново целиком. Замеры добавляют около микросекунды на узел, поэтому профилирование включается явно и в обычное вычисление не встроено.
+"""
+
+import time
+from collections import defaultdict
+
+from src.ast_builder import compile_formulas
+from src.evaluator import FormulaNode, FunctionNode, BinaryOpNode, PullContext, _Pending
+from src.model import workbook_values, evaluate_components, DEFAULT_MAX_ITERATIONS, DEFAULT_MAX_CHANGE
+from src.ranges import CalcContext
+
+_KINDS = ('cells', 'functions')
+_ORDERS = ('exclusive', 'inclusive', 'calls')
+
+
+class _Frame:
+    __slots__ = ('key', 'kind', 'path', 'start', 'children')
+
+    def __init__(self, key: str, kind: str, path: str, start: float):
+        self.key = key
+        self.kind = kind
+        self.path = path
+        self.start = start
+        self.children = 0.0
+
+
+class _CellProbe(FormulaNode):
+    """Корень формулы ячейки с замером времени."""
+
+    def __init__(self, cell: str, node: FormulaNode, profiler: "Profiler"):
+        self.cell = cell
+        self.node = node
+        self._profiler = profiler
+
+    def children(self) -> tuple:
+        return (self.node,)
+
+    def eval(self, context):
+        frame = self._profiler._enter(self.cell, 'cells')
+        aborted = False
+        try:
+            return self.node.eval(context)
+        except _Pending:
+            aborted = True
+            raise
+        finally:
+            self._profiler._exit(frame, aborted)
+
+
+class _FunctionProbe(FunctionNode):
+    """Вызов функции Excel с замером времени."""
+
+    def __init__(self, name: str, args: list, profiler: "Profiler"):
+        super().__init__(name, args)
+        self._profiler = profiler
+
+    def eval(self, context):
+        frame = self._profiler._enter(self.name, 'functions')
+        aborted = False
+        try:
+            return FunctionNode.eval(self, context)
+        except _Pending:
+            aborted = True
+            raise
+        finally:
+            self._profiler._exit(frame, aborted)
+
+
+class Profiler:
+    """Собирает время вычисления по ячейкам и функциям."""
+
+    def __init__(self):
+        self.cells = {}
+        self.functions = {}
+        self.folded = defaultdict(float)  # Стек 'Лист!A1;SUM;...' -> собственное время, с
+        self.formulas = {}                # Текст формул для отчёта (если известен)
+        self._stack = []
+        self._active = defaultdict(int)   # (вид, ключ) -> глубина вложенности в текущем стеке
+
+    # --- Замеры ---
+
+    def _enter(self, key: str, kind: str) -> _Frame:
+        parent = self._stack[-1].path + ';' if self._stack else ''
+        frame = _Frame(key, kind, parent + key, 0.0)
+        self._stack.append(frame)
+        self._active[kind, key] += 1
+        frame.start = time.perf_counter()
+        return frame
+
+    def _exit(self, frame: _Frame, aborted: bool = False):
+        elapsed = time.perf_counter() - frame.start
+        self._stack.pop()
+        self._active[frame.kind, frame.key] -= 1
+        if aborted:
+            return  # Прервано в режиме pull (_Pending): ячейка будет вычислена заново целиком
+        exclusive = elapsed - frame.children
+        if self._stack:
+            self._stack[-1].children += elapsed
+        stats = getattr(self, frame.kind).get(frame.key)
+        if stats is None:
+            stats = getattr(self, frame.kind)[frame.key] = {'calls': 0, 'inclusive': 0.0, 'exclusive': 0.0}
+        stats['calls'] += 1
+        stats['exclusive'] += exclusive
+        if not self._active[frame.kind, frame.key]:
+            stats['inclusive'] += elapsed  # Вложенный вызов того же ключа уже учтён во внешнем
+        self.folded[frame.path] += exclusive
+
+    def _copy(self, node: FormulaNode) -> FormulaNode:
+        """Копия дерева, в которой вызовы функций заменены замеряемыми."""
+        if isinstance(node, FunctionNode):
+            return _FunctionProbe(node.name, [self._copy(arg) for arg in node.args], self)
+        if isinstance(node, BinaryOpNode):
+            return BinaryOpNode(node.op, self._copy(node.left), self._copy(node.right))
+        return node  # Листья (константы, ссылки) не меняются и могут быть общими
+
+    def instrument(self, formulas: dict, texts: dict = None) -> dict:
+        """
+        Возвращает {ячейка: узел с замерами} для словаря формул compile_formulas.
+        texts — исходный текст формул {ячейка: '=...'} для отчёта.
+        """
+        if texts:
+            self.formulas.update(texts)
+        return {cell: _CellProbe(cell, self._copy(node), self) for cell, node in formulas.items()}
+
+    # --- Отчёты ---
+
+    @property
+    def total(self) -> float:
+        """Общее время вычисления всех ячеек верхнего уровня, с."""
+        return sum(self.folded.values())
+
+    def top(self, n: int = 20, kind: str = 'cells', by: str = 'exclusive') -> list:
+        """Самые затратные ячейки или функции: [(ключ, {'calls', 'inclusive', 'exclusive'}), ...]."""
+        if kind not in _KINDS:
+            raise ValueError(f"Неизвестный вид: {kind} (ожидается {', '.join(_KINDS)})")
+        if by not in _ORDERS:
+            raise ValueError(f"Неизвестный порядок: {by} (ожидается {', '.join(_ORDERS)})")
+        items = getattr(self, kind).items()
+        return sorted(items, key=lambda item: (-item[1][by], item[0]))[:n]
+
+    def format(self, n: int = 20) -> str:
+        total = self.total or 1.0
+        lines = [f"Всего: {self.total * 1000:.1f} мс, ячеек: {len(self.cells)}, функций: {len(self.functions)}",
+                 f"{'ячейка':<24} {'вызовов':>8} {'всего, мс':>10} {'своё, мс':>10} {'доля':>7}  формула"]
+        for cell, s in self.top(n, 'cells'):
+            formula = self.formulas.get(cell, '')
+            formula = formula if len(formula) <= 60 else formula[:57] + '...'
+            lines.append(f"{cell:<24} {s['calls']:>8} {s['inclusive'] * 1000:>10.2f} "
+                         f"{s['exclusive'] * 1000:>10.2f} {s['exclusive'] / total:>7.1%}  {formula}")
+        lines.append(f"{'функция':<24} {'вызовов':>8} {'всего, мс':>10} {'своё, мс':>10} {'доля':>7}")
+        for name, s in self.top(n, 'functions'):
+            lines.append(f"{name:<24} {s['calls']:>8} {s['inclusive'] * 1000:>10.2f} "
+                         f"{s['exclusive'] * 1000:>10.2f} {s['exclusive'] / total:>7.1%}")
+        return '\n'.join(lines)
+
+    def write_folded(self, path: str) -> str:
+        """
+        Записывает стеки в «свёрнутом» формате (flamegraph.pl, speedscope, inferno):
+        строка на стек, значение — собственное время в микросекундах.
+        """
+        with open(path, 'w', encoding='utf-8') as handle:
+            for stack, seconds in sorted(self.folded.items()):
+                micros = round(seconds * 1e6)
+                if micros > 0:
+                    handle.write(f"{stack.replace(' ', '_')} {micros}\n")
+        return path
+
+    def __repr__(self):
+        return f"Profiler(cells={len(self.cells)}, functions={len(self.functions)})"
+
+
+def profile_workbook(all_sheets: dict, targets=None, iterative: bool = False,
+                     max_iterations: int = DEFAULT_MAX_ITERATIONS,
+                     max_change: float = DEFAULT_MAX_CHANGE) -> tuple:
+    """
+    Вычисляет книгу с профилированием (параметры — как у evaluate_workbook).
+    Возвращает (context, profiler).
+    """
+    profiler = Profiler()
+    texts = {f"{sheet}!{addr}": formula
+             for sheet, content in all_sheets.items() for addr, formula in content['formulas'].items()}
+    formulas = profiler.instrument(compile_formulas(all_sheets), texts)
+    if targets is not None:
+        context = PullContext(workbook_values(all_sheets), formulas)
+        for key in targets:
+            context.get(key)
+        return context, profiler
+    context = CalcContext(workbook_values(all_sheets))
+    evaluate_components(all_sheets, formulas, context, iterative, max_iterations, max_change)
+    return context, profiler
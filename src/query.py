@@ -0,0 +1,274 @@
+# src/query.py
+
+"""
+Модуль query:
+- DependencyQuery(csr): запросы к графу зависимостей книги
+    * dependents(cell, depth=None, sheets=None) -> list: на что влияет ячейка
+    * precedents(cell, depth=None, sheets=None) -> list: от чего зависит ячейка
+    * affects(cell, other) -> bool: влияет ли cell (транзитивно) на other
+    * depends_on(cell, other) -> bool: зависит ли cell (транзитивно) от other
+    * count_dependents(cell) / count_precedents(cell) -> int: размер множеств без их перечисления
+  DependencyQuery.from_workbook(all_sheets)
+
+Запросы без ограничения глубины обслуживаются из кэшированной структуры достижимости:
+граф сжимается до DAG компонент сильной связности, вершины DAG нумеруются в порядке
+выхода из обхода в глубину (post-order), и каждой компоненте сопоставляется список
+интервалов номеров достижимых из неё компонент (интервальная разметка Агравала и др.).
+В графах электронных таблиц такие списки короткие: цепочка или «дерево» формул
+даёт один интервал. Разметка строится один раз для каждого направления при первом запросе.
+Запросы с ограничением глубины выполняются обходом в ширину и кэшируются по (ячейка, глубина).
+"""
+
+from bisect import bisect_right
+
+import numpy as np
+
+from src.csr_graph import CSRGraph, _to_csr, INDEX_DTYPE
+
+_DIRECTIONS = ('dependents', 'precedents')
+
+
+def _merge_intervals(intervals: list) -> list:
+    """Сливает пересекающиеся и соседние интервалы [начало, конец]."""
+    intervals.sort()
+    merged = [list(intervals[0])]
+    for start, end in intervals[1:]:
+        last = merged[-1]
+        if start <= last[1] + 1:
+            if end > last[1]:
+                last[1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class _IntervalLabels:
+    """
+    Интервальная разметка сжатого DAG в одном направлении обхода.
+    post[c] — номер компоненты c в post-order; starts[c]/ends[c] — интервалы
+    номеров всех компонент, достижимых из c (включая саму c).
+    """
+
+    def __init__(self, ptr: list, idx: list, count: int):
+        post = [-1] * count
+        by_post = [0] * count
+        counter = 0
+        for root in range(count):
+            if post[root] >= 0:
+                continue
+            post[root] = -2  # «в обработке»
+            stack = [(root, ptr[root])]
+            while stack:
+                node, k = stack[-1]
+                if k < ptr[node + 1]:
+                    stack[-1] = (node, k + 1)
+                    child = idx[k]
+                    if post[child] == -1:
+                        post[child] = -2
+                        stack.append((child, ptr[child]))
+                    continue
+                stack.pop()
+                post[node] = counter
+                by_post[counter] = node
+                counter += 1
+
+        # В DAG номер преемника всегда меньше номера вершины,
+        # поэтому при обходе по возрастанию номеров преемники уже размечены
+        self.post = post
+        self.by_post = by_post
+        self.starts = [None] * count
+        self.ends = [None] * count
+        for number, node in enumerate(by_post):
+            intervals = [(number, number)]
+            for child in idx[ptr[node]:ptr[node + 1]]:
+                intervals.extend(zip(self.starts[child], self.ends[child]))
+            merged = _merge_intervals(intervals) if len(intervals) > 1 else intervals
+            self.starts[node] = [s for s, _ in merged]
+            self.ends[node] = [e for _, e in merged]
+
+    def reaches(self, source: int, target: int) -> bool:
+        """Достижима ли компонента target из компоненты source (двоичный поиск по интервалам)."""
+        number = self.post[target]
+        starts = self.starts[source]
+        k = bisect_right(starts, number) - 1
+        return k >= 0 and number <= self.ends[source][k]
+
+    def reachable(self, source: int) -> list:
+        """Все компоненты, достижимые из source (включая её саму)."""
+        by_post = self.by_post
+        result = []
+        for start, end in zip(self.starts[source], self.ends[source]):
+            result.extend(by_post[start:end + 1])
+        return result
+
+
+class DependencyQuery:
+    """
+    Запросы о транзитивных зависимостях поверх CSRGraph.
+    Граф считается неизменным: после правки книги создайте новый объект.
+    """
+
+    def __init__(self, csr: CSRGraph):
+        self.csr = csr
+        self._labels = {}      # Направление -> _IntervalLabels
+        self._bfs_cache = {}   # (направление, номер вершины, глубина) -> номера вершин
+        self._components = None
+        self._post_sizes = {}  # Направление -> префиксные суммы размеров компонент в post-order
+        # Номер листа для каждой вершины — для быстрого фильтра по листам
+        sheet_names = [node.split('!', 1)[0] for node in csr.nodes]
+        self._sheet_codes = {}
+        self._node_sheet = np.array(
+            [self._sheet_codes.setdefault(name, len(self._sheet_codes)) for name in sheet_names],
+            dtype=INDEX_DTYPE)
+
+    @classmethod
+    def from_workbook(cls, all_sheets: dict):
+        return cls(CSRGraph.from_workbook(all_sheets))
+
+    # --- Публичный интерфейс ---
+
+    def dependents(self, cell: str, depth: int = None, sheets=None) -> list:
+        """
+        Ячейки, на которые влияет cell (прямо или через цепочку формул).
+        depth — наибольшая длина цепочки (1 — только прямые зависимые);
+        sheets — оставить только ячейки с этих листов.
+        """
+        return self._query(cell, 'dependents', depth, sheets)
+
+    def precedents(self, cell: str, depth: int = None, sheets=None) -> list:
+        """
+        Ячейки, от которых зависит cell (прямо или через цепочку формул).
+        Параметры — как у dependents.
+        """
+        return self._query(cell, 'precedents', depth, sheets)
+
+    def affects(self, cell: str, other: str) -> bool:
+        """Влияет ли изменение cell на значение other."""
+        return self._reaches(cell, other, 'dependents')
+
+    def depends_on(self, cell: str, other: str) -> bool:
+        """Зависит ли значение cell от other."""
+        return self._reaches(cell, other, 'precedents')
+
+    def count_dependents(self, cell: str) -> int:
+        """Сколько ячеек транзитивно зависит от cell."""
+        return self._count(cell, 'dependents')
+
+    def count_precedents(self, cell: str) -> int:
+        """От скольких ячеек транзитивно зависит cell."""
+        return self._count(cell, 'precedents')
+
+    # --- Внутренняя кухня ---
+
+    def _count(self, cell: str, direction: str) -> int:
+        """Размер замыкания по интервалам: префиксные суммы размеров компонент в post-order."""
+        comp, members_ptr, _, cyclic = self._condense()
+        labels = self._get_labels(direction)
+        sizes = self._post_sizes.get(direction)
+        if sizes is None:
+            counts = [members_ptr[c + 1] - members_ptr[c] for c in labels.by_post]
+            sizes = self._post_sizes[direction] = [0, *np.cumsum(counts).tolist()]
+        source = int(comp[self._id(cell)])
+        total = sum(sizes[end + 1] - sizes[start] for start, end in zip(labels.starts[source], labels.ends[source]))
+        if not cyclic[source]:
+            total -= 1  # Сама ячейка не считается, если не лежит на цикле
+        return total
+
+    def _id(self, cell: str) -> int:
+        try:
+            return self.csr.ids[cell]
+        except KeyError:
+            raise KeyError(f"Ячейка {cell} отсутствует в графе зависимостей") from None
+
+    def _condense(self):
+        """
+        Компоненты сильной связности: comp[вершина] -> номер компоненты,
+        members — вершины каждой компоненты (CSR), cyclic — признак цикла.
+        Для ациклического графа каждая вершина — своя компонента.
+        """
+        if self._components is None:
+            csr = self.csr
+            n = len(csr)
+            comp = np.arange(n, dtype=np.int64)
+            cyclic = np.zeros(n, dtype=bool)
+            for cycle in csr.find_cycles():
+                ids = np.array([csr.ids[node] for node in cycle], dtype=np.int64)
+                comp[ids] = ids[0]
+                cyclic[ids[0]] = True
+            # Перенумеровываем компоненты подряд
+            roots, comp = np.unique(comp, return_inverse=True)
+            members_ptr, members = _to_csr(comp, np.arange(n, dtype=np.int64), len(roots))
+            self._components = (comp.astype(INDEX_DTYPE), members_ptr.tolist(), members.tolist(), cyclic[roots])
+        return self._components
+
+    def _get_labels(self, direction: str) -> _IntervalLabels:
+        """Интервальная разметка для направления; строится при первом обращении."""
+        labels = self._labels.get(direction)
+        if labels is None:
+            comp, members_ptr, _, _ = self._condense()
+            csr = self.csr
+            ptr, idx = (csr.dep_ptr, csr.dep_idx) if direction == 'dependents' else (csr.prec_ptr, csr.prec_idx)
+            sources = comp[np.repeat(np.arange(len(csr)), np.diff(ptr))].astype(np.int64)
+            targets = comp[idx].astype(np.int64)
+            keep = sources != targets  # Рёбра внутри компоненты в сжатом графе не нужны
+            count = len(members_ptr) - 1
+            # Одно ребро между компонентами — один раз
+            keys = np.unique(sources[keep] * count + targets[keep])
+            cptr, cidx = _to_csr(keys // count, keys % count, count)
+            labels = self._labels[direction] = _IntervalLabels(cptr.tolist(), cidx.tolist(), count)
+        return labels
+
+    def _reaches(self, cell: str, other: str, direction: str) -> bool:
+        comp, _, _, cyclic = self._condense()
+        source, target = comp[self._id(cell)], comp[self._id(other)]
+        if source == target:
+            return bool(cyclic[source])  # Ячейка влияет сама на себя только через цикл
+        return self._get_labels(direction).reaches(source, target)
+
+    def _query(self, cell: str, direction: str, depth, sheets) -> list:
+        if direction not in _DIRECTIONS:
+            raise ValueError(f"Неизвестное направление обхода: {direction}")
+        node = self._id(cell)
+        if depth is None:
+            found = self._closure(node, direction)
+        else:
+            found = self._bounded(node, direction, depth)
+        if sheets is not None:
+            codes = [self._sheet_codes[s] for s in sheets if s in self._sheet_codes]
+            found = found[np.isin(self._node_sheet[found], codes)]
+        nodes = self.csr.nodes
+        return [nodes[i] for i in found.tolist()]
+
+    def _closure(self, node: int, direction: str) -> np.ndarray:
+        """Все достижимые вершины по интервальной разметке (без обхода графа)."""
+        comp, members_ptr, members, cyclic = self._condense()
+        source = int(comp[node])
+        found = []
+        for c in self._get_labels(direction).reachable(source):
+            if c == source and not cyclic[c]:
+                continue  # Сама ячейка не входит в результат, если не лежит на цикле
+            found.extend(members[members_ptr[c]:members_ptr[c + 1]])
+        return np.sort(np.array(found, dtype=INDEX_DTYPE))
+
+    def _bounded(self, node: int, direction: str, depth: int) -> np.ndarray:
+        """Вершины на расстоянии от 1 до depth (обход в ширину с кэшем результатов)."""
+        key = (direction, node, depth)
+        found = self._bfs_cache.get(key)
+        if found is None:
+            csr = self.csr
+            ptr, idx = (csr.dep_ptr, csr.dep_idx) if direction == 'dependents' else (csr.prec_ptr, csr.prec_idx)
+            visited = set()  # Сама ячейка попадёт сюда, только если цикл вернёт к ней
+            frontier = [node]
+            for _ in range(depth):
+                next_frontier = []
+                for u in frontier:
+                    for v in idx[ptr[u]:ptr[u + 1]].tolist():
+                        if v not in visited:
+                            visited.add(v)
+                            next_frontier.append(v)
+                frontier = next_frontier
+                if not frontier:
+                    break
+            result = list(visited)
+            found = self._bfs_cache[key] = np.sort(np.array(result, dtype=INDEX_DTYPE))
+        return found
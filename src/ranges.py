@@ -0,0 +1,330 @@
+# src/ranges.py
+
+"""
+Модуль ranges:
+- column_to_letter(col_idx) / letter_to_column(letters): перевод номера столбца в буквы и обратно
+- split_ref(ref) -> (sheet | None, addr): отделяет имя листа от адреса ячейки/диапазона
+- parse_cell(addr) -> (row, col), parse_range(addr) -> (top, left, bottom, right)
+    (также столбцы 'A:C' и строки '1:3' — до края листа Excel, MAX_ROWS x MAX_COLUMNS)
+- RangeRef: ленивая ссылка на прямоугольный диапазон внутри context
+- RangeCache(max_entries): кэш индексов, построенных по диапазонам, с инвалидацией
+  по изменённой ячейке и вытеснением давно не использованных записей
+- CalcContext: словарь-контекст, который сообщает RangeCache об изменении ячеек
+"""
+
+import re
+from collections import defaultdict
+
+# Адрес одиночной ячейки: необязательные '$', буквы столбца, номер строки
+_CELL_RE = re.compile(r"^\$?([A-Za-z]{1,3})\$?(\d+)$")
+
+# Размер листа Excel: границы ссылок на целые столбцы (A:A) и строки (1:1)
+MAX_ROWS = 1048576
+MAX_COLUMNS = 16384
+
+
+def column_to_letter(col_idx):
+    """Преобразует числовой индекс (1-based) в букву столбца Excel"""
+    letter = "" # Инициализация пустой строки для хранения буквы
+    while col_idx > 0:
+        col_idx -= 1 # Уменьшаем индекс на 1, чтобы привести к 0-based
+        letter = chr(col_idx % 26 + 65) + letter # Получаем букву столбца
+        col_idx //= 26 # Уменьшаем индекс на количество букв в алфавите
+    return letter # Возвращаем букву столбца
+
+
+def letter_to_column(letters: str) -> int:
+    """Преобразует буквы столбца Excel ('A', 'AB') в числовой индекс (1-based)"""
+    col_idx = 0
+    for ch in letters.upper():
+        col_idx = col_idx * 26 + (ord(ch) - 64) # Накапливаем 26-ричное число
+    return col_idx
+
+
+def split_ref(ref: str):
+    """
+    Делит ссылку 'Лист!A1' на имя листа и адрес.
+    Кавычки вокруг имени листа ('My Sheet'!A1) снимаются.
+    Для ссылки без листа возвращает (None, ref).
+    """
+    if '!' not in ref:
+        return None, ref
+    sheet, addr = ref.rsplit('!', 1) # Адрес всегда после последнего '!'
+    if sheet.startswith("'") and sheet.endswith("'"):
+        sheet = sheet[1:-1].replace("''", "'") # Снимаем кавычки и экранирование
+    return sheet, addr
+
+
+def parse_cell(addr: str):
+    """
+    Разбирает адрес ячейки 'B12' (или '$B$12') в кортеж (row, col), оба 1-based.
+    Выбрасывает ValueError, если адрес некорректен.
+    """
+    m = _CELL_RE.match(addr)
+    if not m:
+        raise ValueError(f"Некорректный адрес ячейки: {addr!r}")
+    return int(m.group(2)), letter_to_column(m.group(1))
+
+
+def parse_range(addr: str):
+    """
+    Разбирает адрес диапазона 'A1:C10' (или одиночной ячейки) в
+    нормализованный кортеж (top, left, bottom, right).
+    Столбцы 'A:C' и строки '1:3' занимают лист до края (MAX_ROWS, MAX_COLUMNS).
+    """
+    if ':' in addr:
+        first, last = addr.replace('$', '').split(':', 1)
+        if first.isalpha() and last.isalpha():
+            first, last = f"{first}1", f"{last}{MAX_ROWS}"
+        elif first.isdigit() and last.isdigit():
+            first, last = f"A{first}", f"{column_to_letter(MAX_COLUMNS)}{last}"
+    else:
+        first = last = addr
+    r1, c1 = parse_cell(first)
+    r2, c2 = parse_cell(last)
+    # Диапазон может быть записан «наоборот» (C10:A1) — приводим к верхнему левому углу
+    return min(r1, r2), min(c1, c2), max(r1, r2), max(c1, c2)
+
+
+class RangeRef:
+    """
+    Ленивая ссылка на прямоугольный диапазон ячеек.
+    Значения не копируются: они читаются из context только по запросу,
+    поэтому функции (например, VLOOKUP) могут обращаться к отдельным ячейкам
+    и строить кэшируемые индексы по ключу диапазона.
+    """
+    __slots__ = ('sheet', 'top', 'left', 'bottom', 'right', 'context', '_prefix', '_letters')
+
+    def __init__(self, sheet, top, left, bottom, right, context):
+        self.sheet = sheet      # Имя листа или None для ссылок без листа
+        self.top = top          # Первая строка (1-based)
+        self.left = left        # Первый столбец (1-based)
+        self.bottom = bottom    # Последняя строка
+        self.right = right      # Последний столбец
+        self.context = context  # Словарь значений ячеек
+        self._prefix = f"{sheet}!" if sheet is not None else ""
+        self._letters = None    # Буквы столбцов вычисляются один раз при первом обращении
+
+    @classmethod
+    def from_ref(cls, ref: str, context):
+        """Создаёт RangeRef по текстовой ссылке 'Лист!A1:B3' или 'A1:B3'."""
+        sheet, addr = split_ref(ref)
+        return cls(sheet, *parse_range(addr), context)
+
+    @property
+    def key(self) -> str:
+        """Каноническая текстовая ссылка диапазона — ключ для кэшей."""
+        return (f"{self._prefix}{column_to_letter(self.left)}{self.top}"
+                f":{column_to_letter(self.right)}{self.bottom}")
+
+    @property
+    def shape(self):
+        """Размер диапазона: (число строк, число столбцов)."""
+        return self.bottom - self.top + 1, self.right - self.left + 1
+
+    def _column_letters(self):
+        if self._letters is None:
+            self._letters = [column_to_letter(c) for c in range(self.left, self.right + 1)]
+        return self._letters
+
+    def cell_key(self, i: int, j: int) -> str:
+        """Ключ context для ячейки (i, j) диапазона, индексы 0-based."""
+        return f"{self._prefix}{self._column_letters()[j]}{self.top + i}"
+
+    def value(self, i: int, j: int):
+        """Значение ячейки (i, j) диапазона, индексы 0-based."""
+        return self.context.get(self.cell_key(i, j))
+
+    def sub(self, i1: int, j1: int, i2: int, j2: int) -> "RangeRef":
+        """Поддиапазон по 0-based индексам (включительно) в том же context."""
+        return RangeRef(self.sheet, self.top + i1, self.left + j1,
+                        self.top + i2, self.left + j2, self.context)
+
+    def column_ref(self, j: int) -> "RangeRef":
+        """j-й столбец диапазона как отдельный RangeRef."""
+        return self.sub(0, j, self.bottom - self.top, j)
+
+    def row_ref(self, i: int) -> "RangeRef":
+        """i-я строка диапазона как отдельный RangeRef."""
+        return self.sub(i, 0, i, self.right - self.left)
+
+    def rows(self) -> list:
+        """Все значения диапазона построчно: [[...], [...]]."""
+        get = self.context.get
+        prefix = self._prefix
+        letters = self._column_letters()
+        return [[get(f"{prefix}{letter}{r}") for letter in letters]
+                for r in range(self.top, self.bottom + 1)]
+
+    def values(self) -> list:
+        """Все значения диапазона одним плоским списком (по строкам)."""
+        return [v for row in self.rows() for v in row]
+
+    def contains(self, sheet, row: int, col: int) -> bool:
+        """Проверяет, попадает ли ячейка (sheet, row, col) в диапазон."""
+        return (sheet == self.sheet and self.top <= row <= self.bottom
+                and self.left <= col <= self.right)
+
+    def __len__(self):
+        rows, cols = self.shape
+        return rows * cols
+
+    def __iter__(self):
+        return iter(self.values())
+
+    def __repr__(self):
+        return f"RangeRef({self.key!r})"
+
+
+class RangeCache:
+    """
+    Кэш производных структур (хэш-индексов, отсортированных массивов и т.п.),
+    построенных по диапазонам ячеек.
+    Каждая запись помнит диапазоны, из которых она построена, и удаляется
+    только тогда, когда меняется ячейка внутри одного из этих диапазонов.
+    Диапазоны разложены по корзинам (столбец, блок из ROW_BUCKET строк), поэтому
+    изменение ячейки проверяет только диапазоны, проходящие через её корзину;
+    диапазоны больше WIDE_BUCKETS корзин проверяются при каждом изменении листа.
+    Записей не больше max_entries: при переполнении удаляется та,
+    к которой дольше всего не обращались.
+    """
+    ROW_BUCKET = 1024
+    WIDE_BUCKETS = 256
+    DEFAULT_MAX_ENTRIES = 4096
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = {}                   # ключ записи -> значение (в порядке последнего обращения)
+        self._bounds = {}                    # ключ записи -> [(лист, top, left, bottom, right), ...]
+        self._buckets = defaultdict(dict)    # лист -> {(столбец, блок строк): {ключ записи: None}}
+        self._wide = defaultdict(dict)       # лист -> {ключ записи: None} для больших диапазонов
+        self.hits = 0                        # Сколько раз запись нашлась в кэше
+        self.misses = 0                      # Сколько раз запись пришлось строить
+        self.invalidations = 0               # Сколько записей удалено из-за изменений
+        self.evictions = 0                   # Сколько записей вытеснено из-за max_entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Возвращает запись по ключу или None, если её нет."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+        else:
+            self._entries[key] = entry  # В конец: недавно использованная
+            self.hits += 1
+        return entry
+
+    def put(self, key, ranges, value):
+        """
+        Сохраняет запись key, построенную по списку RangeRef ranges.
+        """
+        if key in self._entries:
+            self._unlink(key)
+        self._entries[key] = value
+        bounds = self._bounds[key] = []
+        for rng in ranges:
+            bounds.append((rng.sheet, rng.top, rng.left, rng.bottom, rng.right))
+            for bucket in self._covering(rng.top, rng.left, rng.bottom, rng.right):
+                if bucket is None:
+                    self._wide[rng.sheet][key] = None
+                else:
+                    self._buckets[rng.sheet].setdefault(bucket, {})[key] = None
+        while len(self._entries) > self.max_entries:
+            self._unlink(next(iter(self._entries)))
+            self.evictions += 1
+        return value
+
+    def _covering(self, top, left, bottom, right):
+        """Корзины диапазона; [None] — диапазон слишком велик для корзин."""
+        first, last = (top - 1) // self.ROW_BUCKET, (bottom - 1) // self.ROW_BUCKET
+        if (right - left + 1) * (last - first + 1) > self.WIDE_BUCKETS:
+            return [None]
+        return [(col, block) for col in range(left, right + 1) for block in range(first, last + 1)]
+
+    def invalidate(self, cell_key: str):
+        """
+        Удаляет все записи, диапазоны которых содержат ячейку cell_key.
+        Ключи, не являющиеся адресом ячейки, игнорируются.
+        """
+        if not self._entries:
+            return # Кэш пуст — ничего делать не нужно
+        sheet, addr = split_ref(cell_key)
+        buckets, wide = self._buckets.get(sheet), self._wide.get(sheet)
+        if not buckets and not wide:
+            return # На этом листе нет отслеживаемых диапазонов
+        m = _CELL_RE.match(addr)
+        if not m:
+            return
+        row, col = int(m.group(2)), letter_to_column(m.group(1))
+        candidates = list(buckets.get((col, (row - 1) // self.ROW_BUCKET), ())) if buckets else []
+        if wide:
+            candidates.extend(wide)
+        stale = [key for key in candidates
+                 if any(s == sheet and t <= row <= b and l <= col <= r for s, t, l, b, r in self._bounds[key])]
+        for key in stale:
+            self._drop(key)
+
+    def _unlink(self, key):
+        """Удаляет запись key и все её привязки к корзинам."""
+        self._entries.pop(key, None)
+        for sheet, top, left, bottom, right in self._bounds.pop(key, ()):
+            for bucket in self._covering(top, left, bottom, right):
+                keys = self._wide.get(sheet) if bucket is None else self._buckets[sheet].get(bucket)
+                if keys is not None:
+                    keys.pop(key, None)
+                    if not keys and bucket is not None:
+                        del self._buckets[sheet][bucket]
+
+    def _drop(self, key):
+        """Удаляет запись key, ставшую неверной после изменения ячейки."""
+        if key in self._entries:
+            self._unlink(key)
+            self.invalidations += 1
+
+    def clear(self):
+        """Полностью очищает кэш."""
+        self._entries.clear()
+        self._bounds.clear()
+        self._buckets.clear()
+        self._wide.clear()
+
+
+class CalcContext(dict):
+    """
+    Контекст вычислений (адрес ячейки -> значение) с кэшем индексов диапазонов.
+    Обычный dict тоже можно передавать в evaluate_ast, но тогда индексы
+    не кэшируются между вызовами: об изменении ячеек некому сообщить.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.range_cache = RangeCache() # Индексы по диапазонам (VLOOKUP, MATCH, ...)
+
+    def __setitem__(self, key, value):
+        # Инвалидируем индексы, только если значение действительно изменилось
+        if self.range_cache._entries and (key not in self or dict.__getitem__(self, key) != value):
+            self.range_cache.invalidate(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self.range_cache.invalidate(key)
+        dict.__delitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def pop(self, key, *default):
+        if key in self:
+            self.range_cache.invalidate(key)
+        return dict.pop(self, key, *default)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def clear(self):
+        self.range_cache.clear()
+        dict.clear(self)
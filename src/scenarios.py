@@ -0,0 +1,387 @@
+# src/scenarios.py
+
+"""
+Модуль scenarios:
+- ScenarioModel(all_sheets, inputs, outputs): модель, подготовленная для многократного
+  вычисления с разными значениями входных ячеек
+    * evaluate(values) -> dict: один сценарий {'Вход!A1': значение} -> {выход: значение}
+    * run_batch(columns) -> dict: пакет {'Вход!A1': значения по сценариям} -> {выход: значения}
+- parse_csv_value(text, decimal='.'): значение из CSV ('' -> None, TRUE/FALSE, числа, иначе текст);
+  число, записанное с другим десятичным разделителем или с разделителями тысяч, — ValueError
+- csv_text(value) -> str: значение ячейки для записи в CSV (ошибки — кодом, логические — TRUE/FALSE)
+- run_csv(all_sheets, input_path, output_path, outputs, ...) -> dict
+    Потоково прогоняет сценарии из CSV (строка — сценарий, столбец — входная ячейка)
+    и пишет выходы в CSV, Parquet или Arrow.
+
+Модель один раз отсекается до предшественников выходов (prune_workbook), формулы
+разбираются и вся книга вычисляется один раз. Для сценария пересчитываются только формулы,
+зависящие от входных ячеек, в порядке компонент сильной связности; остальное берётся
+из базового вычисления.
+
+run_csv устроен как конвейер из трёх звеньев, связанных очередями ограниченной длины:
+поток чтения разбивает файл на пакеты по chunk_size строк, вычисление идёт в текущем
+процессе или в пуле процессов (processes), поток записи пишет готовые пакеты по порядку.
+В памяти одновременно находится лишь несколько пакетов, какого бы размера ни был файл.
+"""
+
+import csv
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from src.ast_builder import compile_formulas
+from src.csr_graph import CSRGraph
+from src.errors import ExcelError
+from src.evaluator import RangeNode
+from src.graph import build_dependency_graph, strongly_connected_components, is_cyclic_component
+from src.model import (
+    workbook_values,
+    prune_workbook,
+    evaluate_components,
+    _iterate_component,
+    DEFAULT_MAX_ITERATIONS,
+    DEFAULT_MAX_CHANGE,
+)
+from src.ranges import CalcContext, RangeRef, parse_cell
+
+INPUT_SHEET = 'Вход'  # Лист входных ячеек, если в заголовке столбца лист не указан
+DEFAULT_CHUNK_SIZE = 1000
+_QUEUE_SIZE = 4  # Сколько пакетов может ждать между звеньями конвейера
+_DONE = object()  # Признак конца потока пакетов
+
+
+def _range_readers(formulas: dict, cells) -> dict:
+    """{ячейка: формулы, у которых диапазон содержит ячейку} для ячеек 'Лист!A1'."""
+    by_sheet = {}
+    for cell in cells:
+        sheet, addr = cell.split('!', 1)
+        by_sheet.setdefault(sheet, []).append((parse_cell(addr), cell))
+    readers = {}
+    for key, root in formulas.items():
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, RangeNode):
+                top, left, bottom, right = node.bounds
+                for (row, col), cell in by_sheet.get(node.sheet, ()):
+                    if top <= row <= bottom and left <= col <= right:
+                        readers.setdefault(cell, set()).add(key)
+            else:
+                stack.extend(node.children())
+    return readers
+
+
+class ScenarioModel:
+    """
+    Книга, подготовленная к прогону сценариев.
+    - inputs: входные ячейки 'Лист!A1' (константы, не формулы)
+    - outputs: выходные ячейки, значения которых возвращаются
+    - iterative, max_iterations, max_change: как у evaluate_workbook
+    - formulas: уже разобранные формулы всей книги (compile_formulas, src.cache); без них
+      формулы отсечённой книги разбираются заново
+    unused_inputs — входы, от которых выходы не зависят (их значения ни на что не влияют).
+    """
+
+    def __init__(self, all_sheets: dict, inputs, outputs, iterative: bool = False,
+                 max_iterations: int = DEFAULT_MAX_ITERATIONS, max_change: float = DEFAULT_MAX_CHANGE,
+                 formulas: dict = None):
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.max_iterations = max_iterations
+        self.max_change = max_change
+        for cell in self.inputs:
+            sheet, addr = cell.split('!', 1)
+            if addr in all_sheets.get(sheet, {}).get('formulas', {}):
+                raise ValueError(f"Входная ячейка {cell} содержит формулу")
+
+        self._sheets, _ = prune_workbook(all_sheets, self.outputs)
+        if formulas is None:
+            self._formulas = compile_formulas(self._sheets)
+        else:
+            self._formulas = {f"{sheet}!{addr}": formulas[f"{sheet}!{addr}"]
+                              for sheet, content in self._sheets.items() for addr in content['formulas']}
+        self._context = CalcContext(workbook_values(self._sheets))
+        evaluate_components(self._sheets, self._formulas, self._context, iterative, max_iterations, max_change)
+
+        # План пересчёта: компоненты, зависящие от входов, в порядке вычисления
+        csr = CSRGraph.from_workbook(self._sheets)
+        # Граф раскрывает диапазоны только в существующие ячейки: формулы, чей диапазон
+        # накрывает пустую входную ячейку, находятся по границам диапазонов в AST
+        blank = [cell for cell in self.inputs
+                 if cell.split('!', 1)[1] not in self._sheets.get(cell.split('!', 1)[0], {}).get('data', {})]
+        readers = _range_readers(self._formulas, blank) if blank else {}
+        used = [cell for cell in self.inputs if cell in csr]
+        self.unused_inputs = [cell for cell in self.inputs if cell not in csr and cell not in readers]
+        seeds = used + [node for cells in readers.values() for node in cells if node in csr]
+        affected = set(csr.reachable(seeds, direction='dependents')) if seeds else set()
+        affected.update(node for cells in readers.values() for node in cells)
+        graph, _ = build_dependency_graph(self._sheets)
+        self._plan = []
+        for component in strongly_connected_components(graph):
+            cells = [node for node in component if node in affected and node in self._formulas]
+            if cells:
+                self._plan.append((component, is_cyclic_component(component, graph)))
+
+    @property
+    def recalculated(self) -> int:
+        """Сколько формул пересчитывается на каждый сценарий."""
+        return sum(len(component) for component, _ in self._plan)
+
+    def evaluate(self, values: dict) -> dict:
+        """Вычисляет один сценарий: {входная ячейка: значение} -> {выходная ячейка: значение}."""
+        context, formulas = self._context, self._formulas
+        for cell, value in values.items():
+            context[cell] = value
+        # Каждый сценарий пересчитывает весь план, поэтому контекст можно не восстанавливать
+        for component, cyclic in self._plan:
+            if cyclic:
+                _iterate_component(component, formulas, context, self._sheets,
+                                   self.max_iterations, self.max_change)
+            else:
+                node = component[0]
+                context[node] = formulas[node].eval(context)
+        return {cell: context.get(cell) for cell in self.outputs}
+
+    def run_batch(self, columns: dict) -> dict:
+        """Пакет сценариев: {входная ячейка: значения} -> {выходная ячейка: значения}."""
+        names = list(columns)
+        results = {cell: [] for cell in self.outputs}
+        for row in zip(*(columns[name] for name in names)):
+            for cell, value in self.evaluate(dict(zip(names, row))).items():
+                results[cell].append(value)
+        return results
+
+
+# Число с десятичным разделителем sep и число с разделителями тысяч sep (1,234 или 1.234.567)
+_NUMBER_RE = {sep: re.compile(rf"[+-]?(\d+(\{sep}\d*)?|\{sep}\d+)([eE][+-]?\d+)?") for sep in '.,'}
+_GROUPED_RE = {sep: re.compile(rf"[+-]?\d{{1,3}}(\{sep}\d{{3}})+(\D|$)") for sep in '.,'}
+
+
+def parse_csv_value(text: str, decimal: str = '.'):
+    """
+    Значение ячейки из текста CSV; decimal — десятичный разделитель ('.' или ',').
+    Текст, который читается как число только при другом разделителе ('1,5' при '.')
+    или содержит разделители тысяч ('1,000', '1,234.5'), неоднозначен — ValueError,
+    чтобы неверно указанный разделитель не превратил 1,000 в 1.0 молча.
+    """
+    if decimal not in _NUMBER_RE:
+        raise ValueError(f"Десятичный разделитель должен быть '.' или ',': {decimal!r}")
+    if text == '':
+        return None
+    upper = text.upper()
+    if upper in ('TRUE', 'FALSE'):
+        return upper == 'TRUE'
+    if _NUMBER_RE[decimal].fullmatch(text):
+        return float(text.replace(',', '.'))
+    other = ',' if decimal == '.' else '.'
+    if _NUMBER_RE[other].fullmatch(text) or _GROUPED_RE[other].match(text) or _GROUPED_RE[decimal].match(text):
+        raise ValueError(f"Неоднозначное число {text!r}: десятичный разделитель {decimal!r}, "
+                         f"разделители тысяч не поддерживаются")
+    return text
+
+
+def csv_text(value) -> str:
+    """Значение выходной ячейки для CSV."""
+    if isinstance(value, RangeRef):
+        value = value.value(0, 0)
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, ExcelError):
+        return value.code
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _input_cell(column: str) -> str:
+    return column if '!' in column else f"{INPUT_SHEET}!{column.upper()}"
+
+
+# --- Пул процессов: модель строится в каждом процессе один раз ---
+
+_worker_model = None
+
+
+def _init_worker(all_sheets, inputs, outputs, options):
+    global _worker_model
+    _worker_model = ScenarioModel(all_sheets, inputs, outputs, **options)
+
+
+def _run_in_worker(columns: dict) -> dict:
+    return _worker_model.run_batch(columns)
+
+
+# --- Конвейер ---
+
+class _CsvSink:
+    def __init__(self, path: str, header: list, delimiter: str, encoding: str):
+        self._file = open(path, 'w', newline='', encoding=encoding)
+        self._writer = csv.writer(self._file, delimiter=delimiter)
+        self._writer.writerow(header)
+
+    def write(self, columns: dict):
+        self._writer.writerows(zip(*([csv_text(v) for v in values] for values in columns.values())))
+
+    def close(self):
+        self._file.close()
+
+
+def _open_sink(path: str, header: list, key_columns: list, delimiter: str, encoding: str):
+    if os.path.splitext(path)[1].lower() == '.csv':
+        return _CsvSink(path, header, delimiter, encoding)
+    from src.columnar import ScenarioSink  # Нужен pyarrow
+    return ScenarioSink(path, text_columns=key_columns)
+
+
+def _read_chunks(path: str, columns, key_columns, chunk_size: int, delimiter: str, decimal: str, encoding: str,
+                 out: queue.Queue, stop: threading.Event):
+    """Поток чтения: пакеты (ключевые столбцы, входные столбцы) в очередь out."""
+    try:
+        with open(path, newline='', encoding=encoding) as handle:
+            reader = csv.reader(handle, delimiter=delimiter)
+            header = next(reader)
+            mapping = columns or {name: _input_cell(name) for name in header if name not in key_columns}
+            missing = [name for name in list(mapping) + list(key_columns) if name not in header]
+            if missing:
+                raise KeyError(f"В файле {path} нет столбцов: {', '.join(missing)}")
+            inputs = [(header.index(name), cell) for name, cell in mapping.items()]
+            keys = [(header.index(name), name) for name in key_columns]
+            out.put(list(mapping.values()))  # Первым сообщением — список входных ячеек
+
+            def pack(rows):
+                return ({name: [row[i] for row in rows] for i, name in keys},
+                        {cell: [parse_csv_value(row[i], decimal) for row in rows] for i, cell in inputs})
+
+            rows = []
+            for row in reader:
+                if not row:
+                    continue
+                rows.append(row)
+                if len(rows) == chunk_size:
+                    out.put(pack(rows))
+                    rows = []
+                    if stop.is_set():
+                        return
+            if rows:
+                out.put(pack(rows))
+    except BaseException as exc:  # Ошибка передаётся в основной поток
+        out.put(exc)
+    finally:
+        out.put(_DONE)
+
+
+def _write_chunks(sink, items: queue.Queue, errors: list):
+    """Поток записи: пишет пакеты по порядку; после ошибки только разгружает очередь."""
+    while True:
+        item = items.get()
+        if item is _DONE:
+            break
+        if errors:
+            continue
+        try:
+            sink.write(item)
+        except BaseException as exc:
+            errors.append(exc)
+    try:
+        sink.close()
+    except BaseException as exc:
+        errors.append(exc)
+
+
+def run_csv(all_sheets: dict, input_path: str, output_path: str, outputs, columns: dict = None,
+            key_columns=(), chunk_size: int = DEFAULT_CHUNK_SIZE, processes: int = 0,
+            iterative: bool = False, delimiter: str = ',', decimal: str = '.', encoding: str = 'utf-8') -> dict:
+    """
+    Прогоняет сценарии из CSV-файла input_path и пишет значения outputs в output_path
+    (.csv; .parquet/.arrow — через pyarrow).
+    - columns: {столбец CSV: 'Лист!A1'}; по умолчанию заголовок столбца — адрес ячейки
+      (без листа — на листе «Вход»)
+    - key_columns: столбцы CSV, которые копируются в результат как есть (например, номер сценария)
+    - chunk_size: строк в пакете; processes: число процессов для вычисления (0 — в текущем)
+    - delimiter: разделитель столбцов; decimal: десятичный разделитель чисел во входном файле
+      (см. parse_csv_value; при delimiter=';' обычно decimal=',')
+    Возвращает сводку: scenarios, chunks, seconds, recalculated, unused_inputs.
+    """
+    started = time.perf_counter()
+    key_columns = list(key_columns)
+    stop = threading.Event()
+    read_queue = queue.Queue(maxsize=_QUEUE_SIZE)
+    reader = threading.Thread(target=_read_chunks, daemon=True, args=(
+        input_path, columns, key_columns, chunk_size, delimiter, decimal, encoding, read_queue, stop))
+    reader.start()
+
+    def take():
+        item = read_queue.get()
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    write_queue = queue.Queue(maxsize=_QUEUE_SIZE)
+    write_errors = []
+    writer = None
+    pool = None
+    summary = {'scenarios': 0, 'chunks': 0}
+    try:
+        inputs = take()
+        if inputs is _DONE:
+            raise ValueError(f"Файл {input_path} пуст")
+        options = {'iterative': iterative}
+        model = ScenarioModel(all_sheets, inputs, outputs, **options)
+        summary['recalculated'] = model.recalculated
+        summary['unused_inputs'] = model.unused_inputs
+        sink = _open_sink(output_path, key_columns + list(outputs), key_columns, delimiter, encoding)
+        writer = threading.Thread(target=_write_chunks, args=(sink, write_queue, write_errors), daemon=True)
+        writer.start()
+
+        def emit(keys, results):
+            if write_errors:
+                raise write_errors[0]
+            write_queue.put({**keys, **results})
+            summary['chunks'] += 1
+            summary['scenarios'] += len(next(iter(results.values()), ()))
+
+        if processes:
+            pool = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                       initargs=(all_sheets, inputs, outputs, options))
+            pending = deque()  # Пакеты в работе, по порядку чтения
+            while True:
+                item = take()
+                if item is _DONE:
+                    break
+                keys, values = item
+                pending.append((keys, pool.submit(_run_in_worker, values)))
+                while len(pending) >= 2 * processes:  # Не читаем далеко вперёд
+                    keys, future = pending.popleft()
+                    emit(keys, future.result())
+            while pending:
+                keys, future = pending.popleft()
+                emit(keys, future.result())
+        else:
+            while True:
+                item = take()
+                if item is _DONE:
+                    break
+                keys, values = item
+                emit(keys, model.run_batch(values))
+    finally:
+        stop.set()
+        while reader.is_alive():  # Разгружаем очередь, чтобы поток чтения мог завершиться
+            try:
+                read_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if writer is not None:
+            write_queue.put(_DONE)
+            writer.join()
+    if write_errors:
+        raise write_errors[0]
+    summary['seconds'] = time.perf_counter() - started
+    return summary
@@ -0,0 +1,341 @@
+# src/server.py
+
+"""
+Модуль server:
+- ModelServer(models, max_models=32, batch_window=0.0, max_batch=256)
+    Держит разобранные книги в памяти и отвечает на запросы «что если».
+    * evaluate(model, inputs, outputs) -> dict: корутина, один сценарий
+    * handle(request) -> dict: корутина, запрос в формате JSON (см. ниже)
+    * start_http(host, port) / start_unix(path): корутины, запуск asyncio-сервера
+    * stats() -> dict: число запросов и пакетов, задержки p50/p99
+    * close(): корутина, остановка
+- serve(models, host=None, port=None, socket_path=None, **options): запуск до Ctrl+C
+
+models — {имя: путь к книге или .model} (загружается через src.cache.load_model)
+или {имя: (all_sheets, formulas)}.
+
+Запрос (тело POST /eval по HTTP или строка JSON через Unix-сокет):
+    {"model": "цены", "inputs": {"Вход!A1": 120}, "outputs": ["Итог!A1", "Итог!A2"]}
+Ответ: {"outputs": {"Итог!A1": 144.0, ...}, "ms": 0.4}; ошибки Excel — кодом ('#DIV/0!'),
+ошибка запроса — {"error": "..."} (по HTTP — с кодом 400/404).
+По HTTP есть также GET /models и GET /stats; {"op": "models"} и {"op": "stats"} — через сокет.
+
+Для каждого набора (книга, входы, выходы) один раз строится ScenarioModel: отсечённая
+книга, вычисленная целиком, и план пересчёта только зависящих от входов формул.
+Последние max_models таких моделей хранятся в памяти (вытесненная модель
+досчитывает уже принятые запросы). Одновременные запросы к одной
+модели объединяются в пакет: пока пакет вычисляется, новые запросы копятся в очереди
+и уходят следующим пакетом целиком (batch_window, с — подождать ещё перед пакетом).
+Вычисление идёт в отдельном потоке, поэтому цикл событий продолжает принимать запросы.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from src.errors import ExcelError
+from src.ranges import RangeRef
+from src.scenarios import ScenarioModel
+
+DEFAULT_MAX_MODELS = 32
+DEFAULT_MAX_BATCH = 256
+_LATENCY_WINDOW = 10000  # Сколько последних задержек хранить для p50/p99
+_HTTP_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+class RequestError(ValueError):
+    """Ошибка в запросе (неизвестная книга, ячейка и т. п.); status — код HTTP."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def json_value(value):
+    """Значение ячейки для JSON: ошибки Excel — кодом, диапазон — левой верхней ячейкой."""
+    if isinstance(value, RangeRef):
+        value = value.value(0, 0)
+    if isinstance(value, ExcelError):
+        return value.code
+    if isinstance(value, float) and value != value:
+        return None  # NaN в JSON не представим
+    return value
+
+
+class _Batcher:
+    """
+    Очередь запросов к одной ScenarioModel и задача, вычисляющая их пакетами.
+    close() не прерывает работу: уже поставленные в очередь запросы вычисляются,
+    после чего задача завершается.
+    """
+
+    def __init__(self, server: "ModelServer", model: ScenarioModel):
+        self.model = model
+        self.queue = asyncio.Queue()
+        self.task = asyncio.get_running_loop().create_task(self._run(server))
+
+    def close(self):
+        self.queue.put_nowait(None)  # Признак конца очереди: после него запросов не будет
+
+    async def _run(self, server: "ModelServer"):
+        loop = asyncio.get_running_loop()
+        closed = False
+        while not closed:
+            item = await self.queue.get()
+            if item is None:
+                break
+            items = [item]
+            if server.batch_window:
+                await asyncio.sleep(server.batch_window)
+            while len(items) < server.max_batch and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is None:
+                    closed = True
+                    break
+                items.append(item)
+            try:
+                results = await loop.run_in_executor(server._executor, self.model.run_batch, self._columns(items))
+            except Exception:
+                # Пакет упал из-за входов какого-то запроса: считаем запросы по одному,
+                # чтобы ошибку получил только он
+                for values, future in items:
+                    try:
+                        result = await loop.run_in_executor(server._executor, self.model.evaluate, values)
+                    except Exception as error:
+                        if not future.done():
+                            future.set_exception(error)
+                    else:
+                        if not future.done():
+                            future.set_result(result)
+                server._batches += len(items)
+                continue
+            server._batches += 1
+            for i, (_, future) in enumerate(items):
+                if not future.done():  # Клиент мог уже отключиться
+                    future.set_result({cell: values[i] for cell, values in results.items()})
+
+    def _columns(self, items: list) -> dict:
+        return {name: [values[name] for values, _ in items] for name in self.model.inputs}
+
+
+class ModelServer:
+    """Сервер «что если» над разобранными книгами (см. описание модуля)."""
+
+    def __init__(self, models: dict, max_models: int = DEFAULT_MAX_MODELS, batch_window: float = 0.0,
+                 max_batch: int = DEFAULT_MAX_BATCH, iterative: bool = False):
+        from src.cache import load_model
+        self.workbooks = {name: load_model(source) if isinstance(source, str) else tuple(source)
+                          for name, source in models.items()}
+        self.max_models = max_models
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.iterative = iterative
+        self._batchers = OrderedDict()  # (книга, входы, выходы) -> _Batcher, в порядке использования
+        self._building = {}             # Ключ -> Future строящейся модели (чтобы не строить дважды)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='excel-model')
+        self._servers = []
+        self._requests = 0
+        self._batches = 0
+        self._latencies = deque(maxlen=_LATENCY_WINDOW)
+
+    # --- Вычисление ---
+
+    async def _batcher(self, model: str, inputs: tuple, outputs: tuple) -> _Batcher:
+        key = (model, inputs, outputs)
+        batcher = self._batchers.get(key)
+        if batcher is not None:
+            self._batchers.move_to_end(key)
+            return batcher
+        building = self._building.get(key)
+        if building is None:
+            loop = asyncio.get_running_loop()
+            all_sheets, formulas = self.workbooks[model]
+            building = self._building[key] = loop.run_in_executor(
+                self._executor, lambda: ScenarioModel(all_sheets, inputs, outputs, self.iterative, formulas=formulas))
+        try:
+            scenario = await building
+        except (KeyError, ValueError) as error:
+            raise RequestError(str(error.args[0] if error.args else error)) from None
+        finally:
+            self._building.pop(key, None)
+        batcher = self._batchers.get(key)
+        if batcher is None:
+            batcher = self._batchers[key] = _Batcher(self, scenario)
+            while len(self._batchers) > self.max_models:
+                _, old = self._batchers.popitem(last=False)
+                old.close()  # Досчитает свою очередь и завершится
+        return batcher
+
+    async def evaluate(self, model: str, inputs: dict, outputs) -> dict:
+        """Один сценарий: значения выходных ячеек при заданных входах."""
+        if model not in self.workbooks:
+            raise RequestError(f"Неизвестная книга: {model}", 404)
+        outputs = tuple(outputs)
+        if not outputs:
+            raise RequestError("Не указаны выходные ячейки")
+        started = time.perf_counter()
+        batcher = await self._batcher(model, tuple(sorted(inputs)), outputs)
+        future = asyncio.get_running_loop().create_future()
+        batcher.queue.put_nowait((inputs, future))  # Без await: вытеснение не вклинится между
+        result = await future
+        self._requests += 1
+        self._latencies.append(time.perf_counter() - started)
+        return result
+
+    async def handle(self, request: dict) -> dict:
+        """Ответ на запрос JSON; RequestError — ошибка в запросе."""
+        if not isinstance(request, dict):
+            raise RequestError("Запрос должен быть объектом JSON")
+        op = request.get('op', 'eval')
+        if op == 'models':
+            return {'models': {name: len(formulas) for name, (_, formulas) in self.workbooks.items()}}
+        if op == 'stats':
+            return self.stats()
+        if op != 'eval':
+            raise RequestError(f"Неизвестная операция: {op}")
+        inputs = request.get('inputs') or {}
+        if not isinstance(inputs, dict):
+            raise RequestError("inputs должен быть объектом {ячейка: значение}")
+        for cell, value in inputs.items():
+            if not (value is None or isinstance(value, (int, float, str))):
+                raise RequestError(f"Значение {cell} должно быть числом, строкой, логическим или null")
+        started = time.perf_counter()
+        values = await self.evaluate(request.get('model'), inputs, request.get('outputs') or ())
+        return {'outputs': {cell: json_value(value) for cell, value in values.items()},
+                'ms': round((time.perf_counter() - started) * 1000, 3)}
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3) if latencies else None
+
+        return {
+            'requests': self._requests,
+            'batches': self._batches,
+            'mean_batch': round(self._requests / self._batches, 2) if self._batches else None,
+            'models': len(self._batchers),
+            'p50_ms': percentile(0.5),
+            'p99_ms': percentile(0.99),
+        }
+
+    # --- Транспорт ---
+
+    async def _respond(self, request) -> tuple:
+        """(код HTTP, ответ) для разобранного запроса."""
+        try:
+            return 200, await self.handle(request)
+        except RequestError as error:
+            return error.status, {'error': str(error)}
+        except Exception as error:  # Ошибка вычисления не должна ронять сервер
+            return 400, {'error': f"{type(error).__name__}: {error}"}
+
+    async def _unix_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Строка JSON на запрос, строка JSON в ответ; запросы одного клиента идут по очереди."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    _, response = await self._respond(json.loads(line))
+                except json.JSONDecodeError as error:
+                    response = {'error': f"Некорректный JSON: {error}"}
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _http_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Минимальный HTTP/1.1 с keep-alive: POST /eval, GET /models, GET /stats."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                method, path, *_ = line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                path = path.split('?', 1)[0].rstrip('/')
+                if method == 'GET' and path in ('/models', '/stats'):
+                    status, response = await self._respond({'op': path[1:]})
+                elif path != '/eval':
+                    status, response = 404, {'error': f"Нет такого пути: {path}"}
+                elif method != 'POST':
+                    status, response = 405, {'error': "Ожидается POST"}
+                else:
+                    try:
+                        status, response = await self._respond(json.loads(body or b'{}'))
+                    except json.JSONDecodeError as error:
+                        status, response = 400, {'error': f"Некорректный JSON: {error}"}
+                payload = json.dumps(response, ensure_ascii=False).encode('utf-8')
+                close = headers.get('connection', '').lower() == 'close'
+                writer.write(f"HTTP/1.1 {status} {_HTTP_STATUS[status]}\r\n"
+                             f"Content-Type: application/json; charset=utf-8\r\n"
+                             f"Content-Length: {len(payload)}\r\n"
+                             f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode('latin-1') + payload)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # Клиент отключился или прислал не HTTP
+        finally:
+            writer.close()
+
+    async def start_http(self, host: str = '127.0.0.1', port: int = 8050) -> asyncio.AbstractServer:
+        server = await asyncio.start_server(self._http_client, host, port)
+        self._servers.append(server)
+        return server
+
+    async def start_unix(self, path: str) -> asyncio.AbstractServer:
+        if os.path.exists(path):
+            os.remove(path)  # Сокет, оставшийся от прошлого запуска
+        server = await asyncio.start_unix_server(self._unix_client, path)
+        self._servers.append(server)
+        return server
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers.clear()
+        for batcher in self._batchers.values():
+            batcher.close()
+        await asyncio.gather(*(batcher.task for batcher in self._batchers.values()))
+        self._batchers.clear()
+        self._executor.shutdown(wait=False)
+
+
+def serve(models: dict, host: str = None, port: int = None, socket_path: str = None, **options):
+    """Запускает сервер по HTTP и/или Unix-сокету и работает до прерывания (Ctrl+C)."""
+    if port is None and socket_path is None:
+        raise ValueError("Укажите порт HTTP или путь к Unix-сокету")
+
+    async def run():
+        server = ModelServer(models, **options)
+        try:
+            if port is not None:
+                await server.start_http(host or '127.0.0.1', port)
+                print(f"HTTP: http://{host or '127.0.0.1'}:{port}/eval")
+            if socket_path is not None:
+                await server.start_unix(socket_path)
+                print(f"Unix-сокет: {socket_path}")
+            await asyncio.Event().wait()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
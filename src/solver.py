@@ -0,0 +1,312 @@
+# src/solver.py
+
+"""
+Модуль solver: подбор параметра и оптимизация, как «Подбор параметра» и «Поиск решения» Excel.
+- goal_seek(all_sheets, target_cell, target_value, changing_cell, ...) -> SolverResult
+    Значение changing_cell, при котором target_cell равна target_value.
+    method='newton' (по умолчанию) — шаги Ньютона с производной из src.autodiff,
+    'secant' — секущие без производных, 'brent' — метод Брента на интервале bracket
+    (если интервал не задан, он ищется расширением от начальной точки).
+- optimize(all_sheets, objective, changing_cells, bounds=None, maximize=False, ...) -> SolverResult
+    Минимум (или максимум) objective по нескольким входам в границах bounds
+    спектральным проекционным градиентом (SPG) с градиентом из src.autodiff.
+- SolverResult: x, value, converged, iterations, evaluations, message; as_dict(), format()
+
+Обе функции строят одну SensitivityModel: книга отсекается до предшественников целевой
+ячейки, формулы разбираются один раз, а каждая проба пересчитывает только формулы,
+зависящие от изменяемых ячеек. Значение без производной (проба в линейном поиске, секущие,
+Брент) — обычный сценарий ScenarioModel; значение с производной — одно вычисление
+с дуальными числами. Ошибка Excel в точке пробы (#DIV/0! и т. п.) считается
+недопустимой точкой: шаг уменьшается.
+"""
+
+import math
+
+import numpy as np
+
+from src.autodiff import SensitivityModel
+from src.ranges import RangeRef
+
+DEFAULT_TOLERANCE = 1e-9
+DEFAULT_MAX_ITERATIONS = 100
+_METHODS = ('newton', 'secant', 'brent')
+_BRACKET_STEPS = 60     # Сколько раз удваивать интервал при поиске смены знака
+_HISTORY = 10           # Глубина немонотонного правила Армихо в SPG
+_ARMIJO = 1e-4
+_STEP_LIMITS = (1e-10, 1e10)
+
+
+class SolverResult:
+    """
+    Результат подбора или оптимизации.
+    - x: {изменяемая ячейка: найденное значение}
+    - value: значение целевой ячейки в x; converged, iterations, evaluations (пересчётов), message
+    """
+
+    def __init__(self, x: dict, value, converged: bool, iterations: int, evaluations: int, message: str):
+        self.x = x
+        self.value = value
+        self.converged = converged
+        self.iterations = iterations
+        self.evaluations = evaluations
+        self.message = message
+
+    def as_dict(self) -> dict:
+        return {'x': dict(self.x), 'value': self.value, 'converged': self.converged,
+                'iterations': self.iterations, 'evaluations': self.evaluations, 'message': self.message}
+
+    def format(self) -> str:
+        lines = [f"{'сошлось' if self.converged else 'не сошлось'}: {self.message} "
+                 f"(итераций: {self.iterations}, пересчётов: {self.evaluations})"]
+        lines.extend(f"{cell:<20} {value:.12g}" for cell, value in self.x.items())
+        lines.append(f"{'цель':<20} {self.value!r}")
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f"SolverResult(converged={self.converged}, x={self.x}, value={self.value!r})"
+
+
+def _number(value) -> float:
+    """Значение ячейки как float; ошибки Excel и нечисла — NaN."""
+    if isinstance(value, RangeRef) and len(value) == 1:
+        value = value.value(0, 0)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return math.nan
+
+
+class _Problem:
+    """Целевая ячейка как функция изменяемых ячеек; считает пересчёты."""
+
+    def __init__(self, model: SensitivityModel, target: str, shift: float = 0.0, sign: float = 1.0):
+        self.model = model
+        self.target = target
+        self.shift = shift
+        self.sign = sign
+        self.evaluations = 0
+
+    def value(self, x) -> float:
+        self.evaluations += 1
+        result = self.model.evaluate(dict(zip(self.model.inputs, map(float, x))))
+        return self.sign * (_number(result[self.target]) - self.shift)
+
+    def gradient(self, x) -> tuple:
+        self.evaluations += 1
+        values, matrix = self.model.jacobian(dict(zip(self.model.inputs, map(float, x))))
+        return self.sign * (_number(values[self.target]) - self.shift), self.sign * matrix[0]
+
+    def result(self, x, converged: bool, iterations: int, message: str) -> SolverResult:
+        point = dict(zip(self.model.inputs, map(float, x)))
+        value = self.model.evaluate(point)[self.target]  # Оставляет модель в найденной точке
+        if isinstance(value, RangeRef) and len(value) == 1:
+            value = value.value(0, 0)
+        return SolverResult(point, value, converged, iterations, self.evaluations, message)
+
+
+# --- Подбор параметра ---
+
+def _brent(f, a: float, b: float, fa: float, fb: float, tol: float, xtol: float, max_iterations: int) -> tuple:
+    """Метод Брента на [a, b] со сменой знака f; возвращает (x, итераций, сошлось)."""
+    c, fc = a, fa
+    d = e = b - a
+    for iteration in range(1, max_iterations + 1):
+        if fb * fc > 0:
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tol1 = 2 * np.finfo(float).eps * abs(b) + 0.5 * xtol
+        middle = 0.5 * (c - b)
+        if abs(fb) <= tol or abs(middle) <= tol1:
+            return b, iteration, True
+        if abs(e) >= tol1 and abs(fa) > abs(fb):
+            # Обратная квадратичная интерполяция (или секущая, если точек две)
+            s = fb / fa
+            if a == c:
+                p, q = 2 * middle * s, 1 - s
+            else:
+                q, r = fa / fc, fb / fc
+                p = s * (2 * middle * q * (q - r) - (b - a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            p = abs(p)
+            if 2 * p < min(3 * middle * q - abs(tol1 * q), abs(e * q)):
+                e, d = d, p / q
+            else:
+                d = e = middle  # Интерполяция неудачна — деление пополам
+        else:
+            d = e = middle
+        a, fa = b, fb
+        b += d if abs(d) > tol1 else math.copysign(tol1, middle)
+        fb = f(b)
+        if math.isnan(fb):
+            return b, iteration, False
+    return b, max_iterations, False
+
+
+def _find_bracket(f, x0: float, f0: float) -> tuple:
+    """Интервал со сменой знака, найденный расширением в обе стороны от x0 (или None)."""
+    step = 0.1 * max(abs(x0), 1.0)
+    for _ in range(_BRACKET_STEPS):
+        for direction in (1, -1):
+            x = x0 + direction * step
+            fx = f(x)
+            if not math.isnan(fx) and fx * f0 <= 0:
+                return (x0, f0, x, fx) if direction > 0 else (x, fx, x0, f0)
+        step *= 2
+    return None
+
+
+def goal_seek(all_sheets: dict, target_cell: str, target_value: float, changing_cell: str,
+              start: float = None, bracket: tuple = None, method: str = 'newton',
+              tol: float = DEFAULT_TOLERANCE, xtol: float = 1e-12,
+              max_iterations: int = DEFAULT_MAX_ITERATIONS, iterative: bool = False,
+              formulas: dict = None) -> SolverResult:
+    """
+    Подбирает значение changing_cell (константы), при котором target_cell = target_value
+    с точностью tol. start — начальная точка (по умолчанию значение в книге),
+    bracket — интервал (a, b), на концах которого цель по разные стороны от target_value.
+    formulas — уже разобранные формулы всей книги (src.cache), чтобы не разбирать их заново.
+    """
+    if method not in _METHODS:
+        raise ValueError(f"Неизвестный метод: {method} (ожидается {', '.join(_METHODS)})")
+    model = SensitivityModel(all_sheets, [changing_cell], [target_cell], iterative, formulas=formulas)
+    if model.unused_inputs:
+        raise ValueError(f"{target_cell} не зависит от {changing_cell}")
+    problem = _Problem(model, target_cell, shift=target_value)
+
+    def f(x):
+        return problem.value([x])
+
+    x = model.base[changing_cell] if start is None else float(start)
+    if method == 'brent' or bracket is not None:
+        if bracket is not None:
+            a, b = map(float, bracket)
+            fa, fb = f(a), f(b)
+            if math.isnan(fa) or math.isnan(fb) or fa * fb > 0:
+                return problem.result([x], False, 0, "на концах интервала цель не меняет знак")
+        else:
+            found = _find_bracket(f, x, f(x))
+            if found is None:
+                return problem.result([x], False, 0, "не найден интервал, где цель меняет знак")
+            a, fa, b, fb = found
+        if method == 'brent':
+            root, iterations, converged = _brent(f, a, b, fa, fb, tol, xtol, max_iterations)
+            return problem.result([root], converged, iterations,
+                                  "метод Брента" if converged else "метод Брента: предел итераций")
+        if not min(a, b) <= x <= max(a, b):
+            x = 0.5 * (a + b)
+    else:
+        a = b = fa = fb = None
+
+    # Ньютон или секущие; как только известна смена знака, шаги не выходят за её интервал
+    previous = None  # (x, f(x)) предыдущей допустимой точки
+    for iteration in range(1, max_iterations + 1):
+        if method == 'newton':
+            fx, slope = problem.gradient([x])
+            slope = float(slope[0])
+        else:
+            fx, slope = f(x), math.nan
+        if math.isnan(fx):
+            if previous is None:
+                return problem.result([x], False, iteration, "ошибка в начальной точке")
+            x = 0.5 * (x + previous[0])  # Недопустимая точка: возвращаемся к последней допустимой
+            continue
+        if abs(fx) <= tol:
+            return problem.result([x], True, iteration, "цель достигнута")
+        if a is None:
+            if previous is not None and previous[1] * fx < 0:
+                (a, fa), (b, fb) = previous, (x, fx)  # Смена знака появилась впервые
+        elif fa * fx < 0:
+            b, fb = x, fx
+        else:
+            a, fa = x, fx
+        if math.isfinite(slope) and slope != 0:
+            step = -fx / slope
+        elif previous is not None and fx != previous[1]:
+            step = -fx * (x - previous[0]) / (fx - previous[1])
+        else:
+            step = 0.01 * max(abs(x), 1.0)  # Нет наклона: пробный шаг, чтобы получить секущую
+        new = x + step
+        if a is not None and not min(a, b) < new < max(a, b):
+            new = 0.5 * (a + b)  # Шаг вышел за интервал смены знака — делим его пополам
+        if abs(new - x) <= xtol * (1 + abs(x)) or (a is not None and abs(b - a) <= xtol * (1 + abs(x))):
+            return problem.result([new], abs(f(new)) <= max(tol, abs(fx)), iteration, "шаг меньше xtol")
+        previous = (x, fx)
+        x = new
+    return problem.result([x], False, max_iterations, "предел итераций")
+
+
+# --- Оптимизация ---
+
+def _bounds(cells: list, bounds) -> tuple:
+    lower = np.full(len(cells), -np.inf)
+    upper = np.full(len(cells), np.inf)
+    if bounds is None:
+        return lower, upper
+    pairs = [bounds.get(cell, (None, None)) for cell in cells] if isinstance(bounds, dict) else list(bounds)
+    if len(pairs) != len(cells):
+        raise ValueError(f"Границ {len(pairs)}, а изменяемых ячеек {len(cells)}")
+    for i, (lo, hi) in enumerate(pairs):
+        lower[i] = -np.inf if lo is None else lo
+        upper[i] = np.inf if hi is None else hi
+    if np.any(lower > upper):
+        raise ValueError("Нижняя граница больше верхней")
+    return lower, upper
+
+
+def optimize(all_sheets: dict, objective: str, changing_cells, bounds=None, maximize: bool = False,
+             start: dict = None, tol: float = 1e-8, max_iterations: int = 500,
+             iterative: bool = False, formulas: dict = None) -> SolverResult:
+    """
+    Минимизирует (maximize=True — максимизирует) objective, меняя changing_cells.
+    - bounds: {ячейка: (нижняя, верхняя)} или список пар по порядку changing_cells; None — без границы
+    - start: начальные значения (по умолчанию — значения в книге, прижатые к границам)
+    - tol: точность по проекции градиента и по шагу
+    Использует локальную информацию: для невыпуклой цели найденный минимум локальный.
+    """
+    cells = list(changing_cells)
+    model = SensitivityModel(all_sheets, cells, [objective], iterative, formulas=formulas)
+    problem = _Problem(model, objective, sign=-1.0 if maximize else 1.0)
+    lower, upper = _bounds(cells, bounds)
+
+    def project(x):
+        return np.clip(x, lower, upper)
+
+    x = project(np.array([(start or {}).get(cell, model.base[cell]) for cell in cells], dtype=float))
+    fx, g = problem.gradient(x)
+    if not math.isfinite(fx):
+        return problem.result(x, False, 0, "ошибка в начальной точке")
+    g = np.nan_to_num(g)  # Через SUMIF и т. п. производная не проходит — считаем её нулевой
+    history = [fx]
+    step = 1.0 / max(np.max(np.abs(project(x - g) - x), initial=0.0), 1e-12)
+    step = min(max(step, _STEP_LIMITS[0]), _STEP_LIMITS[1])
+
+    for iteration in range(1, max_iterations + 1):
+        if np.max(np.abs(project(x - g) - x), initial=0.0) <= tol:
+            return problem.result(x, True, iteration, "проекция градиента меньше tol")
+        direction = project(x - step * g) - x
+        slope = float(g @ direction)
+        reference = max(history[-_HISTORY:])
+        scale = 1.0
+        while True:
+            trial = x + scale * direction
+            f_trial = problem.value(trial)
+            if math.isfinite(f_trial) and f_trial <= reference + _ARMIJO * scale * slope:
+                break
+            scale *= 0.5
+            if scale * np.max(np.abs(direction)) <= tol * (1 + np.max(np.abs(x))):
+                return problem.result(x, False, iteration, "линейный поиск не уменьшил цель")
+        f_new, g_new = problem.gradient(trial)
+        g_new = np.nan_to_num(g_new)
+        s, y = trial - x, g_new - g
+        x, fx, g = trial, f_new, g_new
+        history.append(fx)
+        if np.max(np.abs(s)) <= tol * (1 + np.max(np.abs(x))):
+            return problem.result(x, True, iteration, "шаг меньше tol")
+        sy = float(s @ y)
+        # Спектральный шаг Барзилаи — Борвейна; при отрицательной кривизне — наибольший
+        step = min(max(float(s @ s) / sy, _STEP_LIMITS[0]), _STEP_LIMITS[1]) if sy > 0 else _STEP_LIMITS[1]
+    return problem.result(x, False, max_iterations, "предел итераций")
@@ -0,0 +1,133 @@
+# src/synthetic.py
+
+"""
+Модуль synthetic:
+- generate_raw_sheets(cells, ...) -> dict
+    Синтетическая книга в формате read_excel_file: {лист: {'values': [[...]], 'formulas': [[...]]}}.
+- generate_workbook(cells, ...) -> dict
+    То же, сразу в формате all_sheets (через split_into_constants_and_formulas).
+- write_xlsx(path, raw_sheets) -> str: сохраняет синтетическую книгу в .xlsx (формулы без значений)
+
+Книга похожа на финансовую модель: лист «Вход» с константами и листы «Лист1», «Лист2», ...
+с формулами. Формулы заполняют столбцы сверху вниз; каждая ячейка ссылается на ячейку
+выше (цепочка длиной chain_depth) и ещё на fan_in - 1 ячеек предыдущего столбца,
+с вероятностью cross_sheet_ratio — на ячейку предыдущего листа (или «Входа»).
+С вероятностью range_density одна из ссылок заменяется на AVERAGE по диапазону.
+cycles — число циклических ссылок (ячейка ссылается на ячейку под ней);
+такую книгу можно вычислить только с iterative=True.
+Одинаковые параметры и seed дают одинаковую книгу.
+"""
+
+import random
+
+from src.ranges import column_to_letter
+from src.writer import XlsxStreamWriter
+
+INPUT_SHEET = 'Вход'
+MAX_COLUMNS = 16384  # Столбцов на листе Excel
+MAX_RANGE = 10       # Наибольшая длина диапазона в AVERAGE
+
+
+def _sheet_shape(count: int, depth: int) -> int:
+    """Число столбцов листа из count ячеек, заполненного столбцами высотой depth."""
+    columns = max(1, -(-count // depth))
+    if columns > MAX_COLUMNS:
+        raise ValueError(f"Лист из {count} ячеек не помещается в {MAX_COLUMNS} столбцов: "
+                         f"увеличьте chain_depth или число листов")
+    return columns
+
+
+def generate_raw_sheets(cells: int, sheets: int = 3, chain_depth: int = 100, fan_in: int = 3,
+                        range_density: float = 0.1, cross_sheet_ratio: float = 0.1, cycles: int = 0,
+                        inputs: int = None, seed: int = 0) -> dict:
+    """
+    Строит синтетическую книгу примерно из cells ячеек.
+    - sheets: число листов с формулами; chain_depth: высота столбца (длина цепочки)
+    - fan_in: число ссылок в формуле; range_density: доля формул с AVERAGE по диапазону
+    - cross_sheet_ratio: доля ссылок на другой лист; cycles: число циклических ссылок
+    - inputs: число констант на листе «Вход» (по умолчанию 1% ячеек, не меньше 10)
+    """
+    if cells < 1 or sheets < 1 or chain_depth < 1 or fan_in < 1:
+        raise ValueError("cells, sheets, chain_depth и fan_in должны быть положительными")
+    rnd = random.Random(seed)
+    inputs = inputs if inputs is not None else max(10, cells // 100)
+    inputs = min(inputs, cells)
+    formulas_total = cells - inputs
+    counts = [formulas_total // sheets + (1 if i < formulas_total % sheets else 0) for i in range(sheets)]
+    names = [f"Лист{i + 1}" for i in range(sheets)]
+
+    # «Вход»: один столбец констант
+    raw = {INPUT_SHEET: {'values': [[float(rnd.randint(1, 100))] for _ in range(inputs)], 'formulas': None}}
+    raw[INPUT_SHEET]['formulas'] = [row[:] for row in raw[INPUT_SHEET]['values']]
+
+    def input_ref():
+        return f"{INPUT_SHEET}!A{rnd.randint(1, inputs)}"
+
+    def sheet_ref(k: int) -> str:
+        """Случайная ячейка листа k (или «Входа», если у листа нет ячеек)."""
+        if k < 0 or counts[k] == 0:
+            return input_ref()
+        i = rnd.randrange(counts[k])
+        return f"{names[k]}!{column_to_letter(i // chain_depth + 1)}{i % chain_depth + 1}"
+
+    cyclic = set(rnd.sample(range(formulas_total), min(cycles, formulas_total))) if cycles else set()
+    offset = 0
+    for k, (name, count) in enumerate(zip(names, counts)):
+        columns = _sheet_shape(count, chain_depth)
+        rows = min(count, chain_depth) or 1
+        values = [[None] * columns for _ in range(rows)]
+        formulas = [[''] * columns for _ in range(rows)]
+        for i in range(count):
+            col, row = i // chain_depth + 1, i % chain_depth + 1
+            refs = [f"{column_to_letter(col)}{row - 1}" if row > 1 else input_ref()]
+            for _ in range(fan_in - 1):
+                if rnd.random() < cross_sheet_ratio:
+                    refs.append(sheet_ref(k - 1))
+                elif col > 1:
+                    refs.append(f"{column_to_letter(col - 1)}{rnd.randint(1, chain_depth)}")
+                else:
+                    refs.append(input_ref())
+            weight = f"{1 / len(refs):.6g}"  # Среднее ссылок: значения не растут от столбца к столбцу
+            terms = [f"{ref}*{weight}" for ref in refs]
+            if len(refs) > 1 and rnd.random() < range_density:
+                if col > 1:
+                    top = rnd.randint(1, chain_depth)
+                    bottom = min(chain_depth, top + rnd.randint(1, MAX_RANGE - 1))
+                    letter = column_to_letter(col - 1)
+                    terms[-1] = f"AVERAGE({letter}{top}:{letter}{bottom})*{weight}"
+                else:
+                    top = rnd.randint(1, inputs)
+                    bottom = min(inputs, top + rnd.randint(1, MAX_RANGE - 1))
+                    terms[-1] = f"AVERAGE({INPUT_SHEET}!A{top}:A{bottom})*{weight}"
+            if offset + i in cyclic and row < chain_depth and i + 1 < count:
+                terms.append(f"{column_to_letter(col)}{row + 1}*0.1")  # Ячейка ниже ссылается на эту
+            formulas[row - 1][col - 1] = f"={'+'.join(terms)}+1"
+        offset += count
+        raw[name] = {'values': values, 'formulas': formulas}
+    return raw
+
+
+def generate_workbook(cells: int, **kwargs) -> dict:
+    """Синтетическая книга в формате all_sheets (параметры — как у generate_raw_sheets)."""
+    from src.loader import split_into_constants_and_formulas  # Тянет xlwings
+    return split_into_constants_and_formulas(generate_raw_sheets(cells, **kwargs))
+
+
+def write_xlsx(path: str, raw_sheets: dict) -> str:
+    """
+    Сохраняет книгу в формате read_excel_file в .xlsx. Формулы пишутся без
+    вычисленных значений — Excel пересчитает их при открытии.
+    """
+    with XlsxStreamWriter(path) as book:
+        for name, content in raw_sheets.items():
+            with book.sheet(name) as sheet:
+                for row, (values, formulas) in enumerate(zip(content['values'], content['formulas']), start=1):
+                    cells = []
+                    for col, (value, formula) in enumerate(zip(values, formulas), start=1):
+                        if isinstance(formula, str) and formula.startswith('='):
+                            cells.append((col, None, formula))
+                        elif value is not None:
+                            cells.append((col, value))
+                    if cells:
+                        sheet.write_row(row, cells)
+    return path
@@ -0,0 +1,271 @@
+# src/writer.py
+
+"""
+Модуль writer:
+- XlsxStreamWriter(path): потоковая запись .xlsx без Excel и без построения документа в памяти
+    * with writer.sheet(name) as sheet: sheet.write_row(row, cells)
+    * close()
+- excel_serial(value): дата -> последовательное число Excel (остальное без изменений)
+- write_results(path, all_sheets, values, formulas=False) -> str
+    Записывает вычисленные значения книги (и, по желанию, исходные формулы) в новый файл.
+
+Файл .xlsx — это zip-архив с XML-частями. Каждый лист пишется прямо в свою запись
+архива построчно, поэтому в памяти держится только текущая строка, а не весь лист.
+Строки записываются как inlineStr (без общей таблицы строк), так что запись
+однопроходная. Листы пишутся по одному: так устроен zipfile.
+write_results берёт ячейки листа в порядке словаря data, если он уже построчный
+(так его заполняет loader); иначе сортирует только упакованные номера ячеек
+(NumPy, по 8 байт на ячейку), а не кортежи со значениями.
+"""
+
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime, date
+from numbers import Integral, Real
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from src.errors import ExcelError
+from src.ranges import column_to_letter, parse_cell, RangeRef
+
+EXCEL_EPOCH = datetime(1899, 12, 30)  # Нулевой день последовательных дат Excel
+MAX_SHEET_NAME = 31  # Ограничение Excel на длину имени листа
+_COLUMN_BITS = 14    # Номер столбца Excel (до 16384) в упакованном номере ячейки row << 14 | col
+_ORDER_BLOCK = 65536  # По сколько ячеек разворачивать отсортированный порядок
+_FORBIDDEN_IN_NAME = set('[]:*?/\\')
+
+_CONTENT_TYPES_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '</styleSheet>'
+)
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+def excel_serial(value):
+    """Дату (например, из xlwings) переводит в последовательное число Excel, остальное не меняет."""
+    if isinstance(value, datetime):
+        return (value - EXCEL_EPOCH).total_seconds() / 86400
+    if isinstance(value, date):
+        return float((value - EXCEL_EPOCH.date()).days)
+    return value
+
+
+def _cell_xml(ref: str, value, formula: str = None) -> str:
+    """XML одной ячейки; пустая ячейка без формулы не записывается."""
+    f = f"<f>{escape(formula.lstrip('='))}</f>" if formula else ''
+    if isinstance(value, RangeRef):
+        value = value.value(0, 0)  # Формула-диапазон: как в Excel без «разлива», левая верхняя ячейка
+    value = excel_serial(value)
+    if value is None:
+        return f'<c r="{ref}">{f}</c>' if f else ''
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b">{f}<v>{int(value)}</v></c>'
+    if isinstance(value, Integral):
+        return f'<c r="{ref}">{f}<v>{int(value)}</v></c>'
+    if isinstance(value, Real):
+        value = float(value)  # В том числе числа NumPy
+        if value != value or value in (float('inf'), float('-inf')):
+            return f'<c r="{ref}" t="e">{f}<v>#NUM!</v></c>'
+        return f'<c r="{ref}">{f}<v>{value!r}</v></c>'
+    if isinstance(value, ExcelError):
+        return f'<c r="{ref}" t="e">{f}<v>{escape(value.code)}</v></c>'
+    text = escape(str(value))
+    if f:
+        return f'<c r="{ref}" t="str">{f}<v>{text}</v></c>'
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+class _SheetStream:
+    """Открытый для записи лист: строки записываются по возрастанию номера."""
+
+    def __init__(self, handle):
+        self._handle = handle
+        self._last_row = 0
+
+    def write_row(self, row: int, cells):
+        """
+        Записывает строку row. cells — пары (номер столбца, значение)
+        или тройки (номер столбца, значение, формула) по возрастанию столбца.
+        """
+        if row <= self._last_row:
+            raise ValueError(f"Строки нужно записывать по возрастанию: {row} после {self._last_row}")
+        self._last_row = row
+        parts = [f'<row r="{row}">']
+        for cell in cells:
+            col, value = cell[0], cell[1]
+            formula = cell[2] if len(cell) > 2 else None
+            parts.append(_cell_xml(f"{column_to_letter(col)}{row}", value, formula))
+        parts.append('</row>')
+        self._handle.write(''.join(parts).encode('utf-8'))
+
+
+class XlsxStreamWriter:
+    """
+    Потоковая запись книги .xlsx. Пример:
+        with XlsxStreamWriter('out.xlsx') as book:
+            with book.sheet('Итог') as sheet:
+                sheet.write_row(1, [(1, 'Выручка'), (2, 1500.0)])
+    """
+
+    def __init__(self, path: str, compresslevel: int = 1):
+        self.path = path
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=compresslevel)
+        self._sheets = []
+        self._open = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def sheet(self, name: str):
+        """Открывает новый лист; одновременно может быть открыт только один."""
+        if self._open:
+            raise RuntimeError("Предыдущий лист ещё не закрыт")
+        if not name or len(name) > MAX_SHEET_NAME or _FORBIDDEN_IN_NAME & set(name):
+            raise ValueError(f"Недопустимое имя листа: {name!r}")
+        if name in self._sheets:
+            raise ValueError(f"Лист {name!r} уже записан")
+        self._sheets.append(name)
+        part = f"xl/worksheets/sheet{len(self._sheets)}.xml"
+        self._open = True
+        try:
+            with self._zip.open(part, 'w', force_zip64=True) as handle:
+                handle.write(_SHEET_HEAD.encode('utf-8'))
+                yield _SheetStream(handle)
+                handle.write(_SHEET_TAIL.encode('utf-8'))
+        finally:
+            self._open = False
+
+    def close(self):
+        """Дописывает служебные части книги и закрывает архив."""
+        if self._zip is None:
+            return
+        if not self._sheets:
+            with self.sheet('Лист1'):  # В книге должен быть хотя бы один лист
+                pass
+        sheets = self._sheets
+        overrides = ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in range(1, len(sheets) + 1))
+        workbook = (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + ''.join(f'<sheet name="{escape(name, {chr(34): "&quot;"})}" sheetId="{i}" r:id="rId{i}"/>'
+                      for i, name in enumerate(sheets, start=1))
+            + '</sheets></workbook>')
+        rels = (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + ''.join(f'<Relationship Id="rId{i}" '
+                      'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                      f'Target="worksheets/sheet{i}.xml"/>' for i in range(1, len(sheets) + 1))
+            + f'<Relationship Id="rId{len(sheets) + 1}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+            'Target="styles.xml"/></Relationships>')
+        self._zip.writestr('[Content_Types].xml', _CONTENT_TYPES_HEAD + overrides + '</Types>')
+        self._zip.writestr('_rels/.rels', _ROOT_RELS)
+        self._zip.writestr('xl/workbook.xml', workbook)
+        self._zip.writestr('xl/_rels/workbook.xml.rels', rels)
+        self._zip.writestr('xl/styles.xml', _STYLES)
+        self._zip.close()
+        self._zip = None
+
+
+def _cell_key(addr: str) -> int:
+    row, col = parse_cell(addr)
+    return (row << _COLUMN_BITS) | (col - 1)
+
+
+def _cells_in_order(data: dict):
+    """
+    Ячейки листа построчно: (строка, столбец, адрес). Если data уже упорядочен
+    так, ячейки выдаются в его порядке без копирования; иначе сортируются
+    упакованные номера ячеек, а адреса берутся по индексу.
+    """
+    previous = -1
+    for addr in data:
+        key = _cell_key(addr)
+        if key <= previous:
+            break
+        previous = key
+    else:
+        for addr in data:
+            row, col = parse_cell(addr)
+            yield row, col, addr
+        return
+    addrs = list(data)
+    keys = np.fromiter(map(_cell_key, addrs), dtype=np.int64, count=len(addrs))
+    order = np.argsort(keys, kind='stable')
+    mask = (1 << _COLUMN_BITS) - 1
+    for start in range(0, len(order), _ORDER_BLOCK):  # Списки Python — только на блок
+        block = order[start:start + _ORDER_BLOCK]
+        for i, key in zip(block.tolist(), keys[block].tolist()):
+            yield key >> _COLUMN_BITS, (key & mask) + 1, addrs[i]
+
+
+def _sheet_rows(sheet: str, content: dict, values: dict, formulas: bool):
+    """Строки листа по возрастанию: (номер строки, [(столбец, значение[, формула]), ...])."""
+    current, row_cells = None, []
+    for row, col, addr in _cells_in_order(content['data']):
+        if row != current:
+            if row_cells:
+                yield current, row_cells
+            current, row_cells = row, []
+        if addr in content['formulas']:
+            value = values.get(f"{sheet}!{addr}")
+            row_cells.append((col, value, content['formulas'][addr]) if formulas else (col, value))
+        else:
+            row_cells.append((col, content['constants'].get(addr, content['data'][addr])))
+    if row_cells:
+        yield current, row_cells
+
+
+def write_results(path: str, all_sheets: dict, values, formulas: bool = False) -> str:
+    """
+    Записывает книгу с вычисленными значениями в path.
+    - values: результаты вычисления {'Лист!A1': значение} (контекст evaluate_workbook
+      или словарь evaluate_partitioned)
+    - formulas: записать и исходные формулы (Excel пересчитает их при открытии),
+      иначе в файле будут только значения
+    Возвращает путь к файлу.
+    """
+    with XlsxStreamWriter(path) as book:
+        for sheet, content in all_sheets.items():
+            with book.sheet(sheet) as stream:
+                for row, cells in _sheet_rows(sheet, content, values, formulas):
+                    stream.write_row(row, cells)
+    return path
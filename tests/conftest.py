@@ -28,3 +28,16 @@ def sheets():
             }
 
     return shts
+
+
+@pytest.fixture
+def make_sheet():
+    """
+    Фабрика листа в формате split_into_constants_and_formulas:
+    строки, начинающиеся с '=', — формулы, остальное — константы.
+    """
+    def make(data: dict, calculated: dict = None) -> dict:
+        formulas = {addr: v for addr, v in data.items() if isinstance(v, str) and v.startswith('=')}
+        constants = {addr: v for addr, v in data.items() if addr not in formulas}
+        return {'data': dict(data), 'constants': constants, 'formulas': formulas, 'calculated': calculated or {}}
+    return make
@@ -27,6 +27,22 @@ from src.evaluator import evaluate_ast
 
     # Межлистовые ссылки
     ("=Sheet1!A1+Sheet2!B2", {"Sheet1!A1": 3, "Sheet2!B2": 4}, 7),
+    ("='My Sheet'!$A$1*2", {"My Sheet!A1": 3}, 6),
+
+    # Диапазоны и функции поиска
+    ("=SUM(A1:A3)", {"A1": 1, "A2": 2, "A3": 3}, 6),
+    ("=VLOOKUP(2, A1:B2, 2, FALSE)", {"A1": 1, "B1": "x", "A2": 2, "B2": "y"}, "y"),
+    ("=INDEX(A1:B2, 2, 1)+MATCH(\"y\", B1:B2, 0)", {"A1": 1, "B1": "x", "A2": 2, "B2": "y"}, 4),
+
+    # Степень, проценты и склейка строк
+    ("=-2^2", {}, 4),
+    ("=50%", {}, 0.5),
+    ("=\"a\"&A1", {"A1": "b"}, "ab"),
+
+    # Унарный плюс
+    ("=+A1", {"A1": 4}, 4),
+    ("=1++2", {}, 3),
+    ("=-+2*3", {}, -6),
 ])
 def test_parse_and_evaluate(formula, context, expected):
     node = parse_formula(formula)
@@ -39,5 +55,47 @@ def test_parse_and_evaluate(formula, context, expected):
 
 def test_invalid_syntax_raises():
     with pytest.raises(Exception):
-        parse_formula("=1++2")  # синтаксическая ошибка
+        parse_formula("=1+*2")  # синтаксическая ошибка
+
+
+def test_whole_column_and_row_references():
+    """
+    Ссылки на целые столбцы и строки: без книги занимают лист Excel целиком,
+    в compile_formulas ограничиваются заполненной частью листа.
+    """
+    from src.ast_builder import compile_formulas
+    from src.model import evaluate_workbook
+    from src.ranges import MAX_ROWS, MAX_COLUMNS
+    assert parse_formula("=SUM($A:B)").args[0].bounds == (1, 1, MAX_ROWS, 2)
+    assert parse_formula("=SUM(Лист!2:3)").args[0].bounds == (2, 1, 3, MAX_COLUMNS)
+
+    formulas = {'C1': '=SUM(A:A)', 'C2': '=COUNTIF(1:1,">0")', 'C3': '=SUM(Данные!B:B)'}
+    sheets = {
+        'Лист': {'data': {'A1': 1.0, 'A2': 2.0, 'A5': 3.0, 'B1': 4.0, **formulas},
+                 'constants': {'A1': 1.0, 'A2': 2.0, 'A5': 3.0, 'B1': 4.0}, 'formulas': formulas},
+        'Данные': {'data': {'B7': 10.0}, 'constants': {'B7': 10.0}, 'formulas': {}},
+    }
+    compiled = compile_formulas(sheets)
+    assert compiled['Лист!C1'].args[0].ref == 'Лист!A1:A5', compiled['Лист!C1'].args[0].ref
+    assert compiled['Лист!C3'].args[0].ref == 'Данные!B1:B7'
+    context = evaluate_workbook(sheets)
+    assert context['Лист!C1'] == 6, context['Лист!C1']
+    assert context['Лист!C2'] == 3, context['Лист!C2']  # A1, B1 и C1
+    assert context['Лист!C3'] == 10
+    # Часть книги без листа «Данные»: размер листа передаётся через extents
+    part = {'Лист': sheets['Лист']}
+    assert compile_formulas(part)['Лист!C3'].args[0].bounds == (1, 2, MAX_ROWS, 2)
+    assert compile_formulas(part, extents={'Данные': (7, 2)})['Лист!C3'].args[0].ref == 'Данные!B1:B7'
+
 
+def test_compile_formulas_collects_errors():
+    """Неразбираемая формула не прерывает разбор книги: ячейка получает #NAME?, ошибка — в errors."""
+    from src.ast_builder import compile_formulas
+    from src.errors import NAME
+    formulas = {'A1': '=1+', 'A2': '=2*3'}
+    sheets = {'Лист': {'data': dict(formulas), 'constants': {}, 'formulas': formulas}}
+    errors = []
+    compiled = compile_formulas(sheets, errors)
+    assert compiled['Лист!A1'].eval({}) is NAME
+    assert compiled['Лист!A2'].eval({}) == 6
+    assert [cell for cell, _ in errors] == ['Лист!A1'], errors
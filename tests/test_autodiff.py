@@ -0,0 +1,79 @@
+# tests/test_autodiff.py
+
+import numpy as np
+import pytest
+from src.autodiff import Dual, SensitivityModel, sensitivities
+from src.evaluator import BinaryOpNode, ConstantNode, FunctionNode
+from src.errors import DIV0
+from src.scenarios import ScenarioModel
+from src.synthetic import generate_workbook
+
+
+@pytest.fixture
+def pricing(make_sheet):
+    """Выручка = цена * объём ^ 0.9; маржа учитывает MAX, IF, деление и степень входа."""
+    return {
+        'Вход': make_sheet({'A1': 120.0, 'A2': 50.0, 'A3': 0.3}),
+        'Итог': make_sheet({
+            'A1': '=Вход!A1*Вход!A2^0.9',
+            'A2': '=A1*(1-Вход!A3)-MAX(Вход!A2*2,10)',
+            'A3': '=IF(A2>0,A2/A1,0)',
+            'A4': '=SUM(A1:A2)+AVERAGE(Вход!A1:A3)',
+            'A5': '=2^Вход!A3',
+            'A6': '=A2/(Вход!A3-0.3)',
+        }),
+    }
+
+
+def test_dual_arithmetic():
+    """Производные операторов и функций совпадают с аналитическими."""
+    x, y = Dual(3.0, np.array([1.0, 0.0])), Dual(2.0, np.array([0.0, 1.0]))
+    node = BinaryOpNode('^', ConstantNode(x), ConstantNode(y))
+    result = node.eval({})
+    assert result == 9.0 and result.tangent == pytest.approx([2 * 3.0, 9.0 * np.log(3.0)])
+    result = (1 - x / y) * 4
+    assert result == pytest.approx(-2.0) and result.tangent == pytest.approx([-2.0, 3.0])
+    total = FunctionNode('SUM', [ConstantNode(x), ConstantNode(y), ConstantNode(1)]).eval({})
+    assert total == 6.0 and total.tangent == pytest.approx([1.0, 1.0])
+    assert FunctionNode('MAX', [ConstantNode(x), ConstantNode(y)]).eval({}) is x
+    assert BinaryOpNode('/', ConstantNode(x), ConstantNode(0)).eval({}) is DIV0
+    assert BinaryOpNode('&', ConstantNode(Dual(2.0, np.zeros(2))), ConstantNode('шт')).eval({}) == '2шт'
+
+
+def test_matches_finite_differences(pricing):
+    """Матрица чувствительности совпадает с конечными разностями, ошибки дают строку NaN."""
+    inputs = ['Вход!A1', 'Вход!A2', 'Вход!A3']
+    outputs = ['Итог!A1', 'Итог!A2', 'Итог!A3', 'Итог!A4', 'Итог!A5', 'Итог!A6']
+    report = sensitivities(pricing, inputs, outputs)
+    model = ScenarioModel(pricing, inputs, outputs)
+    base = dict(report.point)
+    before = model.evaluate(base)
+    for j, cell in enumerate(inputs):
+        step = 1e-6 * abs(base[cell])
+        after = model.evaluate({**base, cell: base[cell] + step})
+        for i, output in enumerate(outputs[:5]):
+            expected = (after[output] - before[output]) / step
+            assert report.matrix[i, j] == pytest.approx(expected, rel=1e-4, abs=1e-6), f"d{output}/d{cell}"
+    assert report.values['Итог!A6'] is DIV0 and np.isnan(report.matrix[5]).all()
+    assert report.as_dict()['Итог!A5']['Вход!A1'] == 0.0
+    assert report.elasticity()[0, 0] == pytest.approx(1.0), "выручка пропорциональна цене"
+    assert 'Итог!A2' in report.format()
+
+
+def test_jacobian_on_synthetic_workbook(make_sheet):
+    """Одно вычисление с дуальными числами даёт то же, что пересчёт по каждому входу."""
+    all_sheets = generate_workbook(600, seed=4)
+    inputs = [f"Вход!{addr}" for addr in list(all_sheets['Вход']['constants'])[:4]]
+    outputs = [f"Лист2!{addr}" for addr in list(all_sheets['Лист2']['formulas'])[-3:]]
+    model = SensitivityModel(all_sheets, inputs, outputs)
+    values, matrix = model.jacobian()
+    plain = model.evaluate(model.base)  # После производных модель снова считает обычные числа
+    for output in outputs:
+        assert values[output] == pytest.approx(plain[output]) and type(plain[output]) is float
+    for j, cell in enumerate(inputs):
+        shifted = model.evaluate({**model.base, cell: model.base[cell] + 1e-6})
+        numeric = [(shifted[o] - plain[o]) / 1e-6 for o in outputs]
+        assert matrix[:, j] == pytest.approx(numeric, rel=1e-4, abs=1e-8), cell
+    with pytest.raises(ValueError):
+        SensitivityModel({'Вход': make_sheet({'A1': 'текст'}), 'Итог': make_sheet({'A1': '=Вход!A1&"!"'})},
+                         ['Вход!A1'], ['Итог!A1'])
@@ -0,0 +1,49 @@
+# tests/test_cache.py
+
+import os
+import pickle
+
+import pytest
+from src.ast_builder import compile_formulas
+from src.cache import cache_path, save_model, read_model, load_model, clear_cache
+from src.model import evaluate_workbook, workbook_values, evaluate_components
+from src.ranges import CalcContext
+from src.synthetic import generate_workbook
+
+
+def test_model_roundtrip(tmp_path):
+    """Сохранённая и прочитанная модель вычисляется так же, как исходная книга."""
+    all_sheets = generate_workbook(300, seed=3)
+    path = save_model(str(tmp_path / 'book.model'), all_sheets, compile_formulas(all_sheets))
+    sheets, formulas = read_model(path)
+    assert sheets == all_sheets
+    context = evaluate_components(sheets, formulas, CalcContext(workbook_values(sheets)))
+    expected = evaluate_workbook(all_sheets)
+    for cell in formulas:
+        assert context[cell] == pytest.approx(expected[cell]), f"{cell}: {context[cell]} != {expected[cell]}"
+    assert load_model(path)[0] == sheets, "load_model должен читать файл .model напрямую"
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')], "временный файл не удалён"
+
+
+def test_version_mismatch(tmp_path):
+    """Модель, записанная другой версией кэша, не читается."""
+    path = tmp_path / 'old.model'
+    with open(path, 'wb') as handle:
+        pickle.dump((0, {}, {}), handle)
+    with pytest.raises(ValueError):
+        read_model(str(path))
+
+
+def test_cache_path_follows_file(tmp_path, monkeypatch):
+    """Ключ кэша меняется вместе с файлом книги; clear_cache удаляет записи."""
+    monkeypatch.setenv('EXCEL_TO_PYTHON_CACHE', str(tmp_path / 'cache'))
+    book = tmp_path / 'book.xlsx'
+    book.write_bytes(b'one')
+    first = cache_path(str(book))
+    assert first.startswith(str(tmp_path / 'cache')) and first.endswith('.model')
+    assert cache_path(str(book)) == first
+    book.write_bytes(b'second version')
+    assert cache_path(str(book)) != first, "после изменения книги кэш должен стать другим"
+    save_model(first, {}, {})
+    assert clear_cache() == 1
+    assert clear_cache() == 0
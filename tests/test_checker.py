@@ -0,0 +1,70 @@
+# tests/test_checker.py
+
+from datetime import datetime
+
+import pytest
+from src.checker import compare_values, check_workbook
+from src.errors import DIV0
+
+
+def test_compare_values():
+    """
+    Числа сравниваются с допуском, текст — точно, ошибки — по коду,
+    None из xlwings совпадает с ошибкой, даты — как числа Excel.
+    """
+    expected = [1.0, 100.0, 'abc', '#DIV/0!', None, True, datetime(2024, 1, 1), 5]
+    actual = [1.0 + 1e-12, 100.5, 'abc', DIV0, DIV0, True, 45292, '5']
+    ok = compare_values(expected, actual, rtol=1e-9, atol=1e-9)
+    assert ok.tolist() == [True, False, True, True, True, True, True, False]
+    assert compare_values([100.0], [100.5], rtol=0.01, atol=0).tolist() == [True]
+
+
+@pytest.fixture
+def workbook(make_sheet):
+    """
+    В Excel B1 был посчитан иначе (например, ячейка A1 изменена после сохранения),
+    поэтому расходятся B1 и всё, что от неё зависит; C5 расходится сама по себе.
+    """
+    return {
+        'Вход': make_sheet({'A1': 10, 'A2': 2}),
+        'Расчёт': make_sheet(
+            {'B1': '=Вход!A1*2', 'B2': '=B1+1', 'B3': '=B2*Вход!A2', 'C5': '=Вход!A2+1', 'C6': '=Вход!A2'},
+            {'B1': 18, 'B2': 19, 'B3': 38, 'C5': 4, 'C6': 2},
+        ),
+    }
+
+
+@pytest.mark.parametrize('processes', [0, 2])
+def test_check_workbook_ranks_by_impact(workbook, processes):
+    """
+    Расхождения отсортированы по числу зависимых ячеек, первопричины помечены.
+    """
+    report = check_workbook(workbook, processes=processes)
+    assert report.checked == 5 and report.matched == 1 and not report.ok
+    assert [row['cell'] for row in report.mismatches] == ['Расчёт!B1', 'Расчёт!B2', 'Расчёт!B3', 'Расчёт!C5']
+    assert [row['dependents'] for row in report.mismatches] == [2, 1, 0, 0]
+    assert [row['cell'] for row in report.roots] == ['Расчёт!B1', 'Расчёт!C5']
+    assert report.by_sheet == {'Расчёт': 4}
+    assert 'расхождений: 4' in report.format()
+
+
+def test_check_workbook_all_match(workbook):
+    """
+    Если сохранённые значения совпадают с вычисленными, отчёт пустой.
+    """
+    workbook['Расчёт']['calculated'] = {'B1': 20, 'B2': 21, 'B3': 42, 'C5': 3, 'C6': 2}
+    report = check_workbook(workbook, processes=0)
+    assert report.ok and report.matched == 5
+
+
+@pytest.mark.parametrize('processes, iterative', [(0, False), (2, False), (0, True)])
+def test_check_workbook_uses_given_formulas(workbook, processes, iterative):
+    """
+    Уже разобранные формулы (например, из файла .model) используются как есть,
+    а не разбираются заново из текста книги.
+    """
+    from src.ast_builder import compile_formulas, parse_formula
+    formulas = compile_formulas(workbook)
+    formulas['Расчёт!B1'] = parse_formula('=Вход!A1*2-2', 'Расчёт')  # Как посчитал Excel
+    report = check_workbook(workbook, processes=processes, iterative=iterative, formulas=formulas)
+    assert [row['cell'] for row in report.mismatches] == ['Расчёт!C5'], report.mismatches
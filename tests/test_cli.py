@@ -0,0 +1,70 @@
+# tests/test_cli.py
+
+import csv
+import subprocess
+import sys
+import zipfile
+
+import pytest
+from src.ast_builder import compile_formulas
+from src.cache import save_model
+from src.cli import main, build_parser
+from src.model import evaluate_workbook
+from src.synthetic import generate_workbook
+
+
+@pytest.fixture
+def model(tmp_path):
+    """Синтетическая модель в файле .model и ожидаемые значения."""
+    all_sheets = generate_workbook(200, seed=1)
+    path = save_model(str(tmp_path / 'book.model'), all_sheets, compile_formulas(all_sheets))
+    return path, evaluate_workbook(all_sheets), all_sheets
+
+
+def test_load_and_eval(model, capsys):
+    """load печатает листы, eval --cells — значения запрошенных ячеек."""
+    path, expected, all_sheets = model
+    assert main(['load', path]) == 0
+    out = capsys.readouterr().out
+    assert all(sheet in out for sheet in all_sheets), out
+    cell = next(f"{sheet}!{addr}" for sheet, content in all_sheets.items() for addr in content['formulas'])
+    assert main(['eval', path, '--cells', cell]) == 0
+    name, value = capsys.readouterr().out.strip().split('\t')
+    assert name == cell and float(value) == pytest.approx(expected[cell])
+    assert main(['--metrics', 'eval', path, '--profile', '3']) == 0
+    captured = capsys.readouterr()
+    assert 'evaluate' in captured.err and 'Всего' in captured.out
+
+
+def test_export(model, tmp_path):
+    """export пишет значения всех формул в CSV и книгу .xlsx."""
+    path, expected, all_sheets = model
+    output = tmp_path / 'values.csv'
+    assert main(['export', path, '-o', str(output)]) == 0
+    with open(output, encoding='utf-8') as handle:
+        rows = list(csv.reader(handle))[1:]
+    cells = {f"{sheet}!{addr}" for sheet, content in all_sheets.items() for addr in content['formulas']}
+    assert {cell for cell, _ in rows} == cells, "в CSV должны попасть все формулы"
+    for cell, value in rows:
+        assert float(value) == pytest.approx(expected[cell]), f"{cell}: {value}"
+    workbook = tmp_path / 'values.xlsx'
+    assert main(['export', path, '-o', str(workbook)]) == 0
+    assert zipfile.is_zipfile(workbook)
+
+
+def test_arguments():
+    """Разбор аргументов: bench получает всё, что идёт после него; неизвестный аргумент — ошибка."""
+    parser = build_parser()
+    args = parser.parse_args(['eval', 'book.xlsx', '--cells', 'Лист1!A1', 'Лист1!B2', '--no-cache'])
+    assert args.cells == ['Лист1!A1', 'Лист1!B2'] and args.no_cache and not args.iterative
+    with pytest.raises(SystemExit):
+        main(['load', 'book.model', '--unknown'])
+
+
+def test_help_is_light():
+    """--help не импортирует xlwings, pandas, Lark и NumPy."""
+    code = ("import sys; from src.cli import build_parser; build_parser().format_help(); "
+            "print(sorted(m for m in ('xlwings', 'pandas', 'lark', 'numpy') if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=__file__.rsplit('tests', 1)[0])
+    assert result.stdout.strip() == '[]', f"при запуске импортированы: {result.stdout}"
@@ -0,0 +1,93 @@
+# tests/test_columnar.py
+
+import numpy as np
+import pytest
+from src.columnar import (sheet_columns, export_sheets, export_scenarios, ScenarioSink,
+                          TEXT_SUFFIX, BOOLEAN_SUFFIX, ERROR_SUFFIX)
+from src.errors import DIV0, NA
+from src.model import evaluate_workbook
+
+ALL_SHEETS = {
+    'Вход': {'data': {'A1': 10, 'A2': 'шт', 'B1': True}, 'constants': {'A1': 10, 'A2': 'шт', 'B1': True},
+             'formulas': {}, 'calculated': {}},
+    'Итог': {'data': {'A1': '=Вход!A1*2', 'A2': '=A1/0'}, 'constants': {},
+             'formulas': {'A1': '=Вход!A1*2', 'A2': '=A1/0'}, 'calculated': {}},
+}
+
+
+def test_sheet_columns():
+    """
+    Каждое значение попадает в столбец своего типа; формулы сохраняются рядом со значением.
+    """
+    values = evaluate_workbook(ALL_SHEETS)
+    inputs = sheet_columns('Вход', ALL_SHEETS['Вход'], values)
+    assert inputs['cell'] == ['A1', 'B1', 'A2'], f"Ожидался порядок по строкам, получено {inputs['cell']}"
+    assert inputs['row'].tolist() == [1, 1, 2] and inputs['col'].tolist() == [1, 2, 1]
+    assert inputs['number_valid'].tolist() == [True, False, False]
+    assert inputs['number'][0] == 10
+    assert inputs['boolean'] == [None, True, None]
+    assert inputs['text'] == [None, None, 'шт']
+
+    results = sheet_columns('Итог', ALL_SHEETS['Итог'], values)
+    assert results['formula'] == ['=Вход!A1*2', '=A1/0']
+    assert results['number'][0] == 20 and results['number_valid'].tolist() == [True, False]
+    assert results['error'] == [None, '#DIV/0!']
+
+
+def test_export_sheets_roundtrip(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    values = evaluate_workbook(ALL_SHEETS)
+    for name, read in (('cells.parquet', pq.read_table), ('cells.arrow', lambda p: pa.ipc.open_file(p).read_all())):
+        path = export_sheets(str(tmp_path / name), ALL_SHEETS, values, chunk_size=2)
+        table = read(path)
+        assert table.num_rows == 5, f"Ожидалось 5 ячеек, получено {table.num_rows}"
+        assert table.schema.field('number').type == pa.float64()
+        rows = {(r['sheet'], r['cell']): r for r in table.to_pylist()}
+        assert rows[('Итог', 'A1')]['number'] == 20
+        assert rows[('Итог', 'A2')]['error'] == '#DIV/0!' and rows[('Итог', 'A2')]['number'] is None
+        assert rows[('Вход', 'B1')]['boolean'] is True
+
+
+def test_export_scenarios(tmp_path):
+    """
+    Пакеты сценариев пишутся в один файл; у каждой ячейки столбцы числа, текста, логического и ошибки.
+    """
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    batches = [
+        {'Вход!A1': np.array([1.0, 2.0]), 'Итог!A1': [2.0, NA], 'Итог!B1': ['a', 'b']},
+        {'Вход!A1': np.array([3.0]), 'Итог!A1': [6.0], 'Итог!B1': ['c']},
+    ]
+    path = export_scenarios(str(tmp_path / 'scenarios.parquet'), batches)
+    table = pq.read_table(path)
+    assert table.column_names[:4] == ['Вход!A1', 'Вход!A1' + TEXT_SUFFIX, 'Вход!A1' + BOOLEAN_SUFFIX,
+                                      'Вход!A1' + ERROR_SUFFIX], table.column_names
+    assert table.num_columns == 12, f"Ожидалось по 4 столбца на ячейку, получено {table.column_names}"
+    assert table.column('Вход!A1').to_pylist() == [1.0, 2.0, 3.0]
+    assert table.column('Итог!A1').to_pylist() == [2.0, None, 6.0]
+    assert table.column('Итог!A1' + ERROR_SUFFIX).to_pylist() == [None, '#N/A', None]
+    assert table.column('Итог!B1' + TEXT_SUFFIX).to_pylist() == ['a', 'b', 'c']
+
+
+def test_scenario_sink_schema_does_not_depend_on_values(tmp_path):
+    """
+    Схема задаётся первым пакетом по именам столбцов: ошибки, текст и логические значения
+    в следующих пакетах (и массив после списка) записываются в тот же файл.
+    """
+    pa = pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'mixed.arrow')
+    with ScenarioSink(path, chunk_size=2, text_columns=['id']) as sink:
+        sink.write({'id': ['1', '2'], 'Итог!A1': [1.0, 2.0]})
+        sink.write({'id': ['3', '4', '5'], 'Итог!A1': [DIV0, 'текст', True]})
+        sink.write({'id': ['6'], 'Итог!A1': np.array([7], dtype=np.int64)})
+        with pytest.raises(ValueError):
+            sink.write({'id': ['7'], 'Итог!B1': [1.0]})
+        assert sink.rows == 6, f"Ожидалось 6 строк, получено {sink.rows}"
+    table = pa.ipc.open_file(path).read_all()
+    assert table.schema.field('id').type == pa.string()
+    assert table.column('id').to_pylist() == ['1', '2', '3', '4', '5', '6']
+    assert table.column('Итог!A1').to_pylist() == [1.0, 2.0, None, None, None, 7.0]
+    assert table.column('Итог!A1' + ERROR_SUFFIX).to_pylist() == [None, None, '#DIV/0!', None, None, None]
+    assert table.column('Итог!A1' + TEXT_SUFFIX).to_pylist()[3] == 'текст'
+    assert table.column('Итог!A1' + BOOLEAN_SUFFIX).to_pylist()[4] is True
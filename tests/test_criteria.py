@@ -0,0 +1,164 @@
+# tests/test_criteria.py
+
+import pytest
+from src.ranges import CalcContext, RangeRef
+from src.criteria import (
+    _FIRST_USE,
+    compile_criterion,
+    sumif,
+    sumifs,
+    countif,
+    countifs,
+    averageif,
+    averageifs,
+)
+from src.ast_builder import parse_formula
+from src.errors import DIV0, VALUE, NA
+
+
+@pytest.fixture
+def sales_ctx():
+    """
+    Таблица продаж A1:C6: товар, склад, сумма.
+    В ней есть пустая ячейка и текст в столбце сумм.
+    """
+    rows = [
+        ('Яблоко', 1, 10.0),
+        ('груша',  1, 20.0),
+        ('яблоко', 2, 30.0),
+        ('Слива',  2, 'н/д'),
+        (None,     1, 50.0),
+        ('Груша',  2, 60.0),
+    ]
+    ctx = CalcContext()
+    for r, (item, store, amount) in enumerate(rows, start=1):
+        ctx[f'A{r}'] = item
+        ctx[f'B{r}'] = store
+        ctx[f'C{r}'] = amount
+    return ctx
+
+
+def rng(ref, ctx):
+    return RangeRef.from_ref(ref, ctx)
+
+
+def test_compile_criterion_is_cached():
+    """
+    Одно и то же условие разбирается один раз: повторный вызов возвращает тот же объект.
+    """
+    assert compile_criterion('>=10') is compile_criterion('>=10')
+    crit = compile_criterion('<>абв')
+    assert crit.op == '<>' and crit.text == 'абв' and crit.key is None
+    assert compile_criterion(5).key == ('n', 5.0)
+    assert compile_criterion('5').key == ('n', 5.0)
+
+
+def test_sumif_countif_averageif(sales_ctx):
+    """
+    Условия с операторами, без учёта регистра, с подстановочными знаками и пустыми ячейками.
+    """
+    items, stores, amounts = rng('A1:A6', sales_ctx), rng('B1:B6', sales_ctx), rng('C1:C6', sales_ctx)
+    assert sumif(items, 'яблоко', amounts) == 40.0
+    assert sumif(amounts, '>15') == 160.0
+    assert countif(items, 'гр*') == 2
+    assert countif(items, '') == 1
+    assert countif(items, '<>слива') == 5
+    assert countif(stores, 2) == 3
+    assert averageif(stores, 2, amounts) == 45.0  # текст 'н/д' не участвует в среднем
+    assert averageif(items, 'вишня', amounts) is DIV0  # нет подходящих значений
+
+
+def test_ifs_functions(sales_ctx):
+    """
+    Несколько условий объединяются по «И».
+    """
+    items, stores, amounts = rng('A1:A6', sales_ctx), rng('B1:B6', sales_ctx), rng('C1:C6', sales_ctx)
+    assert sumifs(amounts, items, 'груша', stores, 2) == 60.0
+    assert sumifs(amounts, items, 'груша', stores, '>=1') == 80.0
+    assert countifs(items, '*', stores, 1) == 2
+    assert averageifs(amounts, stores, 1) == pytest.approx(80.0 / 3)
+
+
+def test_group_index_shared_between_keys(sales_ctx):
+    """
+    SUMIFS с одними и теми же диапазонами, но разными ключами, строит
+    групповой индекс один раз — при втором вызове (первый считается по маскам);
+    изменение ячейки в диапазоне его сбрасывает.
+    """
+    cache = sales_ctx.range_cache
+    expected = {('яблоко', 1): 10.0, ('яблоко', 2): 30.0, ('груша', 1): 20.0, ('груша', 2): 60.0}
+    ast = parse_formula('=SUMIFS(C1:C6, A1:A6, E1, B1:B6, E2)')
+    for (item, store), total in expected.items():
+        sales_ctx['E1'], sales_ctx['E2'] = item, store
+        assert ast.eval(sales_ctx) == total, f"SUMIFS для {item}/{store}"
+    # Первый вызов: отметка индекса и массивы трёх столбцов; дальше — только попадания
+    assert cache.misses == 4, f"Индекс и массивы должны строиться один раз: {cache.misses}"
+
+    sales_ctx['C2'] = 25.0
+    sales_ctx['E1'], sales_ctx['E2'] = 'груша', 1
+    assert ast.eval(sales_ctx) == 25.0
+
+
+def test_plain_lists_without_cache():
+    """
+    Функции работают и с обычными списками — без кэша, через маски.
+    """
+    assert sumif([1, 2, 3, 4], '>2') == 7.0
+    assert countifs([1, 2, 3], '<3', ['a', 'b', 'a'], 'a') == 1
+    assert sumifs([1, 2], [1, 2, 3], 1) is VALUE  # диапазоны разного размера
+    assert countifs([1, 2], '>1', [3]) is VALUE    # условие без пары
+
+
+def test_error_in_sum_range_propagates(sales_ctx):
+    """
+    Ошибка в диапазоне суммирования возвращается, только если строка подходит под условие.
+    """
+    sales_ctx['C3'] = NA
+    items, amounts = rng('A1:A6', sales_ctx), rng('C1:C6', sales_ctx)
+    assert sumif(items, 'яблоко', amounts) is NA
+    assert sumif(items, 'груша', amounts) == 80.0
+    assert sumif(items, 'ябл*', amounts) is NA  # тот же результат по пути с маской
+
+
+def test_results_are_python_floats(sales_ctx):
+    """
+    И групповой индекс, и путь с масками возвращают float Python, а не np.float64:
+    результат SUMIF участвует в арифметике формул.
+    """
+    items, stores, amounts = rng('A1:A6', sales_ctx), rng('B1:B6', sales_ctx), rng('C1:C6', sales_ctx)
+    for value in (sumif(items, 'груша', amounts), sumif(items, 'гр*', amounts),
+                  sumifs(amounts, stores, 2), averageif(stores, 1, amounts)):
+        assert type(value) is float, f"{value!r}: {type(value)}"
+
+
+def test_ranges_must_have_same_shape(sales_ctx):
+    """Диапазоны одинакового размера, но разной формы не сопоставляются (#VALUE!)."""
+    assert sumifs(rng('A1:B3', sales_ctx), rng('A1:C2', sales_ctx), '*') is VALUE
+    assert sumifs(rng('A1:B3', sales_ctx), rng('C1:C6', sales_ctx), '>0') is VALUE
+    assert countifs(rng('A1:B3', sales_ctx), '*', rng('A4:B6', sales_ctx), '*') == 2
+
+
+def test_sumif_resizes_sum_range(sales_ctx):
+    """
+    SUMIF и AVERAGEIF, как Excel, растягивают диапазон суммирования от левой верхней ячейки
+    до размера диапазона условия; SUMIFS и AVERAGEIFS требуют одинаковой формы.
+    """
+    items = rng('A1:A3', sales_ctx)
+    assert sumif(items, 'яблоко', rng('C1', sales_ctx)) == 40.0  # C1:C3
+    assert averageif(items, 'яблоко', rng('C1:C2', sales_ctx)) == 20.0
+    assert averageif(rng('B1:B4', sales_ctx), 2, rng('C1:C6', sales_ctx)) == 30.0  # C1:C4, 'н/д' не число
+    assert sumif([1, 2, 3], '>1', [10]) == 0.0 and sumif([1, 2, 3], '<3', [10, 20, 30, 40]) == 30.0
+    assert sumifs(rng('C1', sales_ctx), items, 'яблоко') is VALUE
+    assert averageifs(rng('C1:C2', sales_ctx), items, 'яблоко') is VALUE
+
+
+def test_group_index_only_for_reused_ranges():
+    """
+    Протянутая вниз формула COUNTIF($A$1:Ai,Ai) обращается к каждому диапазону один раз
+    и считается по маскам: групповые индексы не строятся.
+    """
+    ctx = CalcContext({f"A{i}": f"к{i % 7}" for i in range(1, 101)})
+    for i in range(1, 101):
+        assert parse_formula(f"=COUNTIF($A$1:A{i},A{i})").eval(ctx) == (i - 1) // 7 + 1
+    groups = [key for key in ctx.range_cache._entries if key[0] == 'groups']
+    assert all(ctx.range_cache._entries[key] is _FIRST_USE for key in groups), "Индексы не должны строиться"
@@ -0,0 +1,77 @@
+# tests/test_csr_graph.py
+
+import pytest
+from src.csr_graph import CSRGraph
+from src.graph import build_dependency_graph, topological_sort_kahn, CyclicDependencyError
+
+
+@pytest.fixture
+def all_sheets():
+    """
+    Лист с диапазоном, цепочкой и ссылкой на пустую ячейку.
+    """
+    formulas = {'B1': '=SUM(A1:A3)', 'B2': '=B1*2', 'C1': '=B2+B1+D9'}
+    return {
+        'Sheet1': {
+            'data': {'A1': 1, 'A2': 2, 'A3': 3, **formulas},
+            'formulas': formulas,
+        }
+    }
+
+
+def test_from_workbook_matches_dict_graph(all_sheets):
+    """
+    CSR-граф содержит те же вершины и рёбра, что и build_dependency_graph,
+    а представление as_dict() ведёт себя как обычные словари.
+    """
+    graph, indeg = build_dependency_graph(all_sheets)
+    csr = CSRGraph.from_workbook(all_sheets)
+    view, indeg_view = csr.as_dict()
+    assert set(view) == set(graph)
+    for node, deps in graph.items():
+        assert sorted(view[node]) == sorted(deps), f"Зависимости {node} не совпадают"
+        assert indeg_view[node] == indeg[node], f"Входная степень {node} не совпадает"
+    assert csr.num_edges == sum(indeg.values())
+    assert sorted(csr.dependents('Sheet1!B1')) == ['Sheet1!B2', 'Sheet1!C1']
+    # Представление можно передавать в функции, написанные для словарей
+    assert topological_sort_kahn(view, indeg_view)[-1] == 'Sheet1!C1'
+
+
+def test_topological_sort(all_sheets):
+    """
+    Каждая ячейка идёт после всех своих зависимостей.
+    """
+    csr = CSRGraph.from_workbook(all_sheets)
+    order = csr.topological_sort()
+    position = {node: i for i, node in enumerate(order)}
+    assert len(order) == len(csr)
+    for node in order:
+        for dep in csr.precedents(node):
+            assert position[dep] < position[node], f"{dep} должна вычисляться раньше {node}"
+
+
+def test_cycles():
+    """
+    Циклы находятся и перечисляются, сортировка сообщает о них в исключении.
+    """
+    csr = CSRGraph.from_dict({'A': ['B'], 'B': ['A'], 'C': ['A'], 'D': ['D'], 'E': []})
+    assert csr.has_cycle()
+    assert sorted(csr.find_cycles()) == [['A', 'B'], ['D']]
+    with pytest.raises(CyclicDependencyError) as info:
+        csr.topological_order()
+    assert sorted(info.value.cycles) == [['A', 'B'], ['D']]
+    assert not CSRGraph.from_dict({'A': ['B'], 'B': []}).has_cycle()
+
+
+def test_reachable_and_long_chain():
+    """
+    Транзитивные зависимые и предшественники; длинная цепочка обходится без рекурсии.
+    """
+    n = 50_000
+    chain = {f'A{i}': [f'A{i - 1}'] if i > 1 else [] for i in range(1, n + 1)}
+    csr = CSRGraph.from_dict(chain)
+    assert csr.topological_sort() == [f'A{i}' for i in range(1, n + 1)]
+    assert len(csr.reachable(['A1'])) == n - 1
+    assert csr.reachable(['A3'], direction='precedents') == ['A1', 'A2']
+    with pytest.raises(ValueError):
+        csr.reachable(['A1'], direction='вбок')
@@ -0,0 +1,88 @@
+# tests/test_diff.py
+
+import pytest
+from src.ast_builder import parse_formula
+from src.diff import ast_hash, diff_workbooks
+
+
+def test_ast_hash_ignores_formatting():
+    """
+    Пробелы, регистр функций и знаки '$' не меняют хэш; другой оператор или ссылка — меняют.
+    """
+    base = ast_hash(parse_formula('=SUM(A1:A3)*2'))
+    assert ast_hash(parse_formula('= sum( $A$1:A3 ) * 2')) == base
+    assert ast_hash(parse_formula('=SUM(A1:A3)+2')) != base
+    assert ast_hash(parse_formula('=SUM(A1:A4)*2')) != base
+    assert ast_hash(parse_formula('=1+2')) != ast_hash(parse_formula('="1"+2'))
+
+
+@pytest.fixture
+def versions(make_sheet):
+    """
+    Прайс-лист: в новой версии изменились наценка (константа) и формула скидки,
+    а формула цены только переформатирована.
+    """
+    old = {
+        'Вход': make_sheet({'A1': 100, 'A2': 0.2, 'A3': 0.05}),
+        'Цена': make_sheet({
+            'B1': '=Вход!A1*(1+Вход!A2)',
+            'B2': '=B1*(1-Вход!A3)',
+            'B3': '=Вход!A1*2',
+            'B4': '=B2+B3',
+        }),
+    }
+    new = {
+        'Вход': make_sheet({'A1': 100, 'A2': 0.25, 'A3': 0.05}),
+        'Цена': make_sheet({
+            'B1': '= Вход!$A$1 * (1 + Вход!A2)',
+            'B2': '=B1*(1-Вход!A3*2)',
+            'B3': '=Вход!A1*2',
+            'B4': '=B2+B3',
+            'B5': '=B4/2',
+        }),
+    }
+    return old, new
+
+
+def test_diff_workbooks(versions):
+    """
+    Изменения ячеек разложены по видам, изменившиеся значения прослежены до причин.
+    """
+    old, new = versions
+    diff = diff_workbooks(old, new)
+    assert diff.cells['constant'] == ['Вход!A2']
+    assert diff.cells['formula'] == ['Цена!B2']
+    assert diff.cells['added'] == ['Цена!B5']
+    assert diff.reformatted == ['Цена!B1']
+    assert diff.structure == {'Цена!B5': (['Цена!B4'], [])}
+
+    outputs = {row['cell']: row for row in diff.outputs}
+    assert set(outputs) == {'Цена!B1', 'Цена!B2', 'Цена!B4', 'Цена!B5'}, "B3 не изменилась"
+    assert outputs['Цена!B1']['causes'] == ['Вход!A2']
+    assert outputs['Цена!B4']['causes'] == ['Вход!A2', 'Цена!B2']
+    assert outputs['Цена!B1']['old'] == pytest.approx(120) and outputs['Цена!B1']['new'] == pytest.approx(125)
+    assert 'Изменилось значений: 4' in diff.format()
+    assert diff.recalculated == 4, f"B3 не зависит от изменений и не пересчитывается: {diff.recalculated}"
+
+
+def test_diff_recalculates_only_affected_cells(make_sheet):
+    """
+    Новая версия пересчитывается только от изменённых ячеек, но результат совпадает
+    с полным вычислением: удаление константы из диапазона и смена вида ячейки учтены.
+    """
+    from src.model import evaluate_workbook
+    old = {'Лист': make_sheet({'A1': 1, 'A2': 2, 'A3': 3, 'B1': '=SUM(A1:A3)', 'B2': '=B1*2',
+                           'C1': 5, 'C2': '=C1+1', 'C3': '=C2*10'})}
+    new = {'Лист': make_sheet({'A1': 1, 'A3': 3, 'B1': '=SUM(A1:A3)', 'B2': '=B1*2',
+                           'C1': '=2+2', 'C2': '=C1+1', 'C3': '=C2*10'})}
+    diff = diff_workbooks(old, new)
+    assert diff.cells['removed'] == ['Лист!A2'] and diff.cells['kind'] == ['Лист!C1']
+    full = evaluate_workbook(new)
+    changed = {row['cell']: row['new'] for row in diff.outputs}
+    assert changed == {cell: full[cell] for cell in ('Лист!B1', 'Лист!B2', 'Лист!C1', 'Лист!C2', 'Лист!C3')}, changed
+
+    unchanged = {'Лист': make_sheet({'A1': 1, 'A2': 2, 'A3': 3, 'B1': '=SUM(A1:A3)', 'B2': '=B1*2',
+                                 'C1': 6, 'C2': '=C1+1', 'C3': '=C2*10'})}
+    diff = diff_workbooks(old, unchanged)
+    assert diff.recalculated == 2, f"пересчитываются только C2 и C3: {diff.recalculated}"
+    assert [row['cell'] for row in diff.outputs] == ['Лист!C2', 'Лист!C3']
@@ -0,0 +1,24 @@
+# tests/test_errors.py
+
+import pickle
+from src.errors import ExcelError, DIV0, NA, ERRORS, error_from_code, is_error
+
+
+def test_error_singletons():
+    """
+    Ошибки — единственные экземпляры: литерал разбирается в тот же объект,
+    что и константа модуля, а текст совпадает с тем, что показывает Excel.
+    """
+    assert error_from_code('#n/a') is NA
+    assert str(DIV0) == '#DIV/0!'
+    assert set(ERRORS) == {'#DIV/0!', '#N/A', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#NULL!'}
+    assert is_error(NA) and not is_error('#N/A')
+
+
+def test_error_survives_pickling():
+    """
+    При передаче между процессами ошибка восстанавливается как тот же экземпляр.
+    """
+    restored = pickle.loads(pickle.dumps([DIV0, NA]))
+    assert restored[0] is DIV0 and restored[1] is NA
+    assert isinstance(restored[0], ExcelError)
@@ -96,3 +96,197 @@ def test_function_node_if():
         ConstantNode('no')
     ])
     assert node_false.eval({}) == 'no'
+
+
+def test_if_skips_untaken_branch():
+    """
+    IF — ленивая форма: невыбранная ветвь не вычисляется (деление на ноль
+    в ней не вызывает ошибку), а её узлы учитываются в счётчиках.
+    """
+    from src.evaluator import collect_stats
+    expensive = BinaryOpNode('/', ConstantNode(1), ConstantNode(0))  # 3 узла
+    node = FunctionNode('IF', [ConstantNode(True), ConstantNode('ok'), expensive])
+    with collect_stats() as stats:
+        assert node.eval({}) == 'ok'
+    assert stats.skipped_branches == 1
+    assert stats.skipped_nodes == 3
+    node.eval({})
+    assert stats.skipped_branches == 1, "вне collect_stats счётчики не ведутся"
+
+
+def test_lazy_iferror_choose_and_or():
+    """
+    IFERROR вычисляет запасное значение только при ошибке,
+    CHOOSE — только выбранный вариант, AND/OR останавливаются досрочно.
+    """
+    from src.evaluator import collect_stats
+    failing = BinaryOpNode('/', ConstantNode(1), ConstantNode(0))
+    with collect_stats() as stats:
+        assert FunctionNode('IFERROR', [failing, ConstantNode(-1)]).eval({}) == -1
+        assert FunctionNode('IFERROR', [ConstantNode(5), failing]).eval({}) == 5
+        assert FunctionNode('CHOOSE', [ConstantNode(2), failing, ConstantNode('b'), failing]).eval({}) == 'b'
+        assert FunctionNode('AND', [ConstantNode(False), failing]).eval({}) is False
+        assert FunctionNode('OR', [CellNode('A1'), failing]).eval({'A1': 1}) is True
+    assert stats.skipped_branches == 5
+
+
+def test_pull_context_computes_only_needed_cells():
+    """
+    В режиме pull ячейки, нужные только невыбранной ветви, не вычисляются.
+    """
+    from src.evaluator import PullContext, collect_stats
+    from src.ast_builder import parse_formula
+    formulas = {
+        'Sheet1!B1': parse_formula('=IF(A1>0, C1, D1)', 'Sheet1'),
+        'Sheet1!C1': parse_formula('=A1*2', 'Sheet1'),
+        'Sheet1!D1': parse_formula('=E1+1', 'Sheet1'),
+        'Sheet1!E1': parse_formula('=A1/0', 'Sheet1'),
+    }
+    ctx = PullContext({'Sheet1!A1': 5}, formulas)
+    with collect_stats() as stats:
+        assert ctx.get('Sheet1!B1') == 10
+    assert stats.pulled_cells == 2
+    assert stats.skipped_branches == 1, f"прерванные попытки не должны учитываться: {stats.as_dict()}"
+    assert ctx.pending_count() == 2, "D1 и E1 не должны вычисляться"
+
+
+def test_pull_context_deep_chains_and_cycles():
+    """
+    PullContext обходит цепочку зависимостей без рекурсии, а цикл
+    приводит к CyclicDependencyError даже внутри IFERROR.
+    """
+    from src.evaluator import PullContext, collect_stats
+    from src.errors import CyclicDependencyError
+    from src.ast_builder import parse_formula
+    depth = 2000  # Глубже предела рекурсии Python
+    formulas = {f'Sheet1!A{i}': parse_formula(f'=IF(TRUE, A{i + 1}+1, 0)', 'Sheet1') for i in range(1, depth)}
+    ctx = PullContext({f'Sheet1!A{depth}': 0}, formulas)
+    with collect_stats() as stats:
+        assert ctx.get('Sheet1!A1') == depth - 1
+    assert ctx.pending_count() == 0
+    assert stats.pulled_cells == depth - 1, stats.as_dict()
+    assert stats.skipped_branches == depth - 1, f"прерванные попытки учтены дважды: {stats.as_dict()}"
+
+    long_cycle = {f'Sheet1!A{i}': parse_formula(f'=A{i % depth + 1}+1', 'Sheet1') for i in range(1, depth + 1)}
+    try:
+        PullContext({}, long_cycle).get('Sheet1!A1')
+    except CyclicDependencyError as error:
+        assert sorted(error.cycles[0]) == sorted(long_cycle), "в цикл должны войти все ячейки"
+    else:
+        assert False, "длинный цикл не обнаружен"
+
+    cyclic = {
+        'Sheet1!A1': parse_formula('=IFERROR(B1, 0)', 'Sheet1'),
+        'Sheet1!B1': parse_formula('=SUM(A1:A2)', 'Sheet1'),
+    }
+    ctx = PullContext({}, cyclic)
+    try:
+        ctx.get('Sheet1!A1')
+    except CyclicDependencyError as error:
+        assert error.cycles == [['Sheet1!A1', 'Sheet1!B1']], error.cycles
+    else:
+        assert False, "цикл не обнаружен"
+    assert ctx.get('Sheet1!C1', 'нет') == 'нет', "после ошибки контекст остаётся рабочим"
+
+
+def test_lazy_forms_check_arity():
+    """Специальные формы с неверным числом аргументов дают #VALUE!, а не исключение."""
+    from src.ast_builder import parse_formula
+    from src.errors import VALUE
+    for formula in ('=IF()', '=IF(1)', '=CHOOSE(1)', '=IFERROR(1)', '=ISNA()', '=AND()', '=IFNA(1,2,3)'):
+        assert parse_formula(formula).eval({}) is VALUE, formula
+    assert FunctionNode('IF', []).eval({}) is VALUE
+
+
+def test_choose_rejects_non_finite_index():
+    """
+    Бесконечный или нечисловой номер CHOOSE даёт #VALUE!, а не OverflowError,
+    и не прерывает вычисление книги.
+    """
+    from src.ast_builder import parse_formula
+    from src.errors import VALUE
+    from src.model import evaluate_workbook
+    assert parse_formula('=CHOOSE(1E400,1,2)').eval({}) is VALUE
+    assert parse_formula('=CHOOSE(A1,1,2)').eval({'A1': float('nan')}) is VALUE
+    assert parse_formula('=CHOOSE(2.9,1,2)').eval({}) == 2
+    formulas = {'A1': '=CHOOSE(1E400,1,2)', 'A2': '=1+1'}
+    values = evaluate_workbook({'Лист': {'data': dict(formulas), 'constants': {}, 'formulas': formulas,
+                                         'calculated': {}}})
+    assert values['Лист!A1'] is VALUE and values['Лист!A2'] == 2, values
+
+
+def test_errors_propagate_without_exceptions():
+    """
+    Деление на ноль, пустые ячейки и неподходящие типы дают значения-ошибки,
+    которые распространяются через операторы и функции, а не исключения.
+    """
+    from src.errors import DIV0, VALUE, NAME
+    div0 = BinaryOpNode('/', ConstantNode(1), CellNode('A1'))  # A1 пустая -> 0
+    assert div0.eval({}) is DIV0
+    assert BinaryOpNode('+', div0, ConstantNode(1)).eval({}) is DIV0
+    assert FunctionNode('SUM', [ConstantNode(1), div0]).eval({}) is DIV0
+    assert BinaryOpNode('*', ConstantNode('abc'), ConstantNode(2)).eval({}) is VALUE
+    assert BinaryOpNode('+', CellNode('A1'), ConstantNode('2')).eval({}) == 2.0
+    assert FunctionNode('NO_SUCH_FUNC', []).eval({}) is NAME
+    assert FunctionNode('IFERROR', [div0, ConstantNode(0)]).eval({}) == 0
+    assert FunctionNode('ISERROR', [div0]).eval({}) is True
+
+
+def test_comparisons_follow_excel_rules():
+    """
+    Сравнение текста без учёта регистра, пустая ячейка равна 0 и "".
+    """
+    eq = lambda a, b: BinaryOpNode('=', a, b).eval({})
+    assert eq(ConstantNode('abc'), ConstantNode('ABC')) is True
+    assert eq(CellNode('A1'), ConstantNode(0)) is True
+    assert eq(CellNode('A1'), ConstantNode('')) is True
+    assert BinaryOpNode('<', ConstantNode(100), ConstantNode('a')).eval({}) is True
+
+
+def test_numpy_numbers_in_arithmetic():
+    """
+    Числа NumPy (np.float64, np.int64) ведут себя как обычные числа в операторах и SUM,
+    а результат — float Python.
+    """
+    import numpy as np
+    result = BinaryOpNode('-', ConstantNode(np.float64(5.0)), ConstantNode(10)).eval({})
+    assert result == -5.0 and type(result) is float
+    assert BinaryOpNode('*', ConstantNode(np.int64(3)), ConstantNode(2)).eval({}) == 6.0
+    assert FunctionNode('SUM', [ConstantNode(np.float64(1.5)), ConstantNode(1)]).eval({}) == 2.5
+
+
+def test_conditional_aggregates_with_operators():
+    """Результаты SUMIF/AVERAGEIF участвуют в арифметике формул (а не дают #VALUE!)."""
+    from src.model import evaluate_workbook
+    inputs = {'A1': 5.0, 'A2': 7.0, 'B1': 'x', 'B2': 'y'}
+    formulas = {
+        'A1': '=SUMIF(Вход!B1:B2,"x",Вход!A1:A2)-10',
+        'A2': '=SUMIF(Вход!B1:B2,"x",Вход!A1:A2)',
+        'A3': '=A2*2',
+        'A4': '=AVERAGEIF(Вход!B1:B2,"y",Вход!A1:A2)+1',
+        'A5': '=SUMIFS(Вход!A1:A2,Вход!B1:B2,"y")/2',
+    }
+    workbook = {
+        'Вход': {'data': inputs, 'constants': inputs, 'formulas': {}, 'calculated': {}},
+        'Итог': {'data': formulas, 'constants': {}, 'formulas': formulas, 'calculated': {}},
+    }
+    ctx = evaluate_workbook(workbook)
+    expected = {'Итог!A1': -5.0, 'Итог!A2': 5.0, 'Итог!A3': 10.0, 'Итог!A4': 8.0, 'Итог!A5': 3.5}
+    for cell, value in expected.items():
+        assert ctx[cell] == value and type(ctx[cell]) is float, f"{cell}: {ctx[cell]!r}"
+
+
+def test_multi_cell_ranges_and_text_conditions():
+    """
+    Диапазон из нескольких ячеек в сравнении и '&' даёт #VALUE!, а не исключение;
+    текстовое условие IF, кроме 'TRUE'/'FALSE', — тоже #VALUE!.
+    """
+    from src.ast_builder import parse_formula
+    from src.errors import VALUE
+    from src.ranges import CalcContext
+    ctx = CalcContext({'A1': 1.0, 'A2': -1.0, 'B1': 'да'})
+    for formula in ('=A1:A2>0', '=SUM(A1:A2>0)', '=A1:A2&"x"', '=IF(B1,1,2)'):
+        assert parse_formula(formula).eval(ctx) is VALUE, formula
+    assert parse_formula('=A1:A1>0').eval(ctx) is True
+    assert parse_formula('=IF("true",1,2)').eval(ctx) == 1
+    assert parse_formula('=IF(A3,1,2)').eval(ctx) == 2  # Пустая ячейка — ЛОЖЬ
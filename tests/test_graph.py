@@ -1,5 +1,5 @@
 import pytest
-from src.graph import build_dependency_graph, has_cycle, topological_sort_kahn
+from src.graph import build_dependency_graph, has_cycle, topological_sort_kahn, CyclicDependencyError
 
 
 # ТЕСТИРУЕМ ФУНКЦИЮ, СТРОЯЩУЮ ГРАФ ЗАВИСИМОСТЕЙ
@@ -443,3 +443,208 @@ def test_topological_sort_kahn_three_independent_components():
 
     order = topological_sort_kahn(graph, indeg)
     assert order in expected_orders, f"Expected {expected_orders}, but got {order}"
+
+
+def test_build_reverse_graph():
+    """
+    Обратный индекс хранит для каждой ячейки список зависящих от неё ячеек.
+    """
+    from src.graph import build_reverse_graph
+    graph = {'A': ['B', 'C'], 'B': ['C'], 'C': []}
+    assert build_reverse_graph(graph) == {'A': [], 'B': ['A'], 'C': ['A', 'B']}
+
+
+def test_topological_sort_kahn_keeps_in_degree(simple_graph):
+    """
+    Сортировка не портит переданный словарь входных степеней, поэтому его можно использовать повторно.
+    """
+    graph, indeg = simple_graph
+    assert topological_sort_kahn(graph, indeg) == ['C', 'B', 'A']
+    assert indeg == {'A': 1, 'B': 1, 'C': 0}, "in_degree не должен изменяться"
+    assert topological_sort_kahn(graph, indeg) == ['C', 'B', 'A']
+
+
+def test_topological_sort_kahn_long_chain():
+    """
+    Цепочка из 100 000 ячеек сортируется за линейное время и без рекурсии.
+    """
+    n = 100_000
+    graph = {f'A{i}': [f'A{i - 1}'] if i > 1 else [] for i in range(1, n + 1)}
+    indeg = {node: len(deps) for node, deps in graph.items()}
+    order = topological_sort_kahn(graph, indeg)
+    assert order[0] == 'A1' and order[-1] == f'A{n}' and len(order) == n
+
+
+# ТЕСТИРУЕМ РАЗБИЕНИЕ НА КОМПОНЕНТЫ СИЛЬНОЙ СВЯЗНОСТИ
+
+def test_strongly_connected_components_order():
+    """
+    Компоненты выдаются в порядке вычисления: зависимости раньше зависящих,
+    а цикл B <-> C образует одну компоненту.
+    """
+    from src.graph import strongly_connected_components, is_cyclic_component
+    graph = {'A': ['B'], 'B': ['C'], 'C': ['B', 'D'], 'D': [], 'E': ['E']}
+    components = strongly_connected_components(graph)
+    position = {node: i for i, comp in enumerate(components) for node in comp}
+    assert sorted(map(sorted, components)) == [['A'], ['B', 'C'], ['D'], ['E']]
+    assert position['D'] < position['B'] < position['A']
+    cyclic = [sorted(c) for c in components if is_cyclic_component(c, graph)]
+    assert cyclic == [['B', 'C'], ['E']]
+
+
+def test_strongly_connected_components_long_chain():
+    """
+    Длинная цепочка (нарастающий итог на 50 000 строк) не упирается в лимит рекурсии.
+    """
+    from src.graph import strongly_connected_components
+    n = 50_000
+    graph = {f'A{i}': [f'A{i - 1}'] if i > 1 else [] for i in range(1, n + 1)}
+    components = strongly_connected_components(graph)
+    assert len(components) == n
+    assert components[0] == ['A1'] and components[-1] == [f'A{n}']
+
+
+def test_build_dependency_graph_expands_ranges():
+    """
+    Диапазоны в формулах разворачиваются в ячейки с данными,
+    а ссылка на пустую ячейку становится вершиной без зависимостей.
+    """
+    all_sheets = {
+        'Sheet1': {
+            'data': {'A1': 1, 'A2': 2, 'A3': 3, 'B1': '=SUM(A1:A3)+A1+C9'},
+            'formulas': {'B1': '=SUM(A1:A3)+A1+C9'},
+        }
+    }
+    graph, indeg = build_dependency_graph(all_sheets)
+    assert sorted(graph['Sheet1!B1']) == ['Sheet1!A1', 'Sheet1!A2', 'Sheet1!A3', 'Sheet1!C9']
+    assert indeg['Sheet1!B1'] == 4
+    assert indeg['Sheet1!C9'] == 0
+
+
+def test_find_cycles_reports_cells():
+    """
+    find_cycles возвращает ячейки каждого цикла, а сортировка сообщает о них в исключении.
+    """
+    from src.graph import find_cycles, CyclicDependencyError
+    graph = {'A': ['B'], 'B': ['C'], 'C': ['A'], 'D': ['E'], 'E': [], 'F': ['F'], 'G': ['A']}
+    assert sorted(find_cycles(graph)) == [['A', 'B', 'C'], ['F']]
+
+    indeg = {node: len(deps) for node, deps in graph.items()}
+    with pytest.raises(CyclicDependencyError) as info:
+        topological_sort_kahn(graph, indeg)
+    assert sorted(info.value.cycles) == [['A', 'B', 'C'], ['F']]
+    assert 'A, B, C' in str(info.value)
+
+
+def test_has_cycle_long_chain():
+    """
+    Нарастающий итог на 20 000 строк не переполняет стек рекурсии.
+    """
+    n = 20_000
+    graph = {f'A{i}': [f'A{i - 1}'] if i > 1 else [] for i in range(1, n + 1)}
+    assert has_cycle(graph) is False
+    graph['A1'] = [f'A{n}']
+    assert has_cycle(graph) is True
+
+
+# ТЕСТИРУЕМ ИНКРЕМЕНТАЛЬНУЮ ПРАВКУ ГРАФА
+
+def _assert_valid_order(dg):
+    """Каждая ячейка в порядке вычисления стоит после всех своих зависимостей."""
+    order = dg.topological_order()
+    position = {node: i for i, node in enumerate(order)}
+    assert set(order) == set(dg.graph), "Порядок должен содержать все вершины графа"
+    for node, deps in dg.graph.items():
+        for dep in deps:
+            assert position[dep] < position[node], f"{dep} должна идти раньше {node}"
+
+
+@pytest.fixture
+def edit_sheets():
+    formulas = {'B1': '=A1*2', 'B2': '=B1+A2', 'C1': '=SUM(A1:A3)'}
+    return {
+        'Sheet1': {
+            'data': {'A1': 1, 'A2': 2, 'A3': 3, **formulas},
+            'formulas': formulas,
+        }
+    }
+
+
+def test_dependency_graph_matches_full_build(edit_sheets):
+    """
+    Начальный граф совпадает с build_dependency_graph, а порядок корректен.
+    """
+    from src.graph import DependencyGraph
+    dg = DependencyGraph.from_workbook(edit_sheets)
+    graph, indeg = build_dependency_graph(edit_sheets)
+    assert {n: sorted(d) for n, d in dg.graph.items()} == {n: sorted(d) for n, d in graph.items()}
+    assert dg.in_degree == dict(indeg)
+    _assert_valid_order(dg)
+
+
+def test_dependency_graph_edits(edit_sheets):
+    """
+    Добавление, замена и удаление формулы обновляют рёбра, обратный индекс и порядок.
+    Новая ячейка внутри диапазона становится зависимостью формулы с этим диапазоном.
+    """
+    from src.graph import DependencyGraph
+    dg = DependencyGraph.from_workbook(edit_sheets)
+
+    dg.replace_formula('Sheet1!B2', '=A2*3')
+    dg.replace_formula('Sheet1!B1', '=B2+1')  # B1 теперь зависит от B2: порядок меняется
+    assert list(dg.graph['Sheet1!B1']) == ['Sheet1!B2'] and dg.in_degree['Sheet1!B1'] == 1
+    _assert_valid_order(dg)
+    # Ссылка B2 на B1 замкнула бы цикл — правка откатывается целиком
+    with pytest.raises(CyclicDependencyError) as info:
+        dg.replace_formula('Sheet1!B2', '=B1+A3')
+    assert info.value.cycles == [['Sheet1!B1', 'Sheet1!B2']]
+    assert list(dg.graph['Sheet1!B2']) == ['Sheet1!A2'] and dg.formulas['Sheet1!B2'] == '=A2*3'
+    _assert_valid_order(dg)
+
+    dg.add_formula('Sheet1!A4', '=B1*10')  # A4 не входит в A1:A3
+    dg.add_formula('Sheet1!D1', '=A1')
+    dg.remove_formula('Sheet1!D1')
+    assert 'Sheet1!D1' not in dg.graph and 'Sheet1!D1' not in dg.dependents['Sheet1!A1']
+    _assert_valid_order(dg)
+
+    dg.replace_formula('Sheet1!C1', '=SUM(A1:A9)')
+    assert 'Sheet1!A4' in dg.graph['Sheet1!C1']
+    dg.remove_formula('Sheet1!A4')
+    assert 'Sheet1!A4' not in dg.graph['Sheet1!C1'], "Пустая ячейка выпадает из диапазона"
+    dg.add_formula('Sheet1!A5', '=B2')
+    assert 'Sheet1!A5' in dg.graph['Sheet1!C1'], "Новая ячейка попадает в существующий диапазон"
+    _assert_valid_order(dg)
+
+
+def test_dependency_graph_random_edits_keep_order():
+    """
+    Серия случайных правок: порядок остаётся корректным, граф совпадает с построенным заново.
+    """
+    import random
+    from src.graph import DependencyGraph
+    rnd = random.Random(7)
+    cells = [f'A{i}' for i in range(1, 41)]
+    formulas = {}
+    sheets = {'S': {'data': {}, 'formulas': formulas}}
+    dg = DependencyGraph.from_workbook(sheets)
+    for _ in range(300):
+        cell = rnd.choice(cells)
+        refs = rnd.sample(cells, rnd.randint(0, 3))
+        formula = '=' + ('+'.join(refs) if refs else '1')
+        try:
+            if f'S!{cell}' in dg.formulas:
+                if rnd.random() < 0.3:
+                    dg.remove_formula(f'S!{cell}')
+                    del formulas[cell]
+                    continue
+                dg.replace_formula(f'S!{cell}', formula)
+            else:
+                dg.add_formula(f'S!{cell}', formula)
+            formulas[cell] = formula
+        except CyclicDependencyError:
+            pass
+        _assert_valid_order(dg)
+
+    sheets['S']['data'] = dict(formulas)
+    rebuilt = DependencyGraph.from_workbook(sheets)
+    assert {n: set(d) for n, d in dg.graph.items()} == {n: set(d) for n, d in rebuilt.graph.items()}
@@ -0,0 +1,103 @@
+# tests/test_lookup.py
+
+import pytest
+from src.ranges import CalcContext, RangeRef
+from src.lookup import vlookup, hlookup, xlookup, index, match, VectorIndex
+from src.ast_builder import parse_formula
+from src.errors import NA, REF
+
+
+@pytest.fixture
+def table_ctx():
+    """
+    Справочная таблица A1:C4 (код, название, цена), отсортированная по коду.
+    """
+    return CalcContext({
+        'A1': 10, 'B1': 'Яблоко', 'C1': 1.5,
+        'A2': 20, 'B2': 'Груша',  'C2': 2.0,
+        'A3': 30, 'B3': 'Слива',  'C3': 3.5,
+        'A4': 40, 'B4': 'Вишня',  'C4': 4.0,
+    })
+
+
+def test_vlookup_exact_and_approximate(table_ctx):
+    """
+    Точный поиск идёт через хэш-таблицу, приближённый — через бинарный поиск:
+    для 25 берётся наибольший код <= 25, то есть 20.
+    """
+    table = RangeRef.from_ref('A1:C4', table_ctx)
+    assert vlookup(30, table, 2, False) == 'Слива'
+    assert vlookup(25, table, 3) == 2.0
+    assert vlookup(99, table, 2, True) == 'Вишня'
+    assert vlookup(25, table, 2, False) is NA  # точного совпадения нет
+    assert vlookup(5, table, 2) is NA          # меньше минимального ключа
+    assert vlookup(10, table, 4, False) is REF # столбца 4 в таблице нет
+
+
+def test_hlookup_and_match_on_lists():
+    """
+    Функции принимают и обычные списки (без кэширования индекса).
+    """
+    table = [['a', 'b', 'c'], [1, 2, 3]]
+    assert hlookup('B', table, 2, False) == 2  # Текст сравнивается без учёта регистра
+    assert match(2.5, [1, 2, 3]) == 2
+    assert match(2.5, [3, 2, 1], -1) == 1
+    assert match('c', ['a', 'b', 'c'], 0) == 3
+
+
+def test_xlookup_modes(table_ctx):
+    """
+    XLOOKUP: значение по умолчанию, поиск следующего меньшего/большего и подстановочные знаки.
+    """
+    keys = RangeRef.from_ref('A1:A4', table_ctx)
+    names = RangeRef.from_ref('B1:B4', table_ctx)
+    assert xlookup(20, keys, names) == 'Груша'
+    assert xlookup(25, keys, names, 'нет') == 'нет'
+    assert xlookup(25, keys, names, None, -1) == 'Груша'
+    assert xlookup(25, keys, names, None, 1) == 'Слива'
+    assert xlookup('с*', names, keys, None, 2) == 30
+
+
+def test_index(table_ctx):
+    """
+    INDEX возвращает значение по номеру строки/столбца, а 0 — целый столбец.
+    """
+    table = RangeRef.from_ref('A1:C4', table_ctx)
+    assert index(table, 2, 3) == 2.0
+    column = index(table, 0, 2)
+    assert isinstance(column, RangeRef) and column.key == 'B1:B4'
+    assert index(table, 5, 1) is REF  # за пределами диапазона
+
+
+def test_index_is_cached_and_invalidated_by_range_only(table_ctx):
+    """
+    Индекс первого столбца строится один раз и переиспользуется.
+    Изменение ячейки вне индексированного столбца его не сбрасывает,
+    изменение ячейки внутри — сбрасывает.
+    """
+    ast = parse_formula('=VLOOKUP(A6, A1:C4, 2, FALSE)')
+    cache = table_ctx.range_cache
+    for code, expected in [(10, 'Яблоко'), (40, 'Вишня'), (20, 'Груша')]:
+        table_ctx['A6'] = code
+        assert ast.eval(table_ctx) == expected
+    assert cache.misses == 1 and cache.hits == 2, "Индекс должен строиться один раз"
+
+    table_ctx['C2'] = 9.9  # столбец цен не входит в индекс по ключам
+    assert len(cache) == 1, "Изменение вне диапазона индекса не должно его сбрасывать"
+
+    table_ctx['A2'] = 25   # меняем сам ключ
+    assert len(cache) == 0, "Изменение внутри диапазона индекса должно его сбросить"
+    table_ctx['A6'] = 25
+    assert ast.eval(table_ctx) == 'Груша'
+
+
+def test_vector_index_mixed_types():
+    """
+    Приближённый поиск сравнивает только значения одного типа:
+    текст не «подходит» для числового ключа и наоборот.
+    """
+    idx = VectorIndex([1, 'b', 5, None, True])
+    assert idx.floor(3) == (0, 1.0)
+    assert idx.floor('a') is None
+    assert idx.ceil('a') == (1, 'b')
+    assert idx.exact(None) is None
@@ -0,0 +1,80 @@
+# tests/test_memory.py
+
+import sys
+
+import numpy as np
+from src.ast_builder import compile_formulas
+from src.csr_graph import CSRGraph
+from src.memory import deep_size, model_footprint
+from src.model import evaluate_workbook
+from src.ranges import CalcContext
+from src.synthetic import generate_workbook
+
+
+def test_deep_size_counts_shared_objects_once():
+    """Общий объект учитывается один раз; массив NumPy — вместе с данными."""
+    text = 'x' * 1000
+    assert deep_size([text, text]) == sys.getsizeof([text, text]) + sys.getsizeof(text)
+    seen = set()
+    first = deep_size({'a': text}, seen)
+    assert deep_size([text], seen) == sys.getsizeof([text]), "Уже учтённая строка не должна считаться снова"
+    assert first > sys.getsizeof(text)
+    array = np.zeros(10_000)
+    assert deep_size(array) >= array.nbytes
+    assert deep_size([array, array[:10]]) < 2 * array.nbytes, "Представление не копирует данные"
+
+
+def test_model_footprint():
+    """
+    Отчёт раскладывает память по структурам, листам и типам узлов AST;
+    сумма по структурам равна общему размеру.
+    """
+    wb = generate_workbook(2000, sheets=2, chain_depth=50, seed=4)
+    formulas = compile_formulas(wb)
+    context = evaluate_workbook(wb)
+    report = model_footprint(wb, formulas=formulas, graph=CSRGraph.from_workbook(wb), context=context)
+    assert report.total == sum(report.structures.values())
+    for name in ('sheets.data', 'sheets.constants', 'sheets.formulas', 'formulas', 'graph', 'context'):
+        assert report.structures.get(name, 0) > 0, f"Пустая структура {name}: {report.structures}"
+    # Текст формул уже учтён в data, поэтому formulas листа — это только словарь
+    assert report.sheets['Лист1']['formulas'] < report.sheets['Лист1']['data']
+    assert report.node_types['BinaryOpNode']['count'] > report.node_types['CellNode']['count'] / 2
+    assert report.node_types['CellNode']['bytes'] > 0
+    assert report.shared > 0
+    assert 'BinaryOpNode' in report.format()
+    assert report.as_dict()['total'] == report.total
+
+
+class _Pair:
+    __slots__ = ('left', 'right')
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+
+class _Triple(_Pair):
+    __slots__ = 'extra'  # Строкой, а не кортежем — тоже допустимо
+
+    def __init__(self, left, right, extra):
+        super().__init__(left, right)
+        self.extra = extra
+
+
+def test_deep_size_follows_slots_and_range_cache():
+    """
+    Обход заходит в __slots__ (включая слоты предков) и в атрибуты наследников dict,
+    например CalcContext.range_cache.
+    """
+    left, right, extra = 'l' * 1000, 'r' * 2000, 'e' * 3000
+    triple = _Triple(left, right, extra)
+    expected = sys.getsizeof(triple) + sum(sys.getsizeof(s) for s in (left, right, extra))
+    assert deep_size(triple) == expected, f"{deep_size(triple)} != {expected}"
+    partial = _Pair(left, None)  # Незаполненный слот пропускается
+    assert deep_size(partial) == sys.getsizeof(partial) + sys.getsizeof(left)
+
+    context = CalcContext({'Лист1!A1': 1.0})
+    empty = deep_size(context)
+    index = np.arange(100_000, dtype=np.float64)
+    context.range_cache.put('index', [], index)
+    assert deep_size(context) >= empty + index.nbytes, "Запись range_cache должна учитываться в контексте"
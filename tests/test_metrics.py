@@ -0,0 +1,101 @@
+# tests/test_metrics.py
+
+import time
+
+import pytest
+from src import metrics
+from src.metrics import collect, instrumented, stage, add
+from src.model import evaluate_workbook
+from src.synthetic import generate_workbook
+
+
+def test_collect_pipeline_stages():
+    """
+    При включённом сборе каждый этап конвейера записывает вызовы, время и элементы;
+    вложенные этапы вычитаются из собственного времени внешнего.
+    """
+    seen = []
+    with collect(memory=True, hooks=[lambda name, data: seen.append(name)]) as m:
+        wb = generate_workbook(300, sheets=1, chain_depth=20, range_density=1.0, seed=2)
+        evaluate_workbook(wb)
+    report = m.report()
+    for name in ('split', 'parse', 'graph', 'references', 'evaluate'):
+        assert name in report, f"Нет этапа {name}: {list(report)}"
+    formulas = len(wb['Лист1']['formulas'])
+    assert report['parse']['calls'] == formulas
+    assert report['evaluate']['items'] == formulas
+    assert report['split']['items'] == sum(len(c['data']) for c in wb.values())
+    evaluate = report['evaluate']
+    assert evaluate['self'] <= evaluate['wall'], "Собственное время не может превышать полное"
+    assert evaluate['peak_bytes'] > 0
+    assert 'range_cache_misses' in evaluate['counters']
+    assert sorted(seen) == sorted(report), "Хуки должны получить каждый этап"
+    assert 'range_cache_misses' in m.format()
+    assert metrics.active() is None
+
+
+def test_disabled_is_noop():
+    @instrumented('work', items=lambda result, n: n)
+    def work(n):
+        with stage('inner'):
+            add('ticks', n)
+        return n
+
+    assert work(5) == 5  # Без collect ничего не записывается и не падает
+    with collect() as m:
+        work(3)
+        work(4)
+        with pytest.raises(RuntimeError):
+            with collect():
+                pass
+    report = m.report()
+    assert report['work']['calls'] == 2 and report['work']['items'] == 7
+    assert report['inner']['counters'] == {'ticks': 7}
+
+
+class _Clock:
+    """Часы для тестов: каждый вызов perf_counter возвращает следующее значение."""
+
+    def __init__(self, *ticks):
+        self._ticks = iter(ticks)
+        self.process_time = time.process_time
+
+    def perf_counter(self):
+        return next(self._ticks)
+
+
+def test_instrumented_without_collect_skips_items():
+    """Без collect функция items не вызывается, stage и add ничего не записывают."""
+    def items(result, n):
+        raise AssertionError("items не должна вызываться без сбора метрик")
+
+    @instrumented('work', items=items)
+    def work(n):
+        with stage('inner'):
+            add('ticks', n)
+        return n * 2
+
+    assert work.__name__ == 'work', "Декоратор должен сохранять имя функции"
+    assert work(5) == 10
+    assert metrics.active() is None
+
+
+def test_nested_stage_self_time(monkeypatch):
+    """
+    Время вложенных этапов вычитается из собственного времени внешнего,
+    но не из полного; соседние вложенные этапы складываются.
+    """
+    # outer: 0..10, first: 1..3, second: 3..6
+    monkeypatch.setattr(metrics, 'time', _Clock(0.0, 1.0, 3.0, 3.0, 6.0, 10.0))
+    with collect() as m:
+        with stage('outer'):
+            with stage('first'):
+                add('ticks', 1)
+            with stage('second'):
+                add('ticks', 2)
+    report = m.report()
+    assert report['outer']['wall'] == 10.0 and report['outer']['self'] == 5.0, report['outer']
+    assert report['first']['wall'] == report['first']['self'] == 2.0, report['first']
+    assert report['second']['wall'] == report['second']['self'] == 3.0, report['second']
+    assert report['first']['counters'] == {'ticks': 1} and report['second']['counters'] == {'ticks': 2}
+    assert report['outer']['counters'] == {}, "Счётчики вложенного этапа не должны попадать во внешний"
@@ -0,0 +1,122 @@
+# tests/test_model.py
+
+import pytest
+from src.model import workbook_values, evaluate_workbook, prune_workbook
+from src.errors import DIV0
+from src.graph import CyclicDependencyError
+
+
+@pytest.fixture
+def workbook():
+    """
+    Небольшая книга из двух листов с межлистовыми ссылками.
+    """
+    return {
+        'Вход': {
+            'data': {'A1': 10, 'A2': 0, 'B1': '=A1*2'},
+            'constants': {'A1': 10, 'A2': 0},
+            'formulas': {'B1': '=A1*2'},
+            'calculated': {'B1': 20},
+        },
+        'Итог': {
+            'data': {'A1': '=Вход!B1+1', 'A2': '=IF(Вход!A2=0, 0, A3)', 'A3': '=Вход!A1/Вход!A2'},
+            'constants': {},
+            'formulas': {'A1': '=Вход!B1+1', 'A2': '=IF(Вход!A2=0, 0, A3)', 'A3': '=Вход!A1/Вход!A2'},
+            'calculated': {'A1': 21, 'A2': 0},
+        },
+    }
+
+
+def test_workbook_values(workbook):
+    """
+    Константы собираются с полными адресами 'Лист!A1'.
+    """
+    assert workbook_values(workbook) == {'Вход!A1': 10, 'Вход!A2': 0}
+
+
+def test_evaluate_workbook_targets(workbook):
+    """
+    С targets вычисляются только нужные ячейки: A3 (деление на ноль)
+    стоит в невыбранной ветви IF и не вычисляется.
+    """
+    ctx = evaluate_workbook(workbook, targets=['Итог!A1', 'Итог!A2'])
+    assert ctx['Итог!A1'] == 21
+    assert ctx['Итог!A2'] == 0
+    assert ctx.pending_count() == 1
+
+
+def test_evaluate_workbook_full(workbook):
+    """
+    Без targets вычисляются все формулы в порядке зависимостей.
+    Деление на ноль даёт значение-ошибку, а не исключение.
+    """
+    ctx = evaluate_workbook(workbook)
+    assert ctx['Вход!B1'] == 20
+    assert ctx['Итог!A1'] == 21
+    assert ctx['Итог!A3'] is DIV0
+    assert ctx.iteration_report == []
+
+
+@pytest.fixture
+def interest_workbook():
+    """
+    Классическая циклическая модель: проценты зависят от остатка,
+    а остаток — от процентов. Решение: B2 = 1000 / (1 - 0.1) ≈ 1111.11.
+    """
+    formulas = {'B1': '=B2*A2', 'B2': '=A1+B1'}
+    return {
+        'Sheet1': {
+            'data': {'A1': 1000, 'A2': 0.1, **formulas},
+            'constants': {'A1': 1000, 'A2': 0.1},
+            'formulas': formulas,
+            'calculated': {},
+        },
+    }
+
+
+def test_cycle_rejected_without_iterative_mode(interest_workbook):
+    """
+    Без итеративного режима циклическая ссылка — ошибка с перечислением ячеек.
+    """
+    with pytest.raises(CyclicDependencyError, match="Sheet1!B1") as info:
+        evaluate_workbook(interest_workbook)
+    assert info.value.cycles == [['Sheet1!B1', 'Sheet1!B2']]
+
+
+def test_iterative_calculation_converges(interest_workbook):
+    """
+    Циклическая компонента итерируется до сходимости с заданной точностью.
+    """
+    ctx = evaluate_workbook(interest_workbook, iterative=True, max_change=1e-9)
+    assert ctx['Sheet1!B2'] == pytest.approx(1000 / 0.9)
+    [report] = ctx.iteration_report
+    assert report['converged'] and set(report['cells']) == {'Sheet1!B1', 'Sheet1!B2'}
+
+    limited = evaluate_workbook(interest_workbook, iterative=True, max_iterations=2)
+    assert limited.iteration_report[0]['iterations'] == 2
+    assert not limited.iteration_report[0]['converged']
+
+
+def test_prune_workbook(workbook):
+    """
+    Остаются только выходная ячейка и её предшественники; отчёт показывает, что отброшено.
+    Уменьшенная книга вычисляется так же, как полная.
+    """
+    workbook['Черновик'] = {
+        'data': {'A1': 1, 'B1': '=A1*Итог!A1'},
+        'constants': {'A1': 1},
+        'formulas': {'B1': '=A1*Итог!A1'},
+        'calculated': {},
+    }
+    reduced, report = prune_workbook(workbook, ['Итог!A1'])
+    assert set(reduced) == {'Вход', 'Итог'}
+    assert reduced['Итог']['formulas'] == {'A1': '=Вход!B1+1'}
+    assert reduced['Вход']['constants'] == {'A1': 10}
+    assert report['formulas_total'] == 5 and report['formulas_dropped'] == 3
+    assert report['constants_dropped'] == 2
+    assert report['sheets_dropped'] == ['Черновик']
+    assert report['edges_total'] - report['edges_dropped'] == 2  # Итог!A1 <- Вход!B1 <- Вход!A1
+    assert evaluate_workbook(reduced)['Итог!A1'] == 21
+
+    with pytest.raises(KeyError):
+        prune_workbook(workbook, ['Итог!Z1'])
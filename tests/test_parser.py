@@ -123,3 +123,21 @@ def test_roundtrip_simple_examples(sheets):
         refs = set(extract_cell_references(formula, sheets)) # Извлекаем ячейки из формулы
         print(f"[test_parser] static: {formula} -> {refs}") # Выводим извлеченные ссылки для проверки
         assert refs == expected, f"Для {formula} ожидали {expected}, получили {refs}" # Сравниваем с ожидаемым результатом
+
+
+def test_operator_before_sheet_name():
+    """
+    Оператор перед именем листа без кавычек не входит в имя листа:
+    раньше из '=A!B1*C!D2' извлекалась ссылка '*C!D2'.
+    """
+    cases = {
+        "=A!B1*C!D2":                    {"A!B1", "C!D2"},
+        "=Sheet1!A1*Лист2!C7+Sheet1!B2": {"Sheet1!A1", "Лист2!C7", "Sheet1!B2"},
+        "=X!A1-Y!B2/Z!C3^W!D4":          {"X!A1", "Y!B2", "Z!C3", "W!D4"},
+        "=Лист1!A1&Лист2!B1":            {"Лист1!A1", "Лист2!B1"},
+        "=A!A1>=B!B1":                   {"A!A1", "B!B1"},
+        "='Мой лист'!A1+Лист2!B1":       {"Мой лист!A1", "Лист2!B1"},
+    }
+    for formula, expected in cases.items():
+        refs = set(extract_cell_references(formula, {}))
+        assert refs == expected, f"{formula}: ожидалось {expected}, получено {refs}"
@@ -0,0 +1,72 @@
+# tests/test_partition.py
+
+import pytest
+from src.partition import partition_by_sheet, evaluate_partitioned
+from src.model import evaluate_workbook
+
+
+@pytest.fixture
+def workbook(make_sheet):
+    """
+    Вход -> (Цех1, Цех2) -> Итог; Цех2 и Склад ссылаются друг на друга.
+    """
+    return {
+        'Вход': make_sheet({'A1': 10, 'A2': 3, 'A3': 'не используется'}),
+        'Цех1': make_sheet({'A1': '=Вход!A1*2', 'A2': '=A1+1'}),
+        'Цех2': make_sheet({'A1': '=Вход!A2*10', 'A2': '=Склад!A1+A1'}),
+        'Склад': make_sheet({'A1': '=Цех2!A1/2'}),
+        'Итог': make_sheet({'A1': '=Цех1!A2+Цех2!A2', 'A2': '=SUM(Цех1!A1:A2)'}),
+    }
+
+
+def test_partition_by_sheet(workbook):
+    """
+    Листы с круговыми ссылками объединяются, части упорядочены,
+    а границы содержат только реально читаемые ячейки.
+    """
+    parts = partition_by_sheet(workbook)
+    assert [p.sheets for p in parts][0] == ['Вход']
+    assert sorted(map(tuple, (p.sheets for p in parts))) == [('Вход',), ('Итог',), ('Цех1',), ('Цех2', 'Склад')]
+    by_sheet = {p.sheets[0]: p for p in parts}
+    assert by_sheet['Вход'].exports == {'Вход!A1', 'Вход!A2'}
+    assert by_sheet['Итог'].imports == {'Цех1!A1', 'Цех1!A2', 'Цех2!A2'}
+    assert by_sheet['Цех2'].imports == {'Вход!A2'}
+    position = {p.index: i for i, p in enumerate(parts)}
+    for p in parts:
+        assert all(position[d] < position[p.index] for d in p.depends_on)
+
+
+@pytest.mark.parametrize('processes', [0, 2])
+def test_evaluate_partitioned_matches_single_process(workbook, processes):
+    """
+    Вычисление по частям (в том числе в процессах) совпадает с обычным.
+    """
+    expected = evaluate_workbook(workbook)
+    values = evaluate_partitioned(workbook, processes=processes)
+    for cell in ('Цех1!A2', 'Цех2!A2', 'Склад!A1', 'Итог!A1', 'Итог!A2'):
+        assert values[cell] == expected[cell], f"{cell}: {values[cell]} != {expected[cell]}"
+    assert values['Итог!A1'] == 21 + 45
+
+    only = evaluate_partitioned(workbook, processes=processes, outputs=['Итог!A2'])
+    assert only == {'Итог!A2': 41}
+
+
+def test_partitions_clip_whole_columns_of_other_sheets(make_sheet, monkeypatch):
+    """
+    Часть, разбирающая свои формулы сама, ограничивает A:A другого листа его заполненной частью,
+    а не всем столбцом Excel.
+    """
+    from src import partition as partition_module
+    original, compiled = partition_module.compile_formulas, {}
+
+    def compile_formulas(*args, **kwargs):
+        result = original(*args, **kwargs)
+        compiled.update(result)
+        return result
+
+    monkeypatch.setattr(partition_module, 'compile_formulas', compile_formulas)
+    workbook = {'Вход': make_sheet({f"A{i}": i for i in range(1, 11)}),
+                'Итог': make_sheet({'A1': '=SUM(Вход!A:A)', 'A2': '=MAX(Вход!A:A)*2'})}
+    values = evaluate_partitioned(workbook, processes=0)
+    assert values['Итог!A1'] == 55 and values['Итог!A2'] == 20, values
+    assert compiled['Итог!A1'].args[0].ref == 'Вход!A1:A10', compiled['Итог!A1'].args[0].ref
@@ -0,0 +1,104 @@
+# tests/test_profiler.py
+
+import pytest
+from src import profiler as profiler_module
+from src.ast_builder import parse_formula
+from src.model import evaluate_workbook
+from src.profiler import profile_workbook, Profiler
+from src.ranges import CalcContext
+
+
+@pytest.fixture
+def workbook():
+    data = {f"A{i}": float(i) for i in range(1, 201)}
+    formulas = {
+        'B1': '=SUM(A1:A200)',
+        'B2': '=IF(B1>0,SUM(A1:A10)+MAX(A1:A200),0)',
+        'B3': '=B1+B2',
+        'B4': '=SUM(SUM(A1:A5),1)',
+    }
+    return {'Лист1': {'data': {**data, **formulas}, 'constants': data, 'formulas': formulas, 'calculated': {}}}
+
+
+def test_profile_matches_evaluation(workbook, tmp_path):
+    """
+    Профилирование не меняет результатов; время и вызовы записываются по ячейкам
+    и функциям, собственное время не больше полного.
+    """
+    context, profiler = profile_workbook(workbook)
+    expected = evaluate_workbook(workbook)
+    for cell in ('Лист1!B1', 'Лист1!B2', 'Лист1!B3', 'Лист1!B4'):
+        assert context[cell] == expected[cell], f"{cell}: {context[cell]} != {expected[cell]}"
+
+    assert set(profiler.cells) == {'Лист1!B1', 'Лист1!B2', 'Лист1!B3', 'Лист1!B4'}
+    assert profiler.functions['SUM']['calls'] == 4
+    assert profiler.functions['IF']['calls'] == 1 and profiler.functions['MAX']['calls'] == 1
+    for stats in list(profiler.cells.values()) + list(profiler.functions.values()):
+        assert stats['exclusive'] <= stats['inclusive'] + 1e-9
+    b2 = profiler.cells['Лист1!B2']
+    assert b2['inclusive'] >= profiler.functions['IF']['inclusive']
+    assert profiler.top(1, 'cells', by='calls')[0][1]['calls'] == 1
+    assert 'Лист1!B2' in profiler.format(5)
+    assert profiler.total == pytest.approx(sum(s['inclusive'] for s in profiler.cells.values()))
+
+    path = profiler.write_folded(str(tmp_path / 'profile.folded'))
+    lines = open(path, encoding='utf-8').read().splitlines()
+    assert any(line.startswith('Лист1!B2;IF;SUM ') for line in lines), lines
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+
+    with pytest.raises(ValueError):
+        profiler.top(kind='листы')
+
+
+def test_profile_pull_mode_nests_cells(workbook):
+    """В режиме pull ячейки, вычисленные по запросу, вложены в стек запросившей ячейки."""
+    context, profiler = profile_workbook(workbook, targets=['Лист1!B3'])
+    assert context['Лист1!B3'] == evaluate_workbook(workbook)['Лист1!B3']
+    assert 'Лист1!B4' not in profiler.cells
+    assert any(path.startswith('Лист1!B3;Лист1!B1') for path in profiler.folded)
+
+
+class _Clock:
+    """Часы для тестов: perf_counter растёт на секунду при каждом вызове."""
+
+    def __init__(self):
+        self.now = -1.0
+
+    def perf_counter(self):
+        self.now += 1.0
+        return self.now
+
+
+def test_inclusive_exclusive_and_folded(monkeypatch, tmp_path):
+    """
+    Вложенный вызов той же функции учитывается в exclusive, но не второй раз в inclusive;
+    свёрнутые стеки — «стек время_в_мкс», пробелы в именах заменены на '_'.
+    """
+    monkeypatch.setattr(profiler_module, 'time', _Clock())
+    profiler = Profiler()
+    formulas = profiler.instrument({'Мой лист!B1': parse_formula('=SUM(SUM(1),1)')})
+    # B1: 0..5, внешний SUM: 1..4, внутренний SUM: 2..3
+    assert formulas['Мой лист!B1'].eval(CalcContext({})) == 2
+    assert profiler.cells['Мой лист!B1'] == {'calls': 1, 'inclusive': 5.0, 'exclusive': 2.0}
+    assert profiler.functions['SUM'] == {'calls': 2, 'inclusive': 3.0, 'exclusive': 3.0}
+    assert profiler.total == 5.0
+
+    path = profiler.write_folded(str(tmp_path / 'profile.folded'))
+    lines = open(path, encoding='utf-8').read().splitlines()
+    assert lines == ['Мой_лист!B1 2000000', 'Мой_лист!B1;SUM 2000000', 'Мой_лист!B1;SUM;SUM 1000000'], lines
+
+
+def test_pull_mode_skips_aborted_frames(make_sheet):
+    """
+    Цепочка глубже PULL_RECURSION_DEPTH в режиме pull прерывается и вычисляется заново;
+    прерванные вычисления не попадают в профиль: каждая ячейка и функция — один вызов.
+    """
+    from src.evaluator import PULL_RECURSION_DEPTH
+    depth = PULL_RECURSION_DEPTH * 3
+    data = {'A1': 1.0, **{f"A{i}": f"=SUM(A{i - 1},1)" for i in range(2, depth + 1)}}
+    context, profiler = profile_workbook({'Лист1': make_sheet(data)}, targets=[f"Лист1!A{depth}"])
+    assert context[f"Лист1!A{depth}"] == depth
+    calls = {cell: stats['calls'] for cell, stats in profiler.cells.items() if stats['calls'] != 1}
+    assert not calls, f"Прерванные вычисления учтены как вызовы: {calls}"
+    assert profiler.functions['SUM']['calls'] == depth - 1
+    assert len(profiler.cells) == depth - 1
@@ -0,0 +1,87 @@
+# tests/test_query.py
+
+import pytest
+from src.query import DependencyQuery
+from src.csr_graph import CSRGraph
+
+
+@pytest.fixture
+def workbook():
+    """
+    Два листа: Вход (исходные данные) и Итог (расчёт с нарастающим итогом).
+    """
+    inputs = {'A1': 10, 'A2': 20, 'C7': 5}
+    formulas = {
+        'B1': '=Вход!A1*Вход!C7',
+        'B2': '=B1+Вход!A2',
+        'B3': '=B2*2',
+        'F12': '=SUM(B1:B3)',
+    }
+    return {
+        'Вход': {'data': inputs, 'formulas': {}},
+        'Итог': {'data': dict(formulas), 'formulas': formulas},
+    }
+
+
+def test_dependents_and_precedents(workbook):
+    """
+    «На что влияет Вход!C7» и «что питает Итог!F12» — транзитивно и с ограничением глубины.
+    """
+    q = DependencyQuery.from_workbook(workbook)
+    assert sorted(q.dependents('Вход!C7')) == ['Итог!B1', 'Итог!B2', 'Итог!B3', 'Итог!F12']
+    assert sorted(q.dependents('Вход!C7', depth=1)) == ['Итог!B1']
+    assert sorted(q.dependents('Вход!C7', depth=2)) == ['Итог!B1', 'Итог!B2', 'Итог!F12']
+    assert sorted(q.precedents('Итог!F12')) == [
+        'Вход!A1', 'Вход!A2', 'Вход!C7', 'Итог!B1', 'Итог!B2', 'Итог!B3']
+    assert sorted(q.precedents('Итог!F12', sheets=['Вход'])) == ['Вход!A1', 'Вход!A2', 'Вход!C7']
+    assert sorted(q.precedents('Итог!B2', depth=1)) == ['Вход!A2', 'Итог!B1']
+    assert q.dependents('Итог!F12') == []
+
+
+def test_reachability_checks(workbook):
+    """
+    Проверки «влияет ли» и «зависит ли» без перечисления множеств.
+    """
+    q = DependencyQuery.from_workbook(workbook)
+    assert q.affects('Вход!A1', 'Итог!B3')
+    assert not q.affects('Итог!B3', 'Вход!A1')
+    assert q.depends_on('Итог!F12', 'Вход!A2')
+    assert not q.depends_on('Итог!B1', 'Вход!A2')
+    assert not q.affects('Итог!B1', 'Итог!B1')
+    with pytest.raises(KeyError):
+        q.dependents('Вход!Z99')
+
+
+def test_cycles_and_cached_labels():
+    """
+    Ячейки цикла влияют друг на друга и на себя; разметка строится один раз на направление.
+    """
+    graph = {'A': ['B'], 'B': ['A', 'C'], 'C': [], 'D': ['B'], 'E': []}
+    q = DependencyQuery(CSRGraph.from_dict(graph))
+    assert sorted(q.dependents('C')) == ['A', 'B', 'D']
+    assert sorted(q.dependents('A')) == ['A', 'B', 'D']
+    assert q.affects('A', 'A') and not q.affects('C', 'C')
+    assert q.count_dependents('A') == 3 and q.count_dependents('C') == 3
+    assert sorted(q.precedents('D')) == ['A', 'B', 'C']
+    labels = q._labels['dependents']
+    q.dependents('E')
+    assert q._labels['dependents'] is labels, "Разметка должна переиспользоваться"
+
+
+def test_matches_breadth_first_search():
+    """
+    Результаты по интервальной разметке совпадают с обычным обходом графа.
+    """
+    import random
+    rnd = random.Random(1)
+    n = 300
+    graph = {f'A{i}': [f'A{j}' for j in rnd.sample(range(i), min(i, rnd.randint(0, 3)))] for i in range(n)}
+    csr = CSRGraph.from_dict(graph)
+    q = DependencyQuery(csr)
+    for node in rnd.sample(sorted(graph), 40):
+        expected = sorted(csr.reachable([node]))
+        assert sorted(q.dependents(node)) == expected, f"Зависимые {node} не совпадают"
+        expected = sorted(csr.reachable([node], direction='precedents'))
+        assert sorted(q.precedents(node)) == expected, f"Предшественники {node} не совпадают"
+        assert q.count_precedents(node) == len(expected)
+        assert q.count_dependents(node) == len(csr.reachable([node]))
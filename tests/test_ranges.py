@@ -0,0 +1,107 @@
+# tests/test_ranges.py
+
+import pytest
+from src.ranges import (
+    column_to_letter,
+    letter_to_column,
+    split_ref,
+    parse_range,
+    RangeRef,
+    CalcContext,
+    RangeCache,
+)
+
+
+@pytest.mark.parametrize("idx, letters", [(1, 'A'), (26, 'Z'), (27, 'AA'), (703, 'AAA')])
+def test_column_letters_roundtrip(idx, letters):
+    """
+    Перевод номера столбца в буквы и обратно должен быть взаимно обратным.
+    """
+    assert column_to_letter(idx) == letters
+    assert letter_to_column(letters) == idx
+
+
+def test_split_ref_and_parse_range():
+    """
+    Имя листа отделяется от адреса, кавычки снимаются,
+    а «перевёрнутый» диапазон нормализуется.
+    """
+    assert split_ref('A1') == (None, 'A1')
+    assert split_ref("'My Sheet'!B2:C3") == ('My Sheet', 'B2:C3')
+    assert split_ref('Вход!C7') == ('Вход', 'C7')
+    assert parse_range('C10:A1') == (1, 1, 10, 3)
+    assert parse_range('$B$2') == (2, 2, 2, 2)
+    with pytest.raises(ValueError):
+        parse_range('A0B')
+
+
+def test_range_ref_reads_context_lazily():
+    """
+    RangeRef читает значения из context при обращении, а не при создании.
+    """
+    ctx = {'Sheet1!A1': 1, 'Sheet1!B1': 2, 'Sheet1!A2': 3}
+    rng = RangeRef.from_ref('Sheet1!A1:B2', ctx)
+    assert rng.shape == (2, 2)
+    assert rng.key == 'Sheet1!A1:B2'
+    ctx['Sheet1!B2'] = 4
+    assert rng.rows() == [[1, 2], [3, 4]]
+    assert rng.column_ref(1).values() == [2, 4]
+    assert rng.contains('Sheet1', 2, 2) and not rng.contains(None, 2, 2)
+
+
+def test_calc_context_invalidates_only_on_change():
+    """
+    CalcContext сбрасывает записи кэша только при реальном изменении
+    значения ячейки внутри отслеживаемого диапазона.
+    """
+    ctx = CalcContext({'A1': 1, 'A2': 2})
+    rng = RangeRef.from_ref('A1:A2', ctx)
+    ctx.range_cache.put('sum', [rng], 3)
+
+    ctx['A1'] = 1          # то же значение
+    ctx['B1'] = 7          # вне диапазона
+    assert ctx.range_cache.get('sum') == 3
+
+    ctx.update({'A2': 5})  # изменение внутри диапазона
+    assert ctx.range_cache.get('sum') is None
+    assert ctx.range_cache.invalidations == 1
+
+
+def test_range_cache_buckets_and_wide_ranges():
+    """
+    Изменение ячейки сбрасывает только записи, чьи диапазоны её содержат, —
+    и для диапазонов в корзинах, и для больших (A:A, 1:1) на всём листе.
+    """
+    ctx = CalcContext()
+    cache = ctx.range_cache
+    column = RangeRef.from_ref('Лист!A1:A5000', ctx)      # Несколько блоков строк
+    whole = RangeRef.from_ref('Лист!A:C', ctx)            # Больше WIDE_BUCKETS корзин
+    other = RangeRef.from_ref('Другой!A1:A10', ctx)
+    cache.put('column', [column], 1)
+    cache.put('whole', [whole], 2)
+    cache.put('both', [other, RangeRef.from_ref('Лист!E1:E2', ctx)], 3)
+    cache.put('column', [column], 4)  # Повторная запись заменяет привязки, а не дублирует их
+
+    ctx['Лист!B5000'] = 1  # Только в A:C
+    assert cache.get('whole') is None and cache.get('column') == 4 and cache.get('both') == 3
+    ctx['Лист!A4097'] = 1  # Пятый блок строк столбца A
+    assert cache.get('column') is None and cache.get('both') == 3
+    ctx['Другой!A11'] = 1
+    assert cache.get('both') == 3
+    ctx['Лист!E2'] = 1
+    assert cache.get('both') is None
+    assert cache.invalidations == 3 and len(cache) == 0
+    assert not cache._buckets['Лист'] and not cache._wide['Лист'], "Привязки удалённых записей не остаются"
+
+
+def test_range_cache_evicts_least_recently_used():
+    """Записей не больше max_entries; вытесняется та, к которой дольше всего не обращались."""
+    cache = RangeCache(max_entries=2)
+    ctx = {}
+    cache.put('a', [RangeRef.from_ref('A1:A2', ctx)], 1)
+    cache.put('b', [RangeRef.from_ref('B1:B2', ctx)], 2)
+    assert cache.get('a') == 1
+    cache.put('c', [RangeRef.from_ref('C1:C2', ctx)], 3)
+    assert len(cache) == 2 and cache.evictions == 1 and cache.invalidations == 0
+    assert cache.get('b') is None and cache.get('a') == 1 and cache.get('c') == 3
+    assert list(cache._bounds) == ['a', 'c'] and (2, 0) not in cache._buckets[None]
@@ -0,0 +1,118 @@
+# tests/test_scenarios.py
+
+import csv
+
+import pytest
+from src.errors import DIV0
+from src.model import evaluate_workbook
+from src.scenarios import ScenarioModel, parse_csv_value, run_csv
+
+
+@pytest.fixture
+def pricing():
+    """Цена = закупка * (1 + наценка); маржа = цена - закупка; лишняя формула не нужна выходам."""
+    return {
+        'Вход': {'data': {'A1': 100.0, 'A2': 0.2, 'A3': 5.0},
+                 'constants': {'A1': 100.0, 'A2': 0.2, 'A3': 5.0}, 'formulas': {}, 'calculated': {}},
+        'Итог': {'data': {'A1': '=Вход!A1*(1+Вход!A2)', 'A2': '=A1-Вход!A1', 'A3': '=Вход!A3*2',
+                          'A4': '=A2/Вход!A1'},
+                 'constants': {},
+                 'formulas': {'A1': '=Вход!A1*(1+Вход!A2)', 'A2': '=A1-Вход!A1', 'A3': '=Вход!A3*2',
+                              'A4': '=A2/Вход!A1'},
+                 'calculated': {}},
+    }
+
+
+def test_scenario_model_matches_full_evaluation(pricing):
+    """
+    Сценарий даёт те же значения, что и полное вычисление книги с изменёнными входами;
+    пересчитываются только формулы, зависящие от входов.
+    """
+    model = ScenarioModel(pricing, ['Вход!A1', 'Вход!A3'], ['Итог!A2', 'Итог!A4'])
+    assert model.unused_inputs == ['Вход!A3'], f"Вход!A3 не влияет на выходы: {model.unused_inputs}"
+    assert model.recalculated == 3
+    for purchase in (50.0, 80.0, 0.0):
+        changed = {**pricing, 'Вход': {**pricing['Вход'], 'constants': {**pricing['Вход']['constants'], 'A1': purchase}}}
+        expected = evaluate_workbook(changed)
+        result = model.evaluate({'Вход!A1': purchase})
+        assert result['Итог!A2'] == pytest.approx(expected['Итог!A2'])
+        if purchase == 0:
+            assert result['Итог!A4'] is DIV0
+    batch = model.run_batch({'Вход!A1': [10.0, 20.0]})
+    assert batch['Итог!A2'] == pytest.approx([2.0, 4.0])
+
+    with pytest.raises(ValueError):
+        ScenarioModel(pricing, ['Итог!A1'], ['Итог!A2'])
+
+
+def test_blank_input_inside_range(make_sheet):
+    """
+    Пустая входная ячейка внутри диапазона: формулы с этим диапазоном тоже пересчитываются,
+    хотя граф зависимостей раскрывает диапазоны только в существующие ячейки.
+    """
+    workbook = {
+        'Вход': make_sheet({'A1': 1}),
+        'Итог': make_sheet({'A1': '=Вход!A4*2', 'A2': '=SUM(Вход!A1:A5)+Вход!A1', 'A3': '=SUM(Вход!B1:B3)'}),
+    }
+    model = ScenarioModel(workbook, ['Вход!A4', 'Вход!B2', 'Вход!C9'], ['Итог!A1', 'Итог!A2', 'Итог!A3'])
+    assert model.unused_inputs == ['Вход!C9'], f"Только C9 ни на что не влияет: {model.unused_inputs}"
+    result = model.evaluate({'Вход!A4': 100, 'Вход!B2': 5})
+    assert result == {'Итог!A1': 200, 'Итог!A2': 102, 'Итог!A3': 5}, result
+
+
+def test_parse_csv_value():
+    assert parse_csv_value('') is None
+    assert parse_csv_value('1.5') == 1.5 and parse_csv_value('1,5', decimal=',') == 1.5
+    assert parse_csv_value('-.5e2') == -50.0 and parse_csv_value('+3,', decimal=',') == 3.0
+    assert parse_csv_value('true') is True
+    assert parse_csv_value('шт') == 'шт' and parse_csv_value('-') == '-'
+    assert parse_csv_value('01.02.2024', decimal=',') == '01.02.2024'
+    assert parse_csv_value('a,b') == 'a,b'
+
+
+@pytest.mark.parametrize('text, decimal', [
+    ('1,5', '.'), ('1,000', '.'), ('1,234.5', '.'), ('1.5', ','), ('1.234,5', ','), ('1.234.567', ','),
+])
+def test_parse_csv_value_rejects_ambiguous_numbers(text, decimal):
+    """Число с чужим десятичным разделителем или разделителями тысяч не читается молча."""
+    with pytest.raises(ValueError):
+        parse_csv_value(text, decimal)
+
+
+@pytest.mark.parametrize('processes', [0, 2])
+def test_run_csv(pricing, tmp_path, processes):
+    """
+    Сценарии из CSV прогоняются пакетами; порядок строк и ключевые столбцы сохраняются.
+    """
+    source = tmp_path / 'in.csv'
+    with open(source, 'w', newline='', encoding='utf-8') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['id', 'A1', 'A2'])
+        for i in range(25):
+            writer.writerow([f's{i}', 10 * i, 0.5])
+    target = tmp_path / 'out.csv'
+    summary = run_csv(pricing, str(source), str(target), ['Итог!A2', 'Итог!A4'],
+                      key_columns=['id'], chunk_size=4, processes=processes)
+    assert summary['scenarios'] == 25 and summary['chunks'] == 7, f"Неверная сводка: {summary}"
+
+    with open(target, newline='', encoding='utf-8') as handle:
+        rows = list(csv.reader(handle))
+    assert rows[0] == ['id', 'Итог!A2', 'Итог!A4']
+    assert rows[1] == ['s0', '0.0', '#DIV/0!']
+    assert rows[-1][0] == 's24' and float(rows[-1][1]) == pytest.approx(120.0)
+
+    with pytest.raises(KeyError):
+        run_csv(pricing, str(source), str(target), ['Итог!A2'], columns={'нет': 'Вход!A1'})
+
+
+def test_run_csv_decimal_comma(pricing, tmp_path):
+    """CSV с ';' и десятичной запятой читается при decimal=','; без него — ValueError."""
+    source = tmp_path / 'in.csv'
+    source.write_text('A1;A2\n10,5;0,5\n', encoding='utf-8')
+    target = tmp_path / 'out.csv'
+    run_csv(pricing, str(source), str(target), ['Итог!A2'], delimiter=';', decimal=',')
+    with open(target, newline='', encoding='utf-8') as handle:
+        rows = list(csv.reader(handle, delimiter=';'))
+    assert float(rows[1][0]) == pytest.approx(5.25), rows  # 10,5 * 0,5
+    with pytest.raises(ValueError):
+        run_csv(pricing, str(source), str(target), ['Итог!A2'], delimiter=';')
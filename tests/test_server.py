@@ -0,0 +1,166 @@
+# tests/test_server.py
+
+import asyncio
+import json
+
+import pytest
+from src.ast_builder import compile_formulas
+from src.server import ModelServer
+
+
+@pytest.fixture
+def pricing():
+    """Цена = закупка * (1 + наценка); маржа = цена - закупка; доля маржи делит на закупку."""
+    sheets = {
+        'Вход': {'data': {'A1': 100.0, 'A2': 0.2}, 'constants': {'A1': 100.0, 'A2': 0.2},
+                 'formulas': {}, 'calculated': {}},
+        'Итог': {'data': {'A1': '=Вход!A1*(1+Вход!A2)', 'A2': '=A1-Вход!A1', 'A3': '=A2/Вход!A1'},
+                 'constants': {},
+                 'formulas': {'A1': '=Вход!A1*(1+Вход!A2)', 'A2': '=A1-Вход!A1', 'A3': '=A2/Вход!A1'},
+                 'calculated': {}},
+    }
+    return sheets, compile_formulas(sheets)
+
+
+def test_concurrent_requests_are_batched(pricing):
+    """Одновременные запросы дают верные ответы и вычисляются меньшим числом пакетов."""
+    async def run():
+        server = ModelServer({'цены': pricing})
+        try:
+            purchases = [float(i) for i in range(1, 51)]
+            results = await asyncio.gather(*(
+                server.evaluate('цены', {'Вход!A1': purchase}, ['Итог!A1', 'Итог!A2']) for purchase in purchases))
+            return results, purchases, server.stats()
+        finally:
+            await server.close()
+
+    results, purchases, stats = asyncio.run(run())
+    for purchase, result in zip(purchases, results):
+        assert result['Итог!A1'] == pytest.approx(purchase * 1.2), f"{purchase}: {result}"
+        assert result['Итог!A2'] == pytest.approx(purchase * 0.2)
+    assert stats['requests'] == 50
+    assert stats['batches'] < 50, f"запросы не объединились в пакеты: {stats}"
+    assert stats['p99_ms'] is not None
+
+
+def test_handle_errors(pricing):
+    """Ошибки Excel возвращаются кодом, ошибки запроса — RequestError с кодом HTTP."""
+    async def run():
+        server = ModelServer({'цены': pricing})
+        try:
+            ok = await server.handle({'model': 'цены', 'inputs': {'Вход!A1': 0}, 'outputs': ['Итог!A3']})
+            statuses = []
+            for request in ({'model': 'нет', 'outputs': ['Итог!A1']},
+                            {'model': 'цены', 'outputs': ['Итог!Z99']},
+                            {'model': 'цены', 'inputs': {'Итог!A1': 1}, 'outputs': ['Итог!A2']}):
+                statuses.append((await server._respond(request))[0])
+            return ok, statuses
+        finally:
+            await server.close()
+
+    ok, statuses = asyncio.run(run())
+    assert ok['outputs'] == {'Итог!A3': '#DIV/0!'}, ok
+    assert statuses == [404, 400, 400], statuses
+
+
+def test_evicted_model_finishes_its_queue(pricing):
+    """Вытеснение модели из кэша не бросает запросы, уже стоящие в её очереди."""
+    async def run():
+        server = ModelServer({'цены': pricing}, max_models=1, batch_window=0.05)
+        try:
+            outputs = ['Итог!A1', 'Итог!A2', 'Итог!A3', ['Итог!A1', 'Итог!A2'], ['Итог!A2', 'Итог!A3']]
+            requests = [server.evaluate('цены', {'Вход!A1': 50.0}, cells if isinstance(cells, list) else [cells])
+                        for cells in outputs]
+            return await asyncio.wait_for(asyncio.gather(*requests), timeout=10), server.stats()
+        finally:
+            await server.close()
+
+    results, stats = asyncio.run(run())
+    assert [sorted(result) for result in results] == [
+        ['Итог!A1'], ['Итог!A2'], ['Итог!A3'], ['Итог!A1', 'Итог!A2'], ['Итог!A2', 'Итог!A3']], results
+    assert results[0]['Итог!A1'] == pytest.approx(60.0)
+    assert stats['models'] <= 1, stats
+
+
+def test_bad_request_does_not_fail_batch(pricing, monkeypatch):
+    """Если пакет падает из-за входов одного запроса, остальные запросы пакета получают ответы."""
+    from src.scenarios import ScenarioModel
+    evaluate = ScenarioModel.evaluate
+
+    def fragile(self, values):
+        if values.get('Вход!A1') == 13.0:
+            raise RuntimeError("плохой вход")
+        return evaluate(self, values)
+
+    monkeypatch.setattr(ScenarioModel, 'evaluate', fragile)
+
+    async def run():
+        server = ModelServer({'цены': pricing}, batch_window=0.05)
+        try:
+            return await asyncio.gather(*(server.evaluate('цены', {'Вход!A1': float(i)}, ['Итог!A1'])
+                                          for i in range(10, 16)), return_exceptions=True)
+        finally:
+            await server.close()
+
+    results = asyncio.run(run())
+    assert isinstance(results[3], RuntimeError), results
+    for i, result in enumerate(results):
+        if i != 3:
+            assert result['Итог!A1'] == pytest.approx((10 + i) * 1.2), f"{i}: {result}"
+
+
+def test_input_values_are_validated(pricing):
+    """Значения входов, не являющиеся значениями ячеек, отклоняются до вычисления."""
+    async def run():
+        server = ModelServer({'цены': pricing})
+        try:
+            return await server._respond({'model': 'цены', 'inputs': {'Вход!A1': [1, 2]}, 'outputs': ['Итог!A1']})
+        finally:
+            await server.close()
+
+    status, response = asyncio.run(run())
+    assert status == 400 and 'Вход!A1' in response['error'], response
+
+
+def test_http_and_unix_socket(pricing, tmp_path):
+    """HTTP (с keep-alive) и Unix-сокет отвечают одинаково."""
+    request = {'model': 'цены', 'inputs': {'Вход!A1': 50, 'Вход!A2': 0.5}, 'outputs': ['Итог!A2']}
+
+    async def http(port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        answers = []
+        for _ in range(2):
+            body = json.dumps(request).encode('utf-8')
+            writer.write(b"POST /eval HTTP/1.1\r\nHost: x\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+            status = await reader.readline()
+            headers = {}
+            while (line := await reader.readline()) != b'\r\n':
+                name, _, value = line.decode().partition(':')
+                headers[name.lower()] = value.strip()
+            answers.append((status.split()[1], json.loads(await reader.readexactly(int(headers['content-length'])))))
+        writer.close()
+        return answers
+
+    async def unix(path):
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(json.dumps(request).encode('utf-8') + b'\n{"op": "models"}\nnot json\n')
+        answers = [json.loads(await reader.readline()) for _ in range(3)]
+        writer.close()
+        return answers
+
+    async def run():
+        server = ModelServer({'цены': pricing})
+        try:
+            http_server = await server.start_http('127.0.0.1', 0)
+            await server.start_unix(str(tmp_path / 'model.sock'))
+            port = http_server.sockets[0].getsockname()[1]
+            return await http(port), await unix(str(tmp_path / 'model.sock'))
+        finally:
+            await server.close()
+
+    http_answers, unix_answers = asyncio.run(run())
+    for status, answer in http_answers:
+        assert status == b'200' and answer['outputs']['Итог!A2'] == pytest.approx(25.0), answer
+    assert unix_answers[0]['outputs'] == http_answers[0][1]['outputs']
+    assert unix_answers[1] == {'models': {'цены': 3}}
+    assert 'error' in unix_answers[2]
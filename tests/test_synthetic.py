@@ -0,0 +1,46 @@
+# tests/test_synthetic.py
+
+import zipfile
+
+import pytest
+from src.graph import build_dependency_graph, find_cycles
+from src.model import evaluate_workbook
+from src.synthetic import generate_raw_sheets, generate_workbook, write_xlsx
+
+
+def test_generate_workbook_shape():
+    """
+    Книга состоит из «Входа» и листов с формулами; параметры задают число ячеек,
+    межлистовые ссылки и диапазоны; одинаковый seed даёт одинаковую книгу.
+    """
+    wb = generate_workbook(1000, sheets=2, chain_depth=50, cross_sheet_ratio=0.3, range_density=0.5, seed=3)
+    assert list(wb) == ['Вход', 'Лист1', 'Лист2'], f"Неверные листы: {list(wb)}"
+    formulas = [f for sheet in ('Лист1', 'Лист2') for f in wb[sheet]['formulas'].values()]
+    assert len(formulas) + len(wb['Вход']['constants']) == 1000
+    assert any('Лист1!' in f for f in wb['Лист2']['formulas'].values()), "Нет ссылок на предыдущий лист"
+    assert any('AVERAGE(' in f for f in formulas), "Нет формул с диапазонами"
+    assert generate_raw_sheets(300, seed=1) == generate_raw_sheets(300, seed=1)
+
+    graph, _ = build_dependency_graph(wb)
+    assert not find_cycles(graph)
+    values = evaluate_workbook(wb)
+    assert all(isinstance(values[f"Лист2!{addr}"], float) for addr in wb['Лист2']['formulas'])
+
+
+def test_generate_cycles():
+    wb = generate_workbook(500, sheets=1, chain_depth=20, cycles=4, seed=0)
+    graph, _ = build_dependency_graph(wb)
+    assert len(find_cycles(graph)) == 4
+    context = evaluate_workbook(wb, iterative=True)
+    assert all(row['converged'] for row in context.iteration_report)
+
+    with pytest.raises(ValueError):
+        generate_raw_sheets(100_000, sheets=1, chain_depth=1)  # Не помещается в столбцы Excel
+
+
+def test_write_xlsx(tmp_path):
+    raw = generate_raw_sheets(200, sheets=1, chain_depth=10)
+    path = write_xlsx(str(tmp_path / 'synthetic.xlsx'), raw)
+    with zipfile.ZipFile(path) as zf:
+        sheet = zf.read('xl/worksheets/sheet2.xml').decode()
+    assert sheet.count('<f>') == 190, "Все формулы листа должны быть записаны"
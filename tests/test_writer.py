@@ -0,0 +1,94 @@
+# tests/test_writer.py
+
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import date
+
+import pytest
+from src.writer import XlsxStreamWriter, write_results
+from src.errors import DIV0
+from src.model import evaluate_workbook
+
+NS = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+
+def read_sheet(path, index=1) -> dict:
+    """Читает лист записанного файла обратно: {адрес: (тип, значение, формула)}."""
+    with zipfile.ZipFile(path) as zf:
+        root = ET.fromstring(zf.read(f'xl/worksheets/sheet{index}.xml'))
+    cells = {}
+    for c in root.iter(f"{{{NS['m']}}}c"):
+        v = c.find('m:v', NS)
+        t = c.find('m:is/m:t', NS)
+        f = c.find('m:f', NS)
+        text = t.text if t is not None else (v.text if v is not None else None)
+        cells[c.get('r')] = (c.get('t'), text, f.text if f is not None else None)
+    return cells
+
+
+def test_stream_writer_value_types(tmp_path):
+    """
+    Числа, текст (с XML-символами), логические, ошибки и даты записываются в своих типах.
+    """
+    path = tmp_path / 'types.xlsx'
+    with XlsxStreamWriter(str(path)) as book:
+        with book.sheet('Итог') as sheet:
+            sheet.write_row(1, [(1, 1.5), (2, 'A&B <c>'), (3, True), (4, DIV0), (5, date(2024, 1, 1))])
+            sheet.write_row(3, [(2, 7, '=A1*2')])
+            with pytest.raises(ValueError):
+                sheet.write_row(2, [(1, 0)])  # строки только по возрастанию
+    with zipfile.ZipFile(path) as zf:
+        names = set(zf.namelist())
+        workbook = zf.read('xl/workbook.xml').decode()
+    assert {'[Content_Types].xml', 'xl/workbook.xml', 'xl/worksheets/sheet1.xml'} <= names
+    assert 'name="Итог"' in workbook
+    cells = read_sheet(path)
+    assert cells['A1'] == (None, '1.5', None)
+    assert cells['B1'] == ('inlineStr', 'A&B <c>', None)
+    assert cells['C1'] == ('b', '1', None)
+    assert cells['D1'] == ('e', '#DIV/0!', None)
+    assert cells['E1'] == (None, '45292.0', None)
+    assert cells['B3'] == (None, '7', 'A1*2')
+
+
+def test_sheet_name_validation(tmp_path):
+    with XlsxStreamWriter(str(tmp_path / 'bad.xlsx')) as book:
+        with pytest.raises(ValueError):
+            with book.sheet('a/b'):
+                pass
+
+
+def test_write_results(tmp_path):
+    """
+    Вычисленные значения записываются вместо формул, по желанию — вместе с формулами.
+    """
+    all_sheets = {
+        'Вход': {'data': {'A1': 10, 'B2': 'текст'}, 'constants': {'A1': 10, 'B2': 'текст'},
+                 'formulas': {}, 'calculated': {}},
+        'Итог': {'data': {'A1': '=Вход!A1*2', 'A2': '=A1/0'}, 'constants': {},
+                 'formulas': {'A1': '=Вход!A1*2', 'A2': '=A1/0'}, 'calculated': {}},
+    }
+    values = evaluate_workbook(all_sheets)
+    path = write_results(str(tmp_path / 'out.xlsx'), all_sheets, values)
+    assert read_sheet(path, 1) == {'A1': (None, '10', None), 'B2': ('inlineStr', 'текст', None)}
+    assert read_sheet(path, 2) == {'A1': (None, '20.0', None), 'A2': ('e', '#DIV/0!', None)}
+
+    path = write_results(str(tmp_path / 'formulas.xlsx'), all_sheets, values, formulas=True)
+    assert read_sheet(path, 2)['A1'] == (None, '20.0', 'Вход!A1*2')
+
+
+def test_write_results_orders_cells(tmp_path):
+    """
+    Ячейки в data в произвольном порядке записываются построчно, по возрастанию столбцов;
+    уже упорядоченный data пишется как есть.
+    """
+    from src.writer import _cells_in_order
+    data = {'B2': 4, 'A10': 5, 'C1': 3, 'A1': 1, 'B1': 2, 'AA2': 6}
+    all_sheets = {'Лист': {'data': data, 'constants': dict(data), 'formulas': {}, 'calculated': {}}}
+    path = write_results(str(tmp_path / 'out.xlsx'), all_sheets, {})
+    with zipfile.ZipFile(path) as zf:
+        root = ET.fromstring(zf.read('xl/worksheets/sheet1.xml'))
+    written = [c.get('r') for c in root.iter(f"{{{NS['m']}}}c")]
+    assert written == ['A1', 'B1', 'C1', 'B2', 'AA2', 'A10'], written
+    ordered = {addr: data[addr] for addr in written}
+    assert [addr for _, _, addr in _cells_in_order(ordered)] == written